@@ -1,12 +1,17 @@
 """
 AI-related API endpoints for prompt analysis and model management
 """
-from typing import Dict, Any, List
+import json
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 # from ....core.security import get_current_user
+from ....core.config import settings
 from ....services.litellm_service import litellm_service
+from ....services.semantic_cache import semantic_cache
+from ....services.circuit_breaker import model_breakers, host_breakers
 from ....models.workflow import WorkflowCreate
 
 
@@ -18,16 +23,30 @@ def get_current_user():
 router = APIRouter()
 
 
+def _use_semantic_cache(requested: Optional[bool]) -> bool:
+    return semantic_cache.enabled if requested is None else requested and semantic_cache.available
+
+
 class PromptAnalysisRequest(BaseModel):
     """Request model for prompt analysis"""
     prompt: str
     context: Dict[str, Any] = {}
+    semantic_cache: Optional[bool] = None  # defaults to SEMANTIC_CACHE_ENABLED
 
 
 class WorkflowGenerationRequest(BaseModel):
     """Request model for workflow generation"""
     prompt: str
     preferences: Dict[str, Any] = {}
+    semantic_cache: Optional[bool] = None  # defaults to SEMANTIC_CACHE_ENABLED
+
+
+class BatchCompletionRequest(BaseModel):
+    """Request model for bulk completions"""
+    requests: List[Dict[str, Any]]
+    # More workers than the per-model concurrency ceiling would only queue
+    concurrency: Optional[int] = Field(None, ge=1, le=settings.LLM_CONCURRENCY_MAX)
+    provider_batch: bool = False
 
 
 class ModelTestRequest(BaseModel):
@@ -47,11 +66,22 @@ async def analyze_prompt(
     Analyze user prompt to extract intent and suggest workflow structure
     """
     try:
-        analysis = await litellm_service.analyze_intent(request.prompt)
+        use_cache = _use_semantic_cache(request.semantic_cache)
+        cached = await semantic_cache.lookup("analyze-prompt", request.prompt) if use_cache else None
+        if cached is not None:
+            analysis, similarity = cached
+            cache_info = {"status": "hit", "similarity": round(similarity, 4)}
+        else:
+            analysis = await litellm_service.analyze_intent(request.prompt)
+            # Fallback analyses are not worth serving to other prompts
+            if use_cache and "parsing_error" not in analysis:
+                await semantic_cache.store("analyze-prompt", request.prompt, analysis)
+            cache_info = {"status": "miss" if use_cache else "bypass"}
 
         return {
             "success": True,
             "analysis": analysis,
+            "cache": cache_info,
             "user_id": current_user["id"]
         }
 
@@ -71,11 +101,27 @@ async def generate_workflow(
     Generate a complete workflow structure from user prompt
     """
     try:
-        # First analyze the prompt
-        intent_analysis = await litellm_service.analyze_intent(request.prompt)
+        # A close enough earlier prompt skips both GPT-4 calls
+        use_cache = _use_semantic_cache(request.semantic_cache)
+        cached = await semantic_cache.lookup("generate-workflow", request.prompt) if use_cache else None
+        if cached is not None:
+            generated, similarity = cached
+            intent_analysis = generated["intent_analysis"]
+            workflow_structure = generated["workflow_structure"]
+            cache_info = {"status": "hit", "similarity": round(similarity, 4)}
+        else:
+            # First analyze the prompt
+            intent_analysis = await litellm_service.analyze_intent(request.prompt)
+
+            # Then generate workflow structure
+            workflow_structure = await litellm_service.generate_workflow_structure(intent_analysis)
 
-        # Then generate workflow structure
-        workflow_structure = await litellm_service.generate_workflow_structure(intent_analysis)
+            if use_cache and "parsing_error" not in intent_analysis:
+                await semantic_cache.store("generate-workflow", request.prompt, {
+                    "intent_analysis": intent_analysis,
+                    "workflow_structure": workflow_structure
+                })
+            cache_info = {"status": "miss" if use_cache else "bypass"}
 
         # Convert to WorkflowCreate model for validation
         try:
@@ -91,6 +137,7 @@ async def generate_workflow(
             "workflow": workflow_dict,
             "intent_analysis": intent_analysis,
             "generation_meta": workflow_structure.get("generation_meta", {}),
+            "cache": cache_info,
             "user_id": current_user["id"]
         }
 
@@ -122,6 +169,19 @@ async def get_available_models():
         )
 
 
+@router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    """
+    Get circuit breaker state for LLM models and HTTP node hosts
+    """
+    return {
+        "success": True,
+        "enabled": model_breakers.enabled,
+        "models": model_breakers.get_stats(),
+        "hosts": host_breakers.get_stats()
+    }
+
+
 @router.post("/test-model")
 async def test_model(
     request: ModelTestRequest,
@@ -217,3 +277,22 @@ async def chat_completion(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Chat completion failed: {str(e)}"
         )
+
+
+@router.post("/batch-completion")
+async def batch_completion(
+    request: BatchCompletionRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Run many completions, streaming one JSON line per item as each finishes
+    """
+    async def result_stream():
+        async for item in litellm_service.batch_completion(
+            request.requests,
+            concurrency=request.concurrency,
+            provider_batch=request.provider_batch
+        ):
+            yield json.dumps(item, default=str) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
@@ -2,44 +2,62 @@
 Execution API endpoints
 """
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 
 from ....core.security import get_current_user
 from ....database import get_supabase
+from ....database.pagination import encode_cursor
 from ....models.execution import WorkflowExecution, ExecutionSummary
-from ....services.execution_service import ExecutionService
+from ....core.http_cache import if_none_match, not_modified
+from ....services.execution_service import ExecutionService, execution_etag, execution_etags
 
 
 router = APIRouter()
 
 
-@router.get("/", response_model=List[WorkflowExecution])
+@router.get("/", response_model=List[ExecutionSummary])
 async def list_executions(
+    response: Response,
     workflow_id: Optional[str] = Query(None, description="Filter by workflow ID"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase = Depends(get_supabase)
 ):
     """List executions for the current user"""
     service = ExecutionService(supabase)
 
-    executions = await service.list_executions(
-        current_user["id"],
-        workflow_id=workflow_id,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        executions = await service.list_executions(
+            current_user["id"],
+            workflow_id=workflow_id,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if len(executions) == limit and executions[-1].created_at:
+        response.headers["X-Next-Cursor"] = encode_cursor(executions[-1].created_at, executions[-1].id)
     return executions
 
 
 @router.get("/{execution_id}", response_model=WorkflowExecution)
 async def get_execution(
     execution_id: str,
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase = Depends(get_supabase)
 ):
-    """Get a specific execution"""
+    """Get a specific execution; send If-None-Match to poll for progress"""
+    # Executions running in this process, or already finished, are answered without a query
+    known_etag = execution_etags.get(execution_id, current_user["id"])
+    if known_etag and if_none_match(request, known_etag):
+        return not_modified(known_etag)
+
     service = ExecutionService(supabase)
 
     execution = await service.get_execution(execution_id, current_user["id"])
@@ -50,6 +68,12 @@ async def get_execution(
             detail="Execution not found"
         )
 
+    etag = execution_etag(execution)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
     return execution
 
 
@@ -2,19 +2,25 @@
 Workflow API endpoints
 """
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request, Response
 from fastapi.responses import StreamingResponse
 import json
 
 # from ....core.security import get_current_user
 from ....database import get_supabase
 from ....database.supabase_client import get_supabase_client
+from ....database.pagination import encode_cursor
 from ....models.workflow import (
-    Workflow, WorkflowCreate, WorkflowUpdate, WorkflowTemplate, NodeType
+    Workflow, WorkflowCreate, WorkflowUpdate, WorkflowPatch, WorkflowSummary, WorkflowTemplate,
+    WorkflowVersion, WorkflowDiff
 )
 from ....models.execution import ExecutionRequest, ExecutionResponse
-from ....services.workflow_service import WorkflowService
+from ....services.workflow_service import (
+    WorkflowService, WorkflowVersionConflict, template_catalog_response, workflow_etag
+)
+from ....core.http_cache import if_none_match, not_modified
 from ....services.execution_service import ExecutionService
+from ....services.workflow_analyzer import WorkflowAnalyzer, analyzer_sessions
 from ....services.litellm_service import litellm_service
 
 
@@ -46,47 +52,63 @@ async def create_workflow(
         )
 
 
-@router.get("/", response_model=List[Workflow])
+@router.get("/", response_model=List[WorkflowSummary])
 async def list_workflows(
+    response: Response,
     include_public: bool = Query(True, description="Include public workflows"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase = Depends(get_supabase)
 ):
     """List workflows for the current user"""
     service = WorkflowService(supabase)
 
-    workflows = await service.list_workflows(
-        current_user["id"],
-        include_public=include_public,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        workflows = await service.list_workflows(
+            current_user["id"],
+            include_public=include_public,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if len(workflows) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(workflows[-1].updated_at, workflows[-1].id)
     return workflows
 
 
-@router.get("/search", response_model=List[Workflow])
+@router.get("/search", response_model=List[WorkflowSummary])
 async def search_workflows(
     q: str = Query(..., description="Search query"),
     limit: int = Query(20, ge=1, le=50),
+    public_only: bool = Query(False, description="Only search the public gallery"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase = Depends(get_supabase)
 ):
     """Search workflows by name or description"""
     service = WorkflowService(supabase)
 
-    workflows = await service.search_workflows(q, current_user["id"], limit)
+    workflows = await service.search_workflows(q, current_user["id"], limit, public_only=public_only)
     return workflows
 
 
-@router.get("/templates")
-async def get_workflow_templates():
-    """Get available workflow templates"""
-    service = WorkflowService(None)  # Templates don't need database
+@router.get("/suggest")
+async def suggest_workflows(
+    q: str = Query(..., min_length=1, description="Prefix typed so far"),
+    limit: int = Query(10, ge=1, le=20)
+):
+    """Typeahead suggestions for public workflows"""
+    return {"suggestions": workflow_service.suggest_workflows(q, limit)}
+
 
-    templates = await service.get_workflow_templates()
-    return templates
+@router.get("/templates")
+async def get_workflow_templates(request: Request):
+    """Get available workflow templates (pre-encoded, ETag and gzip aware)"""
+    return template_catalog_response().render(request)
 
 
 @router.post("/templates/{template_id}", response_model=Workflow)
@@ -113,12 +135,13 @@ async def create_from_template(
 @router.get("/{workflow_id}", response_model=Workflow)
 async def get_workflow(
     workflow_id: str,
+    request: Request,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Get a specific workflow"""
-    service = WorkflowService(supabase=get_supabase_client())
-
-    workflow = await service.get_workflow(workflow_id, current_user["id"])
+    """Get a specific workflow; send If-None-Match to poll for changes"""
+    # Served from the workflow cache when warm, so an unchanged poll touches neither the database nor the serialiser
+    workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
 
     if not workflow:
         raise HTTPException(
@@ -126,6 +149,12 @@ async def get_workflow(
             detail="Workflow not found"
         )
 
+    etag = workflow_etag(workflow)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
     return workflow
 
 
@@ -138,7 +167,39 @@ async def update_workflow(
     """Update a workflow"""
     service = WorkflowService(supabase=get_supabase_client())
 
-    workflow = await service.update_workflow(workflow_id, workflow_data, current_user["id"])
+    try:
+        workflow = await service.update_workflow(workflow_id, workflow_data, current_user["id"])
+    except WorkflowVersionConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Workflow kept changing during the save", "current_version": e.current_version}
+        )
+
+    if not workflow:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workflow not found or access denied"
+        )
+
+    return workflow
+
+
+@router.patch("/{workflow_id}", response_model=Workflow)
+async def patch_workflow(
+    workflow_id: str,
+    patch: WorkflowPatch,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Apply JSON-Patch deltas to a workflow at a known version"""
+    try:
+        workflow = await workflow_service.patch_workflow(workflow_id, patch, current_user["id"])
+    except WorkflowVersionConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Workflow was modified by another save", "current_version": e.current_version}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     if not workflow:
         raise HTTPException(
@@ -186,6 +247,69 @@ async def publish_workflow(
     return workflow
 
 
+@router.get("/{workflow_id}/versions", response_model=List[WorkflowVersion])
+async def list_workflow_versions(
+    workflow_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """List stored revisions of a workflow, newest first"""
+    versions = await workflow_service.list_workflow_versions(workflow_id, current_user["id"], limit)
+
+    if versions is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workflow not found"
+        )
+
+    return versions
+
+
+@router.get("/{workflow_id}/versions/{version_hash}", response_model=Workflow)
+async def get_workflow_version(
+    workflow_id: str,
+    version_hash: str,
+    request: Request,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get a stored revision of a workflow"""
+    # Revisions are immutable and addressed by content hash, which is their ETag
+    etag = f'"{version_hash}"'
+    if if_none_match(request, etag) and await workflow_service.get_workflow(workflow_id, current_user["id"]):
+        return not_modified(etag, cache_control="private, max-age=31536000, immutable")
+
+    workflow = await workflow_service.get_workflow_version(workflow_id, version_hash, current_user["id"])
+
+    if not workflow:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workflow version not found"
+        )
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return workflow
+
+
+@router.post("/{workflow_id}/versions/{version_hash}/restore", response_model=Workflow)
+async def restore_workflow_version(
+    workflow_id: str,
+    version_hash: str,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Roll a workflow back to a stored revision"""
+    workflow = await workflow_service.restore_workflow_version(workflow_id, version_hash, current_user["id"])
+
+    if not workflow:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Workflow version not found or access denied"
+        )
+
+    return workflow
+
+
 @router.post("/{workflow_id}/execute", response_model=ExecutionResponse)
 async def execute_workflow(
     workflow_id: str,
@@ -197,8 +321,11 @@ async def execute_workflow(
     workflow_service = WorkflowService(supabase)
     execution_service = ExecutionService(supabase)
 
-    # Get workflow
-    workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
+    # Get workflow, or the requested stored revision of it
+    if request.version_hash:
+        workflow = await workflow_service.get_workflow_version(workflow_id, request.version_hash, current_user["id"])
+    else:
+        workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
     if not workflow:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -276,8 +403,12 @@ async def execute_workflow(
     Execute a workflow with given input data
     """
     try:
-        # Get workflow
-        workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
+        # Get workflow, or the requested stored revision of it
+        version_hash = execution_data.get("version_hash")
+        if version_hash:
+            workflow = await workflow_service.get_workflow_version(workflow_id, version_hash, current_user["id"])
+        else:
+            workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
         if not workflow:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -325,8 +456,12 @@ async def execute_workflow_stream(
     Execute a workflow with streaming response for real-time updates
     """
     try:
-        # Get workflow
-        workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
+        # Get workflow, or the requested stored revision of it
+        version_hash = execution_data.get("version_hash")
+        if version_hash:
+            workflow = await workflow_service.get_workflow_version(workflow_id, version_hash, current_user["id"])
+        else:
+            workflow = await workflow_service.get_workflow(workflow_id, current_user["id"])
         if not workflow:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -380,69 +515,54 @@ async def execute_workflow_stream(
 @router.post("/validate")
 async def validate_workflow(
     workflow_data: WorkflowCreate,
+    incremental: bool = Query(False, description="Open an editor session that accepts diffs"),
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    Validate a workflow structure without saving it
+    Validate a workflow structure without saving it. With ``incremental``,
+    the response carries a ``session_id`` for validating later edits as diffs.
     """
     try:
-        # Basic validation
-        validation_results = {
-            "valid": True,
-            "errors": [],
-            "warnings": [],
-            "suggestions": []
+        analyzer = WorkflowAnalyzer.from_workflow(workflow_data)
+        analysis = analyzer.analyze()
+        if incremental:
+            analysis.session_id = analyzer_sessions.create(current_user["id"], analyzer)
+
+        return {
+            "success": True,
+            "validation": analysis
         }
 
-        # Check for start node
-        start_nodes = [n for n in workflow_data.nodes if n.type == NodeType.START]
-        if not start_nodes:
-            validation_results["errors"].append("Workflow must have at least one START node")
-            validation_results["valid"] = False
-
-        # Check for end/answer node
-        end_nodes = [n for n in workflow_data.nodes if n.type in [NodeType.ANSWER, NodeType.END]]
-        if not end_nodes:
-            validation_results["warnings"].append("Workflow should have an ANSWER or END node")
-
-        # Check node connections
-        node_ids = {n.id for n in workflow_data.nodes}
-        for edge in workflow_data.edges:
-            if edge.source not in node_ids:
-                validation_results["errors"].append(f"Edge references non-existent source node: {edge.source}")
-                validation_results["valid"] = False
-            if edge.target not in node_ids:
-                validation_results["errors"].append(f"Edge references non-existent target node: {edge.target}")
-                validation_results["valid"] = False
-
-        # Check for isolated nodes
-        connected_nodes = set()
-        for edge in workflow_data.edges:
-            connected_nodes.add(edge.source)
-            connected_nodes.add(edge.target)
-        
-        isolated_nodes = node_ids - connected_nodes
-        if len(isolated_nodes) > 1:  # Allow one isolated node (could be start)
-            validation_results["warnings"].append(f"Found isolated nodes: {list(isolated_nodes)}")
-
-        # Check LLM nodes have prompts
-        for node in workflow_data.nodes:
-            if node.type in [NodeType.LLM, NodeType.CHAT]:
-                if not node.data.prompt:
-                    validation_results["errors"].append(f"LLM node '{node.id}' requires a prompt")
-                    validation_results["valid"] = False
-
-        # Check variable usage
-        all_variables = workflow_data.get_workflow_variables()
-        defined_variables = {v.variable for v in workflow_data.variables}
-        undefined_variables = set(all_variables) - defined_variables
-        
-        if undefined_variables:
-            validation_results["warnings"].append(f"Variables used but not defined: {list(undefined_variables)}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Workflow validation failed: {str(e)}"
+        )
+
 
+@router.post("/validate/{session_id}")
+async def revalidate_workflow(
+    session_id: str,
+    diff: WorkflowDiff,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """
+    Re-validate an editor session after applying a diff. Only the parts of
+    the graph the diff touches are re-analysed.
+    """
+    analyzer = analyzer_sessions.get(session_id, current_user["id"])
+    if analyzer is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Validation session not found or expired"
+        )
+
+    try:
+        analysis = analyzer.apply_diff(diff)
+        analysis.session_id = session_id
         return {
             "success": True,
-            "validation": validation_results
+            "validation": analysis
         }
 
     except Exception as e:
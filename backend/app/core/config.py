@@ -25,14 +25,117 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
     SUPABASE_SERVICE_KEY: Optional[str] = None
+    DB_MAX_WORKERS: int = 16
+    DB_SLOW_QUERY_MS: int = 500
 
     # LiteLLM Configuration
     OPENROUTER_API_KEY: Optional[str] = None
     OPENAI_API_KEY: Optional[str] = None
 
+    # Additional OpenRouter keys, comma separated; calls are spread across
+    # these and OPENROUTER_API_KEY by remaining per-key headroom
+    OPENROUTER_API_KEYS: Optional[str] = None
+    LLM_KEY_RPM: int = 500
+    LLM_KEY_TPM: int = 1_000_000
+    LLM_KEY_AUTH_QUARANTINE_SECONDS: int = 600
+    LLM_KEY_QUOTA_QUARANTINE_SECONDS: int = 300
+
+    # Exact-match LLM completion cache
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_BACKEND: str = "memory"  # memory, sqlite
+    LLM_CACHE_PATH: str = "data/llm_cache.sqlite3"
+    LLM_CACHE_TTL_SECONDS: int = 86400
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LLM_COALESCE_ENABLED: bool = True
+
+    # Provider rate limits across all keys, keyed by model id or provider prefix:
+    # {"openai/gpt-4": {"rpm": 500, "tpm": 300000}, "anthropic": {"rpm": 1000}}
+    LLM_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    LLM_DEFAULT_RPM: int = 500
+    LLM_DEFAULT_TPM: int = 1_000_000
+    LLM_CONCURRENCY_INITIAL: int = 16
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 128
+    LLM_RATE_LIMIT_RETRIES: int = 5
+
+    # Local token counting and prompt budgeting
+    TOKENIZER_ENABLED: bool = True
+    TOKEN_BUDGET_POLICY: str = "truncate"  # truncate, summarize, reject
+    TOKEN_SUMMARY_MODEL: str = "openai/gpt-3.5-turbo"
+    LLM_CONTEXT_WINDOWS: Dict[str, int] = {}  # overrides LiteLLM's model map
+
+    # Bulk completions: local concurrency, and the optional provider batch API
+    LLM_BATCH_CONCURRENCY: int = 32
+    LLM_BATCH_API_BASE: str = "https://api.openai.com/v1"
+    LLM_BATCH_POLL_SECONDS: int = 30
+    LLM_BATCH_TIMEOUT_SECONDS: int = 86400
+    LLM_BATCH_DISCOUNT: float = 0.5
+
+    # Shared keep-alive connection pool for provider calls, across all models
+    HTTP2_ENABLED: bool = True
+    LLM_HTTP_MAX_CONNECTIONS: int = 512
+    LLM_HTTP_KEEPALIVE_SECONDS: int = 120
+    LLM_HTTP_TIMEOUT_SECONDS: int = 600
+    LLM_HTTP_PREWARM_URLS: str = "https://openrouter.ai/api/v1"
+    LLM_HTTP_PREWARM_CONNECTIONS: int = 4
+
+    # Circuit breakers per LLM model and per HTTP node host
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_FAILURE_RATE_THRESHOLD: float = 0.5
+    CIRCUIT_SLOW_CALL_RATE_THRESHOLD: float = 0.8
+    CIRCUIT_MINIMUM_CALLS: int = 10
+    CIRCUIT_WINDOW_SECONDS: int = 60
+    CIRCUIT_OPEN_SECONDS: int = 30
+    CIRCUIT_HALF_OPEN_CALLS: int = 3
+    LLM_CIRCUIT_SLOW_CALL_MS: int = 30000
+    HTTP_CIRCUIT_SLOW_CALL_MS: int = 10000
+
+    # Semantic cache for prompt analysis and workflow generation
+    SEMANTIC_CACHE_ENABLED: bool = False
+    # litellm:<embedding model>; "hashing" is an offline embedder for tests and development
+    SEMANTIC_CACHE_EMBEDDER: Optional[str] = None
+    SEMANTIC_CACHE_DIMENSIONS: int = 512  # hashing embedder only; provider models set their own
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000
+
     # Redis Configuration
     REDIS_URL: str = "redis://localhost:6379/0"
 
+    # Workflow definition cache
+    WORKFLOW_CACHE_MAX_ENTRIES: int = 1000
+    WORKFLOW_CACHE_TTL_SECONDS: int = 300
+    WORKFLOW_CACHE_REDIS_ENABLED: bool = False
+    # Without Redis, other workers never hear of an update: each worker's
+    # memory tier may serve the old definition (and 304s for it) until its
+    # entry expires, so entries live this long instead. Enable Redis to run
+    # several workers with the full TTL.
+    WORKFLOW_CACHE_LOCAL_TTL_SECONDS: int = 5
+    VERSION_OBJECT_CACHE_MAX_ENTRIES: int = 20000
+
+    # Template catalogue HTTP caching
+    TEMPLATE_CACHE_MAX_AGE_SECONDS: int = 3600
+
+    # In-process search index over public workflows
+    SEARCH_INDEX_ENABLED: bool = True
+    SEARCH_INDEX_REFRESH_SECONDS: int = 60
+
+    # Editor validation sessions (incremental static analysis)
+    ANALYZER_SESSION_MAX_ENTRIES: int = 1000
+    ANALYZER_SESSION_TTL_SECONDS: int = 1800
+
+    # Compiled mode: hot workflow revisions run as generated code
+    COMPILED_MODE_ENABLED: bool = False
+    COMPILED_MODE_THRESHOLD_RUNS: int = 20
+    COMPILED_MODE_MAX_ENTRIES: int = 200
+
+    # Execution history write-behind buffer
+    PERSISTENCE_BATCH_SIZE: int = 200
+    PERSISTENCE_FLUSH_INTERVAL_MS: int = 500
+    PERSISTENCE_MAX_PENDING: int = 10000
+    PERSISTENCE_SHUTDOWN_TIMEOUT_SECONDS: float = 5.0
+
     # Sentry Configuration
     SENTRY_DSN: Optional[str] = None
 
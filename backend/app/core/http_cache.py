@@ -0,0 +1,133 @@
+"""
+HTTP caching helpers: strong ETags, conditional GETs and precomputed responses
+"""
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag derived from the values that identify a resource's state"""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """
+    Whether the request's If-None-Match header matches ``etag``. Uses the
+    weak comparison RFC 9110 prescribes for If-None-Match, and treats the
+    ``-gzip`` variant of an ETag as the same resource.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+
+    opaque = etag.removeprefix("W/")
+    for candidate in header.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        if candidate == opaque or candidate == opaque[:-1] + '-gzip"':
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = "private, no-cache") -> Response:
+    """Empty 304 response carrying the validator"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Whether the client accepts a gzip-encoded body"""
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class PrecomputedResponse:
+    """
+    A JSON payload encoded once, with its gzip variant and strong ETag
+    computed up front. Rendering it is a header lookup and a byte copy:
+    no serialisation, hashing or compression per request.
+    """
+
+    def __init__(self, payload: Any, cache_control: str = "public, max-age=3600"):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.cache_control = cache_control
+
+        # Each encoding is a different representation and needs its own strong ETag
+        self.gzip_body: Optional[bytes] = None
+        self.gzip_etag = self.etag[:-1] + '-gzip"'
+        if len(self.body) >= GZIP_MIN_BYTES:
+            self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+
+        self._headers: Dict[str, str] = {
+            "ETag": self.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding"
+        }
+        self._gzip_headers: Dict[str, str] = {
+            **self._headers,
+            "ETag": self.gzip_etag,
+            "Content-Encoding": "gzip"
+        }
+
+    def render(self, request: Request) -> Response:
+        """Full response, or 304 if the client already has this version"""
+        use_gzip = self.gzip_body is not None and accepts_gzip(request)
+        headers = self._gzip_headers if use_gzip else self._headers
+
+        if if_none_match(request, self.etag):
+            return Response(status_code=304, headers={
+                "ETag": headers["ETag"],
+                "Cache-Control": self.cache_control,
+                "Vary": "Accept-Encoding"
+            })
+
+        return Response(
+            content=self.gzip_body if use_gzip else self.body,
+            media_type="application/json",
+            headers=headers
+        )
+
+
+class ETagRegistry:
+    """
+    Bounded map of resource id to (owner, current ETag), kept up to date by
+    the code that changes the resource. A conditional request whose ETag
+    matches can be answered with 304 without loading the resource.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+
+    def get(self, key: str, owner: str) -> Optional[str]:
+        """Current ETag of a resource, if known and owned by ``owner``"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != owner:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, owner: str, etag: str):
+        self._entries[key] = (owner, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
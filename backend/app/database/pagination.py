@@ -0,0 +1,38 @@
+"""
+Keyset (cursor) pagination helpers for PostgREST queries
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """Encode the (sort column, id) position of the last row on a page"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Validate both parts before they are placed in a filter string
+        datetime.fromisoformat(sort_value)
+        if not isinstance(row_id, str) or not row_id.replace("-", "").isalnum():
+            raise ValueError
+        return sort_value, row_id
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_condition(column: str, cursor: str) -> str:
+    """
+    Build the PostgREST ``or`` filter selecting rows after ``cursor`` for an
+    ``ORDER BY column DESC, id DESC`` scan. The result can be passed to
+    ``query.or_()`` directly or wrapped as ``or(...)`` inside a logic tree.
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    # Timestamps contain reserved characters and must be double quoted
+    return f'{column}.lt."{sort_value}",and({column}.eq."{sort_value}",id.lt.{row_id})'
@@ -1,7 +1,11 @@
 """
 Supabase database client configuration
 """
-from typing import Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
 from supabase import create_client, Client
 from ..core.config import settings
 
@@ -9,10 +13,18 @@ from ..core.config import settings
 class SupabaseClient:
     """Supabase client wrapper"""
 
-    def __init__(self):
+    def __init__(self, max_workers: int = 16, slow_query_ms: int = 500):
         self._client: Optional[Client] = None
         self._service_client: Optional[Client] = None
 
+        # supabase-py is synchronous; queries run on a dedicated bounded pool so
+        # they never block the event loop or starve the default executor.
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+        self._slow_query_ms = slow_query_ms
+        self._stats_lock = threading.Lock()
+        self._query_stats: Dict[str, Dict[str, Any]] = {}
+
     @property
     def client(self) -> Client:
         """Get regular Supabase client (uses anon key)"""
@@ -33,6 +45,72 @@ class SupabaseClient:
             )
         return self._service_client
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Get the bounded thread pool used for database calls"""
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="supabase"
+            )
+        return self._executor
+
+    async def execute(self, query, label: str = "query"):
+        """
+        Run a query builder's blocking ``execute()`` off the event loop and
+        record its latency under ``label``
+        """
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            return await loop.run_in_executor(self.executor, query.execute)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record_timing(label, (time.perf_counter() - start_time) * 1000, failed)
+
+    def _record_timing(self, label: str, elapsed_ms: float, failed: bool):
+        """Accumulate per-label query timings"""
+        with self._stats_lock:
+            stats = self._query_stats.setdefault(label, {
+                "count": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "slow": 0
+            })
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if failed:
+                stats["errors"] += 1
+            if elapsed_ms >= self._slow_query_ms:
+                stats["slow"] += 1
+
+        if elapsed_ms >= self._slow_query_ms:
+            print(f"🐢 Slow query '{label}': {elapsed_ms:.1f}ms")
+
+    def get_query_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-label query timing statistics"""
+        with self._stats_lock:
+            return {
+                label: {
+                    **stats,
+                    "total_ms": round(stats["total_ms"], 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0
+                }
+                for label, stats in self._query_stats.items()
+            }
+
+    def shutdown(self):
+        """Release the database thread pool"""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
     def set_auth(self, token: str):
         """Set authentication token for the client"""
         self.client.auth.set_auth(token)
@@ -43,9 +121,17 @@ class SupabaseClient:
 
 
 # Global Supabase client instance
-supabase_client = SupabaseClient()
+supabase_client = SupabaseClient(
+    max_workers=settings.DB_MAX_WORKERS,
+    slow_query_ms=settings.DB_SLOW_QUERY_MS
+)
 
 
 def get_supabase() -> SupabaseClient:
     """Dependency to get Supabase client"""
     return supabase_client
+
+
+def get_supabase_client() -> SupabaseClient:
+    """Get the shared Supabase client outside of request dependencies"""
+    return supabase_client
@@ -6,11 +6,29 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+import asyncio
 import json
 from typing import Dict
 
 from .core.config import settings
 from .api.v1.api import api_router
+from .database.supabase_client import supabase_client
+from .services.persistence_service import write_behind_buffer
+from .services.workflow_cache import workflow_cache
+from .services.version_store import workflow_version_store
+from .services.runtime_graph import runtime_graph_cache
+from .services.workflow_analyzer import analyzer_sessions
+from .services.workflow_compiler import compiled_workflow_cache
+from .services.llm_cache import completion_cache, completion_flights
+from .services.rate_limiter import rate_governor
+from .services.credential_pool import credential_pool
+from .services.litellm_service import litellm_service
+from .services.circuit_breaker import model_breakers, host_breakers
+from .services.token_counter import token_counter
+from .services.http_client import llm_http_client
+from .services.semantic_cache import semantic_cache
+from .services.search_index import refresh_search_index
+from .services.workflow_service import WorkflowService, template_catalog_response
 
 
 # Initialize Sentry if DSN provided
@@ -37,6 +55,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paging cursors and validators travel in headers the frontend must read
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
@@ -92,6 +112,29 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    return {
+        "database": supabase_client.get_query_stats(),
+        "write_behind": write_behind_buffer.get_stats(),
+        "workflow_cache": workflow_cache.get_stats(),
+        "version_store": workflow_version_store.get_stats(),
+        "runtime_graphs": runtime_graph_cache.get_stats(),
+        "analyzer_sessions": analyzer_sessions.get_stats(),
+        "compiled_workflows": compiled_workflow_cache.get_stats(),
+        "llm_cache": completion_cache.get_stats(),
+        "llm_coalescing": completion_flights.get_stats(),
+        "llm_rate_limits": rate_governor.get_stats(),
+        "llm_api_keys": credential_pool.get_stats(),
+        "llm_routing": litellm_service.router.get_stats(),
+        "circuit_breakers": {"models": model_breakers.get_stats(), "hosts": host_breakers.get_stats()},
+        "token_counting": token_counter.get_stats(),
+        "llm_batches": litellm_service.batch_stats,
+        "llm_http_pool": llm_http_client.get_stats(),
+        "semantic_cache": semantic_cache.get_stats()
+    }
+
+
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
@@ -136,12 +179,26 @@ async def startup_event():
     print(f"🔧 Debug mode: {settings.DEBUG}")
     print(f"🌐 CORS origins: {settings.get_cors_origins()}")
     print(f"📊 Sentry enabled: {bool(settings.SENTRY_DSN)}")
+    await write_behind_buffer.start()
+    await workflow_cache.start()
+    await litellm_service.start()  # open provider connections before the first LLM call
+    template_catalog_response()  # encode the template catalogue once, before the first request
+    if settings.SEARCH_INDEX_ENABLED:
+        app.state.search_index_task = asyncio.create_task(
+            refresh_search_index(WorkflowService(supabase_client), settings.SEARCH_INDEX_REFRESH_SECONDS)
+        )
 
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     print("🛑 πlot Backend shutting down...")
+    if getattr(app.state, "search_index_task", None):
+        app.state.search_index_task.cancel()
+    await write_behind_buffer.stop(timeout=settings.PERSISTENCE_SHUTDOWN_TIMEOUT_SECONDS)
+    await workflow_cache.stop()
+    await litellm_service.close()
+    supabase_client.shutdown()
 
 
 if __name__ == "__main__":
@@ -5,9 +5,17 @@ __all__ = [
     "Workflow",
     "WorkflowCreate",
     "WorkflowUpdate",
+    "WorkflowPatch",
+    "PatchOperation",
     "WorkflowInDB",
+    "WorkflowSummary",
+    "WorkflowVersion",
+    "WorkflowDiff",
+    "WorkflowAnalysis",
     "Node",
     "NodeConfig",
+    "BaseNodeConfig",
+    "NODE_CONFIG_MODELS",
     "Edge",
     "NodeType",
     "WorkflowExecution",
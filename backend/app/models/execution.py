@@ -83,6 +83,7 @@ class NodeExecutionLog(BaseModel):
 class WorkflowExecutionBase(BaseModel):
     """Base workflow execution model"""
     workflow_id: str
+    workflow_version_hash: Optional[str] = None  # content hash of the revision that ran
     user_id: str
     input_data: Dict[str, Any] = Field(default_factory=dict)
     status: ExecutionStatus = ExecutionStatus.PENDING
@@ -168,6 +169,7 @@ class ExecutionRequest(BaseModel):
     """Request model for executing a workflow"""
     input_data: Dict[str, Any] = Field(default_factory=dict)
     config: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    version_hash: Optional[str] = None  # run a stored revision instead of the current one
 
     # Execution options
     timeout_seconds: Optional[int] = 300  # 5 minutes default
@@ -206,9 +208,11 @@ class ExecutionSummary(BaseModel):
     """Summary of a workflow execution"""
     id: str
     workflow_id: str
-    workflow_name: str
+    workflow_version_hash: Optional[str] = None
+    workflow_name: Optional[str] = None
     status: ExecutionStatus
-    started_at: datetime
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     duration_ms: Optional[int] = None
     tokens_used: Optional[int] = None
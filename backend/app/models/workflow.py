@@ -1,10 +1,12 @@
 """
 Workflow data models for πlot
 """
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Literal, Type, Union
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, Field, validator
+from pydantic import (
+    BaseModel, ConfigDict, Field, PrivateAttr, SerializeAsAny, TypeAdapter, model_serializer, model_validator, validator
+)
 import uuid
 
 
@@ -51,7 +53,12 @@ class NodePosition(BaseModel):
 
 
 class NodeConfig(BaseModel):
-    """Enhanced configuration for different node types (Dify-inspired)"""
+    """
+    Flat configuration covering every node type (Dify-inspired).
+
+    Kept so that existing payloads and code constructing ``NodeConfig``
+    keep working; nodes convert it to the typed config for their type.
+    """
     # Common configs
     title: Optional[str] = None
     desc: Optional[str] = None
@@ -65,6 +72,8 @@ class NodeConfig(BaseModel):
     top_p: Optional[float] = 1.0
     presence_penalty: Optional[float] = 0.0
     frequency_penalty: Optional[float] = 0.0
+    # {"mode": "fallback" | "fastest" | "hedge", "models": [...], "hedge_after_ms": 1500}
+    routing: Optional[Dict[str, Any]] = None
     
     # Chat node specific
     memory: Optional[Dict[str, Any]] = None
@@ -119,6 +128,176 @@ class NodeConfig(BaseModel):
     extract_settings: Optional[Dict[str, Any]] = None
 
 
+# Field names of the legacy flat config; reading one a typed config lacks gives None
+_LEGACY_CONFIG_FIELDS = frozenset(NodeConfig.model_fields)
+_LEGACY_CONFIG_DEFAULTS = {name: field.default for name, field in NodeConfig.model_fields.items()}
+
+
+class BaseNodeConfig(BaseModel):
+    """
+    Fields shared by every node type; subclasses add the type's own settings.
+    Keys a type does not declare are kept as extras, so saving a node never
+    loses data the client sent.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    title: Optional[str] = None
+    desc: Optional[str] = None
+
+    def __getattr__(self, name: str) -> Any:
+        extra = self.__pydantic_extra__
+        if extra and name in extra:
+            return extra[name]
+        # Generic code may read any legacy flat-config field regardless of node type
+        if name in _LEGACY_CONFIG_FIELDS:
+            return None
+        return super().__getattr__(name)
+
+    @model_serializer(mode="wrap")
+    def _serialize_compact(self, handler):
+        """Leave out fields that were never set; parsing restores their defaults"""
+        fields = type(self).model_fields
+        fields_set = self.model_fields_set
+        return {
+            key: value for key, value in handler(self).items()
+            if key in fields_set or key not in fields
+        }
+
+
+class StartNodeConfig(BaseNodeConfig):
+    variables: Optional[List[Dict[str, Any]]] = None
+
+
+class LLMNodeConfig(BaseNodeConfig):
+    model: Optional[str] = "gpt-3.5-turbo"
+    prompt: Optional[str] = None
+    system_prompt: Optional[str] = None
+    temperature: Optional[float] = 0.7
+    max_tokens: Optional[int] = 1000
+    top_p: Optional[float] = 1.0
+    presence_penalty: Optional[float] = 0.0
+    frequency_penalty: Optional[float] = 0.0
+    # {"mode": "fallback" | "fastest" | "hedge", "models": [...], "hedge_after_ms": 1500}
+    routing: Optional[Dict[str, Any]] = None
+
+
+class ChatNodeConfig(LLMNodeConfig):
+    memory: Optional[Dict[str, Any]] = None
+    conversation_variables: Optional[List[str]] = None
+
+
+class ParameterExtractorNodeConfig(LLMNodeConfig):
+    query_variable: Optional[str] = None
+    variables: Optional[List[Dict[str, Any]]] = None
+
+
+class ConditionNodeConfig(BaseNodeConfig):
+    conditions: Optional[List[Dict[str, Any]]] = None
+    logical_operator: Optional[str] = "and"  # and, or
+
+
+class CodeNodeConfig(BaseNodeConfig):
+    code: Optional[str] = None
+    code_language: Optional[str] = "python3"
+    dependencies: Optional[List[str]] = None
+    variables: Optional[List[Dict[str, Any]]] = None
+
+
+class HttpRequestNodeConfig(BaseNodeConfig):
+    method: Optional[str] = "GET"
+    url: Optional[str] = None
+    authorization: Optional[Dict[str, str]] = None
+    headers: Optional[Dict[str, str]] = None
+    params: Optional[Dict[str, str]] = None
+    body: Optional[Dict[str, Any]] = None
+    timeout: Optional[int] = 30
+
+
+class TemplateTransformNodeConfig(BaseNodeConfig):
+    template: Optional[str] = None
+    variables: Optional[List[Dict[str, Any]]] = None
+
+
+class KnowledgeRetrievalNodeConfig(BaseNodeConfig):
+    dataset_ids: Optional[List[str]] = None
+    query_variable: Optional[str] = None
+    retrieval_mode: Optional[str] = "semantic"  # semantic, full_text, hybrid
+    top_k: Optional[int] = 3
+    score_threshold: Optional[float] = 0.5
+
+
+class ToolNodeConfig(BaseNodeConfig):
+    provider_id: Optional[str] = None
+    provider_type: Optional[str] = None
+    provider_name: Optional[str] = None
+    tool_name: Optional[str] = None
+    tool_parameters: Optional[Dict[str, Any]] = None
+
+
+class IterationNodeConfig(BaseNodeConfig):
+    iterator_selector: Optional[List[str]] = None
+    output_selector: Optional[List[str]] = None
+    output_type: Optional[str] = "array"  # array, object
+
+
+class VariableAssignerNodeConfig(BaseNodeConfig):
+    variable_assignments: Optional[List[Dict[str, Any]]] = None
+
+
+class DocExtractorNodeConfig(BaseNodeConfig):
+    file_types: Optional[List[str]] = None
+    extract_settings: Optional[Dict[str, Any]] = None
+
+
+class AnswerNodeConfig(BaseNodeConfig):
+    template: Optional[str] = None
+
+
+# Typed config for each node type, selected by Node.type
+NODE_CONFIG_MODELS: Dict[NodeType, Type[BaseNodeConfig]] = {
+    NodeType.START: StartNodeConfig,
+    NodeType.END: BaseNodeConfig,
+    NodeType.LLM: LLMNodeConfig,
+    NodeType.CHAT: ChatNodeConfig,
+    NodeType.CONDITION: ConditionNodeConfig,
+    NodeType.IF_ELSE: ConditionNodeConfig,
+    NodeType.CODE: CodeNodeConfig,
+    NodeType.TEMPLATE_TRANSFORM: TemplateTransformNodeConfig,
+    NodeType.VARIABLE_ASSIGNER: VariableAssignerNodeConfig,
+    NodeType.HTTP_REQUEST: HttpRequestNodeConfig,
+    NodeType.TOOL: ToolNodeConfig,
+    NodeType.KNOWLEDGE_RETRIEVAL: KnowledgeRetrievalNodeConfig,
+    NodeType.DOC_EXTRACTOR: DocExtractorNodeConfig,
+    NodeType.LOOP: IterationNodeConfig,
+    NodeType.ITERATION: IterationNodeConfig,
+    NodeType.PARAMETER_EXTRACTOR: ParameterExtractorNodeConfig,
+    NodeType.ANSWER: AnswerNodeConfig,
+}
+
+# Lookup by enum member or raw value, without constructing the enum per node
+_CONFIG_MODEL_BY_TYPE: Dict[Any, Type[BaseNodeConfig]] = {
+    **NODE_CONFIG_MODELS,
+    **{node_type.value: model for node_type, model in NODE_CONFIG_MODELS.items()}
+}
+
+
+def _drop_none(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def _drop_inapplicable(data: Dict[str, Any], config_model: Type[BaseNodeConfig]) -> Dict[str, Any]:
+    """
+    Leave out legacy flat-config keys the typed config does not declare and
+    that only hold NodeConfig's default (None included), as every stored
+    flat node does; other keys are kept as extras
+    """
+    fields = config_model.model_fields
+    return {
+        key: value for key, value in data.items()
+        if key in fields or key not in _LEGACY_CONFIG_DEFAULTS or value != _LEGACY_CONFIG_DEFAULTS[key]
+    }
+
+
 class NodeHandle(BaseModel):
     """Input/Output handle for nodes (Dify-style)"""
     id: str
@@ -145,7 +324,7 @@ class Node(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     type: NodeType
     position: NodePosition
-    data: NodeConfig = Field(default_factory=NodeConfig)
+    data: SerializeAsAny[BaseNodeConfig] = Field(default_factory=BaseNodeConfig)
     
     # Node connections
     inputs: Optional[Dict[str, Any]] = None
@@ -160,6 +339,34 @@ class Node(BaseModel):
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
 
+    @model_validator(mode="before")
+    @classmethod
+    def _typed_config(cls, values: Any) -> Any:
+        """
+        Parse ``data`` into the config model for the node's type. Flat
+        payloads and NodeConfig instances are accepted; legacy fields that
+        do not apply to the type are dropped while they hold their default,
+        anything else is kept as an extra.
+        """
+        if not isinstance(values, dict):
+            return values
+        config_model = _CONFIG_MODEL_BY_TYPE.get(values.get("type"))
+        if config_model is None:
+            return values  # invalid type; field validation reports it
+
+        data = values.get("data")
+        if type(data) is config_model:
+            return values
+        if isinstance(data, BaseModel):
+            data = data.model_dump(exclude_unset=True)
+        values = dict(values)
+        values["data"] = config_model.model_validate(_drop_inapplicable(data or {}, config_model))
+        return values
+
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler):
+        return _drop_none(handler(self))
+
     def get_input_variables(self) -> List[str]:
         """Extract input variables from node configuration"""
         variables = []
@@ -203,6 +410,10 @@ class Edge(BaseModel):
     data: Optional[Dict[str, Any]] = None
     created_at: Optional[datetime] = Field(default_factory=datetime.utcnow)
 
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler):
+        return _drop_none(handler(self))
+
 
 class WorkflowBase(BaseModel):
     """Base workflow model"""
@@ -264,6 +475,37 @@ class WorkflowUpdate(BaseModel):
     variables: Optional[List[WorkflowVariable]] = None
     tags: Optional[List[str]] = None
     is_public: Optional[bool] = None
+    status: Optional[Literal["draft", "published", "archived"]] = None
+
+
+# Top-level members of the patchable workflow document
+PATCHABLE_FIELDS = ("name", "description", "nodes", "edges", "variables", "tags", "is_public")
+
+
+class PatchOperation(BaseModel):
+    """A single JSON-Patch (RFC 6902) operation"""
+    op: Literal["add", "remove", "replace", "test"]
+    path: str
+    value: Any = None
+
+    @validator('path')
+    def validate_path(cls, v):
+        """Only allow pointers into the editable parts of a workflow"""
+        parts = v.split("/")
+        if len(parts) < 2 or parts[0] != "" or parts[1] not in PATCHABLE_FIELDS:
+            raise ValueError(f"Patch path must start with one of: {', '.join(PATCHABLE_FIELDS)}")
+        return v
+
+
+class WorkflowPatch(BaseModel):
+    """Delta update applied only if the workflow is still at ``version``"""
+    version: int = Field(..., ge=1)
+    operations: List[PatchOperation] = Field(..., min_length=1)
+
+
+_NODE_LIST_ADAPTER = TypeAdapter(List[Node])
+_EDGE_LIST_ADAPTER = TypeAdapter(List[Edge])
+_LAZY_GRAPH_FIELDS = ("nodes", "edges")
 
 
 class Workflow(WorkflowBase):
@@ -272,11 +514,100 @@ class Workflow(WorkflowBase):
     user_id: str
     status: str = "draft"  # draft, published, archived
     version: int = 1
+    version_hash: Optional[str] = None  # content hash of this revision, stored on save
     created_at: datetime
     updated_at: datetime
     last_executed_at: Optional[datetime] = None
     execution_count: int = 0
 
+    # Raw nodes/edges from workflow_data, parsed on first access
+    _raw_graph: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_stored(cls, raw_graph: Dict[str, Any], **fields) -> "Workflow":
+        """
+        Build a workflow whose nodes and edges are parsed lazily from the
+        stored ``workflow_data``. The graph was validated when it was saved,
+        so hydration only parses it; the parsed lists are kept on the instance.
+        """
+        workflow = cls.model_construct(**fields)
+        workflow.__dict__.pop("nodes", None)
+        workflow.__dict__.pop("edges", None)
+        workflow._raw_graph = raw_graph
+        return workflow
+
+    def __getattr__(self, name: str) -> Any:
+        if name in _LAZY_GRAPH_FIELDS and self.__pydantic_private__.get("_raw_graph") is not None:
+            self._hydrate_graph()
+            return self.__dict__[name]
+        return super().__getattr__(name)
+
+    def _hydrate_graph(self):
+        """Parse the stored nodes and edges into models"""
+        raw = self._raw_graph
+        if raw is None:
+            return
+        self.__dict__["nodes"] = _NODE_LIST_ADAPTER.validate_python(raw.get("nodes") or [])
+        self.__dict__["edges"] = _EDGE_LIST_ADAPTER.validate_python(raw.get("edges") or [])
+        self._raw_graph = None
+
+    @property
+    def is_hydrated(self) -> bool:
+        """Whether nodes and edges have been parsed"""
+        return self._raw_graph is None
+
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler):
+        self._hydrate_graph()
+        return handler(self)
+
+
+class WorkflowSummary(BaseModel):
+    """Lightweight workflow listing entry without the node graph"""
+    id: str
+    name: str
+    description: Optional[str] = None
+    user_id: str
+    status: str = "draft"
+    version: int = 1
+    is_public: bool = False
+    tags: List[str] = Field(default_factory=list)
+    created_at: datetime
+    updated_at: datetime
+    last_executed_at: Optional[datetime] = None
+    execution_count: int = 0
+
+
+class WorkflowVersion(BaseModel):
+    """An immutable stored revision of a workflow"""
+    workflow_id: str
+    version: int
+    hash: str
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class WorkflowDiff(BaseModel):
+    """Editor changes to a workflow since it was last validated"""
+    nodes: List[Node] = Field(default_factory=list)  # added or changed nodes
+    removed_nodes: List[str] = Field(default_factory=list)
+    edges: List[Edge] = Field(default_factory=list)  # added or changed edges
+    removed_edges: List[str] = Field(default_factory=list)
+    variables: Optional[List[WorkflowVariable]] = None  # replaces all variables when set
+
+
+class WorkflowAnalysis(BaseModel):
+    """Result of statically analysing a workflow graph"""
+    valid: bool = True
+    errors: List[str] = Field(default_factory=list)
+    warnings: List[str] = Field(default_factory=list)
+    suggestions: List[str] = Field(default_factory=list)
+    cycles: List[List[str]] = Field(default_factory=list)
+    unreachable_nodes: List[str] = Field(default_factory=list)
+    undefined_references: Dict[str, List[str]] = Field(default_factory=dict)
+    type_mismatches: List[Dict[str, Any]] = Field(default_factory=list)
+    session_id: Optional[str] = None
+
 
 class WorkflowInDB(Workflow):
     """Workflow model as stored in database"""
@@ -0,0 +1,97 @@
+"""
+Client for OpenAI-compatible provider batch endpoints (files + batches)
+"""
+import asyncio
+import json
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class ProviderBatchClient:
+    """
+    Runs chat completions through a provider's batch API: the requests are
+    uploaded as one JSONL file, a batch job is created and polled, and the
+    output and error files are read back. Works against any server that
+    speaks the OpenAI batch protocol, including ``mock_batch_server``.
+    """
+
+    def __init__(
+        self,
+        api_base: str,
+        api_key: Optional[str],
+        poll_seconds: float = 30,
+        timeout_seconds: float = 86400,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.poll_seconds = poll_seconds
+        self.timeout_seconds = timeout_seconds
+        self.transport = transport
+
+    async def run(self, items: List[Tuple[str, Dict[str, Any]]]) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+        """
+        Batch id and outcome per custom id: ``{"body": <chat completion>}``
+        or ``{"error": <message>}``. Items missing from the output are
+        reported as errors too.
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        async with httpx.AsyncClient(
+            base_url=self.api_base, headers=headers, transport=self.transport, timeout=60
+        ) as client:
+            lines = "\n".join(
+                json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+                for custom_id, body in items
+            )
+            upload = await client.post(
+                "/files",
+                data={"purpose": "batch"},
+                files={"file": ("batch.jsonl", lines.encode(), "application/jsonl")}
+            )
+            upload.raise_for_status()
+
+            created = await client.post("/batches", json={
+                "input_file_id": upload.json()["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h"
+            })
+            created.raise_for_status()
+            batch = created.json()
+
+            deadline = time.monotonic() + self.timeout_seconds
+            while batch["status"] not in _FINAL_STATUSES:
+                if time.monotonic() > deadline:
+                    await client.post(f"/batches/{batch['id']}/cancel")
+                    raise Exception(f"Provider batch {batch['id']} did not finish in {self.timeout_seconds}s")
+                await asyncio.sleep(self.poll_seconds)
+                polled = await client.get(f"/batches/{batch['id']}")
+                polled.raise_for_status()
+                batch = polled.json()
+
+            outcomes: Dict[str, Dict[str, Any]] = {}
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if file_id:
+                    content = await client.get(f"/files/{file_id}/content")
+                    content.raise_for_status()
+                    for line in content.text.splitlines():
+                        if line.strip():
+                            record = json.loads(line)
+                            outcomes[record["custom_id"]] = self._outcome(record)
+
+        if not outcomes and batch["status"] != "completed":
+            raise Exception(f"Provider batch {batch['id']} {batch['status']}")
+        for custom_id, _ in items:
+            outcomes.setdefault(custom_id, {"error": f"No result in provider batch {batch['id']} ({batch['status']})"})
+        return batch["id"], outcomes
+
+    def _outcome(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            error = record.get("error") or body.get("error") or {}
+            return {"error": error.get("message") or f"status {response.get('status_code')}"}
+        return {"body": body}
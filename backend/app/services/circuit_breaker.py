@@ -0,0 +1,250 @@
+"""
+Circuit breakers for LLM models and outbound HTTP hosts
+"""
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Deque, Optional, Tuple
+
+from ..core.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit open for {name}; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# Client errors that say nothing about the dependency: timeouts and throttling are the exceptions
+_DEPENDENCY_CLIENT_ERRORS = (408, 429)
+
+
+def is_caller_error(error: Exception) -> bool:
+    """
+    Whether ``error`` is the caller's own mistake (a 4xx other than 408 and
+    429: bad parameters, a prompt over the context window, content policy,
+    an unknown model), which must not count against the dependency
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return 400 <= status_code < 500 and status_code not in _DEPENDENCY_CLIENT_ERRORS
+    return type(error).__name__ in (
+        "BadRequestError", "NotFoundError", "UnprocessableEntityError",
+        "ContextWindowExceededError", "ContentPolicyViolationError"
+    )
+
+
+class BreakerCall:
+    """Outcome of one guarded call, for calls that succeed at the protocol level but should count as failures"""
+
+    __slots__ = ("ok", "ignored", "latency_ms")
+
+    def __init__(self):
+        self.ok: Optional[bool] = None
+        self.ignored = False
+        self.latency_ms: Optional[float] = None
+
+    def ignore(self):
+        """Leave this call out of the statistics (e.g. the caller's own mistake)"""
+        self.ignored = True
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through while the failure and slow-call rates over the
+    last ``window_seconds`` stay under their thresholds (once at least
+    ``minimum_calls`` were made). Open: calls fail at once for
+    ``open_seconds``. Half-open: up to ``half_open_calls`` trial calls go
+    through; if all succeed the breaker closes, any failure reopens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_ms: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.8,
+        minimum_calls: int = 10,
+        window_seconds: float = 60,
+        open_seconds: float = 30,
+        half_open_calls: int = 3
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_ms = slow_call_ms
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        # (finished_at, failed, slow)
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _rates(self) -> Tuple[int, float, float]:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+        total = len(self._calls)
+        if not total:
+            return 0, 0.0, 0.0
+        failed = sum(1 for _, failure, _ in self._calls if failure)
+        slow = sum(1 for _, _, is_slow in self._calls if is_slow)
+        return total, failed / total, slow / total
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.stats["opened"] += 1
+        print(f"⚠️ Circuit opened for {self.name}")
+
+    def before_call(self):
+        """Admit a call or raise ``CircuitOpenError``"""
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - time.monotonic()
+            if remaining > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+            self._trials = 0
+            self._trial_successes = 0
+        if self.state == HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, 0.0)
+            self._trials += 1
+
+    def after_call(self, ok: Optional[bool], latency_ms: float):
+        """Record a call admitted by ``before_call``; ``ok=None`` leaves it out"""
+        half_open = self.state == HALF_OPEN
+        if ok is None:
+            if half_open:
+                self._trials -= 1
+            return
+
+        slow = self.slow_call_ms is not None and latency_ms >= self.slow_call_ms
+        failed = not ok
+        self.stats["calls"] += 1
+        self.stats["failures"] += failed
+
+        if half_open:
+            if failed or slow:
+                self._open()
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_calls:
+                self.state = CLOSED
+                self._calls.clear()
+            return
+        if self.state == OPEN:
+            return  # a call admitted before the breaker opened
+
+        self._calls.append((time.monotonic(), failed, slow))
+        total, failure_rate, slow_rate = self._rates()
+        if total >= self.minimum_calls and (
+            failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold
+        ):
+            self._open()
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[BreakerCall]:
+        """
+        Run the block as one call: raises ``CircuitOpenError`` without
+        running it when open, otherwise records success, failure (the block
+        raised or set ``ok = False``) or nothing (``ignore()``/cancelled).
+        """
+        self.before_call()
+        call = BreakerCall()
+        started = time.monotonic()
+        outcome: Optional[bool] = None
+        try:
+            yield call
+            outcome = call.ok if call.ok is not None else True
+        except Exception:
+            outcome = False
+            raise
+        finally:
+            latency_ms = call.latency_ms if call.latency_ms is not None else (time.monotonic() - started) * 1000
+            self.after_call(None if call.ignored else outcome, latency_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total, failure_rate, slow_rate = self._rates()
+        stats = {
+            **self.stats,
+            "state": self.state,
+            "window_calls": total,
+            "failure_rate": round(failure_rate, 4),
+            "slow_call_rate": round(slow_rate, 4)
+        }
+        if self.state == OPEN:
+            stats["retry_in_seconds"] = round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 1)
+        return stats
+
+
+class CircuitBreakerRegistry:
+    """One breaker per name (model id, host), created on first use with shared settings"""
+
+    def __init__(self, enabled: bool = True, **breaker_settings):
+        self.enabled = enabled
+        self.breaker_settings = breaker_settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, **self.breaker_settings)
+        return breaker
+
+    @asynccontextmanager
+    async def guard(self, name: str) -> AsyncIterator[BreakerCall]:
+        """``CircuitBreaker.guard`` for ``name``; a no-op when breakers are disabled"""
+        if not self.enabled:
+            yield BreakerCall()
+            return
+        async with self.get(name).guard() as call:
+            yield call
+
+    def state(self, name: str) -> str:
+        breaker = self._breakers.get(name)
+        return breaker.state if breaker is not None else CLOSED
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: breaker.get_stats() for name, breaker in self._breakers.items()}
+
+
+def _shared_settings() -> Dict[str, Any]:
+    return {
+        "failure_rate_threshold": settings.CIRCUIT_FAILURE_RATE_THRESHOLD,
+        "slow_call_rate_threshold": settings.CIRCUIT_SLOW_CALL_RATE_THRESHOLD,
+        "minimum_calls": settings.CIRCUIT_MINIMUM_CALLS,
+        "window_seconds": settings.CIRCUIT_WINDOW_SECONDS,
+        "open_seconds": settings.CIRCUIT_OPEN_SECONDS,
+        "half_open_calls": settings.CIRCUIT_HALF_OPEN_CALLS
+    }
+
+
+# Global circuit breakers for LLM models and HTTP node hosts
+model_breakers = CircuitBreakerRegistry(
+    enabled=settings.CIRCUIT_BREAKER_ENABLED,
+    slow_call_ms=settings.LLM_CIRCUIT_SLOW_CALL_MS,
+    **_shared_settings()
+)
+host_breakers = CircuitBreakerRegistry(
+    enabled=settings.CIRCUIT_BREAKER_ENABLED,
+    slow_call_ms=settings.HTTP_CIRCUIT_SLOW_CALL_MS,
+    **_shared_settings()
+)
@@ -0,0 +1,216 @@
+"""
+Pool of provider API keys with per-key rate limits and health
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, List, Optional
+
+from ..core.config import settings
+from .rate_limiter import TokenBucket, rate_limit_retry_after
+
+
+def classify_key_error(error: Exception) -> Optional[str]:
+    """
+    Kind of key problem behind ``error`` (auth, quota or rate_limit), or
+    None if it is not about the key. A 403 is not an auth error: providers
+    also return it for a single request, e.g. input flagged by moderation.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    name = type(error).__name__
+    message = str(error).lower()
+    if status_code == 401 or name == "AuthenticationError" or "invalid_api_key" in message:
+        return "auth"
+    if status_code == 402 or "insufficient_quota" in message or "insufficient credits" in message:
+        return "quota"
+    if rate_limit_retry_after(error) is not None:
+        return "rate_limit"
+    return None
+
+
+class ApiCredential:
+    """One API key with its own rate buckets and health"""
+
+    def __init__(self, key: str, label: str, rpm: int, tpm: int):
+        self.key = key
+        self.label = label
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.in_flight = 0
+        self.unavailable_until = 0.0
+        self.status = "healthy"
+        self.stats = {"requests": 0, "failures": 0, "quarantines": 0}
+
+    def available(self, now: float) -> bool:
+        return self.unavailable_until <= now
+
+    def headroom(self) -> float:
+        """Share of this minute's allowance still free, less calls already in flight"""
+        return min(
+            self.requests.available() / self.requests.per_minute,
+            self.tokens.available() / self.tokens.per_minute
+        ) - self.in_flight / self.requests.per_minute
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "status": self.status if not self.available(now) else "healthy",
+            "unavailable_for_seconds": round(max(0.0, self.unavailable_until - now), 1),
+            "in_flight": self.in_flight,
+            "requests_available": round(self.requests.available(), 1),
+            "tokens_available": round(self.tokens.available(), 1)
+        }
+
+
+class KeyLease:
+    """The key chosen for one call; reports the outcome back to the pool"""
+
+    def __init__(self, pool: "CredentialPool", credential: Optional[ApiCredential], estimated_tokens: int):
+        self.pool = pool
+        self.credential = credential
+        self.estimated_tokens = estimated_tokens
+
+    @property
+    def key(self) -> Optional[str]:
+        return self.credential.key if self.credential is not None else None
+
+    def record_usage(self, total_tokens: int):
+        if self.credential is None:
+            return
+        difference = self.estimated_tokens - total_tokens
+        if difference > 0:
+            self.credential.tokens.refund(difference)
+        elif difference < 0:
+            self.credential.tokens.reserve(-difference)
+
+    def failed(self, error: Exception) -> bool:
+        """
+        Take the key out of rotation if ``error`` was caused by it. Returns
+        True when another key is available to retry on straight away. The
+        last available key is never quarantined: the call fails and the
+        next one tries the key again.
+        """
+        credential = self.credential
+        if credential is None:
+            return False
+        kind = classify_key_error(error)
+        if kind is None:
+            return False
+
+        credential.stats["failures"] += 1
+        if kind == "rate_limit":
+            cooldown = rate_limit_retry_after(error) or self.pool.rate_limit_cooldown
+        else:
+            now = time.monotonic()
+            if not any(other.available(now) for other in self.pool.credentials if other is not credential):
+                return False
+            cooldown = self.pool.auth_quarantine if kind == "auth" else self.pool.quota_quarantine
+            if credential.available(now):
+                credential.stats["quarantines"] += 1
+                print(f"⚠️ API key {credential.label} quarantined for {cooldown:.0f}s after {kind} error: {str(error)}")
+        credential.status = "rate_limited" if kind == "rate_limit" else f"quarantined_{kind}"
+        credential.unavailable_until = max(credential.unavailable_until, time.monotonic() + cooldown)
+        return self.pool.has_available()
+
+
+class CredentialPool:
+    """
+    Routes each call to the available key with the most rate-limit headroom,
+    so throughput grows with the number of keys. Keys that fail with auth or
+    quota errors are quarantined for a while; rate-limited keys sit out
+    their Retry-After. An empty pool leaves the key to LiteLLM's global
+    configuration.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        rpm: int = 500,
+        tpm: int = 1_000_000,
+        auth_quarantine: float = 600,
+        quota_quarantine: float = 300,
+        rate_limit_cooldown: float = 5
+    ):
+        # Labels show only the last characters of each key
+        self.credentials = [
+            ApiCredential(key, f"{index}:...{key[-4:]}", rpm, tpm)
+            for index, key in enumerate(dict.fromkeys(key for key in keys if key))
+        ]
+        self.auth_quarantine = auth_quarantine
+        self.quota_quarantine = quota_quarantine
+        self.rate_limit_cooldown = rate_limit_cooldown
+
+    def __len__(self) -> int:
+        return len(self.credentials)
+
+    def has_available(self) -> bool:
+        now = time.monotonic()
+        return any(credential.available(now) for credential in self.credentials)
+
+    def _choose(self) -> ApiCredential:
+        now = time.monotonic()
+        available = [credential for credential in self.credentials if credential.available(now)]
+        if available:
+            return max(available, key=ApiCredential.headroom)
+        # Every key is out: rate-limited keys come back on their own, but a
+        # pool that is only quarantined keys has nothing to offer
+        cooling = [credential for credential in self.credentials if credential.status == "rate_limited"]
+        if not cooling:
+            raise Exception("No healthy API keys available; all keys are quarantined")
+        return min(cooling, key=lambda credential: credential.unavailable_until)
+
+    @asynccontextmanager
+    async def lease(self, estimated_tokens: int) -> AsyncIterator[KeyLease]:
+        """Choose a key for one call, waiting if its buckets are empty"""
+        if not self.credentials:
+            yield KeyLease(self, None, estimated_tokens)
+            return
+
+        credential = self._choose()
+        wait = max(
+            credential.requests.reserve(1),
+            credential.tokens.reserve(estimated_tokens),
+            credential.unavailable_until - time.monotonic()
+        )
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled before the call was made: give the reservation back
+                credential.requests.refund(1)
+                credential.tokens.refund(estimated_tokens)
+                raise
+        credential.in_flight += 1
+        credential.stats["requests"] += 1
+        try:
+            yield KeyLease(self, credential, estimated_tokens)
+        finally:
+            credential.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "keys": len(self.credentials),
+            "available": sum(1 for credential in self.credentials if credential.available(now)),
+            "credentials": {credential.label: credential.get_stats() for credential in self.credentials}
+        }
+
+
+def _configured_keys() -> List[str]:
+    keys = [key.strip() for key in (settings.OPENROUTER_API_KEYS or "").split(",") if key.strip()]
+    if settings.OPENROUTER_API_KEY:
+        keys.append(settings.OPENROUTER_API_KEY)
+    return keys
+
+
+# Global API key pool
+credential_pool = CredentialPool(
+    _configured_keys(),
+    rpm=settings.LLM_KEY_RPM,
+    tpm=settings.LLM_KEY_TPM,
+    auth_quarantine=settings.LLM_KEY_AUTH_QUARANTINE_SECONDS,
+    quota_quarantine=settings.LLM_KEY_QUOTA_QUARANTINE_SECONDS
+)
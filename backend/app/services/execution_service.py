@@ -7,12 +7,45 @@ import uuid
 import asyncio
 from ..models.execution import (
     WorkflowExecution, WorkflowExecutionCreate, ExecutionRequest,
-    ExecutionEvent, ExecutionEventType, ExecutionStatus,
+    ExecutionEvent, ExecutionEventType, ExecutionStatus, ExecutionSummary,
     NodeExecutionLog, NodeExecutionStatus
 )
 from ..models.workflow import Workflow, NodeType
 from ..database.supabase_client import SupabaseClient
+from ..database.pagination import keyset_condition
+from ..core.http_cache import ETagRegistry, make_etag
 from .litellm_service import litellm_service
+from .expressions import ExpressionError, compile_expression
+from .persistence_service import write_behind_buffer
+from .version_store import workflow_version_store
+
+
+# Columns needed for ExecutionSummary; input/output JSONB stays on the server
+EXECUTION_SUMMARY_COLUMNS = (
+    "id,workflow_id,workflow_version_hash,status,created_at,started_at,completed_at,duration_ms,"
+    "total_tokens_used,total_cost,workflows(name)"
+)
+
+# Statuses after which an execution no longer changes
+TERMINAL_STATUSES = (ExecutionStatus.COMPLETED, ExecutionStatus.FAILED, ExecutionStatus.CANCELLED)
+
+# Current ETag of executions this process runs or has seen finish
+execution_etags = ETagRegistry()
+
+
+def execution_etag(execution: WorkflowExecution) -> str:
+    """
+    ETag of an execution's polled state. The database rewrites updated_at
+    when the write-behind buffer flushes, so the ETag is built from the
+    fields a status update changes instead; both the in-process execution
+    and its stored row yield the same value.
+    """
+    return make_etag(
+        execution.id,
+        execution.status.value,
+        round(execution.progress, 2),
+        execution.current_node_id
+    )
 
 
 class ExecutionService:
@@ -28,13 +61,15 @@ class ExecutionService:
         request: ExecutionRequest,
         user_id: str
     ) -> WorkflowExecution:
-        """Create a new workflow execution"""
+        """Create a new workflow execution pinned to the workflow's exact revision"""
         execution_id = str(uuid.uuid4())
+        version_hash = workflow_version_store.version_hash(workflow, user_id)
 
         # Create execution record
         execution_data = {
             "id": execution_id,
             "workflow_id": workflow.id,
+            "workflow_version_hash": version_hash,
             "user_id": user_id,
             "input_data": request.input_data,
             "status": ExecutionStatus.PENDING.value,
@@ -43,7 +78,10 @@ class ExecutionService:
         }
 
         # Insert into database
-        result = self.supabase.client.table("workflow_executions").insert(execution_data).execute()
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflow_executions").insert(execution_data),
+            "executions.create"
+        )
 
         if not result.data:
             raise Exception(f"Failed to create execution: {result}")
@@ -52,6 +90,7 @@ class ExecutionService:
         execution = WorkflowExecution(
             id=execution_id,
             workflow_id=workflow.id,
+            workflow_version_hash=version_hash,
             user_id=user_id,
             input_data=request.input_data,
             status=ExecutionStatus.PENDING
@@ -59,6 +98,7 @@ class ExecutionService:
 
         # Store in active executions
         self.active_executions[execution_id] = execution
+        execution_etags.set(execution_id, user_id, execution_etag(execution))
 
         return execution
 
@@ -71,10 +111,17 @@ class ExecutionService:
                 return execution
 
         # Query database
-        result = self.supabase.client.table("workflow_executions").select("*").eq("id", execution_id).eq("user_id", user_id).execute()
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflow_executions").select("*").eq("id", execution_id).eq("user_id", user_id),
+            "executions.get"
+        )
 
         if result.data:
-            return self._db_to_execution(result.data[0])
+            execution = self._db_to_execution(result.data[0])
+            # Finished executions never change, so their ETag can be trusted from memory
+            if execution.status in TERMINAL_STATUSES:
+                execution_etags.set(execution_id, user_id, execution_etag(execution))
+            return execution
         return None
 
     async def list_executions(
@@ -82,19 +129,27 @@ class ExecutionService:
         user_id: str,
         workflow_id: Optional[str] = None,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[WorkflowExecution]:
-        """List executions for a user"""
-        query = self.supabase.client.table("workflow_executions").select("*").eq("user_id", user_id)
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> List[ExecutionSummary]:
+        """
+        List executions for a user, newest first. Pass the cursor of the last
+        row on the previous page to continue with a keyset scan on
+        (created_at, id); ``offset`` is only honoured without a cursor.
+        """
+        query = self.supabase.client.table("workflow_executions").select(EXECUTION_SUMMARY_COLUMNS).eq("user_id", user_id)
 
         if workflow_id:
             query = query.eq("workflow_id", workflow_id)
+        if cursor:
+            query = query.or_(keyset_condition("created_at", cursor))
 
-        query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
+        query = query.order("created_at", desc=True).order("id", desc=True)
+        query = query.limit(limit) if cursor else query.range(offset, offset + limit - 1)
 
-        result = query.execute()
+        result = await self.supabase.execute(query, "executions.list")
 
-        return [self._db_to_execution(row) for row in result.data or []]
+        return [self._db_to_summary(row) for row in result.data or []]
 
     async def execute_workflow(
         self,
@@ -102,6 +157,24 @@ class ExecutionService:
         execution: WorkflowExecution
     ) -> AsyncGenerator[ExecutionEvent, None]:
         """Execute a workflow and yield real-time events"""
+        # Every event, including ones not yielded to the caller, goes to the
+        # write-behind buffer; nothing here waits on the database.
+        persisted = 0
+        async for event in self._run_workflow(workflow, execution):
+            for pending_event in execution.events[persisted:]:
+                write_behind_buffer.record_event(pending_event)
+            persisted = len(execution.events)
+            yield event
+
+        for pending_event in execution.events[persisted:]:
+            write_behind_buffer.record_event(pending_event)
+
+    async def _run_workflow(
+        self,
+        workflow: Workflow,
+        execution: WorkflowExecution
+    ) -> AsyncGenerator[ExecutionEvent, None]:
+        """Run the workflow nodes, yielding events as they happen"""
         try:
             # Update execution status
             execution.status = ExecutionStatus.RUNNING
@@ -160,6 +233,10 @@ class ExecutionService:
                     node_log.completed_at = datetime.utcnow()
                     node_log.output_data = result
                     node_log.execution_time_ms = node_log.duration_ms
+                    if isinstance(result, dict):
+                        node_log.tokens_used = result.get("tokens_used")
+                        node_log.cost = result.get("cost")
+                    write_behind_buffer.record_node_log(node_log)
 
                     # Update context
                     context.set_node_output(node.id, result)
@@ -177,6 +254,7 @@ class ExecutionService:
                     node_log.status = NodeExecutionStatus.FAILED
                     node_log.completed_at = datetime.utcnow()
                     node_log.error_message = str(e)
+                    write_behind_buffer.record_node_log(node_log)
 
                     yield execution.add_event(
                         ExecutionEventType.NODE_FAILED,
@@ -241,7 +319,7 @@ class ExecutionService:
                 # Real LLM execution using LiteLLM
                 prompt_template = node.config.prompt_template or "Process this input: {input}"
                 model = node.config.model or "openai/gpt-3.5-turbo"
-                temperature = node.config.temperature or 0.7
+                temperature = 0.7 if node.config.temperature is None else node.config.temperature
                 max_tokens = node.config.max_tokens or 1000
                 system_message = node.config.system_message
 
@@ -267,32 +345,27 @@ class ExecutionService:
                 }
 
             elif node.type == NodeType.CONDITION:
-                # Simple condition evaluation
+                # Legacy {input} / {input_length} placeholders become variables of the
+                # restricted expression language; no Python is evaluated
                 condition_logic = node.config.condition_logic or "true"
                 input_value = context.get_variable("input", "")
 
-                # Simple evaluation (in production, use safer evaluation)
                 try:
-                    # Replace common variables
-                    condition = condition_logic.replace("{input}", f'"{input_value}"')
-                    condition = condition.replace("{input_length}", str(len(str(input_value))))
-
-                    # Basic safety check
-                    if any(dangerous in condition.lower() for dangerous in ['import', 'exec', 'eval', '__']):
-                        result = False
-                    else:
-                        result = eval(condition)
+                    expression = compile_expression(
+                        condition_logic.replace("{input_length}", "len(input)").replace("{input}", "input")
+                    )
+                    result = expression.evaluate(context.get_variable)
 
                     return {
                         "output": input_value,
                         "condition_result": bool(result),
                         "condition_logic": condition_logic
                     }
-                except:
+                except ExpressionError as e:
                     return {
                         "output": input_value,
                         "condition_result": False,
-                        "error": "Invalid condition logic"
+                        "error": f"Invalid condition logic: {str(e)}"
                     }
 
             elif node.type == NodeType.HTTP_REQUEST:
@@ -396,38 +469,54 @@ class ExecutionService:
             raise Exception(f"Node execution failed: {str(e)}")
 
     async def _update_execution_status(self, execution: WorkflowExecution):
-        """Update execution status in database"""
-        update_data = {
-            "status": execution.status.value,
-            "updated_at": datetime.utcnow().isoformat()
-        }
+        """Queue an execution status update for the write-behind buffer"""
+        write_behind_buffer.record_status(execution)
+        execution_etags.set(execution.id, execution.user_id, execution_etag(execution))
 
-        if execution.started_at:
-            update_data["started_at"] = execution.started_at.isoformat()
-        if execution.completed_at:
-            update_data["completed_at"] = execution.completed_at.isoformat()
-        if execution.output_data:
-            update_data["output_data"] = execution.output_data
-        if execution.error_message:
-            update_data["error_message"] = execution.error_message
+    def _db_to_summary(self, db_row: Dict[str, Any]) -> ExecutionSummary:
+        """Convert a projected database row to ExecutionSummary"""
+        status = ExecutionStatus(db_row["status"])
 
-        self.supabase.client.table("workflow_executions").update(update_data).eq("id", execution.id).execute()
+        return ExecutionSummary(
+            id=db_row["id"],
+            workflow_id=db_row["workflow_id"],
+            workflow_version_hash=db_row.get("workflow_version_hash"),
+            workflow_name=(db_row.get("workflows") or {}).get("name"),
+            status=status,
+            created_at=_parse_timestamp(db_row.get("created_at")),
+            started_at=_parse_timestamp(db_row.get("started_at")),
+            completed_at=_parse_timestamp(db_row.get("completed_at")),
+            duration_ms=db_row.get("duration_ms"),
+            tokens_used=db_row.get("total_tokens_used"),
+            cost=db_row.get("total_cost"),
+            success=status == ExecutionStatus.COMPLETED
+        )
 
     def _db_to_execution(self, db_row: Dict[str, Any]) -> WorkflowExecution:
         """Convert database row to WorkflowExecution model"""
         return WorkflowExecution(
             id=db_row["id"],
             workflow_id=db_row["workflow_id"],
+            workflow_version_hash=db_row.get("workflow_version_hash"),
             user_id=db_row["user_id"],
             input_data=db_row.get("input_data", {}),
             output_data=db_row.get("output_data"),
             status=ExecutionStatus(db_row["status"]),
+            progress=db_row.get("progress") or 0.0,
+            current_node_id=db_row.get("current_node_id"),
             started_at=datetime.fromisoformat(db_row["started_at"].replace("Z", "+00:00")) if db_row.get("started_at") else None,
             completed_at=datetime.fromisoformat(db_row["completed_at"].replace("Z", "+00:00")) if db_row.get("completed_at") else None,
             error_message=db_row.get("error_message")
         )
 
 
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Supabase timestamp string"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
 class ExecutionContext:
     """Execution context for workflow runs"""
 
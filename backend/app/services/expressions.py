@@ -0,0 +1,631 @@
+"""
+Restricted expression language for condition nodes
+"""
+import ast
+import re
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+try:
+    from re import _parser as _regex_parser
+except ImportError:  # Python < 3.11
+    import sre_parse as _regex_parser
+
+# An expression compiles to a function of a variable resolver
+Resolver = Callable[[str], Any]
+Evaluator = Callable[[Resolver], Any]
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_NESTING_DEPTH = 32
+
+# Bounds on ``matches``: patterns longer than this are rejected, and only
+# this many characters of the subject are searched. Even a guarded pattern
+# such as ``\d+x`` costs time quadratic in the subject when searched, so
+# the subject bound keeps the worst case to tens of milliseconds.
+MAX_PATTERN_LENGTH = 256
+MAX_MATCH_SUBJECT_LENGTH = 4000
+
+_REPEAT_OPS = ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+_BACKREFERENCE_OPS = ("GROUPREF", "GROUPREF_EXISTS")
+
+# Characters tried when deciding whether two parts of a pattern can match
+# the same character: Latin-1 and Latin Extended, plus a few other scripts
+_SAMPLE_CHARACTERS = frozenset(map(chr, range(0x250))) | frozenset("\u0663\u0416\u4e2d\u3000\u2028")
+_CATEGORY_CLASSES = {
+    "CATEGORY_DIGIT": r"\d", "CATEGORY_NOT_DIGIT": r"\D",
+    "CATEGORY_SPACE": r"\s", "CATEGORY_NOT_SPACE": r"\S",
+    "CATEGORY_WORD": r"\w", "CATEGORY_NOT_WORD": r"\W",
+    "CATEGORY_LINEBREAK": r"\n", "CATEGORY_NOT_LINEBREAK": r"[^\n]"
+}
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d+)?)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<template>\{\{[^}]+\}\})
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z0-9_]+)*)
+      | (?P<op>==|!=|<=|>=|<|>|\(|\)|,|-)
+    )""", re.VERBOSE)
+
+_CONSTANTS = {"true": True, "false": False, "null": None, "none": None}
+_COMPARISONS = {
+    "==", "!=", "<", "<=", ">", ">=", "contains", "not contains", "in", "not in",
+    "startswith", "endswith", "matches"
+}
+
+
+class ExpressionError(ValueError):
+    """An expression that does not parse or uses something the language does not allow"""
+    pass
+
+
+def _length(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, list, tuple, dict, set)):
+        return len(value)
+    return len(str(value))
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+# The only functions an expression can call
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "len": _length,
+    "lower": lambda value: _text(value).lower(),
+    "upper": lambda value: _text(value).upper(),
+    "trim": lambda value: _text(value).strip(),
+    "str": _text,
+    "number": _number,
+    "is_empty": lambda value: _length(value) == 0,
+}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _coerce(left: Any, right: Any) -> Tuple[Any, Any]:
+    """Compare numbers with numeric strings numerically, as variables are often strings"""
+    if _is_number(left) and isinstance(right, str):
+        number = _number(right)
+        if number is not None:
+            return left, number
+    elif _is_number(right) and isinstance(left, str):
+        number = _number(left)
+        if number is not None:
+            return number, right
+    return left, right
+
+
+def _contains(container: Any, item: Any) -> bool:
+    if container is None:
+        return False
+    if isinstance(container, str):
+        return _text(item) in container
+    if isinstance(container, (list, tuple, set, dict)):
+        return item in container
+    return _text(item) in str(container)
+
+
+def _equal(left: Any, right: Any) -> bool:
+    left, right = _coerce(left, right)
+    return left == right
+
+
+def _ordered(op: str) -> Callable[[Any, Any], bool]:
+    compare = {
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+    }[op]
+
+    def ordered(left: Any, right: Any) -> bool:
+        left, right = _coerce(left, right)
+        try:
+            return bool(compare(left, right))
+        except TypeError:
+            return False  # e.g. None < 3 is simply not true
+    return ordered
+
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": _equal,
+    "!=": lambda a, b: not _equal(a, b),
+    "<": _ordered("<"),
+    "<=": _ordered("<="),
+    ">": _ordered(">"),
+    ">=": _ordered(">="),
+    "contains": _contains,
+    "not contains": lambda a, b: not _contains(a, b),
+    "in": lambda a, b: _contains(b, a),
+    "not in": lambda a, b: not _contains(b, a),
+    "startswith": lambda a, b: a is not None and _text(a).startswith(_text(b)),
+    "endswith": lambda a, b: a is not None and _text(a).endswith(_text(b)),
+}
+
+
+class _Parser:
+    """
+    Recursive-descent parser producing a tuple AST:
+
+        or      := and ("or" and)*
+        and     := not ("and" not)*
+        not     := "not" not | compare
+        compare := unary (op unary)?
+        unary   := "-" unary | primary
+        primary := number | string | constant | variable | {{variable}}
+                 | function "(" args ")" | "(" or ")"
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.tokens = self._tokenize(source)
+        self.position = 0
+
+    def _tokenize(self, source: str) -> List[Tuple[str, str, int]]:
+        tokens, index = [], 0
+        while index < len(source):
+            if source[index:].strip() == "":
+                break
+            match = _TOKEN_RE.match(source, index)
+            if match is None or match.end() == index:
+                raise ExpressionError(f"Unexpected character at position {index}: {source[index:index + 10]!r}")
+            kind = match.lastgroup
+            tokens.append((kind, match.group(kind), match.start(kind)))
+            index = match.end()
+        return tokens
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise ExpressionError("Empty expression")
+        tree = self._or(0)
+        if self.position < len(self.tokens):
+            _, text, offset = self.tokens[self.position]
+            raise ExpressionError(f"Unexpected {text!r} at position {offset}")
+        return tree
+
+    def _peek(self, offset: int = 0) -> Optional[Tuple[str, str, int]]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def _word(self, offset: int = 0) -> Optional[str]:
+        token = self._peek(offset)
+        return token[1].lower() if token and token[0] == "name" else None
+
+    def _expect(self, text: str):
+        token = self._peek()
+        if token is None or token[1] != text:
+            raise ExpressionError(f"Expected {text!r} at position {token[2] if token else len(self.source)}")
+        self.position += 1
+
+    def _or(self, depth: int) -> tuple:
+        operands = [self._and(depth)]
+        while self._word() == "or":
+            self.position += 1
+            operands.append(self._and(depth))
+        return operands[0] if len(operands) == 1 else ("or", operands)
+
+    def _and(self, depth: int) -> tuple:
+        operands = [self._not(depth)]
+        while self._word() == "and":
+            self.position += 1
+            operands.append(self._not(depth))
+        return operands[0] if len(operands) == 1 else ("and", operands)
+
+    def _not(self, depth: int) -> tuple:
+        if self._word() == "not":
+            self.position += 1
+            return ("not", self._not(depth + 1))
+        return self._compare(depth)
+
+    def _compare(self, depth: int) -> tuple:
+        left = self._unary(depth)
+        token = self._peek()
+        if token is None:
+            return left
+
+        op = None
+        if token[0] == "op" and token[1] in _COMPARISONS:
+            op, width = token[1], 1
+        elif self._word() in ("contains", "in", "startswith", "endswith", "matches"):
+            op, width = self._word(), 1
+        elif self._word() == "not" and self._word(1) in ("contains", "in"):
+            op, width = f"not {self._word(1)}", 2
+        if op is None:
+            return left
+
+        self.position += width
+        return ("compare", op, left, self._unary(depth))
+
+    def _unary(self, depth: int) -> tuple:
+        if depth > MAX_NESTING_DEPTH:
+            raise ExpressionError("Expression is nested too deeply")
+        token = self._peek()
+        if token is not None and token[1] == "-":
+            self.position += 1
+            return ("negate", self._unary(depth + 1))
+        return self._primary(depth)
+
+    def _primary(self, depth: int) -> tuple:
+        token = self._peek()
+        if token is None:
+            raise ExpressionError("Unexpected end of expression")
+        kind, text, offset = token
+        self.position += 1
+
+        if kind == "number":
+            return ("const", float(text) if "." in text else int(text))
+        if kind == "string":
+            return ("const", ast.literal_eval(text))
+        if kind == "template":
+            return ("var", text[2:-2].strip())
+        if kind == "name":
+            if text.lower() in _CONSTANTS:
+                return ("const", _CONSTANTS[text.lower()])
+            following = self._peek()
+            if following is not None and following[1] == "(":
+                return self._call(text, offset, depth)
+            return ("var", text)
+        if text == "(":
+            tree = self._or(depth + 1)
+            self._expect(")")
+            return tree
+        raise ExpressionError(f"Unexpected {text!r} at position {offset}")
+
+    def _call(self, name: str, offset: int, depth: int) -> tuple:
+        if name not in FUNCTIONS:
+            raise ExpressionError(f"Unknown function {name!r} at position {offset}")
+        self._expect("(")
+        args = []
+        if self._peek() is not None and self._peek()[1] != ")":
+            args.append(self._or(depth + 1))
+            while self._peek() is not None and self._peek()[1] == ",":
+                self.position += 1
+                args.append(self._or(depth + 1))
+        self._expect(")")
+        if len(args) != 1:
+            raise ExpressionError(f"Function {name!r} takes exactly one argument")
+        return ("call", name, args)
+
+
+def _compile(tree: tuple) -> Evaluator:
+    """Turn an AST into nested closures; all lookups and dispatch happen here, once"""
+    kind = tree[0]
+
+    if kind == "const":
+        value = tree[1]
+        return lambda resolve: value
+
+    if kind == "var":
+        name = tree[1]
+        return lambda resolve: resolve(name)
+
+    if kind == "not":
+        operand = _compile(tree[1])
+        return lambda resolve: not operand(resolve)
+
+    if kind == "negate":
+        operand = _compile(tree[1])
+
+        def negate(resolve: Resolver) -> Any:
+            number = _number(operand(resolve))
+            return None if number is None else -number
+        return negate
+
+    if kind in ("and", "or"):
+        operands = tuple(_compile(operand) for operand in tree[1])
+        if kind == "and":
+            return lambda resolve: all(operand(resolve) for operand in operands)
+        return lambda resolve: any(operand(resolve) for operand in operands)
+
+    if kind == "call":
+        function = FUNCTIONS[tree[1]]
+        argument = _compile(tree[2][0])
+        return lambda resolve: function(argument(resolve))
+
+    if kind == "compare":
+        op, left, right = tree[1], _compile(tree[2]), _compile(tree[3])
+        if op == "matches":
+            return _compile_match(left, tree[3])
+        compare = _OPERATORS[op]
+        return lambda resolve: compare(left(resolve), right(resolve))
+
+    raise ExpressionError(f"Unknown expression node {kind!r}")
+
+
+def _characters(op: str, av: Any) -> Optional[frozenset]:
+    """Sample characters a single-character item can match, or None for other items"""
+    if op == "LITERAL":
+        character = chr(av)
+        return frozenset((character, character.lower(), character.upper()))
+    if op == "NOT_LITERAL":
+        return _SAMPLE_CHARACTERS - {chr(av)}
+    if op == "ANY":
+        return _SAMPLE_CHARACTERS
+    if op == "RANGE":
+        low, high = av
+        return frozenset(c for c in _SAMPLE_CHARACTERS if low <= ord(c) <= high) | {chr(low), chr(high)}
+    if op == "CATEGORY":
+        category = _CATEGORY_CLASSES.get(str(av))
+        if category is None:
+            return _SAMPLE_CHARACTERS
+        return frozenset(filter(re.compile(category).fullmatch, _SAMPLE_CHARACTERS))
+    if op == "IN":
+        negated = bool(av) and str(av[0][0]) == "NEGATE"
+        matched = frozenset().union(*(
+            _characters(str(item_op), item_av) or frozenset()
+            for item_op, item_av in (av[1:] if negated else av)
+        ))
+        return _SAMPLE_CHARACTERS - matched if negated else matched
+    return None
+
+
+def _first(items) -> Tuple[frozenset, bool]:
+    """Characters a sequence can start with, and whether it can match nothing"""
+    first = frozenset()
+    for op, av in items:
+        characters, nullable = _item_first(str(op), av)
+        first |= characters
+        if not nullable:
+            return first, False
+    return first, True
+
+
+def _item_first(op: str, av: Any) -> Tuple[frozenset, bool]:
+    characters = _characters(op, av)
+    if characters is not None:
+        return characters, False
+    if op in _REPEAT_OPS:
+        characters, nullable = _first(av[2])
+        return characters, nullable or av[0] == 0
+    if op == "SUBPATTERN":
+        return _first(av[-1])
+    if op == "ATOMIC_GROUP":
+        return _first(av)
+    if op == "BRANCH":
+        branches = [_first(branch) for branch in av[1]]
+        return frozenset().union(*(chars for chars, _ in branches)), any(nullable for _, nullable in branches)
+    if op in ("AT", "ASSERT", "ASSERT_NOT"):
+        return frozenset(), True
+    return _SAMPLE_CHARACTERS, True  # unknown constructs are assumed to match anything
+
+
+def _variable_repeat(op: str, av: Any) -> Optional[tuple]:
+    """The repeat an item amounts to, if it can match a varying number of times"""
+    while op == "SUBPATTERN" and len(av[-1]) == 1:
+        op, av = str(av[-1][0][0]), av[-1][0][1]
+    if op in _REPEAT_OPS and av[0] != av[1]:
+        return av
+    return None
+
+
+def _check_regex(items, repeated: bool = False):
+    """
+    Reject the constructs that make backtracking super-linear: a quantifier
+    inside another quantifier, such as ``(a+)+``; a repeated group that can
+    match nothing, ``(a?)*``; alternatives under a quantifier that can
+    match the same text, ``(a|a)*``; variable quantifiers in a row over
+    overlapping characters, ``\\d*\\d*``, even with optional items between
+    them; and backreferences.
+    """
+    items = list(items)
+    for index, (op, av) in enumerate(items):
+        name = str(op)
+        if name in _BACKREFERENCE_OPS:
+            raise ExpressionError("Backreferences are not allowed in regular expressions")
+        if name in _REPEAT_OPS:
+            low, high, body = av
+            if repeated and high > 1:
+                raise ExpressionError("Nested quantifiers are not allowed in regular expressions")
+            if high > 1 and _first(body)[1]:
+                raise ExpressionError("Quantified groups that can match nothing are not allowed in regular expressions")
+            _check_regex(body, repeated or high > 1)
+        elif name == "SUBPATTERN":
+            _check_regex(av[-1], repeated)
+        elif name == "BRANCH":
+            if repeated:
+                seen, nullable = frozenset(), False
+                for branch in av[1]:
+                    characters, can_be_empty = _first(branch)
+                    if characters & seen or (can_be_empty and nullable):
+                        raise ExpressionError(
+                            "Alternatives under a quantifier must not match the same text in regular expressions"
+                        )
+                    seen, nullable = seen | characters, nullable or can_be_empty
+            for branch in av[1]:
+                _check_regex(branch, repeated)
+        elif name in ("ASSERT", "ASSERT_NOT"):
+            _check_regex(av[1], repeated)
+        elif name == "ATOMIC_GROUP":
+            _check_regex(av, repeated)
+
+        repeat = _variable_repeat(name, av)
+        if repeat is None:
+            continue
+        characters = _first(repeat[2])[0]
+        for next_op, next_av in items[index + 1:]:
+            next_repeat = _variable_repeat(str(next_op), next_av)
+            if next_repeat is not None and characters & _first(next_repeat[2])[0]:
+                raise ExpressionError(
+                    "Quantifiers in a row must not match the same characters in regular expressions "
+                    "(write \\d+(\\.\\d+)? rather than \\d+\\.?\\d+)"
+                )
+            if not _item_first(str(next_op), next_av)[1]:
+                break  # a required item separates them
+
+
+@lru_cache(maxsize=1024)
+def _compile_regex(source: str) -> "re.Pattern[str]":
+    """Compile a ``matches`` pattern after checking it cannot backtrack catastrophically"""
+    if len(source) > MAX_PATTERN_LENGTH:
+        raise ExpressionError(f"Regular expression is longer than {MAX_PATTERN_LENGTH} characters")
+    try:
+        _check_regex(_regex_parser.parse(source))
+        return re.compile(source)
+    except re.error as e:
+        raise ExpressionError(f"Invalid regular expression: {str(e)}")
+
+
+def _search(pattern: "re.Pattern[str]", subject: Any) -> bool:
+    return pattern.search(_text(subject), 0, MAX_MATCH_SUBJECT_LENGTH) is not None
+
+
+def _compile_match(subject: Evaluator, pattern_tree: tuple) -> Evaluator:
+    """Regex match; literal patterns are compiled once, here"""
+    if pattern_tree[0] == "const":
+        pattern = _compile_regex(_text(pattern_tree[1]))
+        return lambda resolve: _search(pattern, subject(resolve))
+
+    dynamic = _compile(pattern_tree)
+
+    def match(resolve: Resolver) -> bool:
+        # A pattern from a variable that is invalid or unsafe matches nothing
+        try:
+            pattern = _compile_regex(_text(dynamic(resolve)))
+        except ExpressionError:
+            return False
+        return _search(pattern, subject(resolve))
+    return match
+
+
+def _variables(tree: tuple) -> List[str]:
+    kind = tree[0]
+    if kind == "var":
+        return [tree[1]]
+    if kind in ("not", "negate"):
+        return _variables(tree[1])
+    if kind in ("and", "or"):
+        return [name for operand in tree[1] for name in _variables(operand)]
+    if kind == "call":
+        return _variables(tree[2][0])
+    if kind == "compare":
+        return _variables(tree[2]) + _variables(tree[3])
+    return []
+
+
+class CompiledExpression:
+    """A parsed and compiled expression; evaluating it has no side effects"""
+
+    __slots__ = ("source", "variables", "_evaluate")
+
+    def __init__(self, source: str, tree: tuple):
+        self.source = source
+        self.variables: Tuple[str, ...] = tuple(dict.fromkeys(_variables(tree)))
+        self._evaluate = _compile(tree)
+
+    def evaluate(self, resolve: Resolver) -> Any:
+        return self._evaluate(resolve)
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.source!r})"
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(source: str) -> CompiledExpression:
+    """Parse and compile an expression, cached by its source text"""
+    if len(source) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    return CompiledExpression(source, _Parser(source).parse())
+
+
+# Dify-style comparison operators accepted in structured conditions
+_STRUCTURED_OPERATORS = {
+    "contains": "contains",
+    "not contains": "not contains",
+    "start with": "startswith",
+    "starts with": "startswith",
+    "end with": "endswith",
+    "ends with": "endswith",
+    "is": "==",
+    "is not": "!=",
+    "=": "==",
+    "==": "==",
+    "≠": "!=",
+    "!=": "!=",
+    ">": ">",
+    "<": "<",
+    "≥": ">=",
+    ">=": ">=",
+    "≤": "<=",
+    "<=": "<=",
+    "in": "in",
+    "not in": "not in",
+    "regex match": "matches",
+    "matches": "matches",
+}
+
+
+def _structured_tree(condition: Dict[str, Any]) -> Tuple[str, tuple]:
+    """AST and display text of a ``{variable, comparison_operator, value}`` condition"""
+    selector = condition.get("variable_selector")
+    variable = ".".join(str(part) for part in selector) if selector else condition.get("variable")
+    if not variable:
+        raise ExpressionError("Condition needs an 'expression', 'variable' or 'variable_selector'")
+
+    operator = str(condition.get("comparison_operator") or condition.get("operator") or "is").strip().lower()
+    subject = ("var", variable)
+    if operator in ("empty", "is empty"):
+        return f"{variable} is empty", ("call", "is_empty", [subject])
+    if operator in ("not empty", "is not empty"):
+        return f"{variable} is not empty", ("not", ("call", "is_empty", [subject]))
+    if operator not in _STRUCTURED_OPERATORS:
+        raise ExpressionError(f"Unknown comparison operator {operator!r}")
+
+    value = condition.get("value")
+    return f"{variable} {operator} {value!r}", ("compare", _STRUCTURED_OPERATORS[operator], subject, ("const", value))
+
+
+def compile_condition(condition: Dict[str, Any]) -> CompiledExpression:
+    """
+    Compile one entry of a condition node's ``conditions``: either
+    ``{"expression": "..."}`` or a structured
+    ``{"variable" | "variable_selector", "comparison_operator", "value"}``.
+    """
+    expression = condition.get("expression")
+    if isinstance(expression, str):
+        return compile_expression(expression)
+    source, tree = _structured_tree(condition)
+    return CompiledExpression(source, tree)
+
+
+class ConditionSet:
+    """The compiled conditions of a condition node, combined with and/or"""
+
+    __slots__ = ("conditions", "logical_operator", "error")
+
+    def __init__(self, conditions: Optional[List[Dict[str, Any]]], logical_operator: Optional[str] = "and"):
+        self.logical_operator = "or" if (logical_operator or "and").lower() == "or" else "and"
+        self.conditions: Tuple[CompiledExpression, ...] = ()
+        # Compile errors surface when the node runs, not when the graph is built
+        self.error: Optional[str] = None
+        try:
+            self.conditions = tuple(compile_condition(condition) for condition in conditions or [])
+        except ExpressionError as e:
+            self.error = str(e)
+
+    @property
+    def variables(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(name for condition in self.conditions for name in condition.variables))
+
+    def evaluate(self, resolve: Resolver) -> Tuple[bool, List[Tuple[str, bool]]]:
+        """Overall result and each condition's result, in order"""
+        if self.error is not None:
+            raise ExpressionError(self.error)
+        results = [(condition.source, bool(condition.evaluate(resolve))) for condition in self.conditions]
+        if not results:
+            return True, results
+        values = (value for _, value in results)
+        return (any(values) if self.logical_operator == "or" else all(values)), results
@@ -0,0 +1,137 @@
+"""
+Shared, pre-warmed connection pool for LLM provider traffic
+"""
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from ..core.config import settings
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:  # HTTP/1.1 keep-alive still works without it
+    HTTP2_AVAILABLE = False
+
+
+class PooledHttpClient:
+    """
+    One ``httpx.AsyncClient`` for all provider calls, so connections (and
+    their TLS sessions) are kept alive and reused instead of set up per
+    call. Every model shares the pool, so it is sized for the most calls
+    expected in flight across all of them (LLM_HTTP_MAX_CONNECTIONS), not
+    for one model's concurrency ceiling; calls beyond it wait for a free
+    connection. ``start`` opens the first connections before traffic
+    arrives.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 128,
+        keepalive_seconds: float = 120,
+        http2: bool = True,
+        warm_urls: Optional[List[str]] = None,
+        warm_connections: int = 2
+    ):
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.warm_urls = warm_urls or []
+        self.warm_connections = warm_connections
+        self.client: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "responses": 0, "prewarmed": 0, "prewarm_ms": None}
+
+    async def _on_request(self, request: httpx.Request):
+        self.stats["requests"] += 1
+
+    async def _on_response(self, response: httpx.Response):
+        self.stats["responses"] += 1
+
+    def get_client(self) -> httpx.AsyncClient:
+        """The shared client, created on first use"""
+        if self.client is None or self.client.is_closed:
+            if settings.HTTP2_ENABLED and not HTTP2_AVAILABLE:
+                print("⚠️ HTTP/2 requested but the h2 package is not installed; using HTTP/1.1 keep-alive")
+            self.client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_seconds
+                ),
+                timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=10.0),
+                event_hooks={"request": [self._on_request], "response": [self._on_response]}
+            )
+        return self.client
+
+    async def start(self) -> httpx.AsyncClient:
+        """Create the client and open connections to each provider host"""
+        client = self.get_client()
+        started = time.time()
+        # Concurrent requests each need their own HTTP/1.1 connection;
+        # one HTTP/2 connection multiplexes them all
+        per_host = 1 if self.http2 else self.warm_connections
+        results = await asyncio.gather(
+            *(self._warm(client, url) for url in self.warm_urls for _ in range(per_host)),
+            return_exceptions=True
+        )
+        self.stats["prewarmed"] = sum(1 for result in results if result is True)
+        self.stats["prewarm_ms"] = int((time.time() - started) * 1000)
+        return client
+
+    async def _warm(self, client: httpx.AsyncClient, url: str) -> bool:
+        try:
+            # Any response means DNS, TCP and TLS are done and the connection is pooled
+            await client.head(url)
+            return True
+        except Exception as e:
+            print(f"⚠️ Connection pre-warm to {urlparse(url).netloc} failed: {str(e)}")
+            return False
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _connections(self) -> List[Any]:
+        # httpcore's pool is not public API; stats degrade to counters if it changes
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        try:
+            return list(getattr(pool, "connections", None) or [])
+        except TypeError:
+            return []
+
+    @staticmethod
+    def _describe(connection: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return {"idle": bool(connection.is_idle()), "http2": "HTTP/2" in str(connection.info())}
+        except Exception:
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            **self.stats,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "keepalive_seconds": self.keepalive_seconds
+        }
+        if self.client is not None and not self.client.is_closed:
+            connections = self._connections()
+            described = [info for info in map(self._describe, connections) if info is not None]
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for info in described if info["idle"])
+            stats["http2_connections"] = sum(1 for info in described if info["http2"])
+        return stats
+
+
+# Global connection pool for LLM providers
+llm_http_client = PooledHttpClient(
+    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+    keepalive_seconds=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+    http2=settings.HTTP2_ENABLED,
+    warm_urls=[url.strip() for url in settings.LLM_HTTP_PREWARM_URLS.split(",") if url.strip()],
+    warm_connections=settings.LLM_HTTP_PREWARM_CONNECTIONS
+)
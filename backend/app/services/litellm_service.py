@@ -2,13 +2,21 @@
 LiteLLM service for AI model integration with OpenRouter
 """
 import asyncio
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple
 import litellm
 from litellm import acompletion
 import json
 import time
 
 from ..core.config import settings
+from .llm_cache import completion_cache, completion_cache_key, completion_flights
+from .rate_limiter import rate_governor, rate_limit_retry_after
+from .token_counter import token_counter
+from .credential_pool import credential_pool, classify_key_error
+from .circuit_breaker import model_breakers, is_caller_error
+from .model_router import ModelHealthTracker, ModelRouter, RoutingPolicy
+from .batch_client import ProviderBatchClient
+from .http_client import llm_http_client
 
 
 class LiteLLMService:
@@ -38,6 +46,20 @@ class LiteLLMService:
             "meta-llama/llama-2-70b-chat": {"input": 0.7, "output": 0.8}
         }
 
+        # Rolling latency and error rates per model, used for routing
+        self.model_health = ModelHealthTracker()
+        self.router = ModelRouter(self.model_health)
+
+        self.batch_stats = {"batches": 0, "items": 0, "failed_items": 0, "provider_batches": 0}
+
+    async def start(self):
+        """Route provider calls through the shared, pre-warmed connection pool"""
+        litellm.aclient_session = await llm_http_client.start()
+
+    async def close(self):
+        litellm.aclient_session = None
+        await llm_http_client.close()
+
     async def completion(
         self,
         messages: List[Dict[str, str]],
@@ -45,12 +67,36 @@ class LiteLLMService:
         temperature: float = 0.7,
         max_tokens: int = 1000,
         stream: bool = False,
+        cache: Optional[bool] = None,
+        budget_policy: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Generate completion using LiteLLM
+
+        The prompt is measured locally before dispatch. If it does not fit
+        the model's context window next to ``max_tokens``, ``budget_policy``
+        (default TOKEN_BUDGET_POLICY) decides: "truncate" drops old history
+        and shortens the longest message, "summarize" condenses the longest
+        message with a cheaper model, "reject" fails at once. Context
+        windows come from LiteLLM's model map; prompts for models it does
+        not know are left to the provider. The result's ``prompt_budget``
+        field says what was done.
+
+        Deterministic requests (temperature 0) are answered from the
+        completion cache when an identical request was seen before; pass
+        ``cache=True`` to cache other requests too, or ``cache=False`` to
+        always call the provider. Identical cacheable requests already in
+        flight are coalesced into one provider call; sampled requests are
+        not, so each caller gets its own sample. The result's ``cache``
+        field is "hit", "miss", "coalesced" or "bypass"; hits and coalesced
+        results cost nothing.
         """
         try:
+            messages, budget = await self._fit_prompt(
+                messages, model, max_tokens, budget_policy or settings.TOKEN_BUDGET_POLICY
+            )
+
             # Prepare the request
             request_data = {
                 "model": model,
@@ -68,72 +114,397 @@ class LiteLLMService:
                     "X-Title": "πlot AI Workflow Builder"
                 }
 
+            if stream:
+                return self._stream_completion(request_data)
+
+            # Sharing one response is only right where the caller would accept a cached one
+            cacheable = cache if cache is not None else temperature == 0
+            use_cache = completion_cache.enabled and cacheable
+            coalesce = settings.LLM_COALESCE_ENABLED and cacheable
+            if not use_cache and not coalesce:
+                return {**await self._complete(request_data), "cache": "bypass", **budget}
+
             start_time = time.time()
+            cache_key = completion_cache_key(model, messages, temperature, max_tokens, kwargs)
+            if use_cache:
+                cached = await completion_cache.get(cache_key)
+                if cached is not None:
+                    return {
+                        **cached,
+                        "cost": 0.0,
+                        "response_time_ms": int((time.time() - start_time) * 1000),
+                        "cache": "hit",
+                        **budget
+                    }
 
-            if stream:
-                return await self._stream_completion(request_data)
-            else:
-                response = await acompletion(**request_data)
-                end_time = time.time()
+            async def fetch() -> Dict[str, Any]:
+                result = await self._complete(request_data)
+                if use_cache:
+                    await completion_cache.set(cache_key, result)
+                return result
 
-                # Calculate cost and metrics
-                usage = response.usage if hasattr(response, 'usage') and response.usage else None
-                cost = self._calculate_cost(model, usage) if usage else 0.0
+            if not coalesce:
+                return {**await fetch(), "cache": "miss", **budget}
 
-                return {
-                    "content": response.choices[0].message.content,
-                    "model": model,
-                    "usage": {
-                        "prompt_tokens": usage.prompt_tokens if usage else 0,
-                        "completion_tokens": usage.completion_tokens if usage else 0,
-                        "total_tokens": usage.total_tokens if usage else 0
-                    },
-                    "cost": cost,
-                    "response_time_ms": int((end_time - start_time) * 1000),
-                    "finish_reason": response.choices[0].finish_reason
-                }
+            # Identical requests already in flight share one provider call,
+            # whose usage and cost are attributed to the caller that made it
+            result, leader = await completion_flights.run(cache_key, fetch)
+            if not leader:
+                return {**result, "cost": 0.0, "cache": "coalesced", **budget}
+            return {**result, "cache": "miss" if use_cache else "bypass", **budget}
 
         except Exception as e:
             raise Exception(f"LLM completion failed: {str(e)}")
 
+    async def _fit_prompt(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        max_tokens: int,
+        policy: str
+    ) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Messages that fit the model's context window, and a ``prompt_budget``
+        entry for the result when they had to be changed
+        """
+        if policy != "summarize":
+            fitted, original, final = token_counter.fit(messages, model, max_tokens, policy)
+            if fitted is messages:
+                return messages, {}
+            return fitted, {"prompt_budget": {"action": "truncated", "original_tokens": original, "prompt_tokens": final}}
+
+        original = token_counter.count_messages(messages, model)
+        budget = token_counter.prompt_budget(model, max_tokens)
+        if budget is None or original <= budget:
+            return messages, {}
+
+        # Condense the longest message to what it must lose, plus some slack
+        counts = [token_counter.count_message(message, model) for message in messages]
+        longest = max(range(len(messages)), key=counts.__getitem__)
+        target = counts[longest] - (original - budget) - 64
+        fitted = [dict(message) for message in messages]
+        if target >= 64:
+            summary_model = settings.TOKEN_SUMMARY_MODEL
+            # The summary cannot be longer than the summary model can write
+            summary_tokens = min(target, token_counter.max_output_tokens(summary_model) or target)
+            source = str(messages[longest].get("content") or "")
+            source_budget = token_counter.prompt_budget(summary_model, summary_tokens)
+            if source_budget is not None:
+                source = token_counter.truncate_text(source, summary_model, max(0, source_budget - 200))
+            summary = await self.completion(
+                messages=[
+                    {"role": "system", "content": (
+                        f"Condense the user's text to at most {summary_tokens} tokens. Keep every fact, name, "
+                        "number and instruction; drop repetition and filler. Reply with the condensed text only."
+                    )},
+                    {"role": "user", "content": source}
+                ],
+                model=summary_model,
+                temperature=0,
+                max_tokens=summary_tokens,
+                budget_policy="truncate"
+            )
+            fitted[longest]["content"] = summary["content"]
+        token_counter.stats["summarized"] += 1
+
+        # The summary may still overshoot; truncation guarantees the fit
+        fitted, _, final = token_counter.fit(fitted, model, max_tokens, "truncate")
+        return fitted, {"prompt_budget": {"action": "summarized", "original_tokens": original, "prompt_tokens": final}}
+
+    async def routed_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        routing: Dict[str, Any],
+        **params
+    ) -> Dict[str, Any]:
+        """
+        Completion routed across ``model`` and its alternatives according to
+        a node's ``routing`` config (see ``RoutingPolicy``). Without explicit
+        ``models`` the alternatives are the available models in the same
+        price tier. The result's ``routing`` field names the
+        model that answered and the errors of any that did not.
+        """
+        policy = RoutingPolicy.from_config(routing, model, self.get_alternative_models(model))
+        return await self.router.route(
+            policy, lambda candidate: self.completion(messages, model=candidate, **params)
+        )
+
+    def get_alternative_models(self, model: str) -> List[str]:
+        """Available models in the same price tier as ``model`` (within 4x), best first"""
+        available = self.get_available_models()
+        current = next((m for m in available if m["id"] == model or m["id"].endswith(f"/{model}")), None)
+        if current is None:
+            return []
+        price = current["cost_per_1k_tokens"]
+        alternatives = [
+            m["id"] for m in available
+            if m["id"] != current["id"] and price / 4 <= m["cost_per_1k_tokens"] <= price * 4
+        ]
+        return self.model_health.rank(alternatives)
+
+    async def batch_completion(
+        self,
+        requests: List[Dict[str, Any]],
+        concurrency: Optional[int] = None,
+        provider_batch: bool = False
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run many independent completions, yielding each as it finishes.
+
+        Each request holds ``completion`` arguments (``messages``, ``model``,
+        ...) and an optional ``id``. At most ``concurrency`` run at once
+        (default LLM_BATCH_CONCURRENCY), all under the rate limiter, so the
+        pace is set by the provider's limits. Every item yields
+        ``{"index", "id", "success", "result" | "error"}``; one failure
+        does not affect the others.
+
+        With ``provider_batch``, OpenAI models go through the provider's
+        batch API instead (cheaper, but results arrive when the whole job
+        finishes); other models still run locally. Requests with a
+        ``routing`` config are routed like an LLM node's (see
+        ``routed_completion``), which only works locally.
+        """
+        self.batch_stats["batches"] += 1
+        self.batch_stats["items"] += len(requests)
+        queue: asyncio.Queue = asyncio.Queue()
+        local: List[Tuple[int, Dict[str, Any]]] = []
+        remote: List[Tuple[int, Dict[str, Any]]] = []
+        for index, request in enumerate(requests):
+            model = request.get("model", "openai/gpt-3.5-turbo")
+            is_openai = model.startswith(("openai/", "gpt-"))
+            (remote if provider_batch and is_openai and not request.get("routing") else local).append((index, request))
+
+        async def run_local(pending):
+            for index, request in pending:
+                params = {key: value for key, value in request.items() if key not in ("id", "stream", "routing")}
+                try:
+                    if request.get("routing"):
+                        params.setdefault("model", "openai/gpt-3.5-turbo")
+                        result = await self.routed_completion(routing=request["routing"], **params)
+                    else:
+                        result = await self.completion(**params)
+                    await queue.put({"index": index, "id": request.get("id", index), "success": True, "result": result})
+                except Exception as e:
+                    await queue.put({"index": index, "id": request.get("id", index), "success": False, "error": str(e)})
+
+        # Workers share one iterator, so each request is taken exactly once
+        pending = iter(local)
+        workers = [
+            asyncio.ensure_future(run_local(pending))
+            for _ in range(min(max(1, concurrency or settings.LLM_BATCH_CONCURRENCY), len(local)))
+        ]
+        if remote:
+            workers.append(asyncio.ensure_future(self._provider_batch(remote, queue)))
+
+        try:
+            for _ in range(len(requests)):
+                item = await queue.get()
+                if not item["success"]:
+                    self.batch_stats["failed_items"] += 1
+                yield item
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _provider_batch(self, items: List[Tuple[int, Dict[str, Any]]], queue: "asyncio.Queue"):
+        """Run ``items`` as one provider batch job, queueing an outcome for every item"""
+        self.batch_stats["provider_batches"] += 1
+        start_time = time.time()
+        bodies = []
+        for index, request in items:
+            model = request.get("model", "openai/gpt-3.5-turbo")
+            max_tokens = request.get("max_tokens", 1000)
+            try:
+                messages, _ = await self._fit_prompt(
+                    request["messages"], model, max_tokens, request.get("budget_policy") or settings.TOKEN_BUDGET_POLICY
+                )
+            except Exception as e:
+                await queue.put({"index": index, "id": request.get("id", index), "success": False, "error": str(e)})
+                continue
+            body = {
+                key: value for key, value in request.items()
+                if key not in ("id", "stream", "cache", "budget_policy", "routing")
+            }
+            body.update(model=model.split("/", 1)[1] if model.startswith("openai/") else model,
+                        messages=messages, max_tokens=max_tokens)
+            bodies.append((index, request, body))
+
+        client = ProviderBatchClient(
+            settings.LLM_BATCH_API_BASE,
+            settings.OPENAI_API_KEY,
+            poll_seconds=settings.LLM_BATCH_POLL_SECONDS,
+            timeout_seconds=settings.LLM_BATCH_TIMEOUT_SECONDS
+        )
+        try:
+            batch_id, outcomes = await client.run([(f"item-{index}", body) for index, _, body in bodies])
+        except Exception as e:
+            for index, request, _ in bodies:
+                await queue.put({
+                    "index": index, "id": request.get("id", index), "success": False,
+                    "error": f"Provider batch failed: {str(e)}"
+                })
+            return
+
+        for index, request, _ in bodies:
+            outcome = outcomes[f"item-{index}"]
+            item = {"index": index, "id": request.get("id", index)}
+            if "error" in outcome:
+                await queue.put({**item, "success": False, "error": outcome["error"]})
+                continue
+            body = outcome["body"]
+            model = request.get("model", "openai/gpt-3.5-turbo")
+            usage = {
+                "prompt_tokens": body.get("usage", {}).get("prompt_tokens", 0),
+                "completion_tokens": body.get("usage", {}).get("completion_tokens", 0),
+                "total_tokens": body.get("usage", {}).get("total_tokens", 0)
+            }
+            await queue.put({**item, "success": True, "result": {
+                "content": body["choices"][0]["message"]["content"],
+                "model": model,
+                "usage": usage,
+                "cost": round(self._calculate_cost(model, usage) * settings.LLM_BATCH_DISCOUNT, 6),
+                "response_time_ms": int((time.time() - start_time) * 1000),
+                "finish_reason": body["choices"][0].get("finish_reason"),
+                "batch_id": batch_id
+            }})
+
+    async def _complete(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        One non-streaming provider call, made within the model's rate limits
+        with the pooled API key that has the most headroom. A rate-limited
+        call waits out the provider's Retry-After (or an exponential backoff)
+        and is retried instead of failing; a call refused because of its key
+        is retried straight away on another key. Calls to a model whose
+        circuit breaker is open fail immediately.
+        """
+        model = request_data["model"]
+        estimated_tokens = token_counter.count_messages(request_data["messages"], model) + (request_data.get("max_tokens") or 0)
+        start_time = time.time()
+        # An open breaker fails the call at once instead of waiting on a failing model
+        async with model_breakers.guard(model) as breaker_call:
+            for attempt in range(settings.LLM_RATE_LIMIT_RETRIES + 1):
+                async with credential_pool.lease(estimated_tokens) as lease:
+                    call = {**request_data, "api_key": lease.key} if lease.key else request_data
+                    async with rate_governor.slot(model, estimated_tokens) as slot:
+                        call_start = time.time()
+                        try:
+                            response = await acompletion(**call)
+                        except Exception as e:
+                            last_attempt = attempt == settings.LLM_RATE_LIMIT_RETRIES
+                            if lease.failed(e) and not last_attempt:
+                                continue
+                            retry_after = rate_limit_retry_after(e)
+                            if retry_after is None or last_attempt:
+                                if retry_after is not None or classify_key_error(e) is not None or is_caller_error(e):
+                                    breaker_call.ignore()  # throttling, key trouble and bad requests say nothing about the model
+                                self.model_health.record(model, (time.time() - call_start) * 1000, ok=False)
+                                raise
+                            slot.throttled(retry_after or min(30.0, 2.0 ** attempt))
+                            continue
+                        breaker_call.latency_ms = (time.time() - call_start) * 1000
+                        self.model_health.record(model, breaker_call.latency_ms, ok=True)
+                        usage = response.usage if hasattr(response, 'usage') and response.usage else None
+                        slot.record_usage(usage.total_tokens if usage else estimated_tokens)
+                        lease.record_usage(usage.total_tokens if usage else estimated_tokens)
+                        break
+        end_time = time.time()
+
+        # Calculate cost and metrics
+        cost = self._calculate_cost(model, usage) if usage else 0.0
+
+        return {
+            "content": response.choices[0].message.content,
+            "model": model,
+            "usage": {
+                "prompt_tokens": usage.prompt_tokens if usage else 0,
+                "completion_tokens": usage.completion_tokens if usage else 0,
+                "total_tokens": usage.total_tokens if usage else 0
+            },
+            "cost": cost,
+            "response_time_ms": int((end_time - start_time) * 1000),
+            "finish_reason": response.choices[0].finish_reason
+        }
+
     async def _stream_completion(self, request_data: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Handle streaming completion
+
+        Token counts come from the local tokenizer as the text arrives; the
+        final usage is the provider's when the stream reports it.
         """
         try:
             start_time = time.time()
+            model = request_data["model"]
             full_content = ""
-            total_tokens = 0
-
-            async for chunk in await acompletion(**request_data):
-                if chunk.choices and chunk.choices[0].delta:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        content = delta.content
-                        full_content += content
-                        total_tokens += len(content.split())  # Rough token estimate
-
-                        yield {
-                            "type": "content",
-                            "content": content,
-                            "full_content": full_content,
-                            "tokens": total_tokens
-                        }
-
-                # Check for completion
-                if chunk.choices and chunk.choices[0].finish_reason:
-                    end_time = time.time()
-                    cost = self._calculate_cost(request_data["model"], {"total_tokens": total_tokens})
-
-                    yield {
-                        "type": "complete",
-                        "content": full_content,
-                        "usage": {"total_tokens": total_tokens},
-                        "cost": cost,
-                        "response_time_ms": int((end_time - start_time) * 1000),
-                        "finish_reason": chunk.choices[0].finish_reason
-                    }
-                    break
+            completion_tokens = 0
+            finish_reason = None
+            reported_usage = None
+
+            # The stream holds its rate-limit slot until the last chunk
+            prompt_tokens = token_counter.count_messages(request_data["messages"], model)
+            estimated_tokens = prompt_tokens + (request_data.get("max_tokens") or 0)
+            async with model_breakers.guard(model) as breaker_call, \
+                    credential_pool.lease(estimated_tokens) as lease, \
+                    rate_governor.slot(model, estimated_tokens) as slot:
+                call_start = time.time()
+                try:
+                    call = {**request_data, "api_key": lease.key} if lease.key else request_data
+                    response = await acompletion(**call)
+                except Exception as e:
+                    retry_after = rate_limit_retry_after(e)
+                    if not lease.failed(e) and retry_after is not None:
+                        slot.throttled(retry_after)
+                    if retry_after is not None or classify_key_error(e) is not None or is_caller_error(e):
+                        breaker_call.ignore()
+                    raise
+                # A stream is judged by how long it took to start
+                breaker_call.latency_ms = (time.time() - call_start) * 1000
+
+                async for chunk in response:
+                    # Providers that report usage send it with or after the last content
+                    if getattr(chunk, "usage", None):
+                        reported_usage = chunk.usage
+
+                    if chunk.choices and chunk.choices[0].delta:
+                        delta = chunk.choices[0].delta
+                        if hasattr(delta, 'content') and delta.content:
+                            content = delta.content
+                            full_content += content
+                            completion_tokens += token_counter.count_text(content, model)
+
+                            yield {
+                                "type": "content",
+                                "content": content,
+                                "full_content": full_content,
+                                "tokens": completion_tokens
+                            }
+
+                    if chunk.choices and chunk.choices[0].finish_reason:
+                        finish_reason = chunk.choices[0].finish_reason
+
+                # Deltas can split tokens; the whole text counts exactly
+                if reported_usage is not None:
+                    prompt_tokens = reported_usage.prompt_tokens
+                    completion_tokens = reported_usage.completion_tokens
+                else:
+                    completion_tokens = token_counter.count_text(full_content, model)
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+                slot.record_usage(usage["total_tokens"])
+                lease.record_usage(usage["total_tokens"])
+
+                yield {
+                    "type": "complete",
+                    "content": full_content,
+                    "usage": usage,
+                    "cost": self._calculate_cost(model, usage),
+                    "response_time_ms": int((time.time() - start_time) * 1000),
+                    "finish_reason": finish_reason
+                }
 
         except Exception as e:
             yield {
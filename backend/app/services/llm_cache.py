@@ -0,0 +1,280 @@
+"""
+Exact-match caching and in-flight coalescing of LLM completions
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+
+from ..core.config import settings
+
+# Request fields that do not change what the model returns
+_NON_SEMANTIC_PARAMS = ("stream", "extra_headers", "timeout", "metadata", "cache", "api_key", "api_base")
+
+
+def completion_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    temperature: float,
+    max_tokens: int,
+    params: Optional[Dict[str, Any]] = None
+) -> str:
+    """SHA-256 of the canonical JSON encoding of everything that determines a completion"""
+    request = {
+        "model": model,
+        "messages": messages,
+        "temperature": float(temperature),
+        "max_tokens": max_tokens,
+        "params": {k: v for k, v in (params or {}).items() if k not in _NON_SEMANTIC_PARAMS}
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU bounded by entry count and total encoded size"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (encoded value, expires_at)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        if key in self._entries:
+            self._drop(key)
+        if len(value) > self.max_bytes:
+            return
+        self._entries[key] = (value, time.time() + ttl_seconds)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk cache in a SQLite file, shared by workers on the same host and
+    kept across restarts. Queries run on a worker thread; eviction removes
+    expired rows first, then least recently used ones until the stored
+    size fits ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = asyncio.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at)")
+            self._connection = connection
+        return self._connection
+
+    def _get(self, key: str) -> Optional[str]:
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value FROM completions WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: str, ttl_seconds: float):
+        connection = self._connect()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO completions (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), now + ttl_seconds, now)
+        )
+        connection.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = 0
+            for row_key, size in connection.execute(
+                "SELECT key, size FROM completions ORDER BY accessed_at"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                connection.execute("DELETE FROM completions WHERE key = ?", (row_key,))
+                total -= size
+                evicted += 1
+            self.evictions += evicted
+
+    def _stats(self) -> Tuple[int, int]:
+        return self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+
+    async def get(self, key: str) -> Optional[str]:
+        async with self._lock:
+            return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float):
+        async with self._lock:
+            await asyncio.to_thread(self._set, key, value, ttl_seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"backend": "sqlite", "path": self.path, "max_bytes": self.max_bytes, "evictions": self.evictions}
+        if self._connection is not None:
+            stats["entries"], stats["bytes"] = self._stats()
+        return stats
+
+
+class CompletionCache:
+    """
+    Completion results keyed by request hash. Only the response itself is
+    stored; callers mark hits and zero their cost.
+    """
+
+    def __init__(self, backend, ttl_seconds: float = 86400, enabled: bool = True):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            # A broken cache must never fail the completion itself
+            print(f"⚠️ LLM cache read failed: {str(e)}")
+            self.stats["errors"] += 1
+            value = None
+        self.stats["hits" if value is not None else "misses"] += 1
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, result: Dict[str, Any]):
+        try:
+            await self.backend.set(key, json.dumps(result, ensure_ascii=False, default=str), self.ttl_seconds)
+            self.stats["stores"] += 1
+        except Exception as e:
+            print(f"⚠️ LLM cache write failed: {str(e)}")
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self.backend.get_stats()
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests: the first caller for a key
+    starts the call and later callers await the same task. The call runs
+    as its own task, so a caller that goes away does not cancel it for the
+    others (it is cancelled only once every caller has gone), and every
+    caller gets its own deep copy of the result.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, "asyncio.Task"] = {}
+        self._waiters: Dict["asyncio.Task", int] = {}
+        self.stats = {"calls": 0, "coalesced": 0, "saved_cost": 0.0}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """Result of ``call`` for this key, and whether this caller started it"""
+        task = self._in_flight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.stats["calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            result = copy.deepcopy(await asyncio.shield(task))
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody is left waiting for it; a caller arriving before
+                    # the task finishes cancelling must start a new call
+                    if self._in_flight.get(key) is task:
+                        del self._in_flight[key]
+                    task.cancel()
+        if not leader:
+            self.stats["saved_cost"] += result.get("cost", 0.0)
+        return result, leader
+
+    def _finished(self, key: str, task: "asyncio.Task"):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.stats["calls"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "saved_cost": round(self.stats["saved_cost"], 6),
+            "coalesce_rate": round(self.stats["coalesced"] / total, 4) if total else 0.0,
+            "in_flight": len(self._in_flight)
+        }
+
+
+def _create_backend():
+    if settings.LLM_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(settings.LLM_CACHE_PATH, max_bytes=settings.LLM_CACHE_MAX_BYTES)
+    return MemoryCacheBackend(max_entries=settings.LLM_CACHE_MAX_ENTRIES, max_bytes=settings.LLM_CACHE_MAX_BYTES)
+
+
+# Global completion cache
+completion_cache = CompletionCache(
+    _create_backend(),
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    enabled=settings.LLM_CACHE_ENABLED
+)
+
+# Global in-flight request coalescer
+completion_flights = SingleFlight()
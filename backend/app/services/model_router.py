@@ -0,0 +1,182 @@
+"""
+Latency-aware routing of LLM calls across equivalent models
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, Deque, List, Optional, Tuple
+
+ROUTING_MODES = ("fallback", "fastest", "hedge")
+
+# Hedge delay used until a model has enough samples for a p95
+_DEFAULT_HEDGE_AFTER_MS = 2000
+_MIN_SAMPLES = 5
+
+
+class ModelHealth:
+    """Rolling window of recent call latencies and outcomes for one model"""
+
+    def __init__(self, window: int = 200, max_age_seconds: float = 600):
+        self.max_age_seconds = max_age_seconds
+        # (finished_at, latency_ms, ok)
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)
+
+    def record(self, latency_ms: float, ok: bool):
+        self._samples.append((time.monotonic(), latency_ms, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.max_age_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile of successful calls, or None without enough samples"""
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        if len(latencies) < _MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def error_rate(self) -> float:
+        samples = self._recent()
+        return sum(1 for _, _, ok in samples if not ok) / len(samples) if samples else 0.0
+
+    def score(self) -> float:
+        """Expected cost of routing here: median latency inflated by the error rate"""
+        p50 = self.percentile(0.5)
+        if p50 is None:
+            return 0.0  # unmeasured models are tried first so they get measured
+        return p50 * (1 + 4 * self.error_rate())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self._recent()),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "error_rate": round(self.error_rate(), 4)
+        }
+
+
+class ModelHealthTracker:
+    """Per-model latency and error windows fed by every provider call"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._models: Dict[str, ModelHealth] = {}
+
+    def get(self, model: str) -> ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = self._models[model] = ModelHealth(self.window)
+        return health
+
+    def record(self, model: str, latency_ms: float, ok: bool):
+        self.get(model).record(latency_ms, ok)
+
+    def rank(self, models: List[str]) -> List[str]:
+        """Models ordered from best to worst current score"""
+        return sorted(models, key=lambda model: self.get(model).score())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {model: health.get_stats() for model, health in self._models.items()}
+
+
+class RoutingPolicy:
+    """
+    How an LLM node chooses among models, from its ``routing`` config:
+
+    - ``fallback``: the node's model, then each alternative in turn on error
+    - ``fastest``: the model with the best recent latency and error rate
+      first, the others as fallbacks
+    - ``hedge``: the node's model, plus the next one if no answer has come
+      after ``hedge_after_ms`` (default: the model's recent p95); the first
+      answer wins and the other call is cancelled
+    """
+
+    __slots__ = ("mode", "models", "hedge_after_ms")
+
+    def __init__(self, mode: str, models: List[str], hedge_after_ms: Optional[float] = None):
+        self.mode = mode
+        self.models = models
+        self.hedge_after_ms = hedge_after_ms
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], primary: str, alternatives: List[str]) -> "RoutingPolicy":
+        """Policy for ``{"mode": ..., "models": [...], "hedge_after_ms": ...}``"""
+        mode = config.get("mode", "fallback")
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode '{mode}', expected one of: {', '.join(ROUTING_MODES)}")
+        models = list(dict.fromkeys([primary, *(config.get("models") or alternatives)]))
+        return cls(mode, models, config.get("hedge_after_ms"))
+
+
+class ModelRouter:
+    """Runs one logical completion over the models a policy allows"""
+
+    def __init__(self, tracker: ModelHealthTracker):
+        self.tracker = tracker
+        self.stats = {"routed": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0}
+
+    async def route(
+        self,
+        policy: RoutingPolicy,
+        call: Callable[[str], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Result of ``call(model)`` for the model the policy settles on"""
+        self.stats["routed"] += 1
+        if policy.mode == "hedge":
+            return await self._hedge(policy, call)
+
+        models = self.tracker.rank(policy.models) if policy.mode == "fastest" else policy.models
+        errors = []
+        for model in models:
+            try:
+                result = await call(model)
+            except Exception as e:
+                errors.append(f"{model}: {str(e)}")
+                self.stats["fallbacks"] += 1
+                continue
+            return {**result, "routing": {"mode": policy.mode, "model": model, "failed": errors}}
+        raise Exception(f"All routed models failed: {'; '.join(errors)}")
+
+    async def _hedge(self, policy: RoutingPolicy, call: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        pending: Dict["asyncio.Task", str] = {}
+        queue = list(policy.models)
+        errors = []
+
+        def launch():
+            model = queue.pop(0)
+            pending[asyncio.ensure_future(call(model))] = model
+
+        launch()
+        try:
+            while pending:
+                delay = None
+                if queue:
+                    hedge_after = policy.hedge_after_ms
+                    if hedge_after is None:
+                        hedge_after = self.tracker.get(policy.models[0]).percentile(0.95) or _DEFAULT_HEDGE_AFTER_MS
+                    delay = hedge_after / 1000
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Still waiting after the hedge delay: race the next model
+                    self.stats["hedges"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        if model != policy.models[0]:
+                            self.stats["hedge_wins"] += 1
+                        return {**task.result(), "routing": {"mode": "hedge", "model": model, "failed": errors}}
+                    errors.append(f"{model}: {str(task.exception())}")
+                if not pending and queue:
+                    self.stats["fallbacks"] += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise Exception(f"All routed models failed: {'; '.join(errors)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "models": self.tracker.get_stats()}
@@ -0,0 +1,262 @@
+"""
+Write-behind persistence for execution history
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from ..core.config import settings
+from ..models.execution import ExecutionEvent, NodeExecutionLog, WorkflowExecution
+from ..database.supabase_client import SupabaseClient, supabase_client
+
+
+class WriteBehindBuffer:
+    """
+    Buffers execution events, node logs and status updates in memory and
+    writes them to the database as multi-row inserts from a background task.
+
+    Status updates are coalesced per execution (last write wins), so a run
+    that changes status several times between flushes costs one row.
+    """
+
+    def __init__(
+        self,
+        supabase: SupabaseClient,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+        max_pending: int = 10000
+    ):
+        self.supabase = supabase
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+
+        self._events: List[Dict[str, Any]] = []
+        self._node_logs: List[Dict[str, Any]] = []
+        self._status_updates: Dict[str, Dict[str, Any]] = {}
+
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+        self.stats = {
+            "events_written": 0,
+            "node_logs_written": 0,
+            "status_updates_written": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "dropped_rows": 0,
+            "last_flush_ms": 0.0
+        }
+
+    @property
+    def pending(self) -> int:
+        """Number of rows waiting to be written"""
+        return len(self._events) + len(self._node_logs) + len(self._status_updates)
+
+    def record_event(self, event: ExecutionEvent):
+        """Queue an execution event for persistence"""
+        self._events.append({
+            "id": event.id,
+            "execution_id": event.execution_id,
+            "event_type": event.type.value,
+            "node_id": event.node_id,
+            "message": event.message,
+            "data": self._to_json(event.data) or {},
+            "error_message": event.error,
+            "progress": round(event.progress, 2) if event.progress is not None else None,
+            "timestamp": event.timestamp.isoformat()
+        })
+        self._on_enqueue()
+
+    def record_node_log(self, node_log: NodeExecutionLog):
+        """Queue a finished node execution log for persistence"""
+        self._node_logs.append({
+            "id": node_log.id,
+            "execution_id": node_log.execution_id,
+            "node_id": node_log.node_id,
+            "node_type": node_log.node_type,
+            "node_name": node_log.node_name,
+            "status": node_log.status.value,
+            "input_data": self._to_json(node_log.input_data) or {},
+            "output_data": self._to_json(node_log.output_data) or {},
+            "error_message": node_log.error_message,
+            "tokens_used": node_log.tokens_used or 0,
+            "cost": node_log.cost or 0.0,
+            "started_at": node_log.started_at.isoformat(),
+            "completed_at": node_log.completed_at.isoformat() if node_log.completed_at else None
+        })
+        self._on_enqueue()
+
+    def record_status(self, execution: WorkflowExecution):
+        """
+        Queue the current status of an execution, replacing any pending
+        update. Every status row carries the same columns, taken from the
+        execution's current state: PostgREST builds a multi-row upsert's
+        column list from the first row, so a column missing from some rows
+        would be nulled or dropped for the rest of the batch.
+        """
+        self._status_updates[execution.id] = {
+            "id": execution.id,
+            # Needed by the upsert's insert arm when no row exists yet
+            "workflow_id": execution.workflow_id,
+            "workflow_version_hash": execution.workflow_version_hash,
+            "user_id": execution.user_id,
+            "input_data": self._to_json(execution.input_data) or {},
+            "status": execution.status.value,
+            "progress": round(execution.progress, 2),
+            "current_node_id": execution.current_node_id,
+            "started_at": execution.started_at.isoformat() if execution.started_at else None,
+            "completed_at": execution.completed_at.isoformat() if execution.completed_at else None,
+            "output_data": self._to_json(execution.output_data),
+            "error_message": execution.error_message,
+            "total_tokens_used": execution.total_tokens_used or 0,
+            "total_cost": execution.total_cost or 0.0,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        self._on_enqueue()
+
+    async def start(self):
+        """Start the background flush task"""
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop the background task and flush remaining rows under a deadline"""
+        self._stopping = True
+        if self._wakeup:
+            self._wakeup.set()
+
+        deadline = time.monotonic() + timeout
+        if self._task:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+
+        remaining = deadline - time.monotonic()
+        while self.pending and remaining > 0:
+            try:
+                await asyncio.wait_for(self.flush(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            remaining = deadline - time.monotonic()
+
+        if self.pending:
+            print(f"⚠️ Write-behind buffer dropped {self.pending} rows at shutdown")
+            self.stats["dropped_rows"] += self.pending
+
+    async def flush(self):
+        """Write all buffered rows to the database"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            status_rows = list(self._status_updates.values())
+            event_rows, node_log_rows = self._events, self._node_logs
+            self._status_updates, self._events, self._node_logs = {}, [], []
+
+            if not (status_rows or event_rows or node_log_rows):
+                return
+
+            start_time = time.perf_counter()
+            try:
+                # Status rows first so the parent execution reflects the latest state
+                if status_rows:
+                    await self._write("workflow_executions", status_rows)
+                    self.stats["status_updates_written"] += len(status_rows)
+                    status_rows = []
+                if event_rows:
+                    await self._write("execution_events", event_rows)
+                    self.stats["events_written"] += len(event_rows)
+                    event_rows = []
+                if node_log_rows:
+                    await self._write("node_execution_logs", node_log_rows)
+                    self.stats["node_logs_written"] += len(node_log_rows)
+                    node_log_rows = []
+            except Exception as e:
+                self.stats["failed_flushes"] += 1
+                print(f"⚠️ Write-behind flush failed: {str(e)}")
+                self._requeue(status_rows, event_rows, node_log_rows)
+            finally:
+                self.stats["flushes"] += 1
+                self.stats["last_flush_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get buffer statistics"""
+        return {**self.stats, "pending": self.pending}
+
+    async def _run(self):
+        """Flush on a timer, or early when the batch size is reached"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write(self, table: str, rows: List[Dict[str, Any]]):
+        """
+        Send one multi-row statement per batch. Upserts keyed on the primary
+        key keep retries of a partially failed flush idempotent.
+        """
+        # Background writes carry no user token, so bypass RLS when possible
+        client = self.supabase.service_client if settings.SUPABASE_SERVICE_KEY else self.supabase.client
+        for i in range(0, len(rows), self.batch_size):
+            chunk = rows[i:i + self.batch_size]
+            await self.supabase.execute(client.table(table).upsert(chunk), f"{table}.write_behind")
+
+    def _requeue(self, status_rows, event_rows, node_log_rows):
+        """Put rows from a failed flush back, dropping the oldest past max_pending"""
+        for row in status_rows:
+            # A newer update that arrived during the flush wins
+            self._status_updates.setdefault(row["id"], row)
+        self._events = event_rows + self._events
+        self._node_logs = node_log_rows + self._node_logs
+
+        overflow = self.pending - self.max_pending
+        if overflow > 0:
+            dropped_events = min(overflow, len(self._events))
+            self._events = self._events[dropped_events:]
+            dropped_logs = min(overflow - dropped_events, len(self._node_logs))
+            self._node_logs = self._node_logs[dropped_logs:]
+            self.stats["dropped_rows"] += dropped_events + dropped_logs
+
+    def _on_enqueue(self):
+        """Start the flusher lazily and wake it once a batch is full"""
+        if not self._stopping and (self._task is None or self._task.done()):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._wakeup = asyncio.Event()
+            self._flush_lock = self._flush_lock or asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+        if self.pending >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    @staticmethod
+    def _to_json(value: Any) -> Any:
+        """Make a value JSON-serialisable for JSONB columns"""
+        if value is None:
+            return None
+        return json.loads(json.dumps(value, default=str))
+
+
+# Global write-behind buffer instance
+write_behind_buffer = WriteBehindBuffer(
+    supabase_client,
+    batch_size=settings.PERSISTENCE_BATCH_SIZE,
+    flush_interval_ms=settings.PERSISTENCE_FLUSH_INTERVAL_MS,
+    max_pending=settings.PERSISTENCE_MAX_PENDING
+)
@@ -0,0 +1,277 @@
+"""
+Per-model and per-provider rate limiting with adaptive concurrency
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, List, Optional
+
+from ..core.config import settings
+
+
+def provider_of(model: str) -> str:
+    """Provider prefix of an OpenRouter-style model id"""
+    return model.split("/", 1)[0] if "/" in model else "default"
+
+
+def rate_limit_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait if ``error`` is a provider rate-limit response (0.0 when
+    the provider did not say), or None for any other error
+    """
+    status_code = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if status_code != 429 and type(error).__name__ != "RateLimitError":
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After") or getattr(error, "retry_after", None)
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket sized to one minute of allowance. Callers
+    reserve before they go: the balance may go negative and the reservation
+    returns how long to wait, so queued callers are released in order at
+    exactly the refill rate.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` and return the seconds until it is covered"""
+        self._refill()
+        self.tokens -= min(amount, self.per_minute)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        """Return reserved tokens that were not used"""
+        self._refill()
+        self.tokens = min(self.per_minute, self.tokens + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class ConcurrencyController:
+    """
+    AIMD limit on concurrent calls: each success raises the limit by
+    1/limit (about +1 per round trip at full load), a rate-limit response
+    halves it and pauses new calls until the provider's Retry-After.
+
+    A burst of throttled calls is one congestion event, so the limit halves
+    once for it: ``acquire`` returns the number of decreases so far, and a
+    throttled call admitted before the latest decrease only extends the
+    pause.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self.decreases = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            admitted_at = self.decreases
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            try:
+                await asyncio.sleep(pause)
+            except BaseException:
+                await self.release()  # cancelled while paused; the slot was never used
+                raise
+        return admitted_at
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def on_throttled(self, retry_after: float, admitted_at: Optional[int] = None):
+        if admitted_at is None or admitted_at == self.decreases:
+            self.limit = max(self.minimum, self.limit / 2)
+            self.decreases += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class LimitScope:
+    """Request and token buckets, plus concurrency control, for one model or provider"""
+
+    def __init__(self, name: str, rpm: int, tpm: int, concurrency: Optional[ConcurrencyController] = None):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.stats = {"requests": 0, "throttled": 0, "queued": 0, "wait_seconds": 0.0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            **self.stats,
+            "wait_seconds": round(self.stats["wait_seconds"], 3),
+            "rpm_limit": self.requests.per_minute,
+            "tpm_limit": self.tokens.per_minute,
+            "requests_available": round(self.requests.available(), 1),
+            "tokens_available": round(self.tokens.available(), 1)
+        }
+        if self.concurrency is not None:
+            stats.update({
+                "concurrency_limit": round(self.concurrency.limit, 2),
+                "in_flight": self.concurrency.in_flight,
+                "waiting": self.concurrency.waiting
+            })
+        return stats
+
+
+class RateLimitSlot:
+    """Permission for one provider call; reports how it went back to the limiter"""
+
+    def __init__(self, scopes: List[LimitScope], estimated_tokens: int):
+        self.scopes = scopes
+        self.estimated_tokens = estimated_tokens
+        self.retry_after: Optional[float] = None
+        self.succeeded = False
+
+    def record_usage(self, total_tokens: int):
+        """Settle the token reservation against what the call really used"""
+        self.succeeded = True
+        difference = self.estimated_tokens - total_tokens
+        for scope in self.scopes:
+            if difference > 0:
+                scope.tokens.refund(difference)
+            elif difference < 0:
+                scope.tokens.reserve(-difference)
+
+    def throttled(self, retry_after: float):
+        self.retry_after = retry_after
+
+
+class RateLimitGovernor:
+    """
+    Keeps calls to each model within its requests/min and tokens/min, and
+    within the provider's limits when those are configured. Calls over the
+    limit wait for their turn instead of failing, and concurrency adapts to
+    the provider's 429 responses.
+
+    Limits come from ``limits``, keyed by model id or provider prefix
+    (``{"openai/gpt-4": {"rpm": 500, "tpm": 300000}, "anthropic": {...}}``),
+    falling back to the defaults.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, Dict[str, int]],
+        default_rpm: int = 500,
+        default_tpm: int = 1_000_000,
+        concurrency: Dict[str, int] = None
+    ):
+        self.limits = limits
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.concurrency = concurrency or {"initial": 16, "minimum": 1, "maximum": 128}
+        self._models: Dict[str, LimitScope] = {}
+        self._providers: Dict[str, Optional[LimitScope]] = {}
+
+    def _scopes(self, model: str) -> List[LimitScope]:
+        scope = self._models.get(model)
+        if scope is None:
+            limits = self.limits.get(model, {})
+            scope = self._models[model] = LimitScope(
+                model,
+                limits.get("rpm", self.default_rpm),
+                limits.get("tpm", self.default_tpm),
+                ConcurrencyController(**self.concurrency)
+            )
+
+        provider = provider_of(model)
+        if provider not in self._providers:
+            limits = self.limits.get(provider)
+            self._providers[provider] = LimitScope(
+                provider, limits.get("rpm", self.default_rpm), limits.get("tpm", self.default_tpm)
+            ) if limits else None
+        provider_scope = self._providers[provider]
+        return [scope, provider_scope] if provider_scope is not None else [scope]
+
+    @asynccontextmanager
+    async def slot(self, model: str, estimated_tokens: int) -> AsyncIterator[RateLimitSlot]:
+        """Wait for capacity to call ``model``, then hold a concurrency slot for the call"""
+        scopes = self._scopes(model)
+        wait = 0.0
+        for scope in scopes:
+            scope.stats["requests"] += 1
+            wait = max(wait, scope.requests.reserve(1), scope.tokens.reserve(estimated_tokens))
+
+        controller = scopes[0].concurrency
+        try:
+            if wait > 0:
+                for scope in scopes:
+                    scope.stats["queued"] += 1
+                    scope.stats["wait_seconds"] += wait
+                await asyncio.sleep(wait)
+            admitted_at = await controller.acquire()
+        except BaseException:
+            # Cancelled before the call was made: give the reservation back
+            for scope in scopes:
+                scope.requests.refund(1)
+                scope.tokens.refund(estimated_tokens)
+            raise
+
+        slot = RateLimitSlot(scopes, estimated_tokens)
+        try:
+            yield slot
+        finally:
+            if slot.retry_after is not None:
+                controller.on_throttled(slot.retry_after, admitted_at)
+                for scope in scopes:
+                    scope.stats["throttled"] += 1
+            elif slot.succeeded:
+                controller.on_success()
+            await controller.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "models": {name: scope.get_stats() for name, scope in self._models.items()},
+            "providers": {name: scope.get_stats() for name, scope in self._providers.items() if scope is not None}
+        }
+
+
+# Global rate limit governor for LLM calls
+rate_governor = RateLimitGovernor(
+    settings.LLM_RATE_LIMITS,
+    default_rpm=settings.LLM_DEFAULT_RPM,
+    default_tpm=settings.LLM_DEFAULT_TPM,
+    concurrency={
+        "initial": settings.LLM_CONCURRENCY_INITIAL,
+        "minimum": settings.LLM_CONCURRENCY_MIN,
+        "maximum": settings.LLM_CONCURRENCY_MAX
+    }
+)
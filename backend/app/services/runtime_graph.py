@@ -0,0 +1,138 @@
+"""
+Compact runtime representation of a workflow graph for the execution engine
+"""
+import sys
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..models.workflow import Workflow, NodeType, BaseNodeConfig
+from .expressions import ConditionSet
+
+
+class RuntimeNode:
+    """
+    A node as the scheduler sees it: interned id, type, display label,
+    the typed config and any compiled expressions, with neighbours as
+    integer indices. UI-only fields
+    (position, size, selection, timestamps) are not carried over.
+    """
+
+    __slots__ = ("index", "id", "type", "label", "config", "successors", "predecessors", "conditions")
+
+    def __init__(self, index: int, node_id: str, node_type: NodeType, label: str, config: BaseNodeConfig):
+        self.index = index
+        self.id = node_id
+        self.type = node_type
+        self.label = label
+        self.config = config
+        self.successors: Tuple[int, ...] = ()
+        self.predecessors: Tuple[int, ...] = ()
+        # Condition expressions compiled once with the graph
+        self.conditions: Optional[ConditionSet] = None
+        if node_type in (NodeType.CONDITION, NodeType.IF_ELSE):
+            self.conditions = ConditionSet(config.conditions, config.logical_operator)
+
+    def __repr__(self) -> str:
+        return f"RuntimeNode({self.index}, {self.id!r}, {self.type.value})"
+
+
+class RuntimeGraph:
+    """
+    Immutable execution graph compiled from a Workflow.
+
+    Nodes live in a list and refer to each other by index; the execution
+    order is computed once at compile time. A compiled graph holds no
+    per-run state, so every concurrent execution of the same workflow
+    revision shares one instance.
+    """
+
+    __slots__ = ("workflow_id", "version", "nodes", "index_by_id", "order", "blocked", "output_indices")
+
+    def __init__(self, workflow: Workflow):
+        self.workflow_id = workflow.id
+        self.version = workflow.version
+
+        self.nodes: List[RuntimeNode] = []
+        self.index_by_id: Dict[str, int] = {}
+        for index, node in enumerate(workflow.nodes):
+            node_id = sys.intern(node.id)
+            self.nodes.append(RuntimeNode(index, node_id, node.type, node.data.title or node_id, node.data))
+            self.index_by_id[node_id] = index
+
+        successors: List[List[int]] = [[] for _ in self.nodes]
+        predecessors: List[List[int]] = [[] for _ in self.nodes]
+        for edge in workflow.edges:
+            source = self.index_by_id.get(edge.source)
+            target = self.index_by_id.get(edge.target)
+            if source is None or target is None:
+                continue
+            successors[source].append(target)
+            predecessors[target].append(source)
+        for node in self.nodes:
+            node.successors = tuple(successors[node.index])
+            node.predecessors = tuple(predecessors[node.index])
+
+        self.order: Tuple[int, ...] = self._topological_order()
+        # Nodes on or downstream of a cycle never become ready
+        scheduled = set(self.order)
+        self.blocked: Tuple[int, ...] = tuple(i for i in range(len(self.nodes)) if i not in scheduled)
+        self.output_indices: Tuple[int, ...] = tuple(
+            node.index for node in self.nodes if node.type in (NodeType.ANSWER, NodeType.END)
+        )
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node(self, node_id: str) -> Optional[RuntimeNode]:
+        index = self.index_by_id.get(node_id)
+        return None if index is None else self.nodes[index]
+
+    def has_start(self) -> bool:
+        return any(node.type == NodeType.START for node in self.nodes)
+
+    def _topological_order(self) -> Tuple[int, ...]:
+        """Kahn's algorithm in node order; nodes on a cycle are left out"""
+        in_degree = [len(node.predecessors) for node in self.nodes]
+        queue = deque(index for index, degree in enumerate(in_degree) if degree == 0)
+        order = []
+        while queue:
+            index = queue.popleft()
+            order.append(index)
+            for successor in self.nodes[index].successors:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+        return tuple(order)
+
+
+class RuntimeGraphCache:
+    """Bounded LRU of compiled graphs keyed by workflow revision"""
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._graphs: "OrderedDict[Tuple[Any, ...], RuntimeGraph]" = OrderedDict()
+        self.stats = {"hits": 0, "compiles": 0}
+
+    def get(self, workflow: Workflow) -> RuntimeGraph:
+        """Compiled graph for a workflow, compiling it on first use"""
+        # Any save bumps version and updated_at, so the key changes with the content
+        key = (workflow.id, workflow.version, workflow.updated_at)
+        graph = self._graphs.get(key)
+        if graph is not None:
+            self._graphs.move_to_end(key)
+            self.stats["hits"] += 1
+            return graph
+
+        graph = RuntimeGraph(workflow)
+        self._graphs[key] = graph
+        while len(self._graphs) > self.max_entries:
+            self._graphs.popitem(last=False)
+        self.stats["compiles"] += 1
+        return graph
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self._graphs), "max_entries": self.max_entries}
+
+
+# Global compiled graph cache
+runtime_graph_cache = RuntimeGraphCache()
@@ -0,0 +1,252 @@
+"""
+In-process search index over public workflows
+"""
+import asyncio
+import bisect
+import heapq
+import math
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from ..models.workflow import WorkflowSummary
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Relative weight of a term depending on the field it came from
+FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "description": 1.0}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def trigrams(word: str) -> Set[str]:
+    """pg_trgm-style trigrams of a single word"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class WorkflowSearchIndex:
+    """
+    Ranked inverted index over public workflow names, tags and descriptions.
+
+    Documents are indexed by token. Fuzzy matching runs trigram similarity
+    against the token vocabulary rather than the documents, and a sorted
+    vocabulary serves prefix lookups for typeahead. Each term's postings are
+    also kept in impact order (field weight, then recency) and a query only
+    scans the head of each list, so query cost is bounded by the number of
+    matching terms rather than the number of workflows.
+
+    Ranking is therefore approximate: for a term shared by more than
+    ``max_postings_per_term`` workflows, only the head is scored, so an
+    older workflow matching only such common terms can be missing from
+    the results even though it matches.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.3,
+        max_expansions: int = 8,
+        max_postings_per_term: int = 500
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_expansions = max_expansions
+        self.max_postings_per_term = max_postings_per_term
+
+        self._docs: Dict[str, WorkflowSummary] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # Impact-ordered heads of the posting lists as ascending
+        # (-weight, -updated_at, doc_id) tuples, maintained incrementally
+        self._impact_heads: Dict[str, List[Tuple[float, float, str]]] = {}
+        self._vocab_trigrams: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+
+        self.loaded = False
+        self.watermark: Optional[datetime] = None
+        self.deleted_watermark: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def upsert(self, summary: WorkflowSummary):
+        """Index a workflow, or drop it if it is no longer public"""
+        self.remove(summary.id)
+        if not summary.is_public:
+            return
+
+        terms: Dict[str, float] = {}
+        for field, values in (
+            ("name", tokenize(summary.name)),
+            ("tags", [t for tag in summary.tags for t in tokenize(tag)]),
+            ("description", tokenize(summary.description))
+        ):
+            for token in values:
+                terms[token] = max(terms.get(token, 0.0), FIELD_WEIGHTS[field])
+
+        self._docs[summary.id] = summary
+        self._doc_terms[summary.id] = terms
+        for token, weight in terms.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._add_vocab(token)
+            postings[summary.id] = weight
+            self._add_to_head(token, summary.id, weight)
+
+        if self.watermark is None or summary.updated_at > self.watermark:
+            self.watermark = summary.updated_at
+
+    def remove(self, workflow_id: str):
+        """Remove a workflow from the index"""
+        terms = self._doc_terms.pop(workflow_id, None)
+        self._docs.pop(workflow_id, None)
+        if not terms:
+            return
+
+        for token in terms:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(workflow_id, None)
+            if not postings:
+                del self._postings[token]
+                self._impact_heads.pop(token, None)
+                self._remove_vocab(token)
+            else:
+                self._remove_from_head(token, workflow_id)
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[WorkflowSummary, float]]:
+        """Rank public workflows against a free-text query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        total = len(self._docs) or 1
+        scores: Dict[str, float] = {}
+        for position, token in enumerate(tokens):
+            # The last token may still be being typed, so it also matches by prefix
+            is_last = position == len(tokens) - 1
+            for term, similarity in self._expand(token, prefix=is_last):
+                idf = math.log(1 + total / len(self._postings[term]))
+                factor = similarity * idf
+                for neg_weight, _, doc_id in self._impact_head(term):
+                    scores[doc_id] = scores.get(doc_id, 0.0) - factor * neg_weight
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self._docs[doc_id], round(score, 4)) for doc_id, score in best]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Typeahead: public workflows whose name has a token starting with the last query token"""
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+
+        results = []
+        for summary, score in self.search(prefix, limit * 3):
+            name_tokens = tokenize(summary.name)
+            if any(t.startswith(tokens[-1]) for t in name_tokens):
+                results.append({"id": summary.id, "name": summary.name, "score": score})
+                if len(results) == limit:
+                    break
+        return results
+
+    def warm(self):
+        """Build every impact head up front, e.g. after a bulk load"""
+        for term in self._postings:
+            self._impact_head(term)
+
+    def _impact_key(self, doc_id: str, weight: float) -> Tuple[float, float, str]:
+        return (-weight, -self._docs[doc_id].updated_at.timestamp(), doc_id)
+
+    def _impact_head(self, term: str) -> List[Tuple[float, float, str]]:
+        """Highest-impact postings for a term, best first"""
+        head = self._impact_heads.get(term)
+        if head is None:
+            head = heapq.nsmallest(
+                self.max_postings_per_term,
+                (self._impact_key(doc_id, weight) for doc_id, weight in self._postings[term].items())
+            )
+            self._impact_heads[term] = head
+        return head
+
+    def _add_to_head(self, term: str, doc_id: str, weight: float):
+        head = self._impact_heads.get(term)
+        if head is None:
+            return
+        key = self._impact_key(doc_id, weight)
+        if len(head) < self.max_postings_per_term or key < head[-1]:
+            bisect.insort(head, key)
+            del head[self.max_postings_per_term:]
+
+    def _remove_from_head(self, term: str, doc_id: str):
+        head = self._impact_heads.get(term)
+        if head is None:
+            return
+        for i, entry in enumerate(head):
+            if entry[2] == doc_id:
+                del head[i]
+                break
+        # Refill from the full postings once too many head entries were removed
+        if len(head) < self.max_postings_per_term // 2 < len(self._postings[term]):
+            del self._impact_heads[term]
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Map a query token to indexed terms with a similarity weight"""
+        matches: Dict[str, float] = {}
+        if token in self._postings:
+            matches[token] = 1.0
+
+        if prefix:
+            start = bisect.bisect_left(self._vocab, token)
+            for term in self._vocab[start:start + self.max_expansions]:
+                if not term.startswith(token):
+                    break
+                matches.setdefault(term, 0.9)
+
+        if len(token) >= 3:
+            query_grams = trigrams(token)
+            overlap: Dict[str, int] = {}
+            for gram in query_grams:
+                for term in self._vocab_trigrams.get(gram, ()):
+                    overlap[term] = overlap.get(term, 0) + 1
+            for term, shared in overlap.items():
+                if term in matches:
+                    continue
+                similarity = shared / (len(query_grams) + len(trigrams(term)) - shared)
+                if similarity >= self.similarity_threshold:
+                    matches[term] = similarity
+
+        return heapq.nlargest(self.max_expansions, matches.items(), key=lambda item: item[1])
+
+    def _add_vocab(self, token: str):
+        bisect.insort(self._vocab, token)
+        for gram in trigrams(token):
+            self._vocab_trigrams.setdefault(gram, set()).add(token)
+
+    def _remove_vocab(self, token: str):
+        index = bisect.bisect_left(self._vocab, token)
+        if index < len(self._vocab) and self._vocab[index] == token:
+            self._vocab.pop(index)
+        for gram in trigrams(token):
+            words = self._vocab_trigrams.get(gram)
+            if words is not None:
+                words.discard(token)
+                if not words:
+                    del self._vocab_trigrams[gram]
+
+
+# Global search index instance
+workflow_search_index = WorkflowSearchIndex()
+
+
+async def refresh_search_index(service, interval_seconds: float):
+    """Keep the index in sync with workflows changed by other workers"""
+    while True:
+        try:
+            await service.refresh_search_index()
+        except Exception as e:
+            print(f"⚠️ Search index refresh failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
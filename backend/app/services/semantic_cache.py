@@ -0,0 +1,289 @@
+"""
+Semantic cache for prompt analysis and workflow generation
+"""
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Recent prompt embeddings kept so that a miss's ``store`` reuses the vector
+# its ``lookup`` paid for; big enough to span the calls in flight between them
+_EMBEDDING_MEMO_SIZE = 256
+
+# Filler that does not change what is being asked for
+_STOPWORDS = frozenset("""
+a an the me my i we us our you your please pls can could would will want need like to for of
+build create make generate design set up setup give get some that which with and or is be it
+about on in into from this these those
+""".split())
+
+
+# Words that flip or scale what is asked for while barely moving the
+# embedding: prompts must agree on these, and on every number, to share a result
+_GUARD_WORDS = frozenset("""
+not no never without except exclude excluding include including only
+positive negative good bad best worst high low higher lower more less most least
+increase decrease up down above below before after first last top bottom min max minimum maximum
+ascending descending asc desc enable disable enabled disabled allow deny accept reject approve
+true false yes yesterday today tomorrow start stop open close closed success failure failed
+hourly daily weekly monthly quarterly yearly annually
+second seconds minute minutes hour hours day days week weeks month months quarter quarters year years
+""".split())
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase words with punctuation and filler removed"""
+    words = _WORD_RE.findall(prompt.lower())
+    return " ".join(word for word in words if word not in _STOPWORDS) or " ".join(words)
+
+
+def guard_terms(normalized: str) -> frozenset:
+    """Numbers and guard words of a normalised prompt"""
+    return frozenset(word for word in normalized.split() if word.isdigit() or word in _GUARD_WORDS)
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of the words and of the
+    character trigrams of the space-free text, so that "chatbot" and
+    "chat bot" land on the same features. Needs no model or network and
+    is deterministic, so it suits tests and development; it measures
+    spelling rather than meaning, so production needs a real embedder.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        features = [(f"w:{word}", 0.5) for word in text.split()]
+        joined = text.replace(" ", "")
+        padded = f"^{joined}$"
+        features.extend((f"c:{padded[i:i + 3]}", 1.0) for i in range(len(padded) - 2))
+        return features
+
+    async def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += weight if value & (1 << 63) else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class LiteLLMEmbedder:
+    """Embeddings from a provider model through LiteLLM; the dimension is the model's"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.dimensions: Optional[int] = None  # known after the first embedding
+
+    async def embed(self, text: str) -> np.ndarray:
+        from litellm import aembedding
+
+        response = await aembedding(model=self.model, input=[text])
+        vector = np.asarray(response.data[0]["embedding"], dtype=np.float32)
+        self.dimensions = vector.shape[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """
+    Fixed-capacity matrix of unit vectors searched by one matrix-vector
+    product. Each row carries a guard key; a search only matches rows with
+    the same key. When full, the least recently used row is overwritten.
+    """
+
+    def __init__(self, dimensions: int, capacity: int = 2000):
+        self.capacity = capacity
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._guards = np.zeros(capacity, dtype=np.int64)
+        self._values: List[Optional[str]] = [None] * capacity
+        self._expires_at = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._size = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def search(self, vector: np.ndarray, threshold: float, guard: int = 0) -> Optional[Tuple[str, float]]:
+        """Most similar live entry with this guard key, at or above ``threshold``"""
+        if self._size == 0:
+            return None
+        scores = self._vectors[:self._size] @ vector
+        scores[self._expires_at[:self._size] <= time.time()] = -1.0
+        scores[self._guards[:self._size] != guard] = -1.0
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < threshold:
+            return None
+        self._last_used[best] = time.time()
+        return self._values[best], similarity
+
+    def add(self, vector: np.ndarray, value: str, ttl_seconds: float, guard: int = 0):
+        now = time.time()
+        if self._size < self.capacity:
+            slot = self._size
+            self._size += 1
+        else:
+            # Expired rows have the oldest possible use time
+            last_used = np.where(self._expires_at <= now, 0.0, self._last_used)
+            slot = int(np.argmin(last_used))
+            self.evictions += 1
+        self._vectors[slot] = vector
+        self._guards[slot] = guard
+        self._values[slot] = value
+        self._expires_at[slot] = now + ttl_seconds
+        self._last_used[slot] = now
+
+
+class SemanticCache:
+    """
+    Results of expensive prompt-level calls, looked up by meaning rather
+    than exact text. Each namespace (one per kind of result) has its own
+    index; a lookup embeds the normalised prompt and returns the stored
+    result of the most similar earlier prompt above the threshold.
+
+    Embeddings place prompts that differ only in a number or in a word such
+    as "positive"/"negative" or "daily"/"weekly" very close together, so a
+    hit also requires both prompts to have the same numbers and guard words.
+    Without an embedder the cache stays disabled.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        dimensions: Optional[int] = None,
+        threshold: float = 0.85,
+        ttl_seconds: float = 86400,
+        capacity: int = 2000,
+        enabled: bool = False
+    ):
+        if enabled and embedder is None:
+            print("⚠️ Semantic cache disabled: set SEMANTIC_CACHE_EMBEDDER to litellm:<embedding model>")
+            enabled = False
+        self.embedder = embedder
+        # Taken from the first embedding when the embedder does not declare it
+        self.dimensions = dimensions or getattr(embedder, "dimensions", None)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.capacity = capacity
+        self.enabled = enabled
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._embeddings: "OrderedDict[str, Tuple[np.ndarray, int]]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def available(self) -> bool:
+        """Whether lookups can run at all, even if not enabled by default"""
+        return self.embedder is not None
+
+    def _namespace_stats(self, namespace: str) -> Dict[str, float]:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = {"lookups": 0, "hits": 0, "stores": 0, "similarity_sum": 0.0}
+        return stats
+
+    async def _embed(self, prompt: str) -> Tuple[np.ndarray, int]:
+        """Embedding of the normalised prompt and its guard key, memoised"""
+        normalized = normalize_prompt(prompt)
+        embedded = self._embeddings.get(normalized)
+        if embedded is not None:
+            self._embeddings.move_to_end(normalized)
+            return embedded
+
+        vector = await self.embedder.embed(normalized)
+        if self.dimensions is None:
+            self.dimensions = vector.shape[0]
+        elif vector.shape[0] != self.dimensions:
+            raise ValueError(f"Embedder returned {vector.shape[0]} dimensions, expected {self.dimensions}")
+        embedded = self._embeddings[normalized] = (vector, hash(guard_terms(normalized)))
+        while len(self._embeddings) > _EMBEDDING_MEMO_SIZE:
+            self._embeddings.popitem(last=False)
+        return embedded
+
+    async def lookup(self, namespace: str, prompt: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Cached result and its similarity, or None; each hit is a fresh copy"""
+        if not self.available:
+            return None
+        stats = self._namespace_stats(namespace)
+        stats["lookups"] += 1
+        index = self._indexes.get(namespace)
+        if index is None:
+            return None
+        try:
+            vector, guard = await self._embed(prompt)
+            found = index.search(vector, self.threshold, guard)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup failed: {str(e)}")
+            return None
+        if found is None:
+            return None
+        stats["hits"] += 1
+        stats["similarity_sum"] += found[1]
+        return json.loads(found[0]), found[1]
+
+    async def store(self, namespace: str, prompt: str, result: Dict[str, Any]):
+        if not self.available:
+            return
+        stats = self._namespace_stats(namespace)
+        try:
+            vector, guard = await self._embed(prompt)
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = VectorIndex(self.dimensions, self.capacity)
+            index.add(vector, json.dumps(result, ensure_ascii=False, default=str), self.ttl_seconds, guard)
+            stats["stores"] += 1
+        except Exception as e:
+            print(f"⚠️ Semantic cache store failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for namespace, stats in self._stats.items():
+            index = self._indexes.get(namespace)
+            namespaces[namespace] = {
+                "lookups": int(stats["lookups"]),
+                "hits": int(stats["hits"]),
+                "stores": int(stats["stores"]),
+                "hit_rate": round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0,
+                "mean_hit_similarity": round(stats["similarity_sum"] / stats["hits"], 4) if stats["hits"] else None,
+                "entries": len(index) if index is not None else 0,
+                "evictions": index.evictions if index is not None else 0
+            }
+        return {
+            "enabled": self.enabled,
+            "embedder": type(self.embedder).__name__ if self.embedder is not None else None,
+            "threshold": self.threshold,
+            "namespaces": namespaces
+        }
+
+
+def _create_embedder():
+    name = settings.SEMANTIC_CACHE_EMBEDDER or ""
+    if name.startswith("litellm:"):
+        return LiteLLMEmbedder(name.split(":", 1)[1])
+    if name == "hashing":
+        if settings.SEMANTIC_CACHE_ENABLED:
+            print("⚠️ Semantic cache uses the hashing embedder, which is meant for tests and development")
+        return HashingEmbedder(settings.SEMANTIC_CACHE_DIMENSIONS)
+    return None
+
+
+# Global semantic cache
+semantic_cache = SemanticCache(
+    _create_embedder(),
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    capacity=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    enabled=settings.SEMANTIC_CACHE_ENABLED
+)
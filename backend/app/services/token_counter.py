@@ -0,0 +1,230 @@
+"""
+Local token counting and prompt budgeting against model context windows
+"""
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import litellm
+
+from ..core.config import settings
+
+try:
+    import tiktoken  # installed with litellm
+except ImportError:  # exact counts are optional; the approximation covers every model
+    tiktoken = None
+
+BUDGET_POLICIES = ("reject", "truncate", "summarize")
+
+# Per-message framing tokens of the chat format, and the reply primer
+_MESSAGE_OVERHEAD = 4
+_REPLY_OVERHEAD = 2
+
+_TRUNCATION_MARKER = "\n...[truncated]...\n"
+
+
+class PromptBudgetError(Exception):
+    """The prompt does not fit the model's context window under the chosen policy"""
+
+    def __init__(self, model: str, prompt_tokens: int, budget: int):
+        super().__init__(
+            f"Prompt is {prompt_tokens} tokens but {model} allows {budget} "
+            f"after reserving room for the completion"
+        )
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.budget = budget
+
+
+def _base_model(model: str) -> str:
+    return model.split("/", 1)[1] if "/" in model else model
+
+
+def approximate_tokens(text: str) -> int:
+    """
+    Upper-leaning estimate for any tokenizer: about four tokens per three
+    words, and at least one token per four bytes of UTF-8 (which also
+    covers long words and scripts without spaces). Costs well under a
+    millisecond even for prompts near a large context window.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text.split()) * 4 / 3), math.ceil(len(text.encode("utf-8")) / 4))
+
+
+class TokenCounter:
+    """
+    Counts tokens locally. OpenAI models use their tiktoken encoding,
+    loaded once per encoding and shared by every model that uses it; other
+    models, or any model whose encoding cannot be loaded offline, use the
+    approximation.
+    """
+
+    def __init__(self, use_tokenizers: bool = True, context_windows: Optional[Dict[str, int]] = None):
+        self.use_tokenizers = use_tokenizers and tiktoken is not None
+        self.context_windows = dict(context_windows or {})
+        self._model_info: Dict[str, Dict[str, Any]] = {}
+        self._encodings: Dict[str, Any] = {}
+        self._model_encodings: Dict[str, Optional[Any]] = {}
+        self.stats = {"exact": 0, "approximate": 0, "rejected": 0, "truncated": 0, "summarized": 0}
+
+    def _encoding_name(self, model: str) -> Optional[str]:
+        base = _base_model(model)
+        if base.startswith("gpt-4o"):
+            return "o200k_base"
+        if base.startswith(("gpt-4", "gpt-3.5", "text-embedding")):
+            return "cl100k_base"
+        return None
+
+    def encoding_for(self, model: str):
+        """The model's tiktoken encoding, or None to approximate"""
+        if model in self._model_encodings:
+            return self._model_encodings[model]
+        encoding = None
+        name = self._encoding_name(model) if self.use_tokenizers else None
+        if name is not None:
+            if name not in self._encodings:
+                try:
+                    self._encodings[name] = tiktoken.get_encoding(name)
+                except Exception as e:
+                    print(f"⚠️ Tokenizer {name} unavailable, approximating token counts: {str(e)}")
+                    self._encodings[name] = None
+            encoding = self._encodings[name]
+        self._model_encodings[model] = encoding
+        return encoding
+
+    def count_text(self, text: str, model: str) -> int:
+        encoding = self.encoding_for(model)
+        if encoding is None:
+            self.stats["approximate"] += 1
+            return approximate_tokens(text)
+        self.stats["exact"] += 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_message(self, message: Dict[str, Any], model: str) -> int:
+        return self.count_text(str(message.get("content") or ""), model) + _MESSAGE_OVERHEAD
+
+    def count_messages(self, messages: List[Dict[str, Any]], model: str) -> int:
+        return sum(self.count_message(message, model) for message in messages) + _REPLY_OVERHEAD
+
+    def model_info(self, model: str) -> Dict[str, Any]:
+        """
+        LiteLLM's model map entries for ``model`` as given, as an OpenRouter
+        id and without its provider prefix, merged with the more specific
+        entry winning (OpenRouter entries often lack the limits); empty if
+        unmapped
+        """
+        info = self._model_info.get(model)
+        if info is None:
+            info = {}
+            for name in (_base_model(model), f"openrouter/{model}", model):
+                info.update({key: value for key, value in litellm.model_cost.get(name, {}).items() if value is not None})
+            if not info and model not in self.context_windows:
+                print(f"⚠️ No context window known for {model}; its prompts are not checked locally")
+            self._model_info[model] = info
+        return info
+
+    def context_window(self, model: str) -> Optional[int]:
+        """Prompt tokens the model accepts, or None when unknown"""
+        window = self.context_windows.get(model) or self.context_windows.get(_base_model(model))
+        if window:
+            return window
+        info = self.model_info(model)
+        # Older map entries give the whole window as max_tokens
+        return info.get("max_input_tokens") or (info.get("max_tokens") if not info.get("max_output_tokens") else None)
+
+    def max_output_tokens(self, model: str) -> Optional[int]:
+        """Longest completion the model can produce, or None when unknown"""
+        return self.model_info(model).get("max_output_tokens")
+
+    def prompt_budget(self, model: str, max_tokens: int) -> Optional[int]:
+        """
+        Prompt tokens left once the completion's ``max_tokens`` is reserved,
+        or None when the model's window is unknown
+        """
+        window = self.context_window(model)
+        return window - (max_tokens or 0) if window is not None else None
+
+    def truncate_text(self, text: str, model: str, max_tokens: int) -> str:
+        """``text`` cut to ``max_tokens``, keeping its beginning and end"""
+        if self.count_text(text, model) <= max_tokens:
+            return text
+        keep = max(0, max_tokens - self.count_text(_TRUNCATION_MARKER, model))
+        encoding = self.encoding_for(model)
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            head = keep * 2 // 3
+            return encoding.decode(tokens[:head]) + _TRUNCATION_MARKER + encoding.decode(tokens[len(tokens) - (keep - head):])
+
+        # Approximate: shrink the kept characters until the estimate fits
+        chars = int(len(text) * keep / max(1, approximate_tokens(text)))
+        while True:
+            head = chars * 2 // 3
+            candidate = text[:head] + _TRUNCATION_MARKER + text[len(text) - (chars - head):]
+            if chars == 0 or approximate_tokens(candidate) <= max_tokens:
+                return candidate
+            chars = int(chars * 0.9)
+
+    def truncate_messages(self, messages: List[Dict[str, Any]], model: str, budget: int) -> List[Dict[str, Any]]:
+        """
+        Fit ``messages`` into ``budget`` tokens: drop the oldest history
+        first (system messages and the last message stay), then shorten the
+        longest remaining message
+        """
+        messages = [dict(message) for message in messages]
+        counts = [self.count_message(message, model) for message in messages]
+        total = sum(counts) + _REPLY_OVERHEAD
+
+        while total > budget:
+            droppable = [i for i, message in enumerate(messages[:-1]) if message.get("role") != "system"]
+            if not droppable:
+                break
+            total -= counts.pop(droppable[0])
+            del messages[droppable[0]]
+
+        if total > budget:
+            longest = max(range(len(messages)), key=counts.__getitem__)
+            keep = counts[longest] - _MESSAGE_OVERHEAD - (total - budget)
+            if keep <= 0:
+                raise PromptBudgetError(model, total, budget)
+            messages[longest]["content"] = self.truncate_text(str(messages[longest].get("content") or ""), model, keep)
+        return messages
+
+    def fit(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        max_tokens: int,
+        policy: str = "truncate"
+    ) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        Messages that fit the model's window under ``policy`` ("reject" or
+        "truncate"), with the prompt's token count before and after.
+        Summarizing needs a model call and is done by LiteLLMService.
+        Models with an unknown window are left to the provider.
+        """
+        if policy not in BUDGET_POLICIES:
+            raise ValueError(f"Unknown prompt budget policy '{policy}', expected one of: {', '.join(BUDGET_POLICIES)}")
+        prompt_tokens = self.count_messages(messages, model)
+        budget = self.prompt_budget(model, max_tokens)
+        if budget is None or prompt_tokens <= budget:
+            return messages, prompt_tokens, prompt_tokens
+        if policy != "truncate":
+            self.stats["rejected"] += 1
+            raise PromptBudgetError(model, prompt_tokens, budget)
+        fitted = self.truncate_messages(messages, model, budget)
+        self.stats["truncated"] += 1
+        return fitted, prompt_tokens, self.count_messages(fitted, model)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "tokenizers": sorted(name for name, encoding in self._encodings.items() if encoding is not None),
+            "tokenizer_library": tiktoken is not None
+        }
+
+
+# Global token counter
+token_counter = TokenCounter(
+    use_tokenizers=settings.TOKENIZER_ENABLED,
+    context_windows=settings.LLM_CONTEXT_WINDOWS
+)
@@ -0,0 +1,326 @@
+"""
+Content-addressed workflow version history
+"""
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..core.config import settings
+from ..models.workflow import Workflow, WorkflowVersion, WorkflowVariable
+from ..database.supabase_client import SupabaseClient, supabase_client
+
+# Regenerated on every save by the models, so they are not part of the content
+_VOLATILE_KEYS = ("created_at", "updated_at")
+
+_GRAPH_PARTS = ("nodes", "edges", "variables")
+
+# Hash lists are split into content-defined chunks of about this many entries
+_CHUNK_TARGET = 32
+
+# Object hashes per lookup; each adds 65 characters to the GET URL, which
+# proxies and PostgREST reject beyond a few kilobytes
+_LOOKUP_BATCH = 100
+
+
+def content_hash(value: Any) -> str:
+    """SHA-256 of the canonical JSON encoding of a value"""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class WorkflowSnapshot:
+    """
+    A workflow revision split into content-addressed objects.
+
+    Each node, edge and variable is stored once under the hash of its
+    content. The lists of those hashes are cut into chunks at positions
+    chosen by the hashes themselves, so inserting or deleting a node only
+    changes the chunk around it; chunks are stored as objects too. The
+    manifest holds the chunk hashes plus the scalar fields, and the version
+    hash is the hash of the manifest. Two revisions that differ in one node
+    share every other object and chunk, so history grows with the size of
+    the edits rather than the size of the workflow.
+    """
+
+    __slots__ = ("manifest", "objects", "hash")
+
+    def __init__(
+        self,
+        name: str,
+        description: Optional[str],
+        tags: List[str],
+        nodes: List[Dict[str, Any]],
+        edges: List[Dict[str, Any]],
+        variables: List[Dict[str, Any]]
+    ):
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self.manifest: Dict[str, Any] = {
+            "name": name,
+            "description": description,
+            "tags": list(tags or [])
+        }
+        for kind, items in zip(_GRAPH_PARTS, (nodes, edges, variables)):
+            chunks, chunk = [], []
+            for item in items or []:
+                content = {k: v for k, v in item.items() if k not in _VOLATILE_KEYS}
+                object_hash = content_hash(content)
+                self.objects[object_hash] = content
+                chunk.append(object_hash)
+                if int(object_hash[:8], 16) % _CHUNK_TARGET == 0:
+                    chunks.append(self._add_chunk(chunk))
+                    chunk = []
+            if chunk:
+                chunks.append(self._add_chunk(chunk))
+            self.manifest[kind] = chunks
+        self.hash = content_hash(self.manifest)
+
+    def _add_chunk(self, hashes: List[str]) -> str:
+        content = {"items": hashes}
+        chunk_hash = content_hash(content)
+        self.objects[chunk_hash] = content
+        return chunk_hash
+
+    @classmethod
+    def from_workflow(cls, workflow: Workflow) -> "WorkflowSnapshot":
+        data = workflow.model_dump(mode="json", include={"nodes", "edges", "variables"})
+        return cls(workflow.name, workflow.description, workflow.tags, **data)
+
+
+class WorkflowVersionStore:
+    """
+    Immutable store of workflow revisions.
+
+    Objects are immutable, so every object seen is remembered in a bounded
+    LRU: saves only upload objects this process has not written or read
+    before, and loading an old revision only fetches the objects missing
+    from memory. Executions never wait on the store: ``version_hash``
+    answers from memory and records unseen revisions in the background.
+    """
+
+    def __init__(self, supabase: SupabaseClient, max_cached_objects: int = 20000):
+        self.supabase = supabase
+        self.max_cached_objects = max_cached_objects
+        self._objects: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Hash per (workflow id, version) known to be stored, to skip redundant writes
+        self._recorded: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._recording: Dict[Tuple[str, int], asyncio.Task] = {}
+
+        self.stats = {
+            "versions_recorded": 0,
+            "versions_deduplicated": 0,
+            "objects_written": 0,
+            "objects_shared": 0,
+            "object_cache_hits": 0,
+            "object_cache_misses": 0,
+            "hashes_computed": 0,
+            "background_failures": 0
+        }
+
+    async def record(self, workflow: Workflow, user_id: Optional[str] = None) -> str:
+        """
+        Store the workflow's current content as revision ``workflow.version``
+        and return its version hash. Recording the same revision again is a
+        no-op, so this is also safe to call for workflows saved before
+        history existed.
+        """
+        snapshot = WorkflowSnapshot.from_workflow(workflow)
+        if self._recorded.get((workflow.id, workflow.version)) == snapshot.hash:
+            self._recorded.move_to_end((workflow.id, workflow.version))
+            self.stats["versions_deduplicated"] += 1
+            return snapshot.hash
+
+        new_objects = [
+            {"hash": object_hash, "content": content}
+            for object_hash, content in snapshot.objects.items()
+            if object_hash not in self._objects
+        ]
+        self.stats["objects_shared"] += len(snapshot.objects) - len(new_objects)
+
+        version_row = {
+            "workflow_id": workflow.id,
+            "version": workflow.version,
+            "hash": snapshot.hash,
+            "manifest": snapshot.manifest,
+            "created_by": user_id
+        }
+
+        client = self.supabase.client
+        # Objects first, so a stored manifest never points at missing content
+        if new_objects:
+            await self.supabase.execute(
+                client.table("workflow_objects").upsert(
+                    new_objects, on_conflict="hash", ignore_duplicates=True
+                ),
+                "workflow_objects.record"
+            )
+        await self.supabase.execute(
+            client.table("workflow_versions").upsert(
+                version_row, on_conflict="workflow_id,version", ignore_duplicates=True
+            ),
+            "workflow_versions.record"
+        )
+
+        for object_hash, content in snapshot.objects.items():
+            self._remember_object(object_hash, content)
+        self._remember_recorded(workflow.id, workflow.version, snapshot.hash)
+        self.stats["versions_recorded"] += 1
+        self.stats["objects_written"] += len(new_objects)
+        return snapshot.hash
+
+    def version_hash(self, workflow: Workflow, user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Hash of the revision an execution runs, without touching the database.
+        Saves store the hash on the workflow row; rows saved before that are
+        hashed once per process and revision. A revision this process has not
+        seen stored is recorded by a background task, which covers workflows
+        saved before history existed and saves whose version write failed.
+        Returns None rather than failing the run if the hash cannot be made.
+        """
+        key = (workflow.id, workflow.version)
+        version_hash = workflow.version_hash or self._recorded.get(key)
+        if version_hash is None:
+            try:
+                version_hash = WorkflowSnapshot.from_workflow(workflow).hash
+            except Exception as e:
+                print(f"⚠️ Failed to hash workflow revision: {str(e)}")
+                return None
+            self.stats["hashes_computed"] += 1
+
+        if self._recorded.get(key) != version_hash:
+            self.record_later(workflow, user_id)
+        return version_hash
+
+    def record_later(self, workflow: Workflow, user_id: Optional[str] = None):
+        """Record a revision from a background task; failures are logged, never raised"""
+        key = (workflow.id, workflow.version)
+        if key in self._recording:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._record_logged(workflow, user_id))
+        except RuntimeError:
+            return
+        self._recording[key] = task
+        task.add_done_callback(lambda _: self._recording.pop(key, None))
+
+    async def _record_logged(self, workflow: Workflow, user_id: Optional[str]):
+        try:
+            await self.record(workflow, user_id)
+        except Exception as e:
+            self.stats["background_failures"] += 1
+            print(f"⚠️ Failed to record workflow version: {str(e)}")
+
+    async def list_versions(self, workflow_id: str, limit: int = 50) -> List[WorkflowVersion]:
+        """Revisions of a workflow, newest first, without their content"""
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflow_versions")
+            .select("workflow_id,version,hash,created_by,created_at")
+            .eq("workflow_id", workflow_id)
+            .order("version", desc=True)
+            .limit(limit),
+            "workflow_versions.list"
+        )
+        return [WorkflowVersion(**row) for row in result.data or []]
+
+    async def load(self, workflow: Workflow, version_hash: str) -> Optional[Workflow]:
+        """
+        Rebuild a stored revision of ``workflow``. Ownership and timestamps
+        come from the current workflow; content and version number from the
+        revision.
+        """
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflow_versions")
+            .select("version,manifest")
+            .eq("workflow_id", workflow.id)
+            .eq("hash", version_hash)
+            .order("version", desc=True)
+            .limit(1),
+            "workflow_versions.get"
+        )
+        if not result.data:
+            return None
+        row = result.data[0]
+        manifest = row["manifest"]
+
+        chunks = await self._get_objects(
+            [h for kind in _GRAPH_PARTS for h in manifest.get(kind, [])]
+        )
+        item_hashes = {
+            kind: [h for chunk in manifest.get(kind, []) for h in chunks[chunk]["items"]]
+            for kind in _GRAPH_PARTS
+        }
+        objects = await self._get_objects([h for hashes in item_hashes.values() for h in hashes])
+        graph = {kind: [objects[h] for h in hashes] for kind, hashes in item_hashes.items()}
+
+        self._remember_recorded(workflow.id, row["version"], version_hash)
+        fields = {
+            name: getattr(workflow, name)
+            for name in ("id", "user_id", "status", "is_public", "created_at", "updated_at",
+                         "last_executed_at", "execution_count")
+        }
+        return Workflow.from_stored(
+            graph,
+            name=manifest["name"],
+            description=manifest.get("description"),
+            tags=manifest.get("tags", []),
+            variables=[WorkflowVariable(**var) for var in graph["variables"]],
+            version=row["version"],
+            version_hash=version_hash,
+            **fields
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get version store statistics"""
+        return {**self.stats, "cached_objects": len(self._objects), "recording": len(self._recording)}
+
+    async def _get_objects(self, hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for object_hash in dict.fromkeys(hashes):
+            content = self._objects.get(object_hash)
+            if content is None:
+                missing.append(object_hash)
+            else:
+                self._objects.move_to_end(object_hash)
+                found[object_hash] = content
+        self.stats["object_cache_hits"] += len(found)
+        self.stats["object_cache_misses"] += len(missing)
+
+        results = await asyncio.gather(*(
+            self.supabase.execute(
+                self.supabase.client.table("workflow_objects").select("hash,content")
+                .in_("hash", missing[start:start + _LOOKUP_BATCH]),
+                "workflow_objects.get"
+            )
+            for start in range(0, len(missing), _LOOKUP_BATCH)
+        ))
+        for result in results:
+            for row in result.data or []:
+                found[row["hash"]] = row["content"]
+                self._remember_object(row["hash"], row["content"])
+
+        absent = [h for h in missing if h not in found]
+        if absent:
+            raise Exception(f"Workflow version is missing {len(absent)} stored objects")
+        return found
+
+    def _remember_object(self, object_hash: str, content: Dict[str, Any]):
+        self._objects[object_hash] = content
+        self._objects.move_to_end(object_hash)
+        while len(self._objects) > self.max_cached_objects:
+            self._objects.popitem(last=False)
+
+    def _remember_recorded(self, workflow_id: str, version: int, version_hash: str):
+        key = (workflow_id, version)
+        self._recorded[key] = version_hash
+        self._recorded.move_to_end(key)
+        while len(self._recorded) > self.max_cached_objects:
+            self._recorded.popitem(last=False)
+
+
+# Global version store instance
+workflow_version_store = WorkflowVersionStore(
+    supabase_client,
+    max_cached_objects=settings.VERSION_OBJECT_CACHE_MAX_ENTRIES
+)
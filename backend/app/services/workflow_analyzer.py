@@ -0,0 +1,477 @@
+"""
+Static analysis of workflow graphs, with incremental re-validation for the editor
+"""
+import re
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from .expressions import ConditionSet
+from .model_router import ROUTING_MODES
+from ..models.workflow import (
+    WorkflowBase, WorkflowDiff, WorkflowAnalysis, WorkflowVariable, Node, Edge, NodeType
+)
+
+# Same pattern the execution engine substitutes
+_REFERENCE_RE = re.compile(r"\{\{([^}]+)\}\}")
+
+# Config fields the execution engine runs variable substitution on
+_TEMPLATED_FIELDS = ("prompt", "system_prompt", "template", "code", "url")
+
+# Outputs the execution engine writes beyond what Node.get_output_variables declares
+_RUNTIME_OUTPUTS = {
+    NodeType.ANSWER: ("answer", "final_output"),
+}
+
+# Data type of each built-in output, used for handles that declare no type
+_OUTPUT_TYPES = {
+    "text": "string",
+    "output": "string",
+    "answer": "string",
+    "final_output": "string",
+    "status_code": "number",
+    "headers": "object",
+    "body": "any",
+    "result": "any",
+    "sys.query": "string",
+    "sys.files": "array",
+}
+_OUTPUT_TYPES_BY_NODE = {
+    NodeType.CONDITION: {"result": "boolean"},
+    NodeType.KNOWLEDGE_RETRIEVAL: {"result": "array"},
+}
+
+# Values of these types are rendered with str() where a string is expected
+_STRINGIFIABLE = ("number", "boolean")
+
+
+def types_compatible(source_type: str, target_type: str) -> bool:
+    """Whether a value of ``source_type`` may feed a handle of ``target_type``"""
+    if source_type == target_type or "any" in (source_type, target_type):
+        return True
+    return target_type == "string" and source_type in _STRINGIFIABLE
+
+
+def _handle_type(handles: Optional[Dict[str, Any]], handle_id: Optional[str]) -> Optional[str]:
+    """Declared data type of a handle, from NodeHandle-style dicts or plain type strings"""
+    if not handles or handle_id is None:
+        return None
+    handle = handles.get(handle_id)
+    if isinstance(handle, str):
+        return handle
+    if isinstance(handle, dict):
+        return handle.get("data_type")
+    return None
+
+
+class _NodeFacts:
+    """What the analysis needs from a node, extracted once per change"""
+
+    __slots__ = ("node", "references", "outputs", "condition_error")
+
+    def __init__(self, node: Node):
+        self.node = node
+        references = []
+        for field in _TEMPLATED_FIELDS:
+            text = getattr(node.data, field, None)
+            if isinstance(text, str) and "{{" in text:
+                references.extend(match.strip() for match in _REFERENCE_RE.findall(text))
+
+        self.condition_error: Optional[str] = None
+        if node.type in (NodeType.CONDITION, NodeType.IF_ELSE):
+            conditions = ConditionSet(node.data.conditions, node.data.logical_operator)
+            references.extend(conditions.variables)
+            self.condition_error = conditions.error
+        self.references: Tuple[str, ...] = tuple(dict.fromkeys(references))
+        self.outputs: Tuple[str, ...] = tuple(node.get_output_variables()) + _RUNTIME_OUTPUTS.get(node.type, ())
+
+    def output_type(self, handle_id: Optional[str]) -> Optional[str]:
+        declared = _handle_type(self.node.outputs, handle_id)
+        if declared is not None or handle_id not in self.outputs:
+            return declared
+        return _OUTPUT_TYPES_BY_NODE.get(self.node.type, {}).get(handle_id, _OUTPUT_TYPES.get(handle_id))
+
+    def input_type(self, handle_id: Optional[str]) -> Optional[str]:
+        return _handle_type(self.node.inputs, handle_id)
+
+
+class WorkflowAnalyzer:
+    """
+    Static analyzer for one workflow graph.
+
+    A full analysis finds cycles (Tarjan's strongly connected components),
+    nodes unreachable from a START node, ``{{...}}`` references that no
+    earlier node or workflow variable defines, and edges joining handles of
+    incompatible data types, in O(V + E).
+
+    The analyzer keeps the graph and its per-node and per-edge findings, so
+    the editor can send only what changed. Edits to a node's config re-check
+    that node alone; only changes to the node or edge sets re-run the graph
+    passes.
+    """
+
+    def __init__(self, nodes: List[Node], edges: List[Edge], variables: List[WorkflowVariable]):
+        self._facts: Dict[str, _NodeFacts] = {node.id: _NodeFacts(node) for node in nodes}
+        self._edges: Dict[str, Edge] = {edge.id: edge for edge in edges}
+        self._incident: Dict[str, Set[str]] = {}
+        for edge in edges:
+            self._link(edge)
+        self._variables: Set[str] = {var.variable for var in variables}
+
+        # Structural results, recomputed when nodes or edges are added or removed
+        self._cycles: List[List[str]] = []
+        self._unreachable: List[str] = []
+        self._rank: Dict[str, int] = {}
+        self._producers: Dict[str, int] = {}
+
+        # Cached findings per node (reference issues) and per edge (endpoint and type issues)
+        self._node_findings: Dict[str, Tuple[List[str], List[str]]] = {}
+        self._edge_findings: Dict[str, Tuple[List[str], Optional[Dict[str, Any]]]] = {}
+
+        self._structure_dirty = True
+        self._dirty_nodes: Set[str] = set(self._facts)
+        self._dirty_edges: Set[str] = set(self._edges)
+
+    @classmethod
+    def from_workflow(cls, workflow: WorkflowBase) -> "WorkflowAnalyzer":
+        return cls(workflow.nodes, workflow.edges, workflow.variables)
+
+    def apply_diff(self, diff: WorkflowDiff) -> WorkflowAnalysis:
+        """Apply editor changes and return the updated analysis"""
+        for node_id in diff.removed_nodes:
+            if self._facts.pop(node_id, None) is None:
+                continue
+            self._node_findings.pop(node_id, None)
+            self._dirty_nodes.discard(node_id)
+            # Edges of a removed node now dangle; re-check them
+            self._dirty_edges.update(self._incident.get(node_id, ()))
+            self._structure_dirty = True
+
+        for node in diff.nodes:
+            previous = self._facts.get(node.id)
+            self._facts[node.id] = _NodeFacts(node)
+            self._dirty_nodes.add(node.id)
+            incident = self._incident.get(node.id, ())
+            if previous is None or previous.node.type != node.type:
+                # A changed type also moves where flat variables are first defined
+                self._dirty_edges.update(incident)
+                self._structure_dirty = True
+            elif previous.node.inputs != node.inputs or previous.node.outputs != node.outputs:
+                self._dirty_edges.update(incident)
+
+        for edge_id in diff.removed_edges:
+            edge = self._edges.pop(edge_id, None)
+            if edge is None:
+                continue
+            self._unlink(edge)
+            self._edge_findings.pop(edge_id, None)
+            self._dirty_edges.discard(edge_id)
+            self._structure_dirty = True
+
+        for edge in diff.edges:
+            previous = self._edges.get(edge.id)
+            if previous is not None:
+                self._unlink(previous)
+            self._edges[edge.id] = edge
+            self._link(edge)
+            self._dirty_edges.add(edge.id)
+            if previous is None or (previous.source, previous.target) != (edge.source, edge.target):
+                self._structure_dirty = True
+
+        if diff.variables is not None:
+            variables = {var.variable for var in diff.variables}
+            if variables != self._variables:
+                self._variables = variables
+                self._dirty_nodes.update(self._facts)
+
+        return self.analyze()
+
+    def analyze(self) -> WorkflowAnalysis:
+        """Bring stale findings up to date and assemble the analysis"""
+        if self._structure_dirty:
+            self._analyze_structure()
+            self._structure_dirty = False
+            # Ranks may have moved, so every node's references are re-resolved
+            self._dirty_nodes.update(self._facts)
+
+        for node_id in self._dirty_nodes:
+            self._node_findings[node_id] = self._check_node(self._facts[node_id])
+        self._dirty_nodes.clear()
+        for edge_id in self._dirty_edges:
+            self._edge_findings[edge_id] = self._check_edge(self._edges[edge_id])
+        self._dirty_edges.clear()
+
+        analysis = WorkflowAnalysis()
+        types = [facts.node.type for facts in self._facts.values()]
+        if NodeType.START not in types:
+            analysis.errors.append("Workflow must have at least one START node")
+        if NodeType.ANSWER not in types and NodeType.END not in types:
+            analysis.warnings.append("Workflow should have an ANSWER or END node")
+
+        for edge_id, (errors, mismatch) in self._edge_findings.items():
+            analysis.errors.extend(errors)
+            if mismatch is not None:
+                analysis.type_mismatches.append(mismatch)
+
+        for cycle in self._cycles:
+            analysis.errors.append(f"Workflow contains a cycle: {' -> '.join(cycle + cycle[:1])}")
+        analysis.cycles = [list(cycle) for cycle in self._cycles]
+
+        analysis.unreachable_nodes = list(self._unreachable)
+        if self._unreachable:
+            analysis.warnings.append(f"Nodes not reachable from a START node: {self._unreachable}")
+
+        for node_id, (errors, undefined) in self._node_findings.items():
+            analysis.errors.extend(errors)
+            if undefined:
+                analysis.undefined_references[node_id] = undefined
+                analysis.warnings.append(f"Node '{node_id}' uses undefined variables: {undefined}")
+
+        analysis.valid = not analysis.errors
+        return analysis
+
+    def _link(self, edge: Edge):
+        # Kept for missing endpoints too, so a node added later finds its edges
+        for node_id in (edge.source, edge.target):
+            self._incident.setdefault(node_id, set()).add(edge.id)
+
+    def _unlink(self, edge: Edge):
+        for node_id in (edge.source, edge.target):
+            incident = self._incident.get(node_id)
+            if incident is not None:
+                incident.discard(edge.id)
+
+    def _analyze_structure(self):
+        """Cycles, reachability and execution ranks in one O(V + E) pass each"""
+        node_ids = list(self._facts)
+        index_by_id = {node_id: i for i, node_id in enumerate(node_ids)}
+        successors: List[List[int]] = [[] for _ in node_ids]
+        in_degree = [0] * len(node_ids)
+        self_loops = set()
+        for edge in self._edges.values():
+            source = index_by_id.get(edge.source)
+            target = index_by_id.get(edge.target)
+            if source is None or target is None:
+                continue
+            successors[source].append(target)
+            in_degree[target] += 1
+            if source == target:
+                self_loops.add(source)
+
+        self._cycles = [
+            [node_ids[i] for i in component]
+            for component in self._strongly_connected(successors)
+            if len(component) > 1 or component[0] in self_loops
+        ]
+
+        # Reachability from every START node
+        starts = [i for i, node_id in enumerate(node_ids) if self._facts[node_id].node.type == NodeType.START]
+        self._unreachable = []
+        if starts:
+            seen = [False] * len(node_ids)
+            queue = deque(starts)
+            for i in starts:
+                seen[i] = True
+            while queue:
+                for successor in successors[queue.popleft()]:
+                    if not seen[successor]:
+                        seen[successor] = True
+                        queue.append(successor)
+            self._unreachable = [node_ids[i] for i in range(len(node_ids)) if not seen[i]]
+
+        # Execution ranks, in the same Kahn order the runtime graph uses; nodes on
+        # or behind a cycle get no rank because they can never run
+        self._rank = {}
+        queue = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+        while queue:
+            i = queue.popleft()
+            self._rank[node_ids[i]] = len(self._rank)
+            for successor in successors[i]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+
+        # Rank of the first node that writes each flat output variable
+        self._producers = {}
+        for node_id, rank in self._rank.items():
+            for output in self._facts[node_id].outputs:
+                self._producers.setdefault(output, rank)
+
+    @staticmethod
+    def _strongly_connected(successors: List[List[int]]) -> List[List[int]]:
+        """Tarjan's algorithm, iterative so deep graphs cannot hit the recursion limit"""
+        count = len(successors)
+        index = [-1] * count
+        low = [0] * count
+        on_stack = [False] * count
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            work = [(root, 0)]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+
+            while work:
+                vertex, position = work[-1]
+                edges = successors[vertex]
+                if position < len(edges):
+                    work[-1] = (vertex, position + 1)
+                    successor = edges[position]
+                    if index[successor] == -1:
+                        index[successor] = low[successor] = counter
+                        counter += 1
+                        stack.append(successor)
+                        on_stack[successor] = True
+                        work.append((successor, 0))
+                    elif on_stack[successor]:
+                        low[vertex] = min(low[vertex], index[successor])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[vertex])
+                if low[vertex] == index[vertex]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == vertex:
+                            break
+                    component.reverse()
+                    components.append(component)
+
+        return components
+
+    def _check_node(self, facts: _NodeFacts) -> Tuple[List[str], List[str]]:
+        """Config errors and undefined references of one node"""
+        node = facts.node
+        errors = []
+        if node.type in (NodeType.LLM, NodeType.CHAT) and not node.data.prompt:
+            errors.append(f"LLM node '{node.id}' requires a prompt")
+        if facts.condition_error is not None:
+            errors.append(f"Condition node '{node.id}' has an invalid condition: {facts.condition_error}")
+        routing = node.data.routing if node.type in (NodeType.LLM, NodeType.CHAT) else None
+        if routing and routing.get("mode", "fallback") not in ROUTING_MODES:
+            errors.append(f"LLM node '{node.id}' has unknown routing mode '{routing.get('mode')}'")
+
+        rank = self._rank.get(node.id)
+        if rank is None:
+            return errors, []  # never runs; the cycle is reported instead
+
+        undefined = []
+        for reference in facts.references:
+            if not self._is_defined(reference, node.id, rank):
+                undefined.append(reference)
+        return errors, undefined
+
+    def _is_defined(self, reference: str, node_id: str, rank: int) -> bool:
+        """
+        Whether a reference has a value by the time the node runs. Mirrors
+        the execution engine: ``{{node_id.output}}`` reads an earlier node's
+        outputs, anything else is looked up among the input variables and
+        the flat outputs of earlier nodes.
+        """
+        if "." in reference:
+            source_id, output = reference.split(".", 1)
+            source = self._facts.get(source_id)
+            if source is not None:
+                source_rank = self._rank.get(source_id)
+                if source_rank is not None and source_rank < rank and output in source.outputs:
+                    return True
+
+        if reference in self._variables or reference.startswith("sys."):
+            return True
+        producer = self._producers.get(reference)
+        return producer is not None and producer < rank
+
+    def _check_edge(self, edge: Edge) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+        """Endpoint errors and handle type mismatch of one edge"""
+        source = self._facts.get(edge.source)
+        target = self._facts.get(edge.target)
+        errors = []
+        if source is None:
+            errors.append(f"Edge references non-existent source node: {edge.source}")
+        if target is None:
+            errors.append(f"Edge references non-existent target node: {edge.target}")
+        if errors:
+            return errors, None
+
+        source_type = source.output_type(edge.sourceHandle)
+        target_type = target.input_type(edge.targetHandle)
+        if source_type is None or target_type is None or types_compatible(source_type, target_type):
+            return errors, None
+
+        errors.append(
+            f"Edge '{edge.id}' connects {source_type} output '{edge.source}.{edge.sourceHandle}' "
+            f"to {target_type} input '{edge.target}.{edge.targetHandle}'"
+        )
+        return errors, {
+            "edge_id": edge.id,
+            "source": edge.source,
+            "source_handle": edge.sourceHandle,
+            "source_type": source_type,
+            "target": edge.target,
+            "target_handle": edge.targetHandle,
+            "target_type": target_type
+        }
+
+
+class AnalyzerSessionStore:
+    """
+    Live analyzers for workflows open in the editor, so each change is
+    validated against the previous state. Bounded LRU with idle expiry;
+    sessions belong to the user that opened them.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 1800):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._sessions: "OrderedDict[str, Tuple[str, WorkflowAnalyzer, float]]" = OrderedDict()
+        self.stats = {"created": 0, "updates": 0, "expired": 0}
+
+    def create(self, owner: str, analyzer: WorkflowAnalyzer) -> str:
+        session_id = uuid.uuid4().hex
+        self._sessions[session_id] = (owner, analyzer, time.monotonic())
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+        self.stats["created"] += 1
+        return session_id
+
+    def get(self, session_id: str, owner: str) -> Optional[WorkflowAnalyzer]:
+        """Analyzer of a session, or None if it is unknown, expired or not the owner's"""
+        entry = self._sessions.get(session_id)
+        if entry is None or entry[0] != owner:
+            return None
+        if time.monotonic() - entry[2] > self.ttl_seconds:
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+            return None
+        self._sessions[session_id] = (owner, entry[1], time.monotonic())
+        self._sessions.move_to_end(session_id)
+        self.stats["updates"] += 1
+        return entry[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "active": len(self._sessions), "max_entries": self.max_entries}
+
+
+def analyze_workflow(workflow: WorkflowBase) -> WorkflowAnalysis:
+    """One-off full analysis of a workflow"""
+    return WorkflowAnalyzer.from_workflow(workflow).analyze()
+
+
+# Global editor session store
+analyzer_sessions = AnalyzerSessionStore(
+    max_entries=settings.ANALYZER_SESSION_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYZER_SESSION_TTL_SECONDS
+)
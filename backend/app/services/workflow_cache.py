@@ -0,0 +1,227 @@
+"""
+Process-wide workflow definition cache
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from ..core.config import settings
+from ..models.workflow import Workflow
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis tier is optional
+    aioredis = None
+
+
+class WorkflowCache:
+    """
+    Two-tier cache for workflow definitions keyed by workflow id.
+
+    The first tier is an in-process LRU with a TTL; the optional second tier
+    is Redis, shared between workers. With Redis, invalidations are also
+    published to every worker, and the memory tier is only used while this
+    worker is subscribed to them. Without Redis, updates made through other
+    workers go unnoticed, so memory entries only live ``local_ttl_seconds``.
+    Cached workflows are shared objects and must be treated as read-only by
+    callers.
+    """
+
+    INVALIDATION_CHANNEL = "pilot:workflow:invalidations"
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: int = 300,
+        redis_url: Optional[str] = None,
+        redis_ttl_seconds: int = 3600,
+        local_ttl_seconds: int = 5
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds if redis_url else min(ttl_seconds, local_ttl_seconds)
+        self.redis_ttl_seconds = redis_ttl_seconds
+
+        self._entries: "OrderedDict[str, Tuple[float, Workflow]]" = OrderedDict()
+        # Bumped on every invalidation so a read that started before an update
+        # cannot repopulate the cache with the old definition.
+        self._generations: Dict[str, int] = {}
+
+        self._redis_url = redis_url
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+        self.stats = {
+            "hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "redis_errors": 0
+        }
+
+    @property
+    def redis(self):
+        """Get the Redis client, or None when the second tier is disabled"""
+        if self._redis is None and self._redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(self._redis_url)
+        return self._redis
+
+    @property
+    def memory_enabled(self) -> bool:
+        """Whether the memory tier can be trusted: always without Redis, else only while subscribed"""
+        return self._redis_url is None or self._subscribed
+
+    async def start(self):
+        """Follow other workers' invalidations when the Redis tier is enabled"""
+        if self.redis is not None and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def generation(self, workflow_id: str) -> int:
+        """Get the invalidation generation to pass back to ``set``"""
+        return self._generations.get(workflow_id, 0)
+
+    async def get(self, workflow_id: str) -> Optional[Workflow]:
+        """Get a cached workflow, checking memory first and then Redis"""
+        entry = self._entries.get(workflow_id) if self.memory_enabled else None
+        if entry is not None:
+            expires_at, workflow = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(workflow_id)
+                self.stats["hits"] += 1
+                return workflow
+            del self._entries[workflow_id]
+
+        if self.redis is not None:
+            generation = self.generation(workflow_id)
+            try:
+                payload = await self.redis.get(self._redis_key(workflow_id))
+            except Exception:
+                payload = None
+                self.stats["redis_errors"] += 1
+
+            if payload is not None:
+                workflow = Workflow.model_validate_json(payload)
+                self._store(workflow, generation)
+                self.stats["redis_hits"] += 1
+                return workflow
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, workflow: Workflow, generation: Optional[int] = None):
+        """
+        Cache a workflow. When ``generation`` is given and the workflow was
+        invalidated since it was taken, the stale value is discarded.
+        """
+        if generation is None:
+            generation = self.generation(workflow.id)
+        if not self._store(workflow, generation):
+            return
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(
+                    self._redis_key(workflow.id),
+                    workflow.model_dump_json(),
+                    ex=self.redis_ttl_seconds
+                )
+            except Exception:
+                self.stats["redis_errors"] += 1
+
+    async def invalidate(self, workflow_id: str):
+        """Drop a workflow from both tiers and from every other worker's memory"""
+        self._drop(workflow_id)
+        self.stats["invalidations"] += 1
+
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(workflow_id))
+                await self.redis.publish(self.INVALIDATION_CHANNEL, workflow_id)
+            except Exception:
+                self.stats["redis_errors"] += 1
+
+    def clear(self):
+        """Drop every in-memory entry"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics"""
+        lookups = self.stats["hits"] + self.stats["redis_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round((self.stats["hits"] + self.stats["redis_hits"]) / lookups, 4) if lookups else 0.0,
+            "redis_enabled": self.redis is not None,
+            "memory_tier_enabled": self.memory_enabled
+        }
+
+    def _drop(self, workflow_id: str):
+        self._generations[workflow_id] = self.generation(workflow_id) + 1
+        self._entries.pop(workflow_id, None)
+
+    async def _listen(self):
+        """Apply invalidations published by other workers, resubscribing after errors"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                self._subscribed = True
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        data = message["data"]
+                        self._drop(data.decode() if isinstance(data, bytes) else data)
+                        self.stats["remote_invalidations"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                print(f"⚠️ Workflow cache invalidation feed lost, bypassing memory tier: {str(e)}")
+            finally:
+                # Invalidations may have been missed while unsubscribed
+                self._subscribed = False
+                self._entries.clear()
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
+
+    def _store(self, workflow: Workflow, generation: int) -> bool:
+        """Insert into the memory tier, evicting least recently used entries"""
+        if generation != self.generation(workflow.id):
+            return False
+        if not self.memory_enabled:
+            return True
+
+        self._entries[workflow.id] = (time.monotonic() + self.ttl_seconds, workflow)
+        self._entries.move_to_end(workflow.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return True
+
+    @staticmethod
+    def _redis_key(workflow_id: str) -> str:
+        return f"pilot:workflow:{workflow_id}"
+
+
+# Global workflow cache instance
+workflow_cache = WorkflowCache(
+    max_entries=settings.WORKFLOW_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.WORKFLOW_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.WORKFLOW_CACHE_REDIS_ENABLED else None,
+    local_ttl_seconds=settings.WORKFLOW_CACHE_LOCAL_TTL_SECONDS
+)
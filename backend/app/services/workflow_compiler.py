@@ -0,0 +1,277 @@
+"""
+Compiled mode: hot workflow revisions turned into specialised Python code
+"""
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable
+
+from ..core.config import settings
+from ..models.workflow import Workflow, NodeType
+from .litellm_service import litellm_service
+from .runtime_graph import RuntimeGraph, RuntimeNode
+from .workflow_analyzer import analyze_workflow
+
+# Same pattern the interpreter substitutes
+_REFERENCE_RE = re.compile(r"\{\{([^}]+)\}\}")
+
+# Handlers the generated code calls directly instead of specialising
+_DIRECT_HANDLERS = {
+    NodeType.CONDITION: "_execute_condition_node",
+    NodeType.IF_ELSE: "_execute_condition_node",
+    NodeType.HTTP_REQUEST: "_execute_http_node",
+    NodeType.ANSWER: "_execute_answer_node",
+}
+
+
+def _fill(value: Any, placeholder: str) -> str:
+    """A substituted reference, or the placeholder itself if it has no value"""
+    return placeholder if value is None else str(value)
+
+
+def _node_output(node_outputs: Dict[str, Any], variables: Dict[str, Any], node_id: str, output: str, name: str) -> Any:
+    """``{{node_id.output}}`` lookup, falling back to a variable of that name"""
+    source = node_outputs.get(node_id)
+    if source is not None and "outputs" in source:
+        value = source["outputs"].get(output)
+        if value is not None:
+            return value
+    return variables.get(name)
+
+
+class _CodeWriter:
+    """Indented source builder"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.depth = 0
+
+    def line(self, text: str = ""):
+        self.lines.append("    " * self.depth + text if text else "")
+
+    def source(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_expression(template: str) -> str:
+    """
+    Python expression rendering a ``{{...}}`` template against ``variables``
+    and ``node_outputs``. The template is split at compile time, so a run
+    only concatenates literals with looked-up values.
+    """
+    parts, position = [], 0
+    for match in _REFERENCE_RE.finditer(template):
+        name = match.group(1).strip()
+        placeholder = match.group(0)
+        if placeholder != f"{{{{{name}}}}}":
+            continue  # the interpreter only substitutes references without padding
+        if match.start() > position:
+            parts.append(repr(template[position:match.start()]))
+        if "." in name:
+            node_id, output = name.split(".", 1)
+            lookup = f"_node_output(node_outputs, variables, {node_id!r}, {output!r}, {name!r})"
+        else:
+            lookup = f"variables.get({name!r})"
+        parts.append(f"_fill({lookup}, {placeholder!r})")
+        position = match.end()
+    if position < len(template):
+        parts.append(repr(template[position:]))
+
+    if not parts:
+        return "''"
+    if len(parts) == 1 and not parts[0].startswith("_fill("):
+        return parts[0]
+    return f"''.join(({', '.join(parts)},))"
+
+
+def generate_source(graph: RuntimeGraph) -> str:
+    """
+    Source of an async generator equivalent to the interpreter loop for
+    this graph: same events, results and failure handling, with node
+    dispatch, template parsing and config lookups resolved at compile time.
+    All workflow-controlled values enter the source through ``repr``.
+    """
+    code = _CodeWriter()
+    code.line("async def run(service, graph, context, node_outputs):")
+    code.depth += 1
+    code.line("variables = context['variables']")
+    code.line("nodes = graph.nodes")
+    if not graph.order:
+        code.line("return")
+        code.line("yield")
+
+    total = len(graph.order)
+    for position, index in enumerate(graph.order):
+        node = graph.nodes[index]
+        code.line()
+        code.line(f"# node {index}: {node.type.value}")
+        code.line(
+            f"yield {{'type': 'progress_update', 'progress': {(position + 1) / total!r}, "
+            f"'current_node': {node.label!r}, 'node_id': {node.id!r}}}"
+        )
+        code.line("try:")
+        code.depth += 1
+        code.line("started = _time()")
+        code.line("try:")
+        code.depth += 1
+        _write_node(code, node)
+        code.line("result['execution_time_ms'] = int((_time() - started) * 1000)")
+        code.line("result['status'] = 'completed'")
+        code.depth -= 1
+        code.line("except Exception as e:")
+        code.line("    result = service._node_failed(e, started)")
+        code.line(f"node_outputs[{node.id!r}] = result")
+        code.line("variables.update(result.get('outputs', {}))")
+        code.line(
+            f"yield {{'type': 'node_completed', 'node_id': {node.id!r}, 'node_title': {node.label!r}, "
+            f"'result': result, 'execution_time_ms': result.get('execution_time_ms', 0)}}"
+        )
+        code.depth -= 1
+        code.line("except Exception as node_error:")
+        code.line(
+            f"    yield {{'type': 'node_failed', 'node_id': {node.id!r}, 'node_title': {node.label!r}, "
+            f"'error': str(node_error)}}"
+        )
+        code.line("    return")
+
+    return code.source()
+
+
+def _write_node(code: _CodeWriter, node: RuntimeNode):
+    """Statements computing ``result`` for one node"""
+    config = node.config
+
+    if node.type == NodeType.START:
+        code.line("result = {'outputs': variables, 'logs': ['Workflow started with input variables']}")
+
+    elif node.type in (NodeType.LLM, NodeType.CHAT) and config.routing:
+        code.line(f"result = await service._execute_llm_node(nodes[{node.index}], context, node_outputs)")
+
+    elif node.type in (NodeType.LLM, NodeType.CHAT):
+        if not config.prompt:
+            code.line("raise Exception('LLM node requires a prompt')")
+            return
+        code.line("messages = []")
+        if config.system_prompt:
+            code.line(f"messages.append({{'role': 'system', 'content': {render_expression(config.system_prompt)}}})")
+        code.line(f"messages.append({{'role': 'user', 'content': {render_expression(config.prompt)}}})")
+        code.line(
+            f"response = await _llm.completion(messages=messages, model={config.model or 'gpt-3.5-turbo'!r}, "
+            f"temperature={0.7 if config.temperature is None else config.temperature!r}, max_tokens={config.max_tokens or 1000!r})"
+        )
+        code.line(f"result = {{'outputs': {{'text': response['content'], {node.id + '.text'!r}: response['content']}},")
+        code.line("          'logs': service._llm_logs(response),")
+        code.line("          'usage': response['usage'], 'cost': response['cost']}")
+
+    elif node.type == NodeType.CODE:
+        if not config.code:
+            code.line("raise Exception('Code node requires code')")
+            return
+        code.line(f"result = service._run_code({node.id!r}, {render_expression(config.code)}, variables)")
+
+    elif node.type == NodeType.TEMPLATE_TRANSFORM:
+        if not config.template:
+            code.line("raise Exception('Template node requires a template')")
+            return
+        code.line(f"output = {render_expression(config.template)}")
+        code.line(f"result = {{'outputs': {{'output': output, {node.id + '.output'!r}: output}},")
+        code.line("          'logs': [f'Template processed, output length: {len(output)} characters']}")
+
+    elif node.type in _DIRECT_HANDLERS:
+        code.line(f"result = await service.{_DIRECT_HANDLERS[node.type]}(nodes[{node.index}], context, node_outputs)")
+
+    else:
+        code.line(f"result = {{'outputs': {{}}, 'logs': [{f'Node type {node.type} not implemented yet'!r}]}}")
+
+
+class CompiledWorkflow:
+    """A workflow revision compiled to a specialised async generator"""
+
+    __slots__ = ("version_hash", "source", "run")
+
+    def __init__(self, version_hash: str, graph: RuntimeGraph):
+        self.version_hash = version_hash
+        self.source = generate_source(graph)
+        namespace: Dict[str, Any] = {
+            "_time": time.time,
+            "_fill": _fill,
+            "_node_output": _node_output,
+            "_llm": litellm_service,
+        }
+        exec(compile(self.source, f"<workflow {version_hash[:12]}>", "exec"), namespace)
+        self.run: Callable[..., Any] = namespace["run"]
+
+
+class CompiledWorkflowCache:
+    """
+    Compiled revisions keyed by version hash.
+
+    A revision is compiled once it has run ``threshold`` times, so only hot
+    workflows pay for code generation, and only if static analysis finds no
+    errors. Anything not compiled, or whose compilation failed, runs on the
+    interpreter.
+    """
+
+    def __init__(self, enabled: bool = False, threshold: int = 20, max_entries: int = 200):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._compiled: "OrderedDict[str, Optional[CompiledWorkflow]]" = OrderedDict()
+        self._runs: "OrderedDict[str, int]" = OrderedDict()
+        self.stats = {"compiled_runs": 0, "interpreted_runs": 0, "compilations": 0, "compile_failures": 0}
+
+    def get(self, workflow: Workflow, graph: RuntimeGraph, version_hash: Optional[str]) -> Optional[CompiledWorkflow]:
+        """Compiled code for this revision, or None to interpret it"""
+        if not self.enabled or not version_hash:
+            self.stats["interpreted_runs"] += 1
+            return None
+
+        if version_hash in self._compiled:
+            self._compiled.move_to_end(version_hash)
+            compiled = self._compiled[version_hash]
+        else:
+            runs = self._runs.pop(version_hash, 0) + 1
+            if runs < self.threshold:
+                self._runs[version_hash] = runs
+                while len(self._runs) > self.max_entries * 10:
+                    self._runs.popitem(last=False)
+                self.stats["interpreted_runs"] += 1
+                return None
+            compiled = self._compile(workflow, graph, version_hash)
+
+        self.stats["compiled_runs" if compiled is not None else "interpreted_runs"] += 1
+        return compiled
+
+    def _compile(self, workflow: Workflow, graph: RuntimeGraph, version_hash: str) -> Optional[CompiledWorkflow]:
+        compiled = None
+        try:
+            analysis = analyze_workflow(workflow)
+            if analysis.valid:
+                compiled = CompiledWorkflow(version_hash, graph)
+                self.stats["compilations"] += 1
+            else:
+                self.stats["compile_failures"] += 1
+        except Exception as e:
+            print(f"⚠️ Workflow compilation failed, using interpreter: {str(e)}")
+            self.stats["compile_failures"] += 1
+
+        # Failures are remembered too, so a revision is only tried once
+        self._compiled[version_hash] = compiled
+        while len(self._compiled) > self.max_entries:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "cached": sum(1 for compiled in self._compiled.values() if compiled is not None)
+        }
+
+
+# Global compiled workflow cache
+compiled_workflow_cache = CompiledWorkflowCache(
+    enabled=settings.COMPILED_MODE_ENABLED,
+    threshold=settings.COMPILED_MODE_THRESHOLD_RUNS,
+    max_entries=settings.COMPILED_MODE_MAX_ENTRIES
+)
@@ -4,12 +4,22 @@ Workflow execution service for running workflows
 import asyncio
 import json
 import time
+import uuid
 from typing import Dict, Any, List, Optional, AsyncGenerator
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
-from ..models.workflow import Workflow, Node, NodeType
-from ..models.execution import WorkflowExecution, ExecutionStatus, NodeExecutionLog, NodeExecutionStatus
+from ..models.workflow import Workflow, NodeType
+from ..models.execution import (
+    WorkflowExecution, ExecutionStatus, ExecutionEvent, ExecutionEventType, NodeExecutionLog, NodeExecutionStatus
+)
 from ..services.litellm_service import litellm_service
+from ..services.persistence_service import write_behind_buffer
+from ..services.version_store import workflow_version_store
+from ..services.runtime_graph import RuntimeGraph, RuntimeNode, runtime_graph_cache
+from ..services.workflow_compiler import compiled_workflow_cache
+from ..services.expressions import ExpressionError
+from ..services.circuit_breaker import host_breakers
 from ..database.supabase_client import SupabaseClient
 
 
@@ -28,88 +38,71 @@ class WorkflowExecutionService:
         """
         Execute a workflow and yield progress updates
         """
-        # Create execution record
+        # Create execution record, pinned to the revision being run
         execution = WorkflowExecution(
-            id=f"exec_{int(time.time())}",
+            id=str(uuid.uuid4()),
             workflow_id=workflow.id,
+            workflow_version_hash=workflow_version_store.version_hash(workflow, user_id),
             user_id=user_id,
             input_data=input_data,
             status=ExecutionStatus.RUNNING,
             started_at=datetime.utcnow()
         )
 
+        # History is written behind: nothing below waits on the database
+        write_behind_buffer.record_status(execution)
+        graph = None
+
         try:
-            yield {
+            # Compiled once per revision and shared by concurrent runs
+            graph = runtime_graph_cache.get(workflow)
+
+            event = {
                 "type": "execution_started",
                 "execution_id": execution.id,
                 "workflow_name": workflow.name,
-                "total_nodes": len(workflow.nodes)
+                "workflow_version_hash": execution.workflow_version_hash,
+                "total_nodes": len(graph)
             }
+            self._persist_event(execution, graph, event)
+            yield event
 
             # Build execution context
             context = {"variables": input_data.copy()}
-            
-            # Execute nodes in order
-            executed_nodes = set()
             node_outputs = {}
             
             # Find start node
-            start_nodes = [n for n in workflow.nodes if n.type == NodeType.START]
-            if not start_nodes:
+            if not graph.has_start():
                 raise Exception("No start node found in workflow")
+            if graph.blocked:
+                blocked_ids = [graph.nodes[index].id for index in graph.blocked]
+                raise Exception(f"Workflow contains a cycle; these nodes can never run: {blocked_ids}")
+
+            # Hot revisions run as generated code; everything else is interpreted
+            compiled = compiled_workflow_cache.get(workflow, graph, execution.workflow_version_hash)
+            if compiled is not None:
+                node_events = compiled.run(self, graph, context, node_outputs)
+            else:
+                node_events = self._interpret(graph, context, node_outputs)
 
-            # Execute workflow using topological sort
-            execution_order = self._get_execution_order(workflow)
-            
-            for i, node in enumerate(execution_order):
-                if node.id in executed_nodes:
-                    continue
-
-                # Update progress
-                progress = (i + 1) / len(execution_order)
-                yield {
-                    "type": "progress_update",
-                    "progress": progress,
-                    "current_node": node.data.title or node.id,
-                    "node_id": node.id
-                }
-
-                # Execute node
-                try:
-                    node_result = await self._execute_node(node, context, node_outputs)
-                    node_outputs[node.id] = node_result
-                    executed_nodes.add(node.id)
-
-                    # Add node result to context
-                    context["variables"].update(node_result.get("outputs", {}))
-
-                    yield {
-                        "type": "node_completed",
-                        "node_id": node.id,
-                        "node_title": node.data.title or node.id,
-                        "result": node_result,
-                        "execution_time_ms": node_result.get("execution_time_ms", 0)
-                    }
-
-                except Exception as node_error:
-                    yield {
-                        "type": "node_failed",
-                        "node_id": node.id,
-                        "node_title": node.data.title or node.id,
-                        "error": str(node_error)
-                    }
-                    
+            async for event in node_events:
+                self._persist_event(execution, graph, event)
+                yield event
+                if event["type"] == "node_failed":
                     execution.status = ExecutionStatus.FAILED
-                    execution.error_message = f"Node {node.id} failed: {str(node_error)}"
+                    execution.error_message = f"Node {event['node_id']} failed: {event['error']}"
+                    await node_events.aclose()
                     break
 
             # Complete execution
             if execution.status != ExecutionStatus.FAILED:
                 execution.status = ExecutionStatus.COMPLETED
                 execution.completed_at = datetime.utcnow()
-                execution.output_data = self._extract_final_outputs(workflow, node_outputs)
+                execution.output_data = self._extract_final_outputs(graph, node_outputs)
+                execution.progress = 1.0
+                write_behind_buffer.record_status(execution)
 
-                yield {
+                event = {
                     "type": "execution_completed",
                     "execution_id": execution.id,
                     "output_data": execution.output_data,
@@ -117,56 +110,153 @@ class WorkflowExecutionService:
                 }
             else:
                 execution.completed_at = datetime.utcnow()
-                yield {
+                write_behind_buffer.record_status(execution)
+                event = {
                     "type": "execution_failed",
                     "execution_id": execution.id,
                     "error": execution.error_message,
                     "total_time_ms": execution.duration_ms
                 }
+            self._persist_event(execution, graph, event)
+            yield event
 
         except Exception as e:
             execution.status = ExecutionStatus.FAILED
             execution.error_message = str(e)
             execution.completed_at = datetime.utcnow()
-            
-            yield {
+            write_behind_buffer.record_status(execution)
+
+            event = {
                 "type": "execution_failed",
                 "execution_id": execution.id,
                 "error": str(e)
             }
+            self._persist_event(execution, graph, event)
+            yield event
 
-    def _get_execution_order(self, workflow: Workflow) -> List[Node]:
+    def _persist_event(self, execution: WorkflowExecution, graph: Optional[RuntimeGraph], event: Dict[str, Any]):
         """
-        Get nodes in execution order using topological sort
+        Queue the execution event, status and node logs implied by a run
+        event; events are stored as the ExecutionService records them
         """
-        # Build adjacency list
-        graph = {node.id: [] for node in workflow.nodes}
-        in_degree = {node.id: 0 for node in workflow.nodes}
-        
-        for edge in workflow.edges:
-            graph[edge.source].append(edge.target)
-            in_degree[edge.target] += 1
+        if event["type"] == "execution_started":
+            self._record_event(
+                execution, ExecutionEventType.WORKFLOW_STARTED,
+                message=f"Started executing workflow: {event['workflow_name']}"
+            )
+        elif event["type"] == "execution_completed":
+            self._record_event(
+                execution, ExecutionEventType.WORKFLOW_COMPLETED,
+                data=event["output_data"], message="Workflow execution completed successfully"
+            )
+        elif event["type"] == "execution_failed":
+            self._record_event(
+                execution, ExecutionEventType.WORKFLOW_FAILED,
+                error=event["error"], message="Workflow execution failed"
+            )
+        elif event["type"] == "progress_update":
+            execution.progress = round(event["progress"], 2)
+            execution.current_node_id = event["node_id"]
+            write_behind_buffer.record_status(execution)
+            self._record_event(
+                execution, ExecutionEventType.PROGRESS_UPDATE,
+                node_id=event["node_id"], progress=execution.progress,
+                message=f"Progress: {execution.progress * 100:.1f}%"
+            )
+        elif event["type"] in ("node_completed", "node_failed"):
+            node = graph.node(event["node_id"])
+            result = event.get("result") or {}
+            failed = event["type"] == "node_failed" or result.get("status") == "failed"
+            if failed:
+                self._record_event(
+                    execution, ExecutionEventType.NODE_FAILED,
+                    node_id=node.id, error=event.get("error") or result.get("error"),
+                    message=f"Failed to execute node: {node.label}"
+                )
+            else:
+                self._record_event(
+                    execution, ExecutionEventType.NODE_COMPLETED,
+                    node_id=node.id, data=result, message=f"Completed node: {node.label}"
+                )
+            completed_at = datetime.utcnow()
+            execution_time_ms = result.get("execution_time_ms") or 0
+            tokens = (result.get("usage") or {}).get("total_tokens")
+            write_behind_buffer.record_node_log(NodeExecutionLog(
+                execution_id=execution.id,
+                node_id=node.id,
+                node_type=node.type.value,
+                node_name=node.label,
+                status=NodeExecutionStatus.FAILED if failed else NodeExecutionStatus.COMPLETED,
+                output_data=result.get("outputs"),
+                error_message=event.get("error") or result.get("error"),
+                started_at=completed_at - timedelta(milliseconds=execution_time_ms),
+                completed_at=completed_at,
+                execution_time_ms=execution_time_ms,
+                tokens_used=tokens,
+                cost=result.get("cost")
+            ))
+            if tokens:
+                execution.total_tokens_used = (execution.total_tokens_used or 0) + tokens
+            if result.get("cost"):
+                execution.total_cost = (execution.total_cost or 0.0) + result["cost"]
+
+    @staticmethod
+    def _record_event(execution: WorkflowExecution, event_type: ExecutionEventType, **fields):
+        write_behind_buffer.record_event(ExecutionEvent(execution_id=execution.id, type=event_type, **fields))
+
+    async def _interpret(
+        self,
+        graph: RuntimeGraph,
+        context: Dict[str, Any],
+        node_outputs: Dict[str, Any]
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run every node in the precomputed topological order, yielding
+        progress and per-node events
+        """
+        nodes = graph.nodes
+        execution_order = graph.order
 
-        # Topological sort
-        queue = [node_id for node_id, degree in in_degree.items() if degree == 0]
-        result = []
-        
-        while queue:
-            node_id = queue.pop(0)
-            result.append(node_id)
-            
-            for neighbor in graph[node_id]:
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+        for i, index in enumerate(execution_order):
+            node = nodes[index]
+
+            # Update progress
+            progress = (i + 1) / len(execution_order)
+            yield {
+                "type": "progress_update",
+                "progress": progress,
+                "current_node": node.label,
+                "node_id": node.id
+            }
+
+            # Execute node
+            try:
+                node_result = await self._execute_node(node, context, node_outputs)
+                node_outputs[node.id] = node_result
+
+                # Add node result to context
+                context["variables"].update(node_result.get("outputs", {}))
+
+                yield {
+                    "type": "node_completed",
+                    "node_id": node.id,
+                    "node_title": node.label,
+                    "result": node_result,
+                    "execution_time_ms": node_result.get("execution_time_ms", 0)
+                }
 
-        # Convert node IDs back to Node objects
-        node_map = {node.id: node for node in workflow.nodes}
-        return [node_map[node_id] for node_id in result if node_id in node_map]
+            except Exception as node_error:
+                yield {
+                    "type": "node_failed",
+                    "node_id": node.id,
+                    "node_title": node.label,
+                    "error": str(node_error)
+                }
+                return
 
     async def _execute_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -182,7 +272,7 @@ class WorkflowExecutionService:
                 result = await self._execute_llm_node(node, context, node_outputs)
             elif node.type == NodeType.CODE:
                 result = await self._execute_code_node(node, context, node_outputs)
-            elif node.type == NodeType.CONDITION:
+            elif node.type in [NodeType.CONDITION, NodeType.IF_ELSE]:
                 result = await self._execute_condition_node(node, context, node_outputs)
             elif node.type == NodeType.HTTP_REQUEST:
                 result = await self._execute_http_node(node, context, node_outputs)
@@ -200,16 +290,20 @@ class WorkflowExecutionService:
             return result
 
         except Exception as e:
-            execution_time = int((time.time() - start_time) * 1000)
-            return {
-                "status": "failed",
-                "error": str(e),
-                "execution_time_ms": execution_time,
-                "outputs": {},
-                "logs": [f"Node execution failed: {str(e)}"]
-            }
+            return self._node_failed(e, start_time)
 
-    async def _execute_start_node(self, node: Node, context: Dict[str, Any]) -> Dict[str, Any]:
+    def _node_failed(self, error: Exception, start_time: float) -> Dict[str, Any]:
+        """Result recorded for a node whose handler raised"""
+        execution_time = int((time.time() - start_time) * 1000)
+        return {
+            "status": "failed",
+            "error": str(error),
+            "execution_time_ms": execution_time,
+            "outputs": {},
+            "logs": [f"Node execution failed: {str(error)}"]
+        }
+
+    async def _execute_start_node(self, node: RuntimeNode, context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute start node - pass through input variables"""
         return {
             "outputs": context["variables"],
@@ -218,60 +312,82 @@ class WorkflowExecutionService:
 
     async def _execute_llm_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Execute LLM/Chat node"""
-        if not node.data.prompt:
+        if not node.config.prompt:
             raise Exception("LLM node requires a prompt")
 
         # Replace variables in prompt
-        prompt = self._replace_variables(node.data.prompt, context["variables"], node_outputs)
+        prompt = self._replace_variables(node.config.prompt, context["variables"], node_outputs)
         
         # Prepare messages
         messages = []
-        if node.data.system_prompt:
-            system_prompt = self._replace_variables(node.data.system_prompt, context["variables"], node_outputs)
+        if node.config.system_prompt:
+            system_prompt = self._replace_variables(node.config.system_prompt, context["variables"], node_outputs)
             messages.append({"role": "system", "content": system_prompt})
         
         messages.append({"role": "user", "content": prompt})
 
-        # Call LLM
-        response = await litellm_service.completion(
-            messages=messages,
-            model=node.data.model or "gpt-3.5-turbo",
-            temperature=node.data.temperature or 0.7,
-            max_tokens=node.data.max_tokens or 1000
-        )
+        # Call LLM, routed across alternative models if the node asks for it
+        params = {
+            "model": node.config.model or "gpt-3.5-turbo",
+            "temperature": 0.7 if node.config.temperature is None else node.config.temperature,
+            "max_tokens": node.config.max_tokens or 1000
+        }
+        if node.config.routing:
+            response = await litellm_service.routed_completion(messages, routing=node.config.routing, **params)
+        else:
+            response = await litellm_service.completion(messages=messages, **params)
+
+        logs = self._llm_logs(response)
+        for failure in response.get("routing", {}).get("failed", []):
+            logs.append(f"Routed past failed model {failure}")
 
         return {
             "outputs": {
                 "text": response["content"],
                 f"{node.id}.text": response["content"]
             },
-            "logs": [
-                f"LLM call completed with model {response['model']}",
-                f"Tokens used: {response['usage']['total_tokens']}",
-                f"Cost: ${response['cost']:.6f}"
-            ],
+            "logs": logs,
             "usage": response["usage"],
             "cost": response["cost"]
         }
 
+    @staticmethod
+    def _llm_logs(response: Dict[str, Any]) -> List[str]:
+        """Log lines for an LLM call, including any shortening of the prompt to fit the model"""
+        logs = [
+            f"LLM call completed with model {response['model']}",
+            f"Tokens used: {response['usage']['total_tokens']}",
+            f"Cost: ${response['cost']:.6f}"
+        ]
+        budget = response.get("prompt_budget")
+        if budget:
+            logs.append(
+                f"Prompt {budget['action']} to fit the context window: "
+                f"{budget['original_tokens']} -> {budget['prompt_tokens']} tokens"
+            )
+        return logs
+
     async def _execute_code_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Execute code node (simplified - in production, use sandboxed execution)"""
-        if not node.data.code:
+        if not node.config.code:
             raise Exception("Code node requires code")
 
         # Replace variables in code
-        code = self._replace_variables(node.data.code, context["variables"], node_outputs)
-        
+        code = self._replace_variables(node.config.code, context["variables"], node_outputs)
+        return self._run_code(node.id, code, context["variables"])
+
+    def _run_code(self, node_id: str, code: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a code node's rendered source"""
         # Simple execution (WARNING: This is not secure for production)
         # In production, use a sandboxed environment like Docker or restricted Python
         try:
@@ -300,7 +416,7 @@ class WorkflowExecutionService:
             }
             
             # Add context variables
-            safe_globals.update(context["variables"])
+            safe_globals.update(variables)
             
             # Execute code
             local_vars = {}
@@ -312,7 +428,7 @@ class WorkflowExecutionService:
             return {
                 "outputs": {
                     "result": result_value,
-                    f"{node.id}.result": result_value
+                    f"{node_id}.result": result_value
                 },
                 "logs": [
                     "Code executed successfully",
@@ -325,60 +441,64 @@ class WorkflowExecutionService:
 
     async def _execute_condition_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
-        """Execute condition node"""
-        # Simple condition evaluation (can be enhanced)
-        conditions = node.data.conditions or []
-        if not conditions:
+        """Execute condition node with its conditions compiled in the runtime graph"""
+        condition_set = node.conditions
+        if not condition_set.conditions and condition_set.error is None:
             return {"outputs": {"result": True}, "logs": ["No conditions specified, defaulting to true"]}
 
-        # Evaluate conditions (simplified)
-        results = []
-        for condition in conditions:
-            # This is a simplified implementation
-            # In production, use a proper expression evaluator
-            result = True  # Placeholder
-            results.append(result)
-
-        # Apply logical operator
-        logical_op = node.data.logical_operator or "and"
-        if logical_op == "and":
-            final_result = all(results)
-        else:  # or
-            final_result = any(results)
+        variables = context["variables"]
+
+        def resolve(name: str) -> Any:
+            # Same lookup order as _replace_variables
+            if "." in name:
+                source_id, output_name = name.split(".", 1)
+                source = node_outputs.get(source_id)
+                if source is not None and output_name in source.get("outputs", {}):
+                    return source["outputs"][output_name]
+            return variables.get(name)
+
+        try:
+            final_result, results = condition_set.evaluate(resolve)
+        except ExpressionError as e:
+            raise Exception(f"Invalid condition: {str(e)}")
 
         return {
             "outputs": {
                 "result": final_result,
                 f"{node.id}.result": final_result
             },
-            "logs": [f"Condition evaluated to: {final_result}"]
+            "logs": [f"Condition `{source}` evaluated to: {value}" for source, value in results] + [
+                f"Conditions combined with '{condition_set.logical_operator}' evaluated to: {final_result}"
+            ]
         }
 
     async def _execute_http_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Execute HTTP request node"""
         import aiohttp
         
-        if not node.data.url:
+        if not node.config.url:
             raise Exception("HTTP node requires a URL")
 
-        url = self._replace_variables(node.data.url, context["variables"], node_outputs)
-        method = node.data.method or "GET"
-        headers = node.data.headers or {}
-        params = node.data.params or {}
-        body = node.data.body or {}
-        timeout = node.data.timeout or 30
+        url = self._replace_variables(node.config.url, context["variables"], node_outputs)
+        method = node.config.method or "GET"
+        headers = node.config.headers or {}
+        params = node.config.params or {}
+        body = node.config.body or {}
+        timeout = node.config.timeout or 30
 
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            # Hosts that keep failing or timing out are skipped until their breaker recovers
+            async with host_breakers.guard(urlparse(url).hostname or url) as breaker_call, \
+                    aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
                 async with session.request(
                     method=method,
                     url=url,
@@ -386,6 +506,7 @@ class WorkflowExecutionService:
                     params=params,
                     json=body if body else None
                 ) as response:
+                    breaker_call.ok = response.status < 500
                     response_text = await response.text()
                     
                     try:
@@ -413,16 +534,16 @@ class WorkflowExecutionService:
 
     async def _execute_template_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Execute template transform node"""
-        if not node.data.template:
+        if not node.config.template:
             raise Exception("Template node requires a template")
 
         # Replace variables in template
-        output = self._replace_variables(node.data.template, context["variables"], node_outputs)
+        output = self._replace_variables(node.config.template, context["variables"], node_outputs)
 
         return {
             "outputs": {
@@ -434,7 +555,7 @@ class WorkflowExecutionService:
 
     async def _execute_answer_node(
         self,
-        node: Node,
+        node: RuntimeNode,
         context: Dict[str, Any],
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -501,14 +622,14 @@ class WorkflowExecutionService:
 
     def _extract_final_outputs(
         self,
-        workflow: Workflow,
+        graph: RuntimeGraph,
         node_outputs: Dict[str, Any]
     ) -> Dict[str, Any]:
         """Extract final outputs from workflow execution"""
         final_outputs = {}
         
         # Find answer/end nodes
-        answer_nodes = [n for n in workflow.nodes if n.type in [NodeType.ANSWER, NodeType.END]]
+        answer_nodes = [graph.nodes[index] for index in graph.output_indices]
         
         if answer_nodes:
             for node in answer_nodes:
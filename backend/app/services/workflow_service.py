@@ -3,12 +3,42 @@ Workflow service for database operations
 """
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from functools import lru_cache
 import uuid
+from postgrest.exceptions import APIError
 from ..models.workflow import (
-    Workflow, WorkflowCreate, WorkflowUpdate, WorkflowInDB,
-    WORKFLOW_TEMPLATES
+    Workflow, WorkflowCreate, WorkflowUpdate, WorkflowPatch, WorkflowInDB, WorkflowSummary,
+    WorkflowVariable, WorkflowVersion, WORKFLOW_TEMPLATES
 )
+from ..core.config import settings
+from ..core.http_cache import PrecomputedResponse, make_etag
 from ..database.supabase_client import SupabaseClient
+from ..database.pagination import keyset_condition
+from .workflow_cache import workflow_cache
+from .search_index import workflow_search_index
+from .version_store import WorkflowSnapshot, workflow_version_store
+
+
+# Columns needed for WorkflowSummary; list pages never fetch workflow_data
+WORKFLOW_SUMMARY_COLUMNS = (
+    "id,name,description,user_id,status,version,is_public,tags,"
+    "created_at,updated_at,last_executed_at,execution_count"
+)
+
+# patch_workflow errors caused by the operations rather than the server:
+# malformed operations, a removed required field, and values of the wrong type
+PATCH_CLIENT_ERROR_CODES = ("22023", "23502", "22P02")
+
+# Read-modify-write rounds an update gets before giving up on concurrent saves
+UPDATE_ATTEMPTS = 3
+
+
+class WorkflowVersionConflict(Exception):
+    """Raised when a patch targets a workflow version that is no longer current"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Workflow is at version {current_version}")
+        self.current_version = current_version
 
 
 class WorkflowService:
@@ -26,27 +56,52 @@ class WorkflowService:
             "description": workflow_data.description,
             "user_id": user_id,
             "workflow_data": {
-                "nodes": [node.dict() for node in workflow_data.nodes],
-                "edges": [edge.dict() for edge in workflow_data.edges],
-                "variables": [var.dict() for var in workflow_data.variables],
+                "nodes": [node.model_dump(mode="json") for node in workflow_data.nodes],
+                "edges": [edge.model_dump(mode="json") for edge in workflow_data.edges],
+                "variables": [var.model_dump(mode="json") for var in workflow_data.variables],
                 "tags": workflow_data.tags
             },
             "status": "draft",
             "is_public": workflow_data.is_public,
+            "tags": workflow_data.tags,
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
+        db_data["workflow_version_hash"] = self._snapshot(db_data).hash
 
         # Insert into database
-        result = self.supabase.client.table("workflows").insert(db_data).execute()
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflows").insert(db_data),
+            "workflows.create"
+        )
 
         if result.data:
-            return self._db_to_workflow(result.data[0])
+            workflow = self._db_to_workflow(result.data[0])
+            workflow_search_index.upsert(self._db_to_summary(result.data[0]))
+            await self._record_version(workflow, user_id)
+            return workflow
         else:
             raise Exception(f"Failed to create workflow: {result}")
 
     async def get_workflow(self, workflow_id: str, user_id: Optional[str] = None) -> Optional[Workflow]:
         """Get a workflow by ID"""
+        cached = await workflow_cache.get(workflow_id)
+        if cached is not None:
+            return cached if self._can_read(cached, user_id) else None
+
+        generation = workflow_cache.generation(workflow_id)
+        workflow = await self._fetch_workflow(workflow_id, user_id)
+        if workflow:
+            await workflow_cache.set(workflow, generation)
+        return workflow
+
+    async def _fetch_workflow(
+        self,
+        workflow_id: str,
+        user_id: Optional[str],
+        label: str = "workflows.get"
+    ) -> Optional[Workflow]:
+        """Read a workflow from the database, bypassing the cache"""
         query = self.supabase.client.table("workflows").select("*").eq("id", workflow_id)
 
         # If user_id provided, ensure user owns the workflow or it's public
@@ -55,32 +110,40 @@ class WorkflowService:
         else:
             query = query.eq("is_public", True)
 
-        result = query.execute()
-
-        if result.data:
-            return self._db_to_workflow(result.data[0])
-        return None
+        result = await self.supabase.execute(query, label)
+        return self._db_to_workflow(result.data[0]) if result.data else None
 
     async def list_workflows(
         self,
         user_id: str,
         include_public: bool = True,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[Workflow]:
-        """List workflows for a user"""
-        query = self.supabase.client.table("workflows").select("*")
-
-        if include_public:
-            query = query.or_(f"user_id.eq.{user_id},is_public.eq.true")
-        else:
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> List[WorkflowSummary]:
+        """
+        List workflows for a user, newest first. Pass the cursor of the last
+        row on the previous page to continue with a keyset scan on
+        (updated_at, id); ``offset`` is only honoured without a cursor.
+        """
+        query = self.supabase.client.table("workflows").select(WORKFLOW_SUMMARY_COLUMNS)
+
+        visibility = f"or(user_id.eq.{user_id},is_public.eq.true)" if include_public else None
+        after = f"or({keyset_condition('updated_at', cursor)})" if cursor else None
+
+        # Combine into a single logic tree; separate or_() calls do not AND together reliably
+        conditions = [c for c in (visibility, after) if c]
+        if conditions:
+            query = query.or_(f"and({','.join(conditions)})")
+        if not include_public:
             query = query.eq("user_id", user_id)
 
-        query = query.order("updated_at", desc=True).range(offset, offset + limit - 1)
+        query = query.order("updated_at", desc=True).order("id", desc=True)
+        query = query.limit(limit) if cursor else query.range(offset, offset + limit - 1)
 
-        result = query.execute()
+        result = await self.supabase.execute(query, "workflows.list")
 
-        return [self._db_to_workflow(row) for row in result.data or []]
+        return [self._db_to_summary(row) for row in result.data or []]
 
     async def update_workflow(
         self,
@@ -88,12 +151,47 @@ class WorkflowService:
         workflow_data: WorkflowUpdate,
         user_id: str
     ) -> Optional[Workflow]:
-        """Update a workflow"""
-        # First check if user owns the workflow
-        existing = await self.get_workflow(workflow_id, user_id)
-        if not existing or existing.user_id != user_id:
-            return None
-
+        """
+        Update a workflow. The update starts from the stored row, not a
+        cached copy another worker may have superseded, and only applies if
+        the row is still at the version it was read at; a concurrent save
+        makes it re-read and re-apply.
+        """
+        for _ in range(UPDATE_ATTEMPTS):
+            # First check if user owns the workflow
+            existing = await self._fetch_workflow(workflow_id, user_id, "workflows.get_for_update")
+            if not existing or existing.user_id != user_id:
+                return None
+
+            update_data = self._update_data(existing, workflow_data)
+            candidate = self._snapshot(update_data, existing)
+
+            # Saving an identical document is a no-op: no write, no new version
+            if self._is_unchanged(existing, update_data, candidate):
+                return existing
+            update_data["workflow_version_hash"] = candidate.hash
+
+            # Execute update
+            result = await self.supabase.execute(
+                self.supabase.client.table("workflows").update(update_data)
+                .eq("id", workflow_id).eq("version", existing.version),
+                "workflows.update"
+            )
+            if result.data:
+                break
+        else:
+            await workflow_cache.invalidate(workflow_id)
+            raise WorkflowVersionConflict(existing.version)
+        await workflow_cache.invalidate(workflow_id)
+
+        workflow_search_index.upsert(self._db_to_summary(result.data[0]))
+        workflow = self._db_to_workflow(result.data[0])
+        await self._record_version(workflow, user_id)
+        return workflow
+
+    @staticmethod
+    def _update_data(existing: Workflow, workflow_data: WorkflowUpdate) -> Dict[str, Any]:
+        """Columns to write for ``workflow_data`` applied on top of ``existing``"""
         # Prepare update data
         update_data = {"updated_at": datetime.utcnow().isoformat()}
 
@@ -103,6 +201,10 @@ class WorkflowService:
             update_data["description"] = workflow_data.description
         if workflow_data.is_public is not None:
             update_data["is_public"] = workflow_data.is_public
+        if workflow_data.tags is not None:
+            update_data["tags"] = workflow_data.tags
+        if workflow_data.status is not None:
+            update_data["status"] = workflow_data.status
 
         # Update workflow_data if any structural changes
         if any([
@@ -111,14 +213,14 @@ class WorkflowService:
             workflow_data.variables is not None,
             workflow_data.tags is not None
         ]):
-            current_workflow_data = existing.dict()
+            current_workflow_data = existing.model_dump(mode="json")
 
             if workflow_data.nodes is not None:
-                current_workflow_data["nodes"] = [node.dict() for node in workflow_data.nodes]
+                current_workflow_data["nodes"] = [node.model_dump(mode="json") for node in workflow_data.nodes]
             if workflow_data.edges is not None:
-                current_workflow_data["edges"] = [edge.dict() for edge in workflow_data.edges]
+                current_workflow_data["edges"] = [edge.model_dump(mode="json") for edge in workflow_data.edges]
             if workflow_data.variables is not None:
-                current_workflow_data["variables"] = [var.dict() for var in workflow_data.variables]
+                current_workflow_data["variables"] = [var.model_dump(mode="json") for var in workflow_data.variables]
             if workflow_data.tags is not None:
                 current_workflow_data["tags"] = workflow_data.tags
 
@@ -128,14 +230,103 @@ class WorkflowService:
                 "variables": current_workflow_data["variables"],
                 "tags": current_workflow_data["tags"]
             }
+        return update_data
 
-        # Execute update
-        result = self.supabase.client.table("workflows").update(update_data).eq("id", workflow_id).execute()
-
-        if result.data:
-            return self._db_to_workflow(result.data[0])
+    async def patch_workflow(
+        self,
+        workflow_id: str,
+        patch: WorkflowPatch,
+        user_id: str
+    ) -> Optional[Workflow]:
+        """
+        Apply JSON-Patch operations with a conditional update.
+
+        The ``patch_workflow`` database function applies the operations only
+        if the workflow is still at ``patch.version``, so only the delta is
+        sent. It also checks the patched document the way a save is checked
+        and writes nothing if it is not a valid workflow, all in one call.
+        Raises WorkflowVersionConflict if someone else saved first and
+        ValueError for operations that do not apply or leave an invalid
+        workflow; returns None if the workflow does not exist or is not owned
+        by the user.
+        """
+        params = {
+            "target_workflow_id": workflow_id,
+            "requesting_user_id": user_id,
+            "expected_version": patch.version,
+            "operations": [operation.model_dump() for operation in patch.operations]
+        }
+        result = await self._patch_rpc(workflow_id, params, "workflows.patch")
+        await workflow_cache.invalidate(workflow_id)
+
+        if result:
+            workflow_search_index.upsert(self._db_to_summary(result[0]))
+            workflow = self._db_to_workflow(result[0])
+            await self._record_version(workflow, user_id)
+            return workflow
         return None
 
+    async def _patch_rpc(self, workflow_id: str, params: Dict[str, Any], label: str) -> List[Dict[str, Any]]:
+        """Call patch_workflow, mapping its errors to WorkflowVersionConflict and ValueError"""
+        try:
+            result = await self.supabase.execute(self.supabase.client.rpc("patch_workflow", params), label)
+        except APIError as e:
+            if e.code == "PT409":
+                await workflow_cache.invalidate(workflow_id)
+                raise WorkflowVersionConflict(int(e.details or 0))
+            if e.code in PATCH_CLIENT_ERROR_CODES:
+                raise ValueError(e.message)
+            raise
+        return result.data or []
+
+    async def list_workflow_versions(
+        self,
+        workflow_id: str,
+        user_id: str,
+        limit: int = 50
+    ) -> Optional[List[WorkflowVersion]]:
+        """List stored revisions of a workflow, newest first"""
+        workflow = await self.get_workflow(workflow_id, user_id)
+        if not workflow:
+            return None
+        return await workflow_version_store.list_versions(workflow_id, limit)
+
+    async def get_workflow_version(
+        self,
+        workflow_id: str,
+        version_hash: str,
+        user_id: str
+    ) -> Optional[Workflow]:
+        """Get a stored revision of a workflow by its content hash"""
+        workflow = await self.get_workflow(workflow_id, user_id)
+        if not workflow:
+            return None
+        return await workflow_version_store.load(workflow, version_hash)
+
+    async def restore_workflow_version(
+        self,
+        workflow_id: str,
+        version_hash: str,
+        user_id: str
+    ) -> Optional[Workflow]:
+        """Make a stored revision current again; this saves a new version"""
+        revision = await self.get_workflow_version(workflow_id, version_hash, user_id)
+        if not revision:
+            return None
+
+        return await self.update_workflow(
+            workflow_id,
+            WorkflowUpdate(
+                name=revision.name,
+                description=revision.description,
+                nodes=revision.nodes,
+                edges=revision.edges,
+                variables=revision.variables,
+                tags=revision.tags
+            ),
+            user_id
+        )
+
     async def delete_workflow(self, workflow_id: str, user_id: str) -> bool:
         """Delete a workflow"""
         # Check ownership
@@ -144,12 +335,18 @@ class WorkflowService:
             return False
 
         # Delete workflow
-        result = self.supabase.client.table("workflows").delete().eq("id", workflow_id).execute()
+        result = await self.supabase.execute(
+            self.supabase.client.table("workflows").delete().eq("id", workflow_id),
+            "workflows.delete"
+        )
+        await workflow_cache.invalidate(workflow_id)
+        workflow_search_index.remove(workflow_id)
 
         return len(result.data or []) > 0
 
     async def publish_workflow(self, workflow_id: str, user_id: str) -> Optional[Workflow]:
         """Publish a workflow (make it public)"""
+        # update_workflow invalidates the cached definition
         return await self.update_workflow(
             workflow_id,
             WorkflowUpdate(is_public=True, status="published"),
@@ -160,35 +357,93 @@ class WorkflowService:
         self,
         query: str,
         user_id: Optional[str] = None,
-        limit: int = 20
-    ) -> List[Workflow]:
-        """Search workflows by name or description"""
-        supabase_query = self.supabase.client.table("workflows").select("*")
-
-        # Text search in name and description
-        supabase_query = supabase_query.or_(
-            f"name.ilike.%{query}%,description.ilike.%{query}%"
-        )
-
-        # Include public workflows and user's own workflows
-        if user_id:
-            supabase_query = supabase_query.or_(f"user_id.eq.{user_id},is_public.eq.true")
-        else:
-            supabase_query = supabase_query.eq("is_public", True)
-
-        supabase_query = supabase_query.limit(limit)
-
-        result = supabase_query.execute()
-
-        return [self._db_to_workflow(row) for row in result.data or []]
+        limit: int = 20,
+        public_only: bool = False
+    ) -> List[WorkflowSummary]:
+        """
+        Search workflows by name, description and tags, best match first.
+
+        Public-only searches are answered from the in-process index once it
+        has loaded; everything else goes to the ``search_workflows`` database
+        function, which ranks by trigram similarity and full-text relevance.
+        """
+        if (public_only or not user_id) and workflow_search_index.loaded:
+            return [summary for summary, _ in workflow_search_index.search(query, limit)]
+
+        # The query is passed as a bound parameter, never interpolated into a filter
+        rpc = self.supabase.client.rpc("search_workflows", {
+            "search_query": query,
+            "requesting_user_id": None if public_only else user_id,
+            "result_limit": limit
+        })
+        result = await self.supabase.execute(rpc, "workflows.search")
+
+        return [self._db_to_summary(row) for row in result.data or []]
+
+    def suggest_workflows(self, prefix: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Typeahead suggestions from the in-process index of public workflows"""
+        return workflow_search_index.suggest(prefix, limit)
+
+    async def refresh_search_index(self, page_size: int = 1000):
+        """
+        Pull workflows changed since the index watermark into the in-process
+        index, then drop the ones deleted since, which leave no row to pull
+        but a tombstone. The first call loads every public workflow.
+        """
+        watermark = workflow_search_index.watermark
+        while True:
+            query = self.supabase.client.table("workflows").select(WORKFLOW_SUMMARY_COLUMNS)
+            if watermark is None:
+                query = query.eq("is_public", True)
+            else:
+                # Rows sharing the watermark timestamp are re-read; upsert is idempotent
+                query = query.gte("updated_at", watermark.isoformat())
+            query = query.order("updated_at").order("id").limit(page_size)
+
+            result = await self.supabase.execute(query, "workflows.search_index")
+            rows = result.data or []
+            for row in rows:
+                workflow_search_index.upsert(self._db_to_summary(row))
+
+            if len(rows) < page_size:
+                break
+            next_watermark = _parse_timestamp(rows[-1]["updated_at"])
+            if watermark is not None and next_watermark <= watermark:
+                break
+            watermark = next_watermark
+
+        await self._remove_deleted_from_search_index(page_size)
+
+        if not workflow_search_index.loaded:
+            workflow_search_index.warm()
+            workflow_search_index.loaded = True
+
+    async def _remove_deleted_from_search_index(self, page_size: int):
+        """Apply tombstones of workflows deleted since the index's deletion watermark"""
+        watermark = workflow_search_index.deleted_watermark
+        while True:
+            query = self.supabase.client.table("workflow_tombstones").select("workflow_id,deleted_at")
+            if watermark is not None:
+                # Tombstones sharing the watermark timestamp are re-read; remove is idempotent
+                query = query.gte("deleted_at", watermark.isoformat())
+            query = query.order("deleted_at").order("workflow_id").limit(page_size)
+
+            result = await self.supabase.execute(query, "workflow_tombstones.search_index")
+            rows = result.data or []
+            for row in rows:
+                workflow_search_index.remove(row["workflow_id"])
+            if not rows:
+                break
+
+            next_watermark = _parse_timestamp(rows[-1]["deleted_at"])
+            workflow_search_index.deleted_watermark = next_watermark
+            if len(rows) < page_size or (watermark is not None and next_watermark <= watermark):
+                break
+            watermark = next_watermark
 
     async def get_workflow_templates(self) -> Dict[str, Any]:
         """Get available workflow templates"""
-        return {
-            "templates": [template.dict() for template in WORKFLOW_TEMPLATES.values()],
-            "categories": list(set(t.category for t in WORKFLOW_TEMPLATES.values())),
-            "count": len(WORKFLOW_TEMPLATES)
-        }
+        return template_catalog()
 
     async def create_from_template(
         self,
@@ -214,23 +469,120 @@ class WorkflowService:
 
         return await self.create_workflow(workflow_data, user_id)
 
+    @staticmethod
+    def _snapshot(db_data: Dict[str, Any], existing: Optional[Workflow] = None) -> WorkflowSnapshot:
+        """The revision a row write produces, with unwritten fields taken from ``existing``"""
+        graph = db_data.get("workflow_data") or existing.model_dump(
+            mode="json", include={"nodes", "edges", "variables"}
+        )
+        return WorkflowSnapshot(
+            db_data["name"] if "name" in db_data else existing.name,
+            db_data["description"] if "description" in db_data else existing.description,
+            db_data["tags"] if "tags" in db_data else existing.tags,
+            graph["nodes"],
+            graph["edges"],
+            graph["variables"]
+        )
+
+    @staticmethod
+    def _is_unchanged(existing: Workflow, update_data: Dict[str, Any], candidate: WorkflowSnapshot) -> bool:
+        """Whether an update would leave the workflow's content and flags as they are"""
+        for field in ("is_public", "status"):
+            if field in update_data and update_data[field] != getattr(existing, field):
+                return False
+        return candidate.hash == WorkflowSnapshot.from_workflow(existing).hash
+
+    @staticmethod
+    async def _record_version(workflow: Workflow, user_id: str):
+        """Add a saved workflow to the version history"""
+        try:
+            await workflow_version_store.record(workflow, user_id)
+        except Exception as e:
+            # The save itself succeeded; the revision is recorded again on its next run
+            print(f"⚠️ Failed to record workflow version: {str(e)}")
+
+    @staticmethod
+    def _can_read(workflow: Workflow, user_id: Optional[str]) -> bool:
+        """Mirror the visibility filter applied by get_workflow's query"""
+        if user_id:
+            return workflow.user_id == user_id or workflow.is_public
+        return workflow.is_public
+
     def _db_to_workflow(self, db_row: Dict[str, Any]) -> Workflow:
-        """Convert database row to Workflow model"""
-        workflow_data = db_row.get("workflow_data", {})
-
-        return Workflow(
-            id=db_row["id"],
-            name=db_row["name"],
-            description=db_row.get("description"),
-            user_id=db_row["user_id"],
-            status=db_row.get("status", "draft"),
-            is_public=db_row.get("is_public", False),
-            nodes=[],  # Will be populated from workflow_data
-            edges=[],  # Will be populated from workflow_data
-            variables=[],  # Will be populated from workflow_data
-            tags=workflow_data.get("tags", []),
-            created_at=datetime.fromisoformat(db_row["created_at"].replace("Z", "+00:00")),
-            updated_at=datetime.fromisoformat(db_row["updated_at"].replace("Z", "+00:00")),
-            last_executed_at=None,  # TODO: implement
-            execution_count=0  # TODO: implement
+        """Convert database row to Workflow model; nodes and edges hydrate on first access"""
+        workflow_data = db_row.get("workflow_data") or {}
+
+        return Workflow.from_stored(
+            workflow_data,
+            variables=[WorkflowVariable(**var) for var in workflow_data.get("variables", [])],
+            version_hash=db_row.get("workflow_version_hash"),
+            **self._row_fields(db_row)
         )
+
+    def _db_to_summary(self, db_row: Dict[str, Any]) -> WorkflowSummary:
+        """Convert database row to a WorkflowSummary without touching the node graph"""
+        return WorkflowSummary(**self._row_fields(db_row))
+
+    @staticmethod
+    def _row_fields(db_row: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the scalar workflow columns shared by full and summary models"""
+        workflow_data = db_row.get("workflow_data") or {}
+
+        return {
+            "id": db_row["id"],
+            "name": db_row["name"],
+            "description": db_row.get("description"),
+            "user_id": db_row["user_id"],
+            "status": db_row.get("status") or "draft",
+            "version": db_row.get("version") or 1,
+            "is_public": db_row.get("is_public", False),
+            "tags": db_row.get("tags") or workflow_data.get("tags", []),
+            "created_at": _parse_timestamp(db_row["created_at"]),
+            "updated_at": _parse_timestamp(db_row["updated_at"]),
+            "last_executed_at": _parse_timestamp(db_row.get("last_executed_at")),
+            "execution_count": db_row.get("execution_count") or 0
+        }
+
+
+def workflow_etag(workflow: Workflow) -> str:
+    """ETag of a workflow's current definition; updated_at and version change on every save"""
+    return make_etag(workflow.id, workflow.updated_at.isoformat(), workflow.version)
+
+
+# Node and edge timestamps are set when the templates are imported; leaving
+# them out keeps the catalogue, and its ETag, identical across processes
+_TEMPLATE_GRAPH_EXCLUDE = {
+    "workflow": {
+        "nodes": {"__all__": {"created_at", "updated_at"}},
+        "edges": {"__all__": {"created_at"}}
+    }
+}
+
+
+@lru_cache(maxsize=1)
+def template_catalog() -> Dict[str, Any]:
+    """The template catalogue; templates only change between deploys"""
+    return {
+        "templates": [
+            template.model_dump(mode="json", exclude=_TEMPLATE_GRAPH_EXCLUDE)
+            for template in WORKFLOW_TEMPLATES.values()
+        ],
+        "categories": sorted(set(t.category for t in WORKFLOW_TEMPLATES.values())),
+        "count": len(WORKFLOW_TEMPLATES)
+    }
+
+
+@lru_cache(maxsize=1)
+def template_catalog_response() -> PrecomputedResponse:
+    """The template catalogue encoded once, with its ETag and gzip variant"""
+    return PrecomputedResponse(
+        template_catalog(),
+        cache_control=f"public, max-age={settings.TEMPLATE_CACHE_MAX_AGE_SECONDS}"
+    )
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Supabase timestamp string"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
@@ -0,0 +1,116 @@
+"""
+Per-run overhead of compiled mode against the interpreter
+
+Run from the backend directory:
+
+    python -m benchmarks.compiled_mode [--nodes 50] [--runs 2000]
+
+LLM calls are answered by an in-process fake, so the numbers measure the
+engine rather than the provider. Both engines must produce the same node
+outputs, which is checked before timing.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from app.models.workflow import Workflow, Node, Edge, NodeType
+from app.services.litellm_service import litellm_service
+from app.services.runtime_graph import RuntimeGraph
+from app.services.workflow_compiler import CompiledWorkflow
+from app.services.workflow_execution_service import WorkflowExecutionService
+
+
+async def fake_completion(messages, model, temperature, max_tokens, **kwargs):
+    return {
+        "content": f"echo: {messages[-1]['content'][:40]}",
+        "model": model,
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+        "cost": 0.0,
+        "response_time_ms": 0
+    }
+
+
+def build_workflow(template_nodes: int) -> Workflow:
+    position = {"x": 0, "y": 0}
+    nodes = [Node(id="start", type=NodeType.START, position=position, data={"title": "Start"})]
+    previous = "start"
+    for i in range(template_nodes):
+        node_id = f"step_{i}"
+        nodes.append(Node(
+            id=node_id,
+            type=NodeType.TEMPLATE_TRANSFORM,
+            position=position,
+            data={"title": f"Step {i}", "template": f"[{i}] {{{{topic}}}} after {{{{{previous}.output}}}}"[:200]}
+        ))
+        previous = node_id
+    nodes.append(Node(
+        id="check",
+        type=NodeType.CONDITION,
+        position=position,
+        data={"conditions": [{"expression": "len(topic) > 3 and topic contains 'bench'"}]}
+    ))
+    nodes.append(Node(
+        id="writer",
+        type=NodeType.LLM,
+        position=position,
+        data={"title": "Writer", "prompt": f"Summarise: {{{{{previous}.output}}}}", "system_prompt": "Topic: {{topic}}"}
+    ))
+    nodes.append(Node(id="answer", type=NodeType.ANSWER, position=position))
+
+    edges = [Edge(source=a.id, target=b.id) for a, b in zip(nodes, nodes[1:])]
+    now = datetime.utcnow()
+    return Workflow(
+        id="benchmark", user_id="benchmark", name="Benchmark", nodes=nodes, edges=edges,
+        created_at=now, updated_at=now
+    )
+
+
+def strip_timing(node_outputs):
+    return {
+        node_id: {key: value for key, value in result.items() if key != "execution_time_ms"}
+        for node_id, result in node_outputs.items()
+    }
+
+
+async def run_once(service, graph, events_factory):
+    context = {"variables": {"topic": "benchmarking workflows"}}
+    node_outputs = {}
+    async for _ in events_factory(service, graph, context, node_outputs):
+        pass
+    return node_outputs
+
+
+async def main(template_nodes: int, runs: int):
+    litellm_service.completion = fake_completion
+    service = WorkflowExecutionService(None)
+    graph = RuntimeGraph(build_workflow(template_nodes))
+
+    started = time.perf_counter()
+    compiled = CompiledWorkflow("benchmark", graph)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    def interpret(service, graph, context, node_outputs):
+        return service._interpret(graph, context, node_outputs)
+
+    engines = {"interpreter": interpret, "compiled": compiled.run}
+    outputs = {name: strip_timing(await run_once(service, graph, engine)) for name, engine in engines.items()}
+    assert outputs["interpreter"] == outputs["compiled"], "engines disagree"
+
+    print(f"{len(graph)} nodes, {runs} runs, compiled in {compile_ms:.2f} ms")
+    timings = {}
+    for name, engine in engines.items():
+        started = time.perf_counter()
+        for _ in range(runs):
+            await run_once(service, graph, engine)
+        timings[name] = (time.perf_counter() - started) / runs * 1e6
+        print(f"  {name:<12} {timings[name]:9.1f} us/run  {timings[name] / len(graph):6.2f} us/node")
+    print(f"  speedup      {timings['interpreter'] / timings['compiled']:9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=50, help="template nodes in the chain")
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.nodes, args.runs))
@@ -18,6 +18,7 @@ CREATE TABLE IF NOT EXISTS workflows (
     workflow_data JSONB NOT NULL DEFAULT '{}',
     status VARCHAR(50) DEFAULT 'draft' CHECK (status IN ('draft', 'published', 'archived')),
     version INTEGER DEFAULT 1,
+    workflow_version_hash TEXT, -- content hash of the current revision (workflow_versions.hash)
     is_public BOOLEAN DEFAULT FALSE,
     tags TEXT[] DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
@@ -30,10 +31,39 @@ CREATE TABLE IF NOT EXISTS workflows (
     CONSTRAINT workflows_description_length CHECK (LENGTH(description) <= 1000)
 );
 
+-- Content-addressed workflow objects (nodes, edges, variables and chunks of
+-- their hash lists), shared between every revision and workflow that
+-- contains identical content
+CREATE TABLE IF NOT EXISTS workflow_objects (
+    hash TEXT PRIMARY KEY, -- SHA-256 of the canonical JSON content
+    content JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Immutable workflow revisions; the manifest lists chunk hashes per part
+CREATE TABLE IF NOT EXISTS workflow_versions (
+    workflow_id UUID NOT NULL REFERENCES workflows(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    hash TEXT NOT NULL, -- SHA-256 of the manifest
+    manifest JSONB NOT NULL,
+    created_by TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (workflow_id, version)
+);
+
+-- Deleted workflows, written by a trigger, so that workers holding
+-- in-process copies (the search index) can drop them; pruned after a week
+CREATE TABLE IF NOT EXISTS workflow_tombstones (
+    workflow_id UUID PRIMARY KEY,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Workflow executions table
 CREATE TABLE IF NOT EXISTS workflow_executions (
     id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
     workflow_id UUID NOT NULL REFERENCES workflows(id) ON DELETE CASCADE,
+    workflow_version_hash TEXT, -- revision that ran (workflow_versions.hash)
     user_id TEXT NOT NULL,
     input_data JSONB DEFAULT '{}',
     output_data JSONB,
@@ -146,6 +176,8 @@ CREATE INDEX IF NOT EXISTS idx_workflows_updated_at ON workflows(updated_at DESC
 CREATE INDEX IF NOT EXISTS idx_workflows_name_trgm ON workflows USING gin(name gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_workflows_description_trgm ON workflows USING gin(description gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_workflows_tags ON workflows USING gin(tags);
+CREATE INDEX IF NOT EXISTS idx_workflows_search_tsv ON workflows
+    USING gin(to_tsvector('simple', name || ' ' || COALESCE(description, '')));
 
 -- Workflow executions indexes
 CREATE INDEX IF NOT EXISTS idx_executions_workflow_id ON workflow_executions(workflow_id);
@@ -154,6 +186,11 @@ CREATE INDEX IF NOT EXISTS idx_executions_status ON workflow_executions(status);
 CREATE INDEX IF NOT EXISTS idx_executions_created_at ON workflow_executions(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_executions_user_workflow ON workflow_executions(user_id, workflow_id);
 
+-- Workflow version indexes
+CREATE INDEX IF NOT EXISTS idx_workflow_tombstones_deleted_at ON workflow_tombstones(deleted_at);
+CREATE INDEX IF NOT EXISTS idx_workflow_versions_hash ON workflow_versions(workflow_id, hash);
+CREATE INDEX IF NOT EXISTS idx_executions_version_hash ON workflow_executions(workflow_version_hash);
+
 -- Node execution logs indexes
 CREATE INDEX IF NOT EXISTS idx_node_logs_execution_id ON node_execution_logs(execution_id);
 CREATE INDEX IF NOT EXISTS idx_node_logs_node_id ON node_execution_logs(node_id);
@@ -179,6 +216,9 @@ ALTER TABLE workflow_executions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE node_execution_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE execution_events ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_workflow_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE workflow_versions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE workflow_objects ENABLE ROW LEVEL SECURITY;
+ALTER TABLE workflow_tombstones ENABLE ROW LEVEL SECURITY;
 
 -- Workflows policies
 CREATE POLICY "Users can view their own workflows and public workflows" ON workflows
@@ -195,6 +235,35 @@ CREATE POLICY "Users can update their own workflows" ON workflows
 CREATE POLICY "Users can delete their own workflows" ON workflows
     FOR DELETE USING (user_id = auth.jwt() ->> 'sub');
 
+-- Workflow versions policies (revisions are immutable: no update or delete)
+CREATE POLICY "Users can view versions of visible workflows" ON workflow_versions
+    FOR SELECT USING (
+        EXISTS (
+            SELECT 1 FROM workflows
+            WHERE id = workflow_id AND (user_id = auth.jwt() ->> 'sub' OR is_public = true)
+        )
+    );
+
+CREATE POLICY "Users can record versions of their workflows" ON workflow_versions
+    FOR INSERT WITH CHECK (
+        EXISTS (
+            SELECT 1 FROM workflows
+            WHERE id = workflow_id AND user_id = auth.jwt() ->> 'sub'
+        )
+    );
+
+-- Workflow objects are addressed by content hash and shared between workflows;
+-- they are only reachable through a manifest the caller can already read
+CREATE POLICY "Workflow objects are readable by hash" ON workflow_objects
+    FOR SELECT USING (true);
+
+CREATE POLICY "Authenticated users can store workflow objects" ON workflow_objects
+    FOR INSERT WITH CHECK (auth.jwt() ->> 'sub' IS NOT NULL);
+
+-- Tombstones hold only ids of workflows that no longer exist; written by trigger only
+CREATE POLICY "Workflow tombstones are readable" ON workflow_tombstones
+    FOR SELECT USING (true);
+
 -- Workflow executions policies
 CREATE POLICY "Users can view their own executions" ON workflow_executions
     FOR SELECT USING (user_id = auth.jwt() ->> 'sub');
@@ -281,6 +350,45 @@ CREATE TRIGGER update_user_stats_updated_at
     BEFORE UPDATE ON user_workflow_stats
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Bump the workflow version whenever its definition changes. Callers that
+-- set the version themselves (patch_workflow) are left alone.
+CREATE OR REPLACE FUNCTION bump_workflow_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.version IS NOT DISTINCT FROM OLD.version AND (
+        NEW.workflow_data IS DISTINCT FROM OLD.workflow_data
+        OR NEW.name IS DISTINCT FROM OLD.name
+        OR NEW.description IS DISTINCT FROM OLD.description
+        OR NEW.status IS DISTINCT FROM OLD.status
+        OR NEW.is_public IS DISTINCT FROM OLD.is_public
+        OR NEW.tags IS DISTINCT FROM OLD.tags
+    ) THEN
+        NEW.version = COALESCE(OLD.version, 1) + 1;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER bump_workflows_version
+    BEFORE UPDATE ON workflows
+    FOR EACH ROW EXECUTE FUNCTION bump_workflow_version();
+
+-- Leave a tombstone for every deleted workflow and prune old ones
+CREATE OR REPLACE FUNCTION record_workflow_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO workflow_tombstones (workflow_id, deleted_at)
+    VALUES (OLD.id, NOW())
+    ON CONFLICT (workflow_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+    DELETE FROM workflow_tombstones WHERE deleted_at < NOW() - INTERVAL '7 days';
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE TRIGGER record_workflows_tombstone
+    AFTER DELETE ON workflows
+    FOR EACH ROW EXECUTE FUNCTION record_workflow_tombstone();
+
 -- Function to update workflow execution count
 CREATE OR REPLACE FUNCTION update_workflow_execution_count()
 RETURNS TRIGGER AS $$
@@ -350,6 +458,338 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Ranked workflow search (trigram similarity + full-text relevance).
+-- The %, <% and ILIKE predicates are served by the pg_trgm GIN indexes.
+CREATE OR REPLACE FUNCTION search_workflows(
+    search_query TEXT,
+    requesting_user_id TEXT DEFAULT NULL,
+    result_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE (
+    id UUID,
+    name VARCHAR,
+    description TEXT,
+    user_id TEXT,
+    status VARCHAR,
+    version INTEGER,
+    is_public BOOLEAN,
+    tags TEXT[],
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    last_executed_at TIMESTAMP WITH TIME ZONE,
+    execution_count INTEGER,
+    rank REAL
+) AS $$
+    SELECT
+        w.id, w.name, w.description, w.user_id, w.status, w.version, w.is_public,
+        w.tags, w.created_at, w.updated_at, w.last_executed_at, w.execution_count,
+        (
+            GREATEST(
+                similarity(w.name, search_query) * 2,
+                word_similarity(search_query, w.name) * 2,
+                similarity(COALESCE(w.description, ''), search_query)
+            )
+            + ts_rank(
+                to_tsvector('simple', w.name || ' ' || COALESCE(w.description, '')),
+                plainto_tsquery('simple', search_query)
+            )
+            + CASE WHEN search_query = ANY(w.tags) THEN 0.5 ELSE 0 END
+        )::REAL AS rank
+    FROM workflows w
+    WHERE (w.is_public = true OR w.user_id = requesting_user_id)
+      AND (
+          w.name % search_query
+          OR search_query <% w.name
+          OR w.description % search_query
+          OR w.name ILIKE '%' || search_query || '%'
+          OR w.description ILIKE '%' || search_query || '%'
+          OR to_tsvector('simple', w.name || ' ' || COALESCE(w.description, ''))
+             @@ plainto_tsquery('simple', search_query)
+          OR search_query = ANY(w.tags)
+      )
+    ORDER BY rank DESC, w.updated_at DESC
+    LIMIT result_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Why a workflow document fails the checks WorkflowBase (app/models/workflow.py)
+-- applies to a save, or NULL if it passes, so that patch_workflow can reject
+-- a bad result inside its own transaction. Config values are checked against
+-- the kind of the typed config field of the same name; the node types and
+-- config kinds are kept in step with the models by tests/test_workflow_patch.py.
+CREATE OR REPLACE FUNCTION workflow_document_problem(doc JSONB)
+RETURNS TEXT AS $$
+DECLARE
+    node_types CONSTANT TEXT[] := ARRAY[
+        'start', 'end', 'llm', 'chat', 'condition', 'if-else', 'code', 'template-transform',
+        'variable-assigner', 'http-request', 'tool', 'knowledge-retrieval', 'doc-extractor',
+        'loop', 'iteration', 'parameter-extractor', 'answer'
+    ];
+    config_kinds CONSTANT JSONB := '{
+        "title": "string", "desc": "string", "model": "string", "prompt": "string",
+        "system_prompt": "string", "code": "string", "code_language": "string",
+        "template": "string", "url": "string", "method": "string", "tool_name": "string",
+        "provider_id": "string", "provider_name": "string", "provider_type": "string",
+        "query_variable": "string", "retrieval_mode": "string", "logical_operator": "string",
+        "output_type": "string",
+        "temperature": "number", "top_p": "number", "presence_penalty": "number",
+        "frequency_penalty": "number", "score_threshold": "number",
+        "max_tokens": "integer", "timeout": "integer", "top_k": "integer",
+        "body": "object", "memory": "object", "routing": "object", "tool_parameters": "object",
+        "extract_settings": "object",
+        "headers": "string_map", "params": "string_map", "authorization": "string_map",
+        "variables": "object_array", "conditions": "object_array", "variable_assignments": "object_array",
+        "dataset_ids": "string_array", "dependencies": "string_array", "file_types": "string_array",
+        "conversation_variables": "string_array", "iterator_selector": "string_array",
+        "output_selector": "string_array"
+    }';
+    nodes JSONB := COALESCE(NULLIF(doc->'nodes', 'null'), '[]');
+    edges JSONB := COALESCE(NULLIF(doc->'edges', 'null'), '[]');
+    variables JSONB := COALESCE(NULLIF(doc->'variables', 'null'), '[]');
+    item JSONB;
+    config_key TEXT;
+    config_value JSONB;
+    kind TEXT;
+    element_kind TEXT;
+    node_ids TEXT[] := '{}';
+    i INTEGER;
+BEGIN
+    IF jsonb_typeof(doc->'name') IS DISTINCT FROM 'string' OR length(doc->>'name') NOT BETWEEN 1 AND 255 THEN
+        RETURN '/name: must be a string of 1 to 255 characters';
+    END IF;
+    IF COALESCE(jsonb_typeof(doc->'description'), 'null') NOT IN ('string', 'null') THEN
+        RETURN '/description: must be a string';
+    END IF;
+    IF length(doc->>'description') > 1000 THEN
+        RETURN '/description: must be at most 1000 characters';
+    END IF;
+    IF COALESCE(jsonb_typeof(doc->'is_public'), 'null') NOT IN ('boolean', 'null') THEN
+        RETURN '/is_public: must be a boolean';
+    END IF;
+    IF COALESCE(jsonb_typeof(doc->'tags'), 'null') NOT IN ('array', 'null') OR EXISTS (
+        SELECT 1 FROM jsonb_array_elements(CASE WHEN jsonb_typeof(doc->'tags') = 'array' THEN doc->'tags' ELSE '[]' END) t
+        WHERE jsonb_typeof(t) <> 'string'
+    ) THEN
+        RETURN '/tags: must be a list of strings';
+    END IF;
+    IF jsonb_typeof(nodes) <> 'array' THEN
+        RETURN '/nodes: must be a list';
+    END IF;
+    IF jsonb_typeof(edges) <> 'array' THEN
+        RETURN '/edges: must be a list';
+    END IF;
+    IF jsonb_typeof(variables) <> 'array' THEN
+        RETURN '/variables: must be a list';
+    END IF;
+
+    FOR i IN 0 .. jsonb_array_length(nodes) - 1 LOOP
+        item := nodes->i;
+        IF jsonb_typeof(item) <> 'object' THEN
+            RETURN format('/nodes/%s: must be an object', i);
+        END IF;
+        IF item ? 'id' AND jsonb_typeof(item->'id') <> 'string' THEN
+            RETURN format('/nodes/%s/id: must be a string', i);
+        END IF;
+        IF jsonb_typeof(item->'type') IS DISTINCT FROM 'string' OR NOT (item->>'type' = ANY(node_types)) THEN
+            RETURN format('/nodes/%s/type: unknown node type', i);
+        END IF;
+        IF jsonb_typeof(item->'position') IS DISTINCT FROM 'object'
+            OR jsonb_typeof(item->'position'->'x') IS DISTINCT FROM 'number'
+            OR jsonb_typeof(item->'position'->'y') IS DISTINCT FROM 'number' THEN
+            RETURN format('/nodes/%s/position: must have numeric x and y', i);
+        END IF;
+        IF item ? 'selected' AND jsonb_typeof(item->'selected') <> 'boolean' THEN
+            RETURN format('/nodes/%s/selected: must be a boolean', i);
+        END IF;
+        IF COALESCE(jsonb_typeof(item->'data'), 'null') NOT IN ('object', 'null') THEN
+            RETURN format('/nodes/%s/data: must be an object', i);
+        END IF;
+        IF item ? 'id' THEN
+            node_ids := node_ids || (item->>'id');
+        END IF;
+
+        FOR config_key, config_value IN
+            SELECT * FROM jsonb_each(CASE WHEN jsonb_typeof(item->'data') = 'object' THEN item->'data' ELSE '{}' END)
+        LOOP
+            kind := config_kinds->>config_key;
+            CONTINUE WHEN kind IS NULL OR jsonb_typeof(config_value) = 'null';
+            element_kind := CASE kind
+                WHEN 'string_map' THEN 'string' WHEN 'string_array' THEN 'string' WHEN 'object_array' THEN 'object'
+            END;
+            IF NOT CASE
+                WHEN kind IN ('string', 'number', 'object') THEN jsonb_typeof(config_value) = kind
+                WHEN kind = 'integer' THEN CASE WHEN jsonb_typeof(config_value) = 'number'
+                    THEN (config_value #>> '{}')::NUMERIC = trunc((config_value #>> '{}')::NUMERIC)
+                    ELSE false END
+                WHEN kind = 'string_map' THEN jsonb_typeof(config_value) = 'object' AND NOT EXISTS (
+                    SELECT 1 FROM jsonb_each(config_value) e WHERE jsonb_typeof(e.value) <> element_kind
+                )
+                ELSE jsonb_typeof(config_value) = 'array' AND NOT EXISTS (
+                    SELECT 1 FROM jsonb_array_elements(config_value) e WHERE jsonb_typeof(e) <> element_kind
+                )
+            END THEN
+                RETURN format('/nodes/%s/data/%s: must be of kind %s', i, config_key, kind);
+            END IF;
+        END LOOP;
+    END LOOP;
+
+    IF jsonb_array_length(nodes) > 0 AND NOT EXISTS (
+        SELECT 1 FROM jsonb_array_elements(nodes) n WHERE n->>'type' = 'start'
+    ) THEN
+        RETURN '/nodes: Workflow must have at least one START node';
+    END IF;
+
+    FOR i IN 0 .. jsonb_array_length(edges) - 1 LOOP
+        item := edges->i;
+        IF jsonb_typeof(item) <> 'object' THEN
+            RETURN format('/edges/%s: must be an object', i);
+        END IF;
+        IF jsonb_typeof(item->'source') IS DISTINCT FROM 'string' OR NOT (item->>'source' = ANY(node_ids)) THEN
+            RETURN format('/edges/%s/source: not found in nodes', i);
+        END IF;
+        IF jsonb_typeof(item->'target') IS DISTINCT FROM 'string' OR NOT (item->>'target' = ANY(node_ids)) THEN
+            RETURN format('/edges/%s/target: not found in nodes', i);
+        END IF;
+        IF (item ? 'id' AND jsonb_typeof(item->'id') <> 'string')
+            OR (item ? 'type' AND jsonb_typeof(item->'type') <> 'string')
+            OR (item ? 'animated' AND jsonb_typeof(item->'animated') <> 'boolean') THEN
+            RETURN format('/edges/%s: id and type must be strings and animated a boolean', i);
+        END IF;
+    END LOOP;
+
+    FOR i IN 0 .. jsonb_array_length(variables) - 1 LOOP
+        item := variables->i;
+        IF jsonb_typeof(item) <> 'object'
+            OR jsonb_typeof(item->'variable') IS DISTINCT FROM 'string'
+            OR jsonb_typeof(item->'label') IS DISTINCT FROM 'string' THEN
+            RETURN format('/variables/%s: must have string variable and label', i);
+        END IF;
+        IF (item ? 'type' AND jsonb_typeof(item->'type') <> 'string')
+            OR (item ? 'required' AND jsonb_typeof(item->'required') <> 'boolean') THEN
+            RETURN format('/variables/%s: type must be a string and required a boolean', i);
+        END IF;
+    END LOOP;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Apply JSON-Patch operations (add, remove, replace, test) to a workflow in
+-- one statement, conditional on the version the client last saw. The patched
+-- document is workflow_data plus the name, description, is_public and tags
+-- columns. A stale version raises PT409, which PostgREST returns as 409;
+-- malformed operations, and operations that leave a document that is not a
+-- valid workflow, raise 22023 (400) so nothing is written. No row is
+-- returned when the workflow does not exist or is not owned by
+-- requesting_user_id. The new revision's hash is left NULL: the application
+-- hashes and records it after the write.
+DROP FUNCTION IF EXISTS patch_workflow(UUID, TEXT, INTEGER, JSONB);
+DROP FUNCTION IF EXISTS patch_workflow(UUID, TEXT, INTEGER, JSONB, BOOLEAN);
+DROP FUNCTION IF EXISTS patch_workflow(UUID, TEXT, INTEGER, JSONB, BOOLEAN, TEXT);
+CREATE OR REPLACE FUNCTION patch_workflow(
+    target_workflow_id UUID,
+    requesting_user_id TEXT,
+    expected_version INTEGER,
+    operations JSONB
+)
+RETURNS SETOF workflows AS $$
+DECLARE
+    existing workflows%ROWTYPE;
+    doc JSONB;
+    operation JSONB;
+    op TEXT;
+    path TEXT[];
+    parent JSONB;
+    problem TEXT;
+BEGIN
+    SELECT * INTO existing FROM workflows
+    WHERE id = target_workflow_id AND user_id = requesting_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    IF COALESCE(existing.version, 1) <> expected_version THEN
+        RAISE EXCEPTION 'Workflow version conflict'
+            USING ERRCODE = 'PT409', DETAIL = COALESCE(existing.version, 1)::TEXT;
+    END IF;
+
+    doc := existing.workflow_data || jsonb_build_object(
+        'name', existing.name,
+        'description', existing.description,
+        'is_public', existing.is_public,
+        'tags', to_jsonb(COALESCE(existing.tags, '{}'))
+    );
+
+    FOR operation IN SELECT * FROM jsonb_array_elements(operations) LOOP
+        op := operation->>'op';
+        -- JSON Pointer to text[] path, unescaping ~1 and ~0
+        SELECT COALESCE(array_agg(replace(replace(part, '~1', '/'), '~0', '~') ORDER BY n), '{}')
+        INTO path
+        FROM unnest((string_to_array(operation->>'path', '/'))[2:]) WITH ORDINALITY AS t(part, n);
+
+        IF cardinality(path) = 0 THEN
+            RAISE EXCEPTION 'Patch path must not be empty' USING ERRCODE = '22023';
+        END IF;
+        parent := doc #> path[1:cardinality(path) - 1];
+
+        IF op = 'add' THEN
+            IF jsonb_typeof(parent) = 'array' THEN
+                IF path[cardinality(path)] = '-' THEN
+                    path[cardinality(path)] := '-1';
+                    doc := jsonb_insert(doc, path, operation->'value', true);
+                ELSE
+                    doc := jsonb_insert(doc, path, operation->'value');
+                END IF;
+            ELSIF jsonb_typeof(parent) = 'object' THEN
+                doc := jsonb_set(doc, path, operation->'value', true);
+            ELSE
+                RAISE EXCEPTION 'Patch target % does not exist', operation->>'path' USING ERRCODE = '22023';
+            END IF;
+        ELSIF op IN ('remove', 'replace') THEN
+            IF doc #> path IS NULL THEN
+                RAISE EXCEPTION 'Patch target % does not exist', operation->>'path' USING ERRCODE = '22023';
+            END IF;
+            IF op = 'remove' THEN
+                doc := doc #- path;
+            ELSE
+                doc := jsonb_set(doc, path, operation->'value', false);
+            END IF;
+        ELSIF op = 'test' THEN
+            IF doc #> path IS DISTINCT FROM operation->'value' THEN
+                RAISE EXCEPTION 'Patch test failed at %', operation->>'path' USING ERRCODE = '22023';
+            END IF;
+        ELSE
+            RAISE EXCEPTION 'Unsupported patch operation %', op USING ERRCODE = '22023';
+        END IF;
+    END LOOP;
+
+    problem := workflow_document_problem(doc);
+    IF problem IS NOT NULL THEN
+        RAISE EXCEPTION 'Patched workflow is invalid: %', problem USING ERRCODE = '22023';
+    END IF;
+
+    existing.name := doc->>'name';
+    existing.description := doc->>'description';
+    existing.is_public := COALESCE((doc->>'is_public')::BOOLEAN, false);
+    existing.tags := ARRAY(SELECT jsonb_array_elements_text(COALESCE(doc->'tags', '[]')));
+    existing.workflow_data := doc - 'name' - 'description' - 'is_public';
+    existing.version := COALESCE(existing.version, 1) + 1;
+    existing.workflow_version_hash := NULL;
+
+    UPDATE workflows SET
+        name = existing.name,
+        description = existing.description,
+        is_public = existing.is_public,
+        tags = existing.tags,
+        workflow_data = existing.workflow_data,
+        version = existing.version,
+        workflow_version_hash = existing.workflow_version_hash
+    WHERE id = target_workflow_id
+    RETURNING * INTO existing;
+    RETURN NEXT existing;
+END;
+$$ LANGUAGE plpgsql;
+
 -- ====================================
 -- Views for Analytics
 -- ====================================
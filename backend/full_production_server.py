@@ -4,12 +4,14 @@
 """
 import os
 import json
+import gzip
 import uuid
 import asyncio
+import hashlib
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -297,26 +299,67 @@ async def health():
         "uptime": "running"
     }
 
+# 预编码响应：模板只在部署之间变化，启动时序列化、压缩并计算ETag一次
+class PrecomputedResponse:
+    """预编码的JSON响应，支持强ETag、gzip和If-None-Match（304）"""
+
+    def __init__(self, payload: Any, cache_control: str = "public, max-age=3600"):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.gzip_etag = self.etag[:-1] + '-gzip"'
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0) if len(self.body) >= 1024 else None
+        self.cache_control = cache_control
+
+    def render(self, request: Request) -> Response:
+        accept_encoding = request.headers.get("accept-encoding", "")
+        use_gzip = self.gzip_body is not None and "gzip" in accept_encoding and "gzip;q=0" not in accept_encoding.replace(" ", "")
+        headers = {
+            "ETag": self.gzip_etag if use_gzip else self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding"
+        }
+
+        # If-None-Match 使用弱比较；gzip变体视为同一资源
+        if_none_match = request.headers.get("if-none-match", "")
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in candidates or self.etag in candidates or self.gzip_etag in candidates:
+            return Response(status_code=304, headers=headers)
+
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return Response(
+            content=self.gzip_body if use_gzip else self.body,
+            media_type="application/json",
+            headers=headers
+        )
+
+TEMPLATE_CATALOG_RESPONSE = PrecomputedResponse({
+    "templates": list(WORKFLOW_TEMPLATES.values()),
+    "categories": sorted(set(t["category"] for t in WORKFLOW_TEMPLATES.values())),
+    "count": len(WORKFLOW_TEMPLATES)
+})
+
+TEMPLATE_RESPONSES = {
+    template_id: PrecomputedResponse({
+        "template": template,
+        "usage_count": 0  # 可以从数据库获取
+    })
+    for template_id, template in WORKFLOW_TEMPLATES.items()
+}
+
 # 工作流模板端点
 @app.get("/api/v1/workflows/templates")
-async def get_templates():
+async def get_templates(request: Request):
     """获取所有工作流模板"""
-    return {
-        "templates": list(WORKFLOW_TEMPLATES.values()),
-        "categories": list(set(t["category"] for t in WORKFLOW_TEMPLATES.values())),
-        "count": len(WORKFLOW_TEMPLATES)
-    }
+    return TEMPLATE_CATALOG_RESPONSE.render(request)
 
 @app.get("/api/v1/workflows/templates/{template_id}")
-async def get_template(template_id: str):
+async def get_template(template_id: str, request: Request):
     """获取特定工作流模板"""
-    if template_id not in WORKFLOW_TEMPLATES:
+    if template_id not in TEMPLATE_RESPONSES:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    return {
-        "template": WORKFLOW_TEMPLATES[template_id],
-        "usage_count": 0  # 可以从数据库获取
-    }
+    return TEMPLATE_RESPONSES[template_id].render(request)
 
 # AI服务端点
 @app.post("/api/v1/ai/analyze-prompt")
@@ -0,0 +1,128 @@
+"""
+Local stand-in for the OpenAI batch API (files + batches)
+
+    uvicorn mock_batch_server:app --port 8100
+    LLM_BATCH_API_BASE=http://localhost:8100/v1
+
+Batches complete MOCK_BATCH_DELAY_SECONDS after creation. Every request
+is answered with an echo of its last message, except requests whose
+messages contain "[fail]", which come back as per-item errors.
+"""
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse
+
+app = FastAPI(title="πlot Mock Batch API")
+
+DELAY_SECONDS = float(os.environ.get("MOCK_BATCH_DELAY_SECONDS", "1"))
+
+files = {}
+batches = {}
+
+
+def _reply(body):
+    messages = body.get("messages") or []
+    if any("[fail]" in str(message.get("content")) for message in messages):
+        return 400, {"error": {"message": "Mock failure requested", "type": "invalid_request_error"}}
+    prompt = str(messages[-1].get("content")) if messages else ""
+    content = f"Mock reply to: {prompt[:80]}"
+    prompt_tokens = sum(len(str(message.get("content")).split()) for message in messages)
+    completion_tokens = len(content.split())
+    return 200, {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def _complete(batch):
+    outputs, errors = [], []
+    for line in files[batch["input_file_id"]].splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        status_code, body = _reply(request["body"])
+        record = {
+            "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": status_code, "body": body},
+            "error": None
+        }
+        (outputs if status_code == 200 else errors).append(json.dumps(record))
+
+    for name, lines in (("output_file_id", outputs), ("error_file_id", errors)):
+        if lines:
+            file_id = f"file-{uuid.uuid4().hex[:12]}"
+            files[file_id] = "\n".join(lines)
+            batch[name] = file_id
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+    batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+
+
+@app.post("/v1/files")
+async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    file_id = f"file-{uuid.uuid4().hex[:12]}"
+    files[file_id] = (await file.read()).decode()
+    return {"id": file_id, "object": "file", "purpose": purpose, "filename": file.filename}
+
+
+@app.get("/v1/files/{file_id}/content", response_class=PlainTextResponse)
+async def file_content(file_id: str):
+    if file_id not in files:
+        raise HTTPException(status_code=404, detail="File not found")
+    return files[file_id]
+
+
+@app.post("/v1/batches")
+async def create_batch(request: dict):
+    if request.get("input_file_id") not in files:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+    batches[batch_id] = {
+        "id": batch_id,
+        "object": "batch",
+        "endpoint": request.get("endpoint"),
+        "input_file_id": request["input_file_id"],
+        "completion_window": request.get("completion_window", "24h"),
+        "status": "in_progress",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None
+    }
+    return batches[batch_id]
+
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= DELAY_SECONDS:
+        _complete(batch)
+    return batch
+
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch["status"] == "in_progress":
+        batch["status"] = "cancelled"
+    return batch
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8100")))
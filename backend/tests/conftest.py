@@ -0,0 +1,61 @@
+"""
+Shared fixtures. Settings need the Supabase and JWT values set before any
+app module is imported; tests never reach a real database.
+"""
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-anon-key")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+import pytest
+
+
+class FakeQuery:
+    """Records a PostgREST builder chain; ``execute`` returns canned rows"""
+
+    def __init__(self, table: str, calls: list, responses: dict):
+        self.table = table
+        self.calls = calls
+        self.responses = responses
+        self.operations = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.operations.append((name, args, kwargs))
+            return self
+        return record
+
+    def execute(self):
+        self.calls.append(self)
+        data = self.responses.get(self.table, [])
+        return type("Result", (), {"data": data(self) if callable(data) else data})()
+
+
+class FakeSupabase:
+    """Stand-in for SupabaseClient that keeps every executed query"""
+
+    def __init__(self):
+        self.calls = []
+        self.responses = {}
+        self.fail = None
+        self.client = self
+        self.service_client = self
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(name, self.calls, self.responses)
+
+    def rpc(self, name: str, params: dict) -> FakeQuery:
+        query = FakeQuery(f"rpc:{name}", self.calls, self.responses)
+        query.operations.append(("rpc", (name, params), {}))
+        return query
+
+    async def execute(self, query, label: str = "query"):
+        if self.fail:
+            raise self.fail
+        return query.execute()
+
+
+@pytest.fixture
+def fake_supabase() -> FakeSupabase:
+    return FakeSupabase()
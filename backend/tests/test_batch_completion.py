@@ -0,0 +1,180 @@
+"""
+Bulk completions: local concurrency and per-item failures, and provider
+batch jobs run against the mock batch server
+"""
+import asyncio
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+import mock_batch_server
+from app.api.v1.endpoints.ai import BatchCompletionRequest
+from app.core.config import settings
+from app.services import litellm_service as litellm_service_module
+from app.services.batch_client import ProviderBatchClient
+from app.services.litellm_service import litellm_service
+
+
+@pytest.fixture
+def batch_server(monkeypatch):
+    monkeypatch.setattr(mock_batch_server, "DELAY_SECONDS", 0)
+    monkeypatch.setattr(mock_batch_server, "files", {})
+    monkeypatch.setattr(mock_batch_server, "batches", {})
+    return httpx.ASGITransport(app=mock_batch_server.app)
+
+
+def _client(transport, **overrides) -> ProviderBatchClient:
+    return ProviderBatchClient("http://batch.test/v1", "sk-test", **{"poll_seconds": 0, "transport": transport, **overrides})
+
+
+def _request(content, **params):
+    return {"messages": [{"role": "user", "content": content}], **params}
+
+
+async def _collect(generator):
+    return [item async for item in generator]
+
+
+async def test_client_reads_outputs_and_per_item_errors(batch_server):
+    batch_id, outcomes = await _client(batch_server).run([
+        ("a", {"model": "gpt-3.5-turbo", **_request("Hello")}),
+        ("b", {"model": "gpt-3.5-turbo", **_request("[fail] please")})
+    ])
+
+    assert batch_id.startswith("batch_")
+    assert outcomes["a"]["body"]["choices"][0]["message"]["content"] == "Mock reply to: Hello"
+    assert outcomes["b"] == {"error": "Mock failure requested"}
+
+
+async def test_client_cancels_jobs_that_outlive_the_timeout(batch_server, monkeypatch):
+    monkeypatch.setattr(mock_batch_server, "DELAY_SECONDS", 3600)
+
+    with pytest.raises(Exception, match="did not finish"):
+        await _client(batch_server, timeout_seconds=-1).run([("a", {"model": "gpt-3.5-turbo", **_request("Hi")})])
+    assert [batch["status"] for batch in mock_batch_server.batches.values()] == ["cancelled"]
+
+
+async def test_local_batch_caps_concurrency_and_isolates_failures(monkeypatch):
+    running, peak = 0, 0
+
+    async def completion(messages, **params):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if "[fail]" in messages[0]["content"]:
+            raise Exception("LLM completion failed: boom")
+        return {"content": messages[0]["content"].upper()}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    requests = [_request(f"item {i}" + (" [fail]" if i == 3 else ""), id=f"r{i}") for i in range(10)]
+
+    items = await _collect(litellm_service.batch_completion(requests, concurrency=3))
+
+    assert peak == 3
+    assert sorted(item["index"] for item in items) == list(range(10))
+    failed = [item for item in items if not item["success"]]
+    assert [(item["id"], item["error"]) for item in failed] == [("r3", "LLM completion failed: boom")]
+    assert next(item for item in items if item["id"] == "r5")["result"]["content"] == "ITEM 5"
+
+
+async def test_provider_batch_runs_openai_models_remotely(batch_server, monkeypatch):
+    local_calls = []
+
+    async def completion(messages, model, **params):
+        local_calls.append(model)
+        return {"content": "local", "model": model}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    monkeypatch.setattr(settings, "LLM_BATCH_POLL_SECONDS", 0)
+    monkeypatch.setattr(
+        litellm_service_module, "ProviderBatchClient",
+        lambda api_base, api_key, **kwargs: ProviderBatchClient(api_base, api_key, **{**kwargs, "transport": batch_server})
+    )
+    requests = [
+        _request("Summarize this", model="openai/gpt-3.5-turbo", id="remote-ok"),
+        _request("[fail] this one", model="openai/gpt-3.5-turbo", id="remote-failed"),
+        _request("Stay local", model="anthropic/claude-3-haiku", id="local")
+    ]
+
+    items = {item["id"]: item for item in await _collect(litellm_service.batch_completion(requests, provider_batch=True))}
+
+    assert local_calls == ["anthropic/claude-3-haiku"]
+    remote = items["remote-ok"]["result"]
+    assert remote["content"] == "Mock reply to: Summarize this"
+    assert remote["batch_id"].startswith("batch_")
+    assert remote["usage"]["total_tokens"] == 7
+    full_price = litellm_service._calculate_cost("openai/gpt-3.5-turbo", remote["usage"])
+    assert remote["cost"] == pytest.approx(full_price * settings.LLM_BATCH_DISCOUNT, abs=1e-6)
+    assert items["remote-failed"] == {
+        "index": 1, "id": "remote-failed", "success": False, "error": "Mock failure requested"
+    }
+
+
+async def test_a_failed_provider_batch_fails_only_its_items(monkeypatch):
+    def unreachable(request):
+        raise httpx.ConnectError("connection refused")
+
+    async def completion(messages, model, **params):
+        return {"content": "local"}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    monkeypatch.setattr(
+        litellm_service_module, "ProviderBatchClient",
+        lambda api_base, api_key, **kwargs: ProviderBatchClient(
+            api_base, api_key, **{**kwargs, "transport": httpx.MockTransport(unreachable)}
+        )
+    )
+    requests = [_request("a", model="openai/gpt-4"), _request("b", model="anthropic/claude-3-haiku")]
+
+    items = sorted(await _collect(litellm_service.batch_completion(requests, provider_batch=True)), key=lambda item: item["index"])
+
+    assert items[0]["success"] is False
+    assert items[0]["error"].startswith("Provider batch failed: connection refused")
+    assert items[1]["result"]["content"] == "local"
+
+
+async def test_non_positive_concurrency_still_runs_every_item(monkeypatch):
+    async def completion(messages, **params):
+        return {"content": "ok"}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    requests = [_request(f"item {i}") for i in range(3)]
+
+    items = await asyncio.wait_for(_collect(litellm_service.batch_completion(requests, concurrency=-1)), timeout=5)
+    assert len(items) == 3
+
+
+def test_request_concurrency_is_validated():
+    with pytest.raises(ValidationError):
+        BatchCompletionRequest(requests=[], concurrency=-1)
+    with pytest.raises(ValidationError):
+        BatchCompletionRequest(requests=[], concurrency=settings.LLM_CONCURRENCY_MAX + 1)
+    assert BatchCompletionRequest(requests=[], concurrency=4).concurrency == 4
+
+
+async def test_routed_items_are_routed_locally(monkeypatch):
+    completions, routed = [], []
+
+    async def completion(messages, **params):
+        completions.append(params)
+        return {"content": "plain"}
+
+    async def routed_completion(messages, model, routing, **params):
+        routed.append((model, routing, params))
+        return {"content": "routed"}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    monkeypatch.setattr(litellm_service, "routed_completion", routed_completion)
+    requests = [
+        _request("a", model="openai/gpt-4", routing={"mode": "fallback"}, temperature=0),
+        _request("b", model="openai/gpt-4")
+    ]
+
+    items = await _collect(litellm_service.batch_completion(requests, provider_batch=False))
+
+    assert sorted(item["result"]["content"] for item in items) == ["plain", "routed"]
+    assert routed == [("openai/gpt-4", {"mode": "fallback"}, {"temperature": 0})]
+    assert all("routing" not in params for params in completions)
@@ -0,0 +1,168 @@
+"""
+Circuit breakers: opening on failure and slow-call rates, half-open
+trials, and outcomes the guard leaves out, such as the caller's own
+bad requests
+"""
+import asyncio
+
+import pytest
+
+from app.services import litellm_service as litellm_service_module
+from app.services.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError, is_caller_error
+)
+from app.services.litellm_service import litellm_service
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    return CircuitBreaker("model", **{"minimum_calls": 4, "open_seconds": 30, "half_open_calls": 2, **overrides})
+
+
+async def _fail(breaker: CircuitBreaker):
+    with pytest.raises(RuntimeError):
+        async with breaker.guard():
+            raise RuntimeError("provider down")
+
+
+async def _succeed(breaker: CircuitBreaker):
+    async with breaker.guard():
+        pass
+
+
+async def _succeed_slowly(breaker: CircuitBreaker):
+    async with breaker.guard():
+        await asyncio.sleep(10)
+
+
+async def test_opens_once_the_failure_rate_is_over_threshold():
+    breaker = _breaker()
+    await _succeed(breaker)
+    await _fail(breaker)
+    await _fail(breaker)
+    assert breaker.state == CLOSED  # too few calls to judge
+
+    await _succeed(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        await _succeed(breaker)
+    assert raised.value.retry_in > 29
+    assert breaker.get_stats()["rejected"] == 1
+
+
+async def test_slow_calls_open_the_breaker():
+    breaker = _breaker(slow_call_ms=1000, slow_call_rate_threshold=0.75)
+    for _ in range(4):
+        async with breaker.guard() as call:
+            call.latency_ms = 1500
+
+    assert breaker.state == OPEN
+
+
+async def test_half_open_trials_close_the_breaker():
+    breaker = _breaker(open_seconds=0)
+    for _ in range(4):
+        await _fail(breaker)
+    assert breaker.state == OPEN
+
+    await _succeed(breaker)
+    assert breaker.state == HALF_OPEN
+    await _succeed(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()["window_calls"] == 0
+
+
+async def test_a_failed_trial_reopens_the_breaker():
+    breaker = _breaker(open_seconds=0)
+    for _ in range(4):
+        await _fail(breaker)
+
+    await _fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.stats["opened"] == 2
+
+
+def test_half_open_admits_only_the_trial_calls():
+    breaker = _breaker(open_seconds=0)
+    breaker.state = OPEN
+    breaker.before_call()
+    breaker.before_call()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.after_call(None, 0)  # a trial left out frees its place
+    breaker.before_call()
+
+
+async def test_ignored_and_cancelled_calls_are_not_counted():
+    breaker = _breaker(minimum_calls=1)
+    with pytest.raises(RuntimeError):
+        async with breaker.guard() as call:
+            call.ignore()
+            raise RuntimeError("rate limited")
+
+    task = asyncio.ensure_future(_succeed_slowly(breaker))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert breaker.state == CLOSED
+    assert breaker.stats["calls"] == 0
+
+
+async def test_ok_false_counts_as_a_failure():
+    breaker = _breaker(minimum_calls=1)
+    async with breaker.guard() as call:
+        call.ok = False
+
+    assert breaker.state == OPEN
+
+
+async def test_registry_keeps_one_breaker_per_name_and_can_be_disabled():
+    registry = CircuitBreakerRegistry(minimum_calls=1)
+    with pytest.raises(RuntimeError):
+        async with registry.guard("api.example.com"):
+            raise RuntimeError("boom")
+
+    assert registry.state("api.example.com") == OPEN
+    assert registry.state("other.example.com") == CLOSED
+    assert list(registry.get_stats()) == ["api.example.com"]
+
+    disabled = CircuitBreakerRegistry(enabled=False, minimum_calls=1)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            async with disabled.guard("api.example.com"):
+                raise RuntimeError("boom")
+    assert disabled.get_stats() == {}
+
+
+class _ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"provider returned {status_code}")
+        self.status_code = status_code
+
+
+def test_caller_errors_are_4xx_other_than_timeouts_and_throttling():
+    assert is_caller_error(_ProviderError(400))
+    assert is_caller_error(_ProviderError(404))
+    assert not is_caller_error(_ProviderError(408))
+    assert not is_caller_error(_ProviderError(429))
+    assert not is_caller_error(_ProviderError(503))
+    assert not is_caller_error(RuntimeError("connection reset"))
+
+
+@pytest.mark.parametrize("status_code, state", [(400, CLOSED), (404, CLOSED), (500, OPEN)])
+async def test_bad_requests_do_not_open_the_model_breaker(monkeypatch, status_code, state):
+    registry = CircuitBreakerRegistry(minimum_calls=3)
+
+    async def acompletion(**params):
+        raise _ProviderError(status_code)
+
+    monkeypatch.setattr(litellm_service_module, "model_breakers", registry)
+    monkeypatch.setattr(litellm_service_module, "acompletion", acompletion)
+    request = {"model": "openai/gpt-3.5-turbo", "messages": [{"role": "user", "content": "Hi"}], "max_tokens": -1}
+    for _ in range(3):
+        with pytest.raises(_ProviderError):
+            await litellm_service._complete(request)
+
+    assert registry.state("openai/gpt-3.5-turbo") == state
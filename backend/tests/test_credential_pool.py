@@ -0,0 +1,129 @@
+"""
+API key pool: headroom-based routing, quarantine of bad keys and
+cooldown of rate-limited ones
+"""
+import asyncio
+
+import pytest
+
+from app.services.credential_pool import CredentialPool, classify_key_error
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _ProviderError(Exception):
+    def __init__(self, status_code, message="provider error", headers=None):
+        super().__init__(message)
+        self.response = _Response(status_code, headers)
+
+
+def test_key_errors_are_classified():
+    assert classify_key_error(_ProviderError(401)) == "auth"
+    assert classify_key_error(_ProviderError(400, "Incorrect API key provided (invalid_api_key)")) == "auth"
+    assert classify_key_error(_ProviderError(403, "Input was flagged by moderation")) is None
+    assert classify_key_error(_ProviderError(402)) == "quota"
+    assert classify_key_error(_ProviderError(400, "insufficient_quota for this key")) == "quota"
+    assert classify_key_error(_ProviderError(429)) == "rate_limit"
+    assert classify_key_error(_ProviderError(500)) is None
+    assert classify_key_error(ValueError("bad json")) is None
+
+
+def test_keys_are_deduplicated_and_labels_hide_them():
+    pool = CredentialPool(["sk-aaaa1111", "", "sk-aaaa1111", "sk-bbbb2222"])
+
+    assert len(pool) == 2
+    assert list(pool.get_stats()["credentials"]) == ["0:...1111", "1:...2222"]
+
+
+async def test_calls_spread_across_keys_by_headroom():
+    pool = CredentialPool(["sk-one", "sk-two"], rpm=10, tpm=10_000)
+    used = []
+    for _ in range(4):
+        async with pool.lease(100) as lease:
+            used.append(lease.key)
+
+    assert sorted(used) == ["sk-one", "sk-one", "sk-two", "sk-two"]
+
+
+async def test_empty_pool_leaves_the_key_to_litellm():
+    async with CredentialPool([]).lease(100) as lease:
+        assert lease.key is None
+        assert not lease.failed(_ProviderError(401))
+
+
+async def test_auth_failure_quarantines_the_key_and_retries_on_another():
+    pool = CredentialPool(["sk-bad1", "sk-good"], auth_quarantine=600)
+    async with pool.lease(10) as lease:
+        assert lease.key == "sk-bad1"
+        assert lease.failed(_ProviderError(401))
+
+    for _ in range(3):
+        async with pool.lease(10) as lease:
+            assert lease.key == "sk-good"
+    stats = pool.get_stats()
+    assert stats["available"] == 1
+    assert stats["credentials"]["0:...bad1"]["status"] == "quarantined_auth"
+
+
+async def test_errors_not_caused_by_the_key_keep_it_in_rotation():
+    pool = CredentialPool(["sk-only"])
+    async with pool.lease(10) as lease:
+        assert not lease.failed(_ProviderError(500))
+
+    assert pool.get_stats()["available"] == 1
+
+
+async def test_the_last_available_key_is_never_quarantined():
+    pool = CredentialPool(["sk-bad1", "sk-bad2"])
+    async with pool.lease(10) as lease:
+        assert lease.failed(_ProviderError(401))
+    async with pool.lease(10) as lease:
+        assert lease.key == "sk-bad2"
+        assert not lease.failed(_ProviderError(401))
+
+    async with pool.lease(10) as lease:
+        assert lease.key == "sk-bad2"
+    assert pool.get_stats()["credentials"]["1:...bad2"]["status"] == "healthy"
+
+
+async def test_a_flagged_prompt_does_not_take_the_only_key_out():
+    pool = CredentialPool(["sk-only"])
+    async with pool.lease(10) as lease:
+        assert not lease.failed(_ProviderError(403, "Input was flagged by moderation"))
+
+    async with pool.lease(10) as lease:
+        assert lease.key == "sk-only"
+    assert pool.get_stats()["available"] == 1
+
+
+async def test_rate_limited_keys_come_back_after_retry_after():
+    pool = CredentialPool(["sk-only"])
+    async with pool.lease(10) as lease:
+        assert not lease.failed(_ProviderError(429, headers={"retry-after": "0.05"}))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with pool.lease(10) as lease:
+        assert lease.key == "sk-only"
+    assert loop.time() - started >= 0.04
+
+
+async def test_cancelled_lease_refunds_the_reservation():
+    pool = CredentialPool(["sk-only"], rpm=60, tpm=1000)
+    async with pool.lease(1000) as lease:
+        lease.record_usage(1000)
+
+    waiting = asyncio.ensure_future(pool.lease(500).__aenter__())
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    stats = pool.get_stats()["credentials"]["0:...only"]
+    assert stats["tokens_available"] == pytest.approx(0.0, abs=5)
+    assert stats["requests_available"] == pytest.approx(59.0, abs=0.1)
+    assert stats["in_flight"] == 0
@@ -0,0 +1,84 @@
+"""
+ETags for workflow and execution reads
+"""
+from datetime import datetime, timedelta
+
+from app.core.http_cache import ETagRegistry
+from app.models.execution import ExecutionStatus, WorkflowExecution
+from app.models.workflow import Workflow
+from app.services import execution_service as execution_service_module
+from app.services.execution_service import ExecutionService, execution_etag
+from app.services.workflow_service import workflow_etag
+
+
+def _execution(**overrides) -> WorkflowExecution:
+    fields = {"id": "ex-1", "workflow_id": "wf-1", "user_id": "user-1", "input_data": {}}
+    fields.update(overrides)
+    return WorkflowExecution(**fields)
+
+
+def _row(**overrides) -> dict:
+    row = {
+        "id": "ex-1", "workflow_id": "wf-1", "user_id": "user-1", "input_data": {},
+        "status": "completed", "progress": 1.0, "current_node_id": "end",
+        "started_at": "2024-01-01T00:00:00", "completed_at": "2024-01-01T00:00:05"
+    }
+    row.update(overrides)
+    return row
+
+
+def test_registry_only_answers_the_owner_and_stays_bounded():
+    registry = ETagRegistry(max_entries=2)
+    registry.set("a", "user-1", '"1"')
+
+    assert registry.get("a", "user-1") == '"1"'
+    assert registry.get("a", "user-2") is None
+
+    registry.set("b", "user-1", '"2"')
+    registry.get("a", "user-1")  # refresh a, so b is the oldest
+    registry.set("c", "user-1", '"3"')
+    assert registry.get("b", "user-1") is None
+    assert len(registry) == 2
+
+
+def test_workflow_etag_changes_on_save():
+    now = datetime(2024, 1, 1)
+    workflow = Workflow.from_stored(
+        {"nodes": [], "edges": [], "variables": []},
+        id="wf-1", user_id="user-1", name="Flow", version=1, created_at=now, updated_at=now
+    )
+    saved = workflow.model_copy(update={"version": 2, "updated_at": now + timedelta(seconds=1)})
+
+    assert workflow_etag(workflow) == workflow_etag(workflow.model_copy())
+    assert workflow_etag(workflow) != workflow_etag(saved)
+
+
+def test_execution_etag_follows_polled_state_only():
+    running = _execution(status=ExecutionStatus.RUNNING, progress=0.5, current_node_id="llm")
+
+    assert execution_etag(running) == execution_etag(running.model_copy(update={"progress": 0.501}))
+    assert execution_etag(running) != execution_etag(running.model_copy(update={"progress": 0.75}))
+    assert execution_etag(running) != execution_etag(running.model_copy(update={"current_node_id": "end"}))
+
+
+async def test_stored_and_in_process_executions_share_an_etag(fake_supabase, monkeypatch):
+    registry = ETagRegistry()
+    monkeypatch.setattr(execution_service_module, "execution_etags", registry)
+    fake_supabase.responses["workflow_executions"] = [_row()]
+
+    stored = await ExecutionService(fake_supabase).get_execution("ex-1", "user-1")
+    in_process = _execution(status=ExecutionStatus.COMPLETED, progress=1.0, current_node_id="end")
+
+    assert execution_etag(stored) == execution_etag(in_process)
+    # Finished executions never change, so their ETag is kept for query-free 304s
+    assert registry.get("ex-1", "user-1") == execution_etag(stored)
+
+
+async def test_running_executions_read_from_the_database_are_not_registered(fake_supabase, monkeypatch):
+    registry = ETagRegistry()
+    monkeypatch.setattr(execution_service_module, "execution_etags", registry)
+    fake_supabase.responses["workflow_executions"] = [_row(status="running", progress=0.4, completed_at=None)]
+
+    await ExecutionService(fake_supabase).get_execution("ex-1", "user-1")
+
+    assert registry.get("ex-1", "user-1") is None
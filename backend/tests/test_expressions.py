@@ -0,0 +1,102 @@
+"""
+Condition expression language: parsing, evaluation, structured conditions
+and the guards on regular expressions
+"""
+import time
+
+import pytest
+
+from app.services.expressions import (
+    MAX_PATTERN_LENGTH, ConditionSet, ExpressionError, compile_condition, compile_expression
+)
+
+
+def _evaluate(source: str, **variables):
+    return compile_expression(source).evaluate(variables.get)
+
+
+def test_comparisons_coerce_numeric_strings():
+    assert _evaluate("score > 3 and score <= 10", score="7")
+    assert _evaluate('status == "done" or retries >= 3', status="open", retries=3)
+    assert not _evaluate("not (len(items) > 2)", items=[1, 2, 3])
+    assert _evaluate('lower(trim(name)) == "ada"', name="  ADA ")
+
+
+def test_variables_are_collected():
+    assert compile_expression("a.b > 1 and {{c}} contains d").variables == ("a.b", "c", "d")
+
+
+@pytest.mark.parametrize("source", ["__import__('os')", "a +", "unknown(a)", "a ==", "(" * 40 + "a" + ")" * 40])
+def test_invalid_expressions_are_rejected(source):
+    with pytest.raises(ExpressionError):
+        compile_expression(source)
+
+
+def test_structured_conditions():
+    condition = compile_condition({"variable_selector": ["llm", "text"], "comparison_operator": "start with", "value": "Yes"})
+    assert condition.evaluate({"llm.text": "Yes, approved"}.get)
+    assert compile_condition({"variable": "notes", "comparison_operator": "is empty"}).evaluate({}.get)
+
+    conditions = ConditionSet(
+        [{"variable": "a", "operator": ">", "value": 1}, {"variable": "b", "operator": "is", "value": "x"}],
+        logical_operator="or"
+    )
+    result, results = conditions.evaluate({"a": 0, "b": "x"}.get)
+    assert result and [value for _, value in results] == [False, True]
+
+
+def test_compile_errors_surface_when_the_node_runs():
+    conditions = ConditionSet([{"variable": "a", "operator": "resembles", "value": 1}])
+    assert conditions.error
+    with pytest.raises(ExpressionError):
+        conditions.evaluate({}.get)
+
+
+def test_regex_match():
+    assert _evaluate('email matches "^[a-z]+@example\\\\.com$"', email="ada@example.com")
+    assert not _evaluate('email matches "^[a-z]+@example\\\\.com$"', email="ada@example.org")
+
+
+@pytest.mark.parametrize("pattern", [
+    "(a+)+$", "(a*)*b", "(?:ab*)+c", "(x+x+)+y", "(a)\\\\1", "(?P<q>a)(?P=q)",
+    "(a|a)*b", "(?:cat|dog|cat)+s", "(a?){25}", "(a|)*",
+    "\\\\d*\\\\d*\\\\d*\\\\d*\\\\d*x", "\\\\d+\\\\.?\\\\d+", "(\\\\w*)(\\\\d*)x", ".*\\\\d+"
+])
+def test_backtracking_patterns_are_rejected_at_compile_time(pattern):
+    with pytest.raises(ExpressionError):
+        compile_expression(f'text matches "{pattern}"')
+
+
+@pytest.mark.parametrize("pattern", [
+    "^[a-z]+@example\\\\.com$", "\\\\d+(\\\\.\\\\d+)?", "(foo|bar)+", "\\\\w+\\\\s+\\\\w+", "colou?r", "https?://\\\\S+"
+])
+def test_ordinary_patterns_are_accepted(pattern):
+    compile_expression(f'text matches "{pattern}"')
+
+
+@pytest.mark.parametrize("pattern, subject", [("(a|a)*b", "a" * 26), (r"\d*\d*\d*\d*\d*x", "1" * 200)])
+def test_reported_redos_patterns_match_nothing_quickly(pattern, subject):
+    started = time.perf_counter()
+    assert not compile_expression("text matches pattern").evaluate({"text": subject, "pattern": pattern}.get)
+    assert time.perf_counter() - started < 0.1
+
+
+def test_overlong_patterns_are_rejected():
+    with pytest.raises(ExpressionError, match="longer than"):
+        compile_condition({"variable": "text", "operator": "matches", "value": "a" * (MAX_PATTERN_LENGTH + 1)})
+
+
+def test_unsafe_dynamic_patterns_match_nothing_quickly():
+    expression = compile_expression("text matches pattern")
+    started = time.perf_counter()
+
+    assert not expression.evaluate({"text": "a" * 50 + "!", "pattern": "(a+)+$"}.get)
+    assert not expression.evaluate({"text": "a", "pattern": "a" * (MAX_PATTERN_LENGTH + 1)}.get)
+    assert not expression.evaluate({"text": "a", "pattern": "(unclosed"}.get)
+    assert expression.evaluate({"text": "order 42", "pattern": "\\d+"}.get)
+    assert time.perf_counter() - started < 1
+
+
+def test_only_the_start_of_long_subjects_is_searched():
+    assert not _evaluate('text matches "needle"', text="x" * 20000 + "needle")
+    assert _evaluate('text matches "needle"', text="needle" + "x" * 20000)
@@ -0,0 +1,84 @@
+"""
+Precomputed responses and conditional GET helpers
+"""
+import gzip
+import json
+
+from starlette.requests import Request
+
+from app.core.http_cache import PrecomputedResponse, accepts_gzip, if_none_match
+from app.services.workflow_service import template_catalog, template_catalog_response
+
+
+def _request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+
+
+def _payload() -> dict:
+    return {"items": [{"id": i, "name": f"Item {i}"} for i in range(200)]}
+
+
+def test_body_is_encoded_once_with_a_gzip_variant():
+    response = PrecomputedResponse(_payload())
+
+    assert json.loads(response.body) == _payload()
+    assert gzip.decompress(response.gzip_body) == response.body
+    assert response.gzip_etag != response.etag
+
+
+def test_small_bodies_are_not_compressed():
+    response = PrecomputedResponse({"ok": True})
+
+    rendered = response.render(_request(accept_encoding="gzip"))
+    assert response.gzip_body is None
+    assert "content-encoding" not in rendered.headers
+
+
+def test_gzip_is_served_only_when_accepted():
+    response = PrecomputedResponse(_payload())
+
+    compressed = response.render(_request(accept_encoding="br, gzip"))
+    plain = response.render(_request(accept_encoding="gzip;q=0"))
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == response.gzip_etag
+    assert compressed.body == response.gzip_body
+    assert plain.body == response.body
+    assert plain.headers["etag"] == response.etag
+    assert plain.headers["vary"] == "Accept-Encoding"
+
+
+def test_matching_etag_of_either_encoding_is_not_modified():
+    response = PrecomputedResponse(_payload())
+
+    for etag in (response.etag, response.gzip_etag, "W/" + response.etag, f'"other", {response.etag}'):
+        rendered = response.render(_request(if_none_match=etag, accept_encoding="gzip"))
+        assert rendered.status_code == 304
+        assert rendered.body == b""
+        assert rendered.headers["etag"] == response.gzip_etag
+
+    assert response.render(_request(if_none_match='"stale"')).status_code == 200
+
+
+def test_header_parsing():
+    assert if_none_match(_request(if_none_match="*"), '"abc"')
+    assert not if_none_match(_request(), '"abc"')
+    assert accepts_gzip(_request(accept_encoding="*"))
+    assert not accepts_gzip(_request(accept_encoding="identity"))
+
+
+def test_template_catalogue_is_stable_and_precomputed():
+    catalog = template_catalog()
+
+    assert catalog["count"] == len(catalog["templates"])
+    assert catalog["categories"] == sorted(catalog["categories"])
+    assert template_catalog_response() is template_catalog_response()
+    # Import-time timestamps would make the ETag differ between workers
+    for template in catalog["templates"]:
+        for node in template["workflow"]["nodes"]:
+            assert "created_at" not in node
@@ -0,0 +1,86 @@
+"""
+Shared LLM connection pool: sizing, pre-warming and stats that survive
+changes to httpcore's private pool
+"""
+from app.core.config import settings
+from app.services.http_client import PooledHttpClient, llm_http_client
+
+
+class _Connection:
+    def __init__(self, idle=True, info="HTTP/2", broken=False):
+        self.idle = idle
+        self.description = info
+        self.broken = broken
+
+    def is_idle(self):
+        if self.broken:
+            raise RuntimeError("connection state changed")
+        return self.idle
+
+    def info(self):
+        return self.description
+
+
+class _Pool:
+    def __init__(self, connections):
+        self.connections = connections
+
+
+class _Transport:
+    def __init__(self, pool=None):
+        if pool is not None:
+            self._pool = pool
+
+    async def aclose(self):
+        pass
+
+
+def test_pool_is_sized_for_all_models_together():
+    assert llm_http_client.max_connections == settings.LLM_HTTP_MAX_CONNECTIONS
+    assert settings.LLM_HTTP_MAX_CONNECTIONS > settings.LLM_CONCURRENCY_MAX
+
+
+async def test_stats_count_pooled_connections():
+    pool = PooledHttpClient(max_connections=8)
+    client = pool.get_client()
+    client._transport = _Transport(_Pool([
+        _Connection(idle=True, info="HTTP/2"),
+        _Connection(idle=False, info="HTTP/1.1"),
+        _Connection(broken=True)
+    ]))
+
+    stats = pool.get_stats()
+    assert (stats["connections"], stats["idle_connections"], stats["http2_connections"]) == (3, 1, 1)
+    assert stats["max_connections"] == 8
+    await pool.close()
+
+
+async def test_stats_degrade_when_the_private_pool_is_missing():
+    pool = PooledHttpClient()
+    client = pool.get_client()
+    client._transport = _Transport()
+    assert pool.get_stats()["connections"] == 0
+
+    client._transport = _Transport(_Pool(None))
+    assert pool.get_stats()["connections"] == 0
+    await pool.close()
+    assert "connections" not in pool.get_stats()
+
+
+async def test_a_real_pool_starts_empty():
+    pool = PooledHttpClient()
+    pool.get_client()
+
+    stats = pool.get_stats()
+    assert (stats["connections"], stats["idle_connections"]) == (0, 0)
+    await pool.close()
+
+
+async def test_failed_prewarm_is_counted_not_raised():
+    pool = PooledHttpClient(http2=False, warm_urls=["http://127.0.0.1:9"], warm_connections=2)
+
+    client = await pool.start()
+    assert client is pool.get_client()
+    assert pool.stats["prewarmed"] == 0
+    assert pool.stats["prewarm_ms"] is not None
+    await pool.close()
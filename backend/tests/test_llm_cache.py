@@ -0,0 +1,210 @@
+"""
+Exact-match completion cache and in-flight coalescing: keys, backends,
+SingleFlight and how the completion service uses them
+"""
+import asyncio
+import time
+
+from app.services import litellm_service as litellm_service_module
+from app.services.litellm_service import litellm_service
+from app.services.llm_cache import (
+    CompletionCache, MemoryCacheBackend, SQLiteCacheBackend, SingleFlight, completion_cache_key
+)
+
+_MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def test_key_ignores_transport_params_only():
+    key = completion_cache_key("gpt-4", _MESSAGES, 0, 100, {"stream": True, "api_key": "sk-1"})
+
+    assert key == completion_cache_key("gpt-4", _MESSAGES, 0.0, 100, {"timeout": 5})
+    assert key != completion_cache_key("gpt-4", _MESSAGES, 0, 100, {"top_p": 0.5})
+    assert key != completion_cache_key("gpt-4", _MESSAGES, 0, 200)
+    assert key != completion_cache_key("gpt-4o", _MESSAGES, 0, 100)
+
+
+async def test_memory_backend_evicts_by_count_and_size():
+    backend = MemoryCacheBackend(max_entries=2, max_bytes=10)
+    await backend.set("a", "1234", 60)
+    await backend.set("b", "1234", 60)
+    await backend.get("a")  # a is now the most recently used
+    await backend.set("c", "1234", 60)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == "1234"
+
+    await backend.set("d", "12345678", 60)
+    assert backend.get_stats()["bytes"] <= 10
+    await backend.set("huge", "x" * 11, 60)
+    assert await backend.get("huge") is None
+
+
+async def test_memory_backend_expires_entries(monkeypatch):
+    backend = MemoryCacheBackend()
+    await backend.set("a", "value", 10)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert await backend.get("a") is None
+    assert backend.get_stats()["entries"] == 0
+
+
+async def test_sqlite_backend_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache" / "llm.sqlite3")
+    backend = SQLiteCacheBackend(path, max_bytes=12)
+    await backend.set("a", "12345", 60)
+    await backend.set("b", "12345", 60)
+    await backend.set("c", "12345", 60)
+
+    reopened = SQLiteCacheBackend(path)
+    assert await reopened.get("a") is None  # least recently used went first
+    assert await reopened.get("c") == "12345"
+    assert backend.get_stats()["evictions"] == 1
+
+    await backend.set("d", "x", -1)
+    assert await reopened.get("d") is None
+
+
+async def test_completion_cache_round_trips_and_counts():
+    cache = CompletionCache(MemoryCacheBackend())
+    await cache.set("k", {"content": "Hello", "cost": 0.01})
+
+    assert await cache.get("k") == {"content": "Hello", "cost": 0.01}
+    assert await cache.get("missing") is None
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+
+async def test_broken_backend_never_fails_the_call():
+    class Broken:
+        async def get(self, key):
+            raise OSError("disk gone")
+
+        async def set(self, key, value, ttl_seconds):
+            raise OSError("disk gone")
+
+        def get_stats(self):
+            return {}
+
+    cache = CompletionCache(Broken())
+    await cache.set("k", {"content": "x"})
+
+    assert await cache.get("k") is None
+    assert cache.get_stats()["errors"] == 2
+
+
+async def test_deterministic_completions_are_served_from_the_cache(monkeypatch):
+    calls = []
+
+    async def complete(request_data):
+        calls.append(request_data)
+        return {"content": f"answer {len(calls)}", "model": request_data["model"], "usage": {}, "cost": 0.02}
+
+    monkeypatch.setattr(litellm_service_module, "completion_cache", CompletionCache(MemoryCacheBackend()))
+    monkeypatch.setattr(litellm_service, "_complete", complete)
+
+    first = await litellm_service.completion(_MESSAGES, model="openai/gpt-4", temperature=0)
+    second = await litellm_service.completion(_MESSAGES, model="openai/gpt-4", temperature=0)
+    sampled = await litellm_service.completion(_MESSAGES, model="openai/gpt-4", temperature=0.7)
+    uncached = await litellm_service.completion(_MESSAGES, model="openai/gpt-4", temperature=0, cache=False)
+
+    assert (first["cache"], second["cache"], sampled["cache"], uncached["cache"]) == ("miss", "hit", "bypass", "bypass")
+    assert second["content"] == first["content"]
+    assert second["cost"] == 0.0
+    assert len(calls) == 3
+
+
+def _gated_call(calls, gate):
+    async def call():
+        calls.append(1)
+        await gate.wait()
+        return {"content": "shared", "cost": 0.5, "tags": []}
+    return call
+
+
+async def test_concurrent_identical_calls_share_one_call():
+    flights, calls, gate = SingleFlight(), [], asyncio.Event()
+    call = _gated_call(calls, gate)
+
+    tasks = [asyncio.ensure_future(flights.run("k", call)) for _ in range(3)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(calls) == 1
+    assert [leader for _, leader in results] == [True, False, False]
+    results[0][0]["tags"].append("mutated")
+    assert results[1][0]["tags"] == []  # every caller has its own copy
+    assert flights.get_stats()["saved_cost"] == 1.0
+    assert flights.get_stats()["in_flight"] == 0
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    flights, calls, gate = SingleFlight(), [], asyncio.Event()
+    call = _gated_call(calls, gate)
+
+    leader = asyncio.ensure_future(flights.run("k", call))
+    follower = asyncio.ensure_future(flights.run("k", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    gate.set()
+
+    result, _ = await follower
+    assert result["content"] == "shared"
+    assert len(calls) == 1
+
+
+async def test_abandoned_call_is_forgotten_at_once():
+    flights, calls, gate = SingleFlight(), [], asyncio.Event()
+    call = _gated_call(calls, gate)
+
+    only = asyncio.ensure_future(flights.run("k", call))
+    await asyncio.sleep(0)
+    only.cancel()
+    await asyncio.sleep(0)
+
+    # The abandoned task may not have finished cancelling; a new caller must not join it
+    assert flights.get_stats()["in_flight"] == 0
+    gate.set()
+    result, leader = await flights.run("k", call)
+    assert leader and result["content"] == "shared"
+    assert len(calls) == 2
+
+
+async def test_failures_reach_every_caller():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(flights.run("k", call), flights.run("k", call), return_exceptions=True)
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert flights.get_stats()["in_flight"] == 0
+
+
+async def test_only_cacheable_requests_are_coalesced(monkeypatch):
+    calls, gate = [], asyncio.Event()
+
+    async def complete(request_data):
+        calls.append(request_data["temperature"])
+        number = len(calls)
+        await gate.wait()
+        return {"content": f"sample {number}", "model": request_data["model"], "usage": {}, "cost": 0.02}
+
+    monkeypatch.setattr(litellm_service_module, "completion_cache", CompletionCache(MemoryCacheBackend(), enabled=False))
+    monkeypatch.setattr(litellm_service_module, "completion_flights", SingleFlight())
+    monkeypatch.setattr(litellm_service, "_complete", complete)
+
+    requests = [
+        litellm_service.completion(_MESSAGES, model="openai/gpt-4", temperature=temperature)
+        for temperature in (0, 0, 0.7, 0.7)
+    ]
+    tasks = [asyncio.ensure_future(request) for request in requests]
+    await asyncio.sleep(0.01)
+    gate.set()
+    results = await asyncio.gather(*tasks)
+
+    assert sorted(calls) == [0, 0.7, 0.7]
+    assert [result["cache"] for result in results] == ["bypass", "coalesced", "bypass", "bypass"]
+    assert results[2]["content"] != results[3]["content"]
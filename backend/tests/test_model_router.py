@@ -0,0 +1,113 @@
+"""
+Model routing: policies from node config, fallback, latency ranking and
+hedged requests
+"""
+import asyncio
+
+import pytest
+
+from app.services.model_router import ModelHealthTracker, ModelRouter, RoutingPolicy
+
+
+def _caller(latencies, failures=(), calls=None):
+    calls = [] if calls is None else calls
+
+    async def call(model):
+        calls.append(model)
+        await asyncio.sleep(latencies.get(model, 0))
+        if model in failures:
+            raise RuntimeError(f"{model} down")
+        return {"content": model}
+    return call
+
+
+def test_policy_from_config():
+    policy = RoutingPolicy.from_config({"mode": "fastest", "models": ["b", "a", "c"]}, "a", ["x"])
+    assert (policy.mode, policy.models) == ("fastest", ["a", "b", "c"])
+
+    assert RoutingPolicy.from_config({}, "a", ["x", "a"]).models == ["a", "x"]
+    with pytest.raises(ValueError, match="Unknown routing mode"):
+        RoutingPolicy.from_config({"mode": "random"}, "a", [])
+
+
+def test_health_scores_need_samples_and_penalise_errors():
+    tracker = ModelHealthTracker()
+    for _ in range(4):
+        tracker.record("slow", 900, True)
+    assert tracker.get("slow").percentile(0.5) is None
+    tracker.record("slow", 900, True)
+    for _ in range(5):
+        tracker.record("flaky", 300, True)
+    for _ in range(15):
+        tracker.record("flaky", 300, False)
+
+    assert tracker.get("flaky").score() == pytest.approx(300 * 4)
+    assert tracker.rank(["slow", "flaky", "new"]) == ["new", "slow", "flaky"]
+
+
+async def test_fallback_tries_models_in_order():
+    router = ModelRouter(ModelHealthTracker())
+    calls = []
+    result = await router.route(RoutingPolicy("fallback", ["a", "b", "c"]), _caller({}, failures={"a"}, calls=calls))
+
+    assert calls == ["a", "b"]
+    assert result["content"] == "b"
+    assert result["routing"] == {"mode": "fallback", "model": "b", "failed": ["a: a down"]}
+
+
+async def test_all_models_failing_raises():
+    router = ModelRouter(ModelHealthTracker())
+    with pytest.raises(Exception, match="All routed models failed: a: a down; b: b down"):
+        await router.route(RoutingPolicy("fallback", ["a", "b"]), _caller({}, failures={"a", "b"}))
+
+
+async def test_fastest_routes_to_the_best_scoring_model():
+    tracker = ModelHealthTracker()
+    for _ in range(5):
+        tracker.record("a", 800, True)
+        tracker.record("b", 200, True)
+    calls = []
+    result = await ModelRouter(tracker).route(RoutingPolicy("fastest", ["a", "b"]), _caller({}, calls=calls))
+
+    assert calls == ["b"]
+    assert result["routing"]["model"] == "b"
+
+
+async def test_hedge_races_a_second_model_and_cancels_the_loser():
+    router = ModelRouter(ModelHealthTracker())
+    cancelled = []
+
+    async def call(model):
+        try:
+            await asyncio.sleep({"a": 1.0, "b": 0.01}[model])
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return {"content": model}
+
+    result = await router.route(RoutingPolicy("hedge", ["a", "b"], hedge_after_ms=20), call)
+    await asyncio.sleep(0)
+
+    assert result["routing"] == {"mode": "hedge", "model": "b", "failed": []}
+    assert cancelled == ["a"]
+    assert (router.stats["hedges"], router.stats["hedge_wins"]) == (1, 1)
+
+
+async def test_hedge_does_not_fire_when_the_primary_is_fast():
+    router = ModelRouter(ModelHealthTracker())
+    calls = []
+    result = await router.route(RoutingPolicy("hedge", ["a", "b"], hedge_after_ms=200), _caller({"a": 0.01}, calls=calls))
+
+    assert calls == ["a"]
+    assert result["routing"]["model"] == "a"
+    assert router.stats["hedges"] == 0
+
+
+async def test_hedge_falls_back_at_once_when_the_primary_fails():
+    router = ModelRouter(ModelHealthTracker())
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await router.route(RoutingPolicy("hedge", ["a", "b"], hedge_after_ms=5000), _caller({}, failures={"a"}))
+
+    assert result["routing"] == {"mode": "hedge", "model": "b", "failed": ["a: a down"]}
+    assert loop.time() - started < 1
@@ -0,0 +1,55 @@
+"""
+Keyset pagination cursors and projected list queries
+"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database.pagination import decode_cursor, encode_cursor, keyset_condition
+from app.main import app
+from app.services.workflow_service import WORKFLOW_SUMMARY_COLUMNS, WorkflowService
+
+
+def test_cursor_round_trips():
+    cursor = encode_cursor(datetime(2024, 5, 1, 12, 30), "3f1c2a7e-0000-4000-8000-000000000001")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2024-05-01T12:30:00", "3f1c2a7e-0000-4000-8000-000000000001")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor(datetime(2024, 5, 1), "x),user_id.neq.(y"),
+])
+def test_malformed_or_injected_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_keyset_condition_continues_after_the_cursor_row():
+    cursor = encode_cursor(datetime(2024, 5, 1), "abc")
+    assert keyset_condition("updated_at", cursor) == (
+        'updated_at.lt."2024-05-01T00:00:00",and(updated_at.eq."2024-05-01T00:00:00",id.lt.abc)'
+    )
+
+
+async def test_list_pages_select_summary_columns_only(fake_supabase):
+    fake_supabase.responses["workflows"] = []
+    service = WorkflowService(fake_supabase)
+
+    await service.list_workflows("user-1", limit=10, cursor=encode_cursor(datetime(2024, 5, 1), "abc"))
+
+    [query] = fake_supabase.calls
+    operations = {name: args for name, args, _ in query.operations}
+    assert operations["select"] == (WORKFLOW_SUMMARY_COLUMNS,)
+    assert "workflow_data" not in WORKFLOW_SUMMARY_COLUMNS
+    assert operations["limit"] == (10,)
+    assert "range" not in operations
+    assert "id.lt.abc" in operations["or_"][0]
+
+
+def test_browsers_may_read_the_cursor_header():
+    response = TestClient(app).get("/health", headers={"Origin": "http://localhost:3000"})
+
+    exposed = {name.strip().lower() for name in response.headers["access-control-expose-headers"].split(",")}
+    assert {"x-next-cursor", "etag"} <= exposed
@@ -0,0 +1,168 @@
+"""
+Write-behind buffer: batching, coalescing, retries, and the execution
+service that feeds it
+"""
+from datetime import datetime
+
+import pytest
+
+from app.models.execution import ExecutionEvent, ExecutionEventType, ExecutionStatus, WorkflowExecution
+from app.models.workflow import Workflow
+from app.services import persistence_service, workflow_execution_service
+from app.services.persistence_service import WriteBehindBuffer
+from app.services.version_store import WorkflowVersionStore
+
+
+def _execution(execution_id: str, **fields) -> WorkflowExecution:
+    return WorkflowExecution(id=execution_id, workflow_id="wf-1", user_id="user-1", **fields)
+
+
+@pytest.fixture
+async def make_buffer(fake_supabase):
+    """Buffers whose lazily started flusher is stopped after the test"""
+    buffers = []
+
+    def make(**options) -> WriteBehindBuffer:
+        buffers.append(WriteBehindBuffer(fake_supabase, **options))
+        return buffers[-1]
+
+    yield make
+    for buffer in buffers:
+        fake_supabase.fail = None
+        await buffer.stop(timeout=1)
+
+
+def _upserts(fake_supabase, table: str):
+    return [
+        args[0]
+        for query in fake_supabase.calls if query.table == table
+        for name, args, _ in query.operations if name == "upsert"
+    ]
+
+
+async def test_status_rows_in_one_batch_share_columns(fake_supabase, make_buffer):
+    buffer = make_buffer(batch_size=50)
+    buffer.record_status(_execution("exec-running", status=ExecutionStatus.RUNNING))
+    buffer.record_status(_execution(
+        "exec-done",
+        status=ExecutionStatus.COMPLETED,
+        started_at=datetime(2024, 1, 1, 12, 0),
+        completed_at=datetime(2024, 1, 1, 12, 1),
+        output_data={"answer": 42},
+        total_tokens_used=10,
+        total_cost=0.5
+    ))
+    await buffer.flush()
+
+    [rows] = _upserts(fake_supabase, "workflow_executions")
+    assert len({frozenset(row) for row in rows}) == 1
+    done = next(row for row in rows if row["id"] == "exec-done")
+    assert done["completed_at"] == "2024-01-01T12:01:00"
+    assert done["output_data"] == {"answer": 42}
+    running = next(row for row in rows if row["id"] == "exec-running")
+    assert running["completed_at"] is None
+
+
+async def test_status_updates_coalesce_to_latest(fake_supabase, make_buffer):
+    buffer = make_buffer()
+    execution = _execution("exec-1", status=ExecutionStatus.RUNNING)
+    buffer.record_status(execution)
+    execution.status = ExecutionStatus.COMPLETED
+    execution.progress = 1.0
+    buffer.record_status(execution)
+    assert buffer.pending == 1
+
+    await buffer.flush()
+    [[row]] = _upserts(fake_supabase, "workflow_executions")
+    assert row["status"] == "completed"
+    assert row["progress"] == 1.0
+
+
+async def test_rows_are_chunked_by_batch_size(fake_supabase, make_buffer):
+    buffer = make_buffer(batch_size=3)
+    for i in range(7):
+        buffer.record_event(ExecutionEvent(execution_id="exec-1", type=ExecutionEventType.PROGRESS_UPDATE, message=str(i)))
+    await buffer.flush()
+
+    assert [len(chunk) for chunk in _upserts(fake_supabase, "execution_events")] == [3, 3, 1]
+    assert buffer.stats["events_written"] == 7
+
+
+async def test_failed_flush_requeues_without_overwriting_newer_status(fake_supabase, make_buffer):
+    buffer = make_buffer()
+    execution = _execution("exec-1", status=ExecutionStatus.RUNNING)
+    buffer.record_status(execution)
+    buffer.record_event(ExecutionEvent(execution_id="exec-1", type=ExecutionEventType.WORKFLOW_STARTED))
+
+    fake_supabase.fail = Exception("connection reset")
+    await buffer.flush()
+    assert buffer.stats["failed_flushes"] == 1
+    assert buffer.pending == 2
+
+    execution.status = ExecutionStatus.COMPLETED
+    buffer.record_status(execution)
+    fake_supabase.fail = None
+    await buffer.flush()
+
+    [[row]] = _upserts(fake_supabase, "workflow_executions")
+    assert row["status"] == "completed"
+    assert buffer.pending == 0
+
+
+async def test_requeue_drops_oldest_past_max_pending(fake_supabase, make_buffer):
+    buffer = make_buffer(max_pending=3)
+    for i in range(5):
+        buffer.record_event(ExecutionEvent(execution_id="exec-1", type=ExecutionEventType.PROGRESS_UPDATE, message=str(i)))
+    fake_supabase.fail = Exception("down")
+    await buffer.flush()
+
+    assert buffer.pending == 3
+    assert buffer.stats["dropped_rows"] == 2
+    assert [event["message"] for event in buffer._events] == ["2", "3", "4"]
+
+
+async def test_stop_flushes_pending_rows(fake_supabase, make_buffer):
+    buffer = make_buffer(flush_interval_ms=60000)
+    await buffer.start()
+    buffer.record_status(_execution("exec-1"))
+    await buffer.stop(timeout=1)
+
+    assert buffer.pending == 0
+    assert buffer.stats["status_updates_written"] == 1
+
+
+async def test_workflow_execution_service_persists_history(fake_supabase, make_buffer, monkeypatch):
+    buffer = make_buffer()
+    monkeypatch.setattr(persistence_service, "write_behind_buffer", buffer)
+    monkeypatch.setattr(workflow_execution_service, "write_behind_buffer", buffer)
+
+    monkeypatch.setattr(workflow_execution_service, "workflow_version_store", WorkflowVersionStore(fake_supabase))
+
+    now = datetime.utcnow()
+    workflow = Workflow(
+        id="wf-1", user_id="user-1", name="Echo", version_hash="hash-1", created_at=now, updated_at=now,
+        nodes=[
+            {"id": "start", "type": "start", "position": {"x": 0, "y": 0}},
+            {"id": "answer", "type": "answer", "position": {"x": 1, "y": 0}, "data": {"template": "{{query}}"}}
+        ],
+        edges=[{"source": "start", "target": "answer"}]
+    )
+    service = workflow_execution_service.WorkflowExecutionService(fake_supabase)
+    events = [event async for event in service.execute_workflow(workflow, {"query": "hi"}, "user-1")]
+    assert events[-1]["type"] == "execution_completed"
+    await buffer.flush()
+
+    [[status]] = _upserts(fake_supabase, "workflow_executions")
+    assert status["id"] == events[0]["execution_id"]
+    assert status["status"] == "completed"
+    assert status["workflow_version_hash"] == "hash-1"
+    assert status["completed_at"] is not None
+    [logs] = _upserts(fake_supabase, "node_execution_logs")
+    assert [log["node_id"] for log in logs] == ["start", "answer"]
+    assert {log["status"] for log in logs} == {"completed"}
+    [stored_events] = _upserts(fake_supabase, "execution_events")
+    assert {event["execution_id"] for event in stored_events} == {status["id"]}
+    assert [event["event_type"] for event in stored_events] == [
+        "workflow_started", "progress_update", "node_completed", "progress_update", "node_completed",
+        "workflow_completed"
+    ]
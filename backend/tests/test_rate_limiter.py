@@ -0,0 +1,163 @@
+"""
+Rate limiting: token buckets, the AIMD concurrency governor, and slots
+that never leak capacity when their caller is cancelled
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_limiter import (
+    ConcurrencyController, RateLimitGovernor, TokenBucket, rate_limit_retry_after
+)
+
+
+class _Response:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class _ProviderError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__("provider error")
+        self.response = _Response(status_code, headers or {})
+
+
+def test_bucket_reservations_queue_at_the_refill_rate():
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+    bucket.refund(2)
+    assert bucket.available() == pytest.approx(0.0, abs=0.1)
+
+
+def test_aimd_limit_grows_additively_and_halves_on_throttling():
+    controller = ConcurrencyController(initial=4, minimum=1, maximum=5)
+    for _ in range(4):
+        controller.on_success()
+    assert controller.limit == pytest.approx(5.0, abs=0.1)
+
+    controller.on_throttled(0)
+    assert controller.limit == pytest.approx(2.5, abs=0.1)
+    for _ in range(5):
+        controller.on_throttled(0)
+    assert controller.limit == 1
+
+
+def test_retry_after_is_read_from_rate_limit_errors_only():
+    assert rate_limit_retry_after(_ProviderError(429, {"retry-after": "7"})) == 7.0
+    assert rate_limit_retry_after(_ProviderError(429)) == 0.0
+    assert rate_limit_retry_after(_ProviderError(500, {"retry-after": "7"})) is None
+
+
+async def test_concurrency_is_capped_at_the_limit():
+    governor = RateLimitGovernor({}, concurrency={"initial": 2, "minimum": 1, "maximum": 4})
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        async with governor.slot("openai/gpt-4", 10) as slot:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            slot.record_usage(10)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    assert governor.get_stats()["models"]["openai/gpt-4"]["in_flight"] == 0
+
+
+async def test_throttled_calls_halve_the_limit_and_pause_new_calls():
+    governor = RateLimitGovernor({}, concurrency={"initial": 8, "minimum": 1, "maximum": 8})
+    async with governor.slot("openai/gpt-4", 10) as slot:
+        slot.throttled(0.05)
+
+    started = time.monotonic()
+    async with governor.slot("openai/gpt-4", 10):
+        pass
+    stats = governor.get_stats()["models"]["openai/gpt-4"]
+    assert time.monotonic() - started >= 0.04
+    assert stats["concurrency_limit"] == 4
+    assert stats["throttled"] == 1
+
+
+async def test_a_burst_of_throttled_calls_halves_the_limit_once():
+    governor = RateLimitGovernor({}, concurrency={"initial": 8, "minimum": 1, "maximum": 8})
+    all_admitted = asyncio.Event()
+    admitted = 0
+
+    async def call():
+        nonlocal admitted
+        async with governor.slot("openai/gpt-4", 10) as slot:
+            admitted += 1
+            if admitted == 4:
+                all_admitted.set()
+            await all_admitted.wait()
+            slot.throttled(0)
+
+    await asyncio.gather(*(call() for _ in range(4)))
+    assert governor.get_stats()["models"]["openai/gpt-4"]["concurrency_limit"] == 4
+
+    # A call admitted after the decrease belongs to a new congestion event
+    async with governor.slot("openai/gpt-4", 10) as slot:
+        slot.throttled(0)
+    stats = governor.get_stats()["models"]["openai/gpt-4"]
+    assert stats["concurrency_limit"] == 2
+    assert stats["throttled"] == 5
+
+
+async def test_cancelled_while_paused_releases_the_slot():
+    controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+    controller.on_throttled(10)
+
+    waiter = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0.01)
+    assert controller.in_flight == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert controller.in_flight == 0
+
+
+async def test_cancelled_while_queued_refunds_the_reservation():
+    governor = RateLimitGovernor({"openai/gpt-4": {"rpm": 60, "tpm": 1000}})
+    async with governor.slot("openai/gpt-4", 1000) as slot:
+        slot.record_usage(1000)
+
+    queued = asyncio.ensure_future(governor.slot("openai/gpt-4", 500).__aenter__())
+    await asyncio.sleep(0.01)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+    stats = governor.get_stats()["models"]["openai/gpt-4"]
+    assert stats["tokens_available"] == pytest.approx(0.0, abs=5)
+    assert stats["requests_available"] == pytest.approx(59.0, abs=0.1)
+    assert stats["in_flight"] == 0
+
+
+async def test_cancelled_while_waiting_for_a_slot_leaks_nothing():
+    governor = RateLimitGovernor({}, concurrency={"initial": 1, "minimum": 1, "maximum": 1})
+    release = asyncio.Event()
+
+    async def holder():
+        async with governor.slot("openai/gpt-4", 10):
+            await release.wait()
+
+    holding = asyncio.ensure_future(holder())
+    await asyncio.sleep(0)
+    waiting = asyncio.ensure_future(governor.slot("openai/gpt-4", 10).__aenter__())
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    release.set()
+    await holding
+
+    stats = governor.get_stats()["models"]["openai/gpt-4"]
+    assert (stats["in_flight"], stats["waiting"]) == (0, 0)
@@ -0,0 +1,76 @@
+"""
+Runtime graphs: index-based adjacency, execution order and the compile cache
+"""
+from datetime import datetime, timedelta
+
+from app.models.workflow import NodeType, Workflow
+from app.services.runtime_graph import RuntimeGraph, RuntimeGraphCache
+
+
+def _workflow(nodes, edges, version: int = 1) -> Workflow:
+    now = datetime(2024, 1, 1)
+    return Workflow.from_stored(
+        {
+            "nodes": [{"id": node_id, "type": node_type, "position": {"x": 0, "y": 0}} for node_id, node_type in nodes],
+            "edges": [{"id": f"{source}-{target}", "source": source, "target": target} for source, target in edges]
+        },
+        id="wf-1", user_id="user-1", name="Flow", version=version,
+        created_at=now, updated_at=now + timedelta(seconds=version)
+    )
+
+
+def test_adjacency_uses_indices_and_skips_dangling_edges():
+    graph = RuntimeGraph(_workflow(
+        [("start", "start"), ("llm", "llm"), ("end", "end")],
+        [("start", "llm"), ("llm", "end"), ("llm", "missing")]
+    ))
+
+    assert graph.node("llm").predecessors == (0,)
+    assert graph.node("llm").successors == (2,)
+    assert graph.node("missing") is None
+    assert graph.has_start()
+    assert graph.output_indices == (2,)
+
+
+def test_order_is_topological_not_list_order():
+    graph = RuntimeGraph(_workflow(
+        [("end", "end"), ("llm", "llm"), ("start", "start")],
+        [("start", "llm"), ("llm", "end")]
+    ))
+
+    assert [graph.nodes[i].id for i in graph.order] == ["start", "llm", "end"]
+    assert graph.blocked == ()
+
+
+def test_nodes_on_or_after_a_cycle_are_blocked():
+    graph = RuntimeGraph(_workflow(
+        [("start", "start"), ("a", "llm"), ("b", "llm"), ("end", "end")],
+        [("start", "a"), ("a", "b"), ("b", "a"), ("b", "end")]
+    ))
+
+    assert [graph.nodes[i].id for i in graph.order] == ["start"]
+    assert sorted(graph.nodes[i].id for i in graph.blocked) == ["a", "b", "end"]
+
+
+def test_condition_nodes_compile_their_expressions_once():
+    workflow = _workflow([("start", "start"), ("check", "condition")], [("start", "check")])
+    workflow.nodes[1].data.conditions = [{"variable": "score", "operator": ">", "value": 3}]
+
+    graph = RuntimeGraph(workflow)
+
+    assert len(graph.node("check").conditions.conditions) == 1
+    assert graph.node("check").conditions.error is None
+    assert graph.node("start").conditions is None
+    assert graph.node("check").type == NodeType.CONDITION
+
+
+def test_cache_shares_a_graph_per_revision():
+    cache = RuntimeGraphCache(max_entries=1)
+    nodes, edges = [("start", "start")], []
+
+    first = cache.get(_workflow(nodes, edges))
+    assert cache.get(_workflow(nodes, edges)) is first
+    assert cache.get(_workflow(nodes, edges, version=2)) is not first
+    assert cache.get(_workflow(nodes, edges)) is not first  # evicted by the newer revision
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["size"] == 1
@@ -0,0 +1,83 @@
+"""
+In-process public workflow search index
+"""
+from datetime import datetime, timedelta
+
+from app.models.workflow import WorkflowSummary
+from app.services.search_index import WorkflowSearchIndex, trigrams
+
+
+def _summary(workflow_id: str, name: str, description: str = "", tags=(), public: bool = True, age_days: int = 0):
+    updated = datetime(2024, 6, 1) - timedelta(days=age_days)
+    return WorkflowSummary(
+        id=workflow_id, name=name, description=description, user_id="user-1", tags=list(tags),
+        is_public=public, created_at=updated, updated_at=updated
+    )
+
+
+def _index(*summaries) -> WorkflowSearchIndex:
+    index = WorkflowSearchIndex()
+    for summary in summaries:
+        index.upsert(summary)
+    return index
+
+
+def _ids(results):
+    return [summary.id for summary, _ in results]
+
+
+def test_trigrams_match_pg_trgm_padding():
+    assert trigrams("cat") == {"  c", " ca", "cat", "at "}
+
+
+def test_name_matches_outrank_description_matches():
+    index = _index(
+        _summary("described", "Helper", description="summarize support tickets"),
+        _summary("named", "Ticket summarizer")
+    )
+    assert _ids(index.search("summarize tickets")) == ["named", "described"]
+
+
+def test_misspelled_terms_match_fuzzily():
+    index = _index(_summary("translator", "Document translator"), _summary("other", "Image captioner"))
+    assert _ids(index.search("translater")) == ["translator"]
+
+
+def test_last_token_matches_as_a_prefix():
+    index = _index(_summary("sentiment", "Sentiment analysis"), _summary("other", "Email drafts"))
+    assert _ids(index.search("sentim")) == ["sentiment"]
+    assert index.suggest("sent")[0]["id"] == "sentiment"
+
+
+def test_private_and_removed_workflows_drop_out():
+    index = _index(_summary("a", "Invoice parser"), _summary("b", "Invoice checker"))
+
+    index.upsert(_summary("a", "Invoice parser", public=False))
+    index.remove("b")
+
+    assert index.search("invoice") == []
+    assert len(index) == 0
+    assert index.suggest("inv") == []
+
+
+def test_recent_workflows_win_ties():
+    index = _index(_summary("old", "Resume screener", age_days=30), _summary("new", "Resume screener"))
+    assert _ids(index.search("resume", limit=1)) == ["new"]
+
+
+async def test_refresh_drops_workflows_deleted_on_another_worker(fake_supabase, monkeypatch):
+    from app.services import workflow_service as workflow_service_module
+    from app.services.workflow_service import WorkflowService
+
+    index = _index(_summary("a", "Invoice parser"), _summary("b", "Invoice checker"))
+    index.loaded = True
+    monkeypatch.setattr(workflow_service_module, "workflow_search_index", index)
+    fake_supabase.responses["workflows"] = []
+    fake_supabase.responses["workflow_tombstones"] = [
+        {"workflow_id": "b", "deleted_at": "2024-06-02T00:00:00+00:00"}
+    ]
+
+    await WorkflowService(fake_supabase).refresh_search_index()
+
+    assert _ids(index.search("invoice")) == ["a"]
+    assert index.deleted_watermark == datetime.fromisoformat("2024-06-02T00:00:00+00:00")
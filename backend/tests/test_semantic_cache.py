@@ -0,0 +1,113 @@
+"""
+Semantic cache: paraphrases hit, near-miss prompts do not, and the cache
+needs a configured embedder
+"""
+import numpy as np
+import pytest
+
+from app.services.semantic_cache import HashingEmbedder, SemanticCache, guard_terms, normalize_prompt
+
+NEAR_MISSES = [
+    ("Analyze customer reviews for positive sentiment", "Analyze customer reviews for negative sentiment"),
+    ("Send me a daily summary of new support tickets", "Send me a weekly summary of new support tickets"),
+    ("Summarize the top 5 news articles", "Summarize the top 10 news articles"),
+    ("Translate emails that mention invoices", "Translate emails that do not mention invoices"),
+]
+
+
+class FixedEmbedder:
+    """Provider-style embedder: no declared dimension, one vector per text"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.dimensions = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.vectors[text], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def _cache(**overrides) -> SemanticCache:
+    return SemanticCache(HashingEmbedder(512), **{"threshold": 0.85, "enabled": True, **overrides})
+
+
+async def test_paraphrase_hits():
+    cache = _cache()
+    await cache.store("generate", "Create a chatbot that answers questions about our docs", {"nodes": 3})
+
+    hit = await cache.lookup("generate", "Build a chat bot which answers questions about our docs please")
+
+    assert hit is not None
+    assert hit[0] == {"nodes": 3}
+    assert hit[1] > 0.95
+
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+async def test_near_misses_do_not_hit(stored, asked):
+    cache = _cache()
+    await cache.store("analyze", stored, {"prompt": stored})
+
+    assert await cache.lookup("analyze", asked) is None
+    assert (await cache.lookup("analyze", stored))[0] == {"prompt": stored}
+
+
+async def test_near_misses_would_pass_the_threshold_alone():
+    # Why the guard exists: these pairs embed above the similarity threshold
+    embedder = HashingEmbedder(512)
+    for stored, asked in NEAR_MISSES[:2]:
+        similarity = float(
+            await embedder.embed(normalize_prompt(stored)) @ await embedder.embed(normalize_prompt(asked))
+        )
+        assert similarity >= 0.85
+
+
+def test_guard_terms_are_numbers_and_guard_words():
+    assert guard_terms(normalize_prompt("Top 5 positive reviews from the last 7 days")) == {
+        "top", "5", "positive", "last", "7", "days"
+    }
+
+
+async def test_without_an_embedder_the_cache_is_off():
+    cache = SemanticCache(None, enabled=True)
+    await cache.store("analyze", "anything", {"a": 1})
+
+    assert not cache.enabled
+    assert not cache.available
+    assert await cache.lookup("analyze", "anything") is None
+
+
+async def test_provider_embedder_dimension_comes_from_the_first_embedding():
+    embedder = FixedEmbedder({"weather report": [1, 0, 0], "weather forecast": [0.95, 0.1, 0], "long": [1, 0, 0, 0]})
+    cache = SemanticCache(embedder, enabled=True)
+    assert cache.dimensions is None
+
+    await cache.store("analyze", "weather report", {"ok": True})
+    assert cache.dimensions == 3
+    assert (await cache.lookup("analyze", "weather forecast"))[0] == {"ok": True}
+    assert await cache.lookup("analyze", "long") is None  # wrong dimension is logged, not raised
+
+
+async def test_entries_expire():
+    cache = _cache(ttl_seconds=-1)
+    await cache.store("analyze", "Classify support tickets", {"a": 1})
+
+    assert await cache.lookup("analyze", "Classify support tickets") is None
+    assert cache.get_stats()["namespaces"]["analyze"]["entries"] == 1
+
+
+async def test_a_miss_embeds_its_prompt_once():
+    embedder = HashingEmbedder(512)
+    embedded = []
+    embed = embedder.embed
+
+    async def counting_embed(text):
+        embedded.append(text)
+        return await embed(text)
+    embedder.embed = counting_embed
+    cache = SemanticCache(embedder, enabled=True)
+    await cache.store("generate", "Create a chatbot for our docs", {"nodes": 3})
+
+    assert await cache.lookup("generate", "Summarize support tickets") is None
+    await cache.store("generate", "Summarize support tickets", {"nodes": 2})
+
+    assert len(embedded) == 2
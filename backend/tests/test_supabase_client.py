@@ -0,0 +1,49 @@
+"""
+Database calls run on the bounded pool and are timed per label
+"""
+import threading
+
+import pytest
+
+from app.database.supabase_client import SupabaseClient
+
+
+class BlockingQuery:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.thread = None
+
+    def execute(self):
+        self.thread = threading.current_thread().name
+        if self.error:
+            raise self.error
+        return self.result
+
+
+async def test_queries_run_on_the_database_pool():
+    client = SupabaseClient(max_workers=2)
+    query = BlockingQuery(result="rows")
+    try:
+        assert await client.execute(query, "workflows.get") == "rows"
+    finally:
+        client.shutdown()
+    assert query.thread.startswith("supabase")
+
+
+async def test_timings_are_recorded_per_label():
+    client = SupabaseClient(max_workers=2, slow_query_ms=0)
+    try:
+        await client.execute(BlockingQuery(), "workflows.get")
+        await client.execute(BlockingQuery(), "workflows.get")
+        with pytest.raises(ValueError):
+            await client.execute(BlockingQuery(error=ValueError("boom")), "workflows.list")
+    finally:
+        client.shutdown()
+
+    stats = client.get_query_stats()
+    assert stats["workflows.get"]["count"] == 2
+    assert stats["workflows.get"]["errors"] == 0
+    assert stats["workflows.get"]["slow"] == 2
+    assert stats["workflows.list"]["errors"] == 1
+    assert stats["workflows.get"]["avg_ms"] <= stats["workflows.get"]["max_ms"]
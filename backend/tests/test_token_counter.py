@@ -0,0 +1,87 @@
+"""
+Local token counting and prompt budgets: context windows from LiteLLM's
+model map, the truncate/reject policies and summarization limits
+"""
+import pytest
+
+from app.core.config import settings
+from app.services import token_counter as token_counter_module
+from app.services.litellm_service import litellm_service
+from app.services.token_counter import PromptBudgetError, TokenCounter, approximate_tokens
+
+
+def _messages(*contents):
+    roles = ["system"] + ["user", "assistant"] * len(contents)
+    return [{"role": role, "content": content} for role, content in zip(roles, contents)]
+
+
+def test_approximation_leans_high():
+    assert approximate_tokens("") == 0
+    assert approximate_tokens("one two three") == 4
+    assert approximate_tokens("x" * 400) == 100
+
+
+def test_context_windows_come_from_the_litellm_model_map():
+    counter = TokenCounter(use_tokenizers=False, context_windows={"openai/gpt-4": 4000})
+
+    assert counter.context_window("anthropic/claude-3-haiku-20240307") == 200000
+    assert counter.context_window("openai/gpt-3.5-turbo") == 16385
+    assert counter.context_window("openai/gpt-4") == 4000
+    assert counter.max_output_tokens("openai/gpt-3.5-turbo") == 4096
+
+
+def test_unknown_models_have_no_local_limit():
+    counter = TokenCounter(use_tokenizers=False)
+    messages = _messages("You help.", "word " * 50000)
+
+    assert counter.context_window("acme/unreleased-model") is None
+    assert counter.prompt_budget("acme/unreleased-model", 1000) is None
+    fitted, original, final = counter.fit(messages, "acme/unreleased-model", 1000, "reject")
+    assert fitted is messages and original == final
+
+
+def test_truncate_drops_old_history_then_shortens_the_longest_message():
+    counter = TokenCounter(use_tokenizers=False, context_windows={"test/small": 300})
+    messages = _messages("You help.", "old question " * 40, "old answer " * 40, "latest " * 400)
+
+    fitted, original, final = counter.fit(messages, "test/small", 100)
+
+    assert original > 200 >= final
+    assert [message["role"] for message in fitted] == ["system", "user"]
+    assert fitted[0]["content"] == "You help."
+    assert "...[truncated]..." in fitted[1]["content"]
+    assert counter.stats["truncated"] == 1
+
+
+def test_reject_is_opt_in():
+    counter = TokenCounter(use_tokenizers=False, context_windows={"test/small": 300})
+    messages = _messages("You help.", "latest " * 400)
+
+    with pytest.raises(PromptBudgetError) as raised:
+        counter.fit(messages, "test/small", 100, "reject")
+    assert raised.value.budget == 200
+    assert settings.TOKEN_BUDGET_POLICY == "truncate"
+
+
+async def test_summary_length_is_clamped_to_the_summary_model(monkeypatch):
+    counter = TokenCounter(use_tokenizers=False, context_windows={"test/large": 100000})
+    monkeypatch.setattr(token_counter_module, "token_counter", counter)
+    monkeypatch.setattr("app.services.litellm_service.token_counter", counter)
+    requests = []
+
+    async def completion(messages, model, max_tokens, **kwargs):
+        requests.append((messages, model, max_tokens))
+        return {"content": "condensed"}
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    messages = _messages("You help.", "lorem " * 85000)
+
+    fitted, budget = await litellm_service._fit_prompt(messages, "test/large", 1000, "summarize")
+
+    summary_model = settings.TOKEN_SUMMARY_MODEL
+    (summary_messages, model, max_tokens), = requests
+    assert model == summary_model
+    assert max_tokens == counter.max_output_tokens(summary_model) == 4096
+    assert counter.count_messages(summary_messages, summary_model) + max_tokens <= counter.context_window(summary_model)
+    assert fitted[1]["content"] == "condensed"
+    assert budget["prompt_budget"]["action"] == "summarized"
@@ -0,0 +1,140 @@
+"""
+Workflow version store: stored revision hashes, deduplication, shared
+objects, background recording and loading revisions back
+"""
+import asyncio
+from datetime import datetime
+
+from app.models.workflow import Workflow, WorkflowCreate
+from app.services import workflow_service as workflow_service_module
+from app.services.version_store import WorkflowSnapshot, WorkflowVersionStore
+from app.services.workflow_cache import WorkflowCache
+from app.services.workflow_service import WorkflowService
+
+
+def _workflow(version: int = 1, node_count: int = 3, **overrides) -> Workflow:
+    now = datetime(2024, 1, 1)
+    nodes = [{"id": "start", "type": "start", "position": {"x": 0, "y": 0}}] + [
+        {"id": f"llm-{i}", "type": "llm", "position": {"x": i, "y": 0}, "data": {"config": {"prompt": f"Step {i}"}}}
+        for i in range(1, node_count)
+    ]
+    return Workflow.from_stored(
+        {"nodes": nodes, "edges": [], "variables": []},
+        id="wf-1", user_id="user-1", name="Flow", version=version, created_at=now, updated_at=now,
+        **overrides
+    )
+
+
+async def test_created_rows_carry_the_hash_of_their_content(fake_supabase, monkeypatch):
+    monkeypatch.setattr(workflow_service_module, "workflow_cache", WorkflowCache())
+
+    async def record(*args):
+        return None
+    monkeypatch.setattr(WorkflowService, "_record_version", staticmethod(record))
+    fake_supabase.responses["workflows"] = lambda query: [
+        {**query.operations[0][1][0], "version": 1}
+    ]
+
+    workflow = await WorkflowService(fake_supabase).create_workflow(
+        WorkflowCreate(name="Flow", nodes=[{"id": "start", "type": "start", "position": {"x": 0, "y": 0}}]),
+        "user-1"
+    )
+
+    assert workflow.version_hash == WorkflowSnapshot.from_workflow(workflow).hash
+
+
+async def test_stored_hash_is_used_without_hashing(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    workflow = _workflow(version_hash="stored-hash")
+
+    assert store.version_hash(workflow, "user-1") == "stored-hash"
+    assert store.stats["hashes_computed"] == 0
+    await asyncio.gather(*store._recording.values())
+
+
+async def test_unseen_revision_is_recorded_in_the_background(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    workflow = _workflow()
+
+    version_hash = store.version_hash(workflow, "user-1")
+    assert not fake_supabase.calls  # nothing written on the caller's path
+    await asyncio.gather(*store._recording.values())
+
+    assert version_hash == WorkflowSnapshot.from_workflow(workflow).hash
+    assert store.stats["versions_recorded"] == 1
+    assert store.version_hash(workflow, "user-1") == version_hash
+    assert not store._recording
+    assert store.stats["hashes_computed"] == 1
+
+
+async def test_failed_background_record_is_logged_not_raised(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    fake_supabase.fail = Exception("database unavailable")
+
+    version_hash = store.version_hash(_workflow(), "user-1")
+    await asyncio.gather(*store._recording.values())
+
+    assert version_hash is not None
+    assert store.stats["background_failures"] == 1
+
+
+async def test_recording_a_revision_twice_writes_once(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    workflow = _workflow()
+
+    first = await store.record(workflow)
+    written = len(fake_supabase.calls)
+    second = await store.record(workflow)
+
+    assert first == second
+    assert len(fake_supabase.calls) == written
+    assert store.stats["versions_deduplicated"] == 1
+
+
+async def test_revisions_share_unchanged_objects(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    await store.record(_workflow(version=1, node_count=40))
+    objects_before = store.stats["objects_written"]
+
+    edited = _workflow(version=2, node_count=41)
+    await store.record(edited)
+
+    assert store.stats["objects_written"] - objects_before < 5
+    assert store.stats["objects_shared"] >= 40
+
+
+async def test_loaded_revision_matches_the_recorded_content(fake_supabase):
+    store = WorkflowVersionStore(fake_supabase)
+    original = _workflow(node_count=5)
+    version_hash = await store.record(original)
+    snapshot = WorkflowSnapshot.from_workflow(original)
+
+    fake_supabase.responses["workflow_versions"] = [{"version": 1, "manifest": snapshot.manifest}]
+    fake_supabase.responses["workflow_objects"] = [
+        {"hash": object_hash, "content": content} for object_hash, content in snapshot.objects.items()
+    ]
+    loaded = await WorkflowVersionStore(fake_supabase).load(_workflow(version=7, node_count=1), version_hash)
+
+    assert loaded.version == 1
+    assert loaded.version_hash == version_hash
+    assert WorkflowSnapshot.from_workflow(loaded).hash == version_hash
+
+
+async def test_cold_load_of_a_large_revision_looks_objects_up_in_batches(fake_supabase):
+    original = _workflow(node_count=300)
+    version_hash = await WorkflowVersionStore(fake_supabase).record(original)
+    snapshot = WorkflowSnapshot.from_workflow(original)
+
+    def objects(query):
+        (hashes,) = [args[1] for name, args, _ in query.operations if name == "in_"]
+        return [{"hash": object_hash, "content": snapshot.objects[object_hash]} for object_hash in hashes]
+
+    fake_supabase.responses["workflow_versions"] = [{"version": 1, "manifest": snapshot.manifest}]
+    fake_supabase.responses["workflow_objects"] = objects
+    fake_supabase.calls.clear()
+    loaded = await WorkflowVersionStore(fake_supabase).load(_workflow(version=7, node_count=1), version_hash)
+
+    lookups = [call for call in fake_supabase.calls if call.table == "workflow_objects"]
+    sizes = [len(args[1]) for call in lookups for name, args, _ in call.operations if name == "in_"]
+    assert len(lookups) > 1 and max(sizes) <= 100
+    assert WorkflowSnapshot.from_workflow(loaded).hash == version_hash
@@ -0,0 +1,122 @@
+"""
+Static workflow analysis: cycles, reachability, references, handle types
+and incremental re-analysis of editor diffs
+"""
+import time
+
+from app.models.workflow import Edge, Node, WorkflowDiff, WorkflowVariable
+from app.services.workflow_analyzer import AnalyzerSessionStore, WorkflowAnalyzer, types_compatible
+
+
+def _node(node_id: str, node_type: str, **data) -> Node:
+    fields = {key: data.pop(key) for key in ("inputs", "outputs") if key in data}
+    return Node(id=node_id, type=node_type, position={"x": 0, "y": 0}, data=data, **fields)
+
+
+def _edge(source: str, target: str, **handles) -> Edge:
+    return Edge(id=f"{source}-{target}", source=source, target=target, **handles)
+
+
+def _linear(prompt: str = "Summarise {{query}}") -> WorkflowAnalyzer:
+    return WorkflowAnalyzer(
+        [_node("start", "start"), _node("llm", "llm", prompt=prompt), _node("answer", "answer", template="{{llm.text}}")],
+        [_edge("start", "llm"), _edge("llm", "answer")],
+        [WorkflowVariable(variable="query", label="Query")]
+    )
+
+
+def test_valid_workflow_has_no_findings():
+    analysis = _linear().analyze()
+
+    assert analysis.valid, analysis.errors
+    assert analysis.warnings == []
+
+
+def test_cycles_and_unreachable_nodes_are_reported():
+    analysis = WorkflowAnalyzer(
+        [_node("start", "start"), _node("a", "code"), _node("b", "code"), _node("orphan", "end")],
+        [_edge("start", "a"), _edge("a", "b"), _edge("b", "a")],
+        []
+    ).analyze()
+
+    assert analysis.cycles == [["a", "b"]]
+    assert analysis.unreachable_nodes == ["orphan"]
+    assert not analysis.valid
+
+
+def test_references_must_be_defined_before_the_node_runs():
+    analysis = WorkflowAnalyzer(
+        [
+            _node("start", "start"),
+            _node("first", "llm", prompt="{{second.text}} and {{missing}}"),
+            _node("second", "llm", prompt="{{first.text}} at {{sys.query}}"),
+            _node("end", "end")
+        ],
+        [_edge("start", "first"), _edge("first", "second"), _edge("second", "end")],
+        []
+    ).analyze()
+
+    assert analysis.undefined_references == {"first": ["second.text", "missing"]}
+
+
+def test_incompatible_handle_types_are_errors():
+    analysis = WorkflowAnalyzer(
+        [
+            _node("start", "start"),
+            _node("check", "condition", conditions=[]),
+            _node("fetch", "http-request", url="https://example.com", inputs={"items": {"data_type": "array"}}),
+            _node("end", "end")
+        ],
+        [_edge("start", "check"), _edge("check", "fetch", sourceHandle="result", targetHandle="items"), _edge("fetch", "end")],
+        []
+    ).analyze()
+
+    assert [(m["source_type"], m["target_type"]) for m in analysis.type_mismatches] == [("boolean", "array")]
+    assert types_compatible("number", "string")
+    assert not types_compatible("string", "number")
+
+
+def test_diff_matches_a_full_analysis():
+    analyzer = _linear()
+    analyzer.analyze()
+
+    incremental = analyzer.apply_diff(WorkflowDiff(
+        nodes=[_node("llm", "llm", prompt="Summarise {{topic}}")],
+        edges=[_edge("answer", "start")]
+    ))
+    full = WorkflowAnalyzer(
+        [_node("start", "start"), _node("llm", "llm", prompt="Summarise {{topic}}"),
+         _node("answer", "answer", template="{{llm.text}}")],
+        [_edge("start", "llm"), _edge("llm", "answer"), _edge("answer", "start")],
+        [WorkflowVariable(variable="query", label="Query")]
+    ).analyze()
+
+    assert incremental.model_dump() == full.model_dump()
+    assert incremental.cycles == [["start", "llm", "answer"]]
+
+
+def test_removing_a_node_flags_its_edges_and_adding_a_variable_clears_references():
+    analyzer = _linear(prompt="Summarise {{topic}}")
+    assert analyzer.analyze().undefined_references == {"llm": ["topic"]}
+
+    analysis = analyzer.apply_diff(WorkflowDiff(
+        removed_nodes=["answer"],
+        variables=[WorkflowVariable(variable="topic", label="Topic")]
+    ))
+
+    assert analysis.undefined_references == {}
+    assert "Edge references non-existent target node: answer" in analysis.errors
+
+
+def test_sessions_belong_to_their_owner_and_expire(monkeypatch):
+    store = AnalyzerSessionStore(ttl_seconds=60)
+    analyzer = _linear()
+    session_id = store.create("user-1", analyzer)
+
+    assert store.get(session_id, "user-1") is analyzer
+    assert store.get(session_id, "user-2") is None
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 120)
+    assert store.get(session_id, "user-1") is None
+    assert store.get_stats()["expired"] == 1
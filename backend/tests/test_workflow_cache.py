@@ -0,0 +1,191 @@
+"""
+Workflow definition cache: LRU/TTL tier, stale-write guard, cross-worker
+invalidation, and the update path that bypasses it
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.models.workflow import Workflow, WorkflowUpdate
+from app.services import workflow_service as workflow_service_module
+from app.services.workflow_cache import WorkflowCache
+from app.services.workflow_service import WorkflowService, WorkflowVersionConflict
+
+
+def _workflow(workflow_id: str = "wf-1", name: str = "Flow", version: int = 1) -> Workflow:
+    now = datetime(2024, 1, 1)
+    return Workflow(id=workflow_id, user_id="user-1", name=name, version=version, created_at=now, updated_at=now)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.redis.subscribers.append(self)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        self.redis.subscribers.remove(self)
+
+
+class FakeRedis:
+    """Key/value store and pub/sub shared by every cache built on it"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = []
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def publish(self, channel, message):
+        for subscriber in self.subscribers:
+            subscriber.queue.put_nowait({"type": "message", "data": message.encode()})
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+def _redis_cache(redis: FakeRedis) -> WorkflowCache:
+    cache = WorkflowCache(redis_url="redis://fake")
+    cache._redis = redis
+    return cache
+
+
+async def test_memory_tier_hits_and_evicts_least_recent():
+    cache = WorkflowCache(max_entries=2)
+    for workflow_id in ("a", "b", "c"):
+        await cache.set(_workflow(workflow_id))
+
+    assert await cache.get("a") is None
+    assert (await cache.get("c")).id == "c"
+    assert cache.stats["evictions"] == 1
+
+
+async def test_expired_entries_miss():
+    cache = WorkflowCache(ttl_seconds=0)
+    await cache.set(_workflow())
+    assert await cache.get("wf-1") is None
+
+
+def test_memory_entries_are_short_lived_without_redis():
+    assert WorkflowCache(ttl_seconds=300, local_ttl_seconds=5).ttl_seconds == 5
+    assert WorkflowCache(ttl_seconds=300, redis_url="redis://fake").ttl_seconds == 300
+
+
+async def test_read_started_before_invalidation_is_not_cached():
+    cache = WorkflowCache()
+    generation = cache.generation("wf-1")
+    await cache.invalidate("wf-1")
+    await cache.set(_workflow(), generation)
+    assert await cache.get("wf-1") is None
+
+
+async def test_invalidation_reaches_other_workers():
+    redis = FakeRedis()
+    worker_a, worker_b = _redis_cache(redis), _redis_cache(redis)
+    await worker_a.start()
+    await worker_b.start()
+    await asyncio.sleep(0)
+    try:
+        await worker_b.set(_workflow(name="Old"))
+        assert (await worker_b.get("wf-1")).name == "Old"
+
+        await worker_a.invalidate("wf-1")
+        await asyncio.sleep(0)
+        assert await worker_b.get("wf-1") is None
+        assert worker_b.stats["remote_invalidations"] == 1
+    finally:
+        await worker_a.stop()
+        await worker_b.stop()
+
+
+async def test_memory_tier_is_bypassed_until_subscribed():
+    redis = FakeRedis()
+    cache = _redis_cache(redis)
+    await cache.set(_workflow())
+
+    assert not cache.memory_enabled
+    assert cache._entries == {}
+    assert (await cache.get("wf-1")).id == "wf-1"  # served from Redis
+    assert cache.stats["redis_hits"] == 1
+
+
+def _row(version: int, name: str = "Flow") -> dict:
+    return {
+        "id": "wf-1", "name": name, "user_id": "user-1", "version": version,
+        "workflow_data": {"nodes": [], "edges": [], "variables": [], "tags": []},
+        "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"
+    }
+
+
+def _operations(query, name):
+    return [args for operation, args, _ in query.operations if operation == name]
+
+
+@pytest.fixture
+def service(fake_supabase, monkeypatch):
+    monkeypatch.setattr(workflow_service_module, "workflow_cache", WorkflowCache())
+
+    async def record(*args):
+        return None
+    monkeypatch.setattr(WorkflowService, "_record_version", staticmethod(record))
+    return WorkflowService(fake_supabase)
+
+
+async def test_update_reads_the_database_not_the_cache(service, fake_supabase):
+    # Another worker saved version 5; this worker still caches version 1
+    await workflow_service_module.workflow_cache.set(_workflow(version=1))
+
+    def workflows(query):
+        return [_row(6, "Renamed")] if _operations(query, "update") else [_row(5)]
+    fake_supabase.responses["workflows"] = workflows
+
+    workflow = await service.update_workflow("wf-1", WorkflowUpdate(name="Renamed"), "user-1")
+
+    assert workflow.version == 6
+    update = next(query for query in fake_supabase.calls if _operations(query, "update"))
+    assert ("version", 5) in _operations(update, "eq")
+
+
+async def test_update_is_not_skipped_on_a_stale_cached_copy(service, fake_supabase):
+    # The cache still holds the old name, which matches the request
+    await workflow_service_module.workflow_cache.set(_workflow(name="Renamed"))
+    fake_supabase.responses["workflows"] = lambda query: [_row(2, "Renamed" if _operations(query, "update") else "Other")]
+
+    await service.update_workflow("wf-1", WorkflowUpdate(name="Renamed"), "user-1")
+    assert any(_operations(query, "update") for query in fake_supabase.calls)
+
+
+async def test_update_retries_after_a_concurrent_save(service, fake_supabase):
+    versions = iter([3, 4])
+    attempts = []
+
+    def workflows(query):
+        if _operations(query, "update"):
+            attempts.append(query)
+            return [] if len(attempts) == 1 else [_row(5, "Renamed")]
+        return [_row(next(versions))]
+    fake_supabase.responses["workflows"] = workflows
+
+    workflow = await service.update_workflow("wf-1", WorkflowUpdate(name="Renamed"), "user-1")
+    assert workflow.version == 5
+    assert [dict(_operations(query, "eq"))["version"] for query in attempts] == [3, 4]
+
+
+async def test_update_gives_up_when_the_row_keeps_changing(service, fake_supabase):
+    fake_supabase.responses["workflows"] = lambda query: [] if _operations(query, "update") else [_row(7)]
+    with pytest.raises(WorkflowVersionConflict):
+        await service.update_workflow("wf-1", WorkflowUpdate(name="Renamed"), "user-1")
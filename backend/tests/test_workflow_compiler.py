@@ -0,0 +1,165 @@
+"""
+Compiled mode: generated code must behave exactly like the interpreter
+"""
+from datetime import datetime
+
+import pytest
+
+from app.models.workflow import Workflow
+from app.services import litellm_service as litellm_service_module
+from app.services.litellm_service import litellm_service
+from app.services.llm_cache import CompletionCache, MemoryCacheBackend
+from app.services.runtime_graph import RuntimeGraph
+from app.services.workflow_compiler import CompiledWorkflow, CompiledWorkflowCache, render_expression
+from app.services.workflow_execution_service import WorkflowExecutionService
+
+
+def _workflow(template: str = "Dear {{name}}, {{ignored }} '{{quote}}'", answer: str = "{{shape.output}}!") -> Workflow:
+    now = datetime(2024, 1, 1)
+    return Workflow(
+        id="wf-1", user_id="user-1", name="Flow", version=1, created_at=now, updated_at=now,
+        nodes=[
+            {"id": "start", "type": "start", "position": {"x": 0, "y": 0}},
+            {"id": "shape", "type": "template-transform", "position": {"x": 1, "y": 0}, "data": {"template": template}},
+            {"id": "answer", "type": "answer", "position": {"x": 2, "y": 0}, "data": {"template": answer}}
+        ],
+        edges=[{"source": "start", "target": "shape"}, {"source": "shape", "target": "answer"}]
+    )
+
+
+async def _events(run, service, graph, variables):
+    context = {"variables": dict(variables)}
+    node_outputs = {}
+    events = []
+    async for event in run(service, graph, context, node_outputs):
+        event = dict(event)
+        event.pop("execution_time_ms", None)
+        if "result" in event:
+            event["result"] = {k: v for k, v in event["result"].items() if k != "execution_time_ms"}
+        events.append(event)
+    return events, node_outputs
+
+
+@pytest.mark.parametrize("template", [
+    "Dear {{name}}, {{ignored }} '{{quote}}'",
+    "{{missing}} and {{shape.output}}",
+    "no references",
+    "\"\"\"'; import os; {{name}}",
+])
+def test_rendered_templates_match_the_interpreter(template):
+    variables = {"name": "Ada", "quote": "it's \"fine\""}
+    rendered = eval(render_expression(template), {
+        "variables": variables, "node_outputs": {},
+        "_fill": lambda value, placeholder: placeholder if value is None else str(value),
+        "_node_output": lambda outputs, variables, node_id, output, name: variables.get(name)
+    })
+
+    assert rendered == WorkflowExecutionService(None)._replace_variables(template, variables, {})
+
+
+async def test_compiled_run_emits_the_interpreter_events():
+    service = WorkflowExecutionService(None)
+    graph = RuntimeGraph(_workflow())
+    variables = {"name": "Ada", "quote": "hi"}
+
+    interpreted = await _events(WorkflowExecutionService._interpret, service, graph, variables)
+    compiled = await _events(CompiledWorkflow("a" * 64, graph).run, service, graph, variables)
+
+    assert compiled == interpreted
+    assert compiled[1]["shape"]["outputs"]["output"] == "Dear Ada, {{ignored }} 'hi'"
+
+
+async def test_failing_node_stops_both_modes_alike():
+    service = WorkflowExecutionService(None)
+    graph = RuntimeGraph(_workflow(template=""))
+
+    interpreted = await _events(WorkflowExecutionService._interpret, service, graph, {})
+    compiled = await _events(CompiledWorkflow("b" * 64, graph).run, service, graph, {})
+
+    assert compiled == interpreted
+
+
+@pytest.mark.parametrize("mode", ["interpreted", "compiled"])
+async def test_temperature_zero_llm_node_is_served_from_the_cache_on_rerun(monkeypatch, mode):
+    calls = []
+
+    async def complete(request_data):
+        calls.append(request_data["temperature"])
+        return {"content": "Hello", "model": request_data["model"], "usage": {"total_tokens": 3}, "cost": 0.01}
+
+    monkeypatch.setattr(litellm_service_module, "completion_cache", CompletionCache(MemoryCacheBackend()))
+    monkeypatch.setattr(litellm_service, "_complete", complete)
+    now = datetime(2024, 1, 1)
+    workflow = Workflow(
+        id="wf-1", user_id="user-1", name="Flow", version=1, created_at=now, updated_at=now,
+        nodes=[
+            {"id": "start", "type": "start", "position": {"x": 0, "y": 0}},
+            {"id": "llm", "type": "llm", "position": {"x": 1, "y": 0}, "data": {"prompt": "Hi", "temperature": 0}}
+        ],
+        edges=[{"source": "start", "target": "llm"}]
+    )
+    service, graph = WorkflowExecutionService(None), RuntimeGraph(workflow)
+    run = WorkflowExecutionService._interpret if mode == "interpreted" else CompiledWorkflow("c" * 64, graph).run
+
+    for _ in range(2):
+        await _events(run, service, graph, {})
+
+    assert calls == [0]
+
+
+@pytest.mark.parametrize("mode", ["interpreted", "compiled"])
+async def test_shortened_prompts_are_logged_on_the_llm_node(monkeypatch, mode):
+    async def completion(messages, **params):
+        return {
+            "content": "Hello", "model": params["model"], "usage": {"total_tokens": 900}, "cost": 0.01,
+            "prompt_budget": {"action": "truncated", "original_tokens": 5000, "prompt_tokens": 800}
+        }
+
+    monkeypatch.setattr(litellm_service, "completion", completion)
+    now = datetime(2024, 1, 1)
+    workflow = Workflow(
+        id="wf-1", user_id="user-1", name="Flow", version=1, created_at=now, updated_at=now,
+        nodes=[
+            {"id": "start", "type": "start", "position": {"x": 0, "y": 0}},
+            {"id": "llm", "type": "llm", "position": {"x": 1, "y": 0}, "data": {"prompt": "Hi"}}
+        ],
+        edges=[{"source": "start", "target": "llm"}]
+    )
+    service, graph = WorkflowExecutionService(None), RuntimeGraph(workflow)
+    run = WorkflowExecutionService._interpret if mode == "interpreted" else CompiledWorkflow("d" * 64, graph).run
+
+    events, _ = await _events(run, service, graph, {})
+
+    (logs,) = [event["result"]["logs"] for event in events if event.get("node_id") == "llm" and "result" in event]
+    assert "Prompt truncated to fit the context window: 5000 -> 800 tokens" in logs
+
+
+def test_cache_compiles_hot_valid_revisions_once():
+    cache = CompiledWorkflowCache(enabled=True, threshold=3)
+    workflow = _workflow()
+    graph = RuntimeGraph(workflow)
+
+    assert [cache.get(workflow, graph, "hash-1") is None for _ in range(2)] == [True, True]
+    compiled = cache.get(workflow, graph, "hash-1")
+    assert compiled is not None
+    assert cache.get(workflow, graph, "hash-1") is compiled
+    assert cache.get(workflow, graph, None) is None
+    assert cache.get_stats()["compilations"] == 1
+
+
+def test_invalid_revisions_stay_interpreted():
+    cache = CompiledWorkflowCache(enabled=True, threshold=1)
+    workflow = _workflow()
+    workflow.edges.append(workflow.edges[0].model_copy(update={"id": "loop", "source": "answer", "target": "start"}))
+
+    assert cache.get(workflow, RuntimeGraph(workflow), "hash-2") is None
+    assert cache.get(workflow, RuntimeGraph(workflow), "hash-2") is None
+    assert cache.get_stats()["compile_failures"] == 1
+
+
+def test_disabled_cache_never_compiles():
+    cache = CompiledWorkflowCache(enabled=False, threshold=1)
+    workflow = _workflow()
+
+    assert cache.get(workflow, RuntimeGraph(workflow), "hash-3") is None
+    assert cache.get_stats()["compilations"] == 0
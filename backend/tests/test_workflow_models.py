@@ -0,0 +1,124 @@
+"""
+Workflow models: lazy graph hydration, summaries and typed node configs
+"""
+from datetime import datetime
+
+import pytest
+
+from app.models.workflow import NODE_CONFIG_MODELS, Node, NodeConfig, NodeType, Workflow, WorkflowSummary
+from app.services.workflow_service import WorkflowService
+
+
+def _stored_row(**overrides) -> dict:
+    row = {
+        "id": "wf-1",
+        "name": "Flow",
+        "user_id": "user-1",
+        "version": 3,
+        "tags": ["demo"],
+        "workflow_data": {
+            "nodes": [
+                {"id": "start", "type": "start", "position": {"x": 0, "y": 0}},
+                {"id": "llm", "type": "llm", "position": {"x": 1, "y": 0}, "data": {"prompt": "Hi {{name}}"}}
+            ],
+            "edges": [{"id": "e1", "source": "start", "target": "llm"}],
+            "variables": [],
+            "tags": ["demo"]
+        },
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "updated_at": "2024-01-02T00:00:00+00:00"
+    }
+    row.update(overrides)
+    return row
+
+
+def test_stored_graph_is_parsed_on_first_access():
+    workflow = WorkflowService(None)._db_to_workflow(_stored_row())
+    assert not workflow.is_hydrated
+
+    assert [node.type for node in workflow.nodes] == [NodeType.START, NodeType.LLM]
+    assert workflow.is_hydrated
+    assert workflow.nodes[1].data.prompt == "Hi {{name}}"
+    assert workflow.edges[0].target == "llm"
+
+
+def test_serialising_hydrates_the_graph():
+    workflow = WorkflowService(None)._db_to_workflow(_stored_row())
+    dumped = workflow.model_dump(mode="json")
+
+    assert [node["id"] for node in dumped["nodes"]] == ["start", "llm"]
+    assert dumped["version"] == 3
+
+
+def test_from_stored_matches_a_validated_workflow():
+    row = _stored_row()
+    lazy = WorkflowService(None)._db_to_workflow(row)
+    eager = Workflow(
+        id="wf-1", name="Flow", user_id="user-1", version=3, tags=["demo"],
+        created_at=datetime.fromisoformat(row["created_at"]),
+        updated_at=datetime.fromisoformat(row["updated_at"]),
+        nodes=row["workflow_data"]["nodes"], edges=row["workflow_data"]["edges"]
+    )
+    exclude = {"nodes": {"__all__": {"created_at", "updated_at"}}, "edges": {"__all__": {"created_at"}}}
+    assert lazy.model_dump(exclude=exclude) == eager.model_dump(exclude=exclude)
+
+
+def test_summary_needs_no_graph():
+    summary = WorkflowService(None)._db_to_summary(_stored_row(workflow_data=None, version=None))
+    assert isinstance(summary, WorkflowSummary)
+    assert summary.version == 1
+    assert summary.tags == ["demo"]
+
+
+def _node(node_type: str, **data) -> Node:
+    return Node(id="n", type=node_type, position={"x": 0, "y": 0}, data=data)
+
+
+def test_config_is_typed_by_node_type():
+    assert type(_node("llm", prompt="Hi").data) is NODE_CONFIG_MODELS[NodeType.LLM]
+    assert type(_node("http-request", url="https://example.com").data) is NODE_CONFIG_MODELS[NodeType.HTTP_REQUEST]
+
+
+def test_config_serialises_only_what_was_set():
+    dumped = _node("llm", prompt="Hi", temperature=0.7, system_prompt=None).model_dump(mode="json")["data"]
+
+    # A value equal to the default and an explicit None are both kept
+    assert dumped == {"prompt": "Hi", "temperature": 0.7, "system_prompt": None}
+    assert _node("llm").model_dump(mode="json")["data"] == {}
+
+
+def test_config_round_trip_keeps_unknown_keys():
+    node = _node("llm", prompt="Hi", response_format={"type": "json"})
+    restored = Node.model_validate(node.model_dump(mode="json"))
+
+    assert restored.data.response_format == {"type": "json"}
+    assert restored.data.max_tokens == 1000  # default restored on parse
+    assert restored.model_dump(mode="json")["data"] == {"prompt": "Hi", "response_format": {"type": "json"}}
+
+
+def test_legacy_fields_read_as_none_and_others_raise():
+    data = _node("code", code="print(1)").data
+
+    assert data.prompt is None
+    assert data.template is None
+    with pytest.raises(AttributeError):
+        data.not_a_config_field
+
+
+def test_flat_config_is_converted_to_the_typed_config():
+    node = Node(id="n", type="llm", position={"x": 0, "y": 0}, data=NodeConfig(prompt="Hi", url="https://example.com"))
+
+    assert node.data.prompt == "Hi"
+    assert node.model_dump(mode="json")["data"] == {"prompt": "Hi", "url": "https://example.com"}
+
+
+def test_stored_flat_llm_node_dumps_only_llm_fields():
+    # How every stored row looks today: all NodeConfig keys, defaults and Nones included
+    stored = {**NodeConfig(prompt="Hi", temperature=0).model_dump(), "response_format": {"type": "json"}}
+    node = Node(id="n", type="llm", position={"x": 0, "y": 0}, data=stored)
+
+    dumped = node.model_dump(mode="json")["data"]
+    llm_fields = set(NODE_CONFIG_MODELS[NodeType.LLM].model_fields)
+    assert set(dumped) - llm_fields == {"response_format"}
+    assert dumped["prompt"] == "Hi" and dumped["temperature"] == 0
+    assert node.data.url is None
@@ -0,0 +1,129 @@
+"""
+PATCH /workflows/{id}: JSON-Patch validation, one conditional call and error mapping
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, get_args
+
+import pytest
+from postgrest.exceptions import APIError
+from pydantic import ValidationError
+
+from app.models.workflow import NODE_CONFIG_MODELS, NodeType, PatchOperation, WorkflowPatch
+from app.services import workflow_service as workflow_service_module
+from app.services.workflow_cache import WorkflowCache
+from app.services.workflow_service import WorkflowService, WorkflowVersionConflict
+
+
+def _row(**workflow_data_overrides) -> dict:
+    workflow_data = {
+        "nodes": [{"id": "start", "type": "start", "position": {"x": 0, "y": 0}}],
+        "edges": [],
+        "variables": [],
+        "tags": []
+    }
+    workflow_data.update(workflow_data_overrides)
+    return {
+        "id": "wf-1", "name": "Flow", "user_id": "user-1", "version": 4, "is_public": False, "tags": [],
+        "workflow_data": workflow_data,
+        "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"
+    }
+
+
+def _patch(*operations) -> WorkflowPatch:
+    return WorkflowPatch(version=3, operations=[dict(zip(("op", "path", "value"), op)) for op in operations])
+
+
+@pytest.fixture
+def service(fake_supabase, monkeypatch):
+    monkeypatch.setattr(workflow_service_module, "workflow_cache", WorkflowCache())
+
+    async def record(*args):
+        return None
+    monkeypatch.setattr(WorkflowService, "_record_version", staticmethod(record))
+    return WorkflowService(fake_supabase)
+
+
+def _rpc_calls(fake_supabase):
+    return [query.operations[0][1][1] for query in fake_supabase.calls if query.table == "rpc:patch_workflow"]
+
+
+def test_paths_outside_the_document_are_rejected():
+    with pytest.raises(ValidationError):
+        PatchOperation(op="replace", path="/user_id", value="someone-else")
+    with pytest.raises(ValidationError):
+        WorkflowPatch(version=1, operations=[])
+
+
+async def test_valid_patch_is_applied_in_one_call(service, fake_supabase):
+    fake_supabase.responses["rpc:patch_workflow"] = [_row()]
+
+    workflow = await service.patch_workflow("wf-1", _patch(("replace", "/name", "Renamed")), "user-1")
+
+    assert workflow.version == 4
+    (call,) = _rpc_calls(fake_supabase)
+    assert call["expected_version"] == 3
+    assert "dry_run" not in call
+
+
+async def test_patch_leaving_an_invalid_graph_is_a_client_error(service, fake_supabase):
+    def reject(query):
+        raise APIError({
+            "code": "22023", "details": None,
+            "message": "Patched workflow is invalid: /nodes/0/type: unknown node type"
+        })
+    fake_supabase.responses["rpc:patch_workflow"] = reject
+
+    with pytest.raises(ValueError, match="nodes/0/type"):
+        await service.patch_workflow("wf-1", _patch(("replace", "/nodes/0/type", "bogus")), "user-1")
+
+
+def _schema_function(name: str) -> str:
+    schema = (Path(__file__).parents[1] / "database" / "supabase_schema.sql").read_text()
+    start = schema.index(f"CREATE OR REPLACE FUNCTION {name}(")
+    return schema[start:schema.index("$$ LANGUAGE", start)]
+
+
+_CONFIG_KINDS = {
+    str: "string", float: "number", int: "integer", Dict[str, Any]: "object", Dict[str, str]: "string_map",
+    List[str]: "string_array", List[Dict[str, Any]]: "object_array"
+}
+
+
+def test_sql_document_check_matches_the_models():
+    source = _schema_function("workflow_document_problem")
+    node_types = re.search(r"node_types CONSTANT TEXT\[\] := ARRAY\[(.*?)\];", source, re.S).group(1)
+    config_kinds = re.search(r"config_kinds CONSTANT JSONB := '(.*?)';", source, re.S).group(1)
+
+    assert re.findall(r"'([^']+)'", node_types) == [node_type.value for node_type in NodeType]
+    expected = {
+        name: _CONFIG_KINDS[get_args(field.annotation)[0]]
+        for model in NODE_CONFIG_MODELS.values() for name, field in model.model_fields.items()
+    }
+    assert json.loads(config_kinds) == expected
+
+
+@pytest.mark.parametrize("code", ["22023", "23502", "22P02"])
+async def test_database_rejections_map_to_value_errors(service, fake_supabase, code):
+    def reject(query):
+        raise APIError({"code": code, "message": "rejected", "details": None})
+    fake_supabase.responses["rpc:patch_workflow"] = reject
+
+    with pytest.raises(ValueError, match="rejected"):
+        await service.patch_workflow("wf-1", _patch(("remove", "/nodes/9")), "user-1")
+
+
+async def test_stale_version_raises_conflict(service, fake_supabase):
+    def conflict(query):
+        raise APIError({"code": "PT409", "message": "Workflow version conflict", "details": "7"})
+    fake_supabase.responses["rpc:patch_workflow"] = conflict
+
+    with pytest.raises(WorkflowVersionConflict) as raised:
+        await service.patch_workflow("wf-1", _patch(("replace", "/name", "Renamed")), "user-1")
+    assert raised.value.current_version == 7
+
+
+async def test_missing_or_foreign_workflow_returns_none(service, fake_supabase):
+    fake_supabase.responses["rpc:patch_workflow"] = []
+    assert await service.patch_workflow("wf-1", _patch(("replace", "/name", "Renamed")), "user-1") is None